@@ -0,0 +1,262 @@
+"""
+Time and memory-profile every stage of the report pipeline on synthetic plan dumps.
+
+    python benchmarks/bench_pipeline.py --sizes 1000 10000 100000
+    python benchmarks/bench_pipeline.py --sizes 1000 --compare benchmarks/results/<earlier run>.json
+
+Each stage runs ``--repeat`` times and the fastest wall time is kept.  Peak memory is measured in one extra run
+under tracemalloc, so tracing does not slow down the timed runs.  Results are written as JSON and can be compared
+against an earlier run to spot regressions.
+"""
+
+import argparse
+import io
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "mtv_parser"))
+
+from clioutput import CLIOutput  # noqa: E402
+from plan_generator import PlanGenerator  # noqa: E402
+from plan_loader import iter_plans  # noqa: E402
+from visualization import plot_gantt_chart  # noqa: E402
+from vm_information import analyze_concurrent_migrations, summarize_plan  # noqa: E402
+from vm_records import VMRecords  # noqa: E402
+
+DEFAULT_SIZES = [1000, 10000, 100000]
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+STAGES = ["yaml_load", "extraction", "analyze", "report", "gantt"]
+
+
+def generate_dump(vms: int, seed: int, dump_dir: Path) -> Path:
+    """
+    Generate (or reuse) a dump with about ``vms`` VMs.
+
+    Args:
+        vms (int): Target VM count.
+        seed (int): Generator seed.
+        dump_dir (Path): Directory the dumps are kept in between runs.
+
+    Returns:
+        Path: The dump.
+    """
+    path = dump_dir / f"plans-{vms}-{seed}.yaml"
+    if not path.exists():
+        generator = PlanGenerator(seed=seed)
+        # each plan holds between 1 and vms_per_plan VMs
+        plans = max(1, round(vms * 2 / (generator.vms_per_plan + 1)))
+        partial = path.with_suffix(".partial")
+        with open(partial, "w") as dump:
+            generator.write(dump, plans)
+        partial.rename(path)
+    return path
+
+
+def load_stage(path: Path) -> List[Dict[str, Any]]:
+    with open(path, "rb") as dump:
+        return list(iter_plans(dump))
+
+
+def extraction_stage(plans: List[Dict[str, Any]]) -> Tuple[VMRecords, List[dict], List[dict]]:
+    all_vms = VMRecords()
+    successful_migrations = []
+    failed_migrations = []
+    for entry in plans:
+        summary = summarize_plan(entry)
+        if summary is None:
+            continue
+        vm_records, migration_dict = summary
+        all_vms.extend(vm_records)
+        if migration_dict["vms_failed"] == "True":
+            failed_migrations.append(migration_dict)
+        else:
+            successful_migrations.append(migration_dict)
+    return all_vms, successful_migrations, failed_migrations
+
+
+def report_stage(extracted: Tuple[VMRecords, List[dict], List[dict]], concurrency_data: Dict[str, Any]) -> str:
+    all_vms, successful_migrations, failed_migrations = extracted
+    text = io.StringIO()
+    output = CLIOutput(text)
+    output.write_report(all_vms, successful_migrations, failed_migrations, concurrency_data)
+    output.close()
+    return text.getvalue()
+
+
+def measure(function: Callable[[], Any], repeat: int, memory: bool) -> Tuple[Any, Dict[str, Any]]:
+    """
+    Run a stage and measure it.
+
+    Args:
+        function (Callable[[], Any]): The stage.
+        repeat (int): Number of timed runs.
+        memory (bool): Also measure peak traced memory in an extra run.
+
+    Returns:
+        Tuple[Any, Dict[str, Any]]: The stage result and its measurements.
+    """
+    timings = []
+    for _ in range(repeat):
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        result = function()
+        timings.append((time.perf_counter() - wall, time.process_time() - cpu))
+    seconds, cpu_seconds = min(timings)
+    stats = {"seconds": round(seconds, 6), "cpu_seconds": round(cpu_seconds, 6)}
+    if memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+        function()
+        stats["peak_bytes"] = tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+    return result, stats
+
+
+def run_size(vms: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    Benchmark every stage on one dump size.
+
+    Args:
+        vms (int): Target VM count.
+        args (argparse.Namespace): Command line options.
+
+    Returns:
+        Dict[str, Any]: Dump details and per-stage measurements.
+    """
+    path = generate_dump(vms, args.seed, args.dump_dir)
+    stages: Dict[str, Dict[str, Any]] = {}
+    memory = not args.no_memory
+
+    plans, stages["yaml_load"] = measure(lambda: load_stage(path), args.repeat, memory)
+    extracted, stages["extraction"] = measure(lambda: extraction_stage(plans), args.repeat, memory)
+    all_vms = extracted[0]
+    concurrency_data, stages["analyze"] = measure(lambda: analyze_concurrent_migrations(all_vms), args.repeat, memory)
+    _, stages["report"] = measure(lambda: report_stage(extracted, concurrency_data), args.repeat, memory)
+    if not args.no_gantt:
+        chart = str(args.dump_dir / "gantt.png")
+        _, stages["gantt"] = measure(lambda: plot_gantt_chart(all_vms, filename=chart), args.repeat, memory)
+
+    return {
+        "dump_bytes": path.stat().st_size,
+        "plans": len(plans),
+        "vms": sum(len(((entry.get("status") or {}).get("migration") or {}).get("vms") or []) for entry in plans),
+        "migrated_vms": len(all_vms),
+        "stages": stages,
+    }
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare a run against an earlier one.
+
+    Args:
+        results (Dict[str, Any]): Current run.
+        baseline (Dict[str, Any]): Earlier run.
+        threshold (float): Relative slowdown (or memory growth) reported as a regression, e.g. 0.1 for 10%.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    print(f"\n{'size':>8} {'stage':<12} {'seconds':>10} {'baseline':>10} {'ratio':>7} {'peak MB':>9} {'ratio':>7}")
+    for size, current in results["sizes"].items():
+        previous = baseline.get("sizes", {}).get(size)
+        if previous is None:
+            continue
+        for stage, stats in current["stages"].items():
+            old = previous["stages"].get(stage)
+            if old is None:
+                continue
+            time_ratio = stats["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+            memory_ratio = None
+            if "peak_bytes" in stats and old.get("peak_bytes"):
+                memory_ratio = stats["peak_bytes"] / old["peak_bytes"]
+            peak = f"{stats['peak_bytes'] / 2**20:9.1f}" if "peak_bytes" in stats else f"{'-':>9}"
+            memory_text = f"{memory_ratio:7.2f}" if memory_ratio is not None else f"{'-':>7}"
+            print(
+                f"{size:>8} {stage:<12} {stats['seconds']:10.3f} {old['seconds']:10.3f} {time_ratio:7.2f} "
+                f"{peak} {memory_text}"
+            )
+            if time_ratio > 1 + threshold:
+                regressions.append(f"{size} VMs {stage}: {time_ratio:.2f}x slower")
+            if memory_ratio is not None and memory_ratio > 1 + threshold:
+                regressions.append(f"{size} VMs {stage}: {memory_ratio:.2f}x more memory")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the MTV report pipeline on synthetic plan dumps")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help=f"VM counts to benchmark (default: {' '.join(map(str, DEFAULT_SIZES))})",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage, the fastest is kept (default: 3)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: 0)")
+    parser.add_argument(
+        "--dump-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "mtv-parser-bench",
+        help="directory generated dumps are kept in between runs",
+    )
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--no-gantt", action="store_true", help="skip the Gantt chart stage")
+    parser.add_argument(
+        "-o", "--output", type=Path, help="results file (default: benchmarks/results/<UTC timestamp>.json)"
+    )
+    parser.add_argument("--compare", type=Path, metavar="RESULTS", help="earlier results file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.1, help="relative slowdown reported as a regression (default: 0.1)"
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    args.dump_dir.mkdir(parents=True, exist_ok=True)
+    created = datetime.now(timezone.utc)
+    results: Dict[str, Any] = {
+        "created": created.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "seed": args.seed,
+        "sizes": {},
+    }
+    for vms in args.sizes:
+        size_results = run_size(vms, args)
+        results["sizes"][str(vms)] = size_results
+        stage_text = "  ".join(f"{stage} {stats['seconds']:.3f}s" for stage, stats in size_results["stages"].items())
+        print(f"{vms:>8} VMs ({size_results['dump_bytes'] / 2**20:.1f} MB dump): {stage_text}")
+
+    output = args.output or RESULTS_DIR / f"{created:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
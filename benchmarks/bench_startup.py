@@ -0,0 +1,197 @@
+"""
+Time the startup of the command line tool and check the report-only path stays free of plotting imports.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --compare benchmarks/results/startup-<earlier run>.json
+
+Every scenario runs the tool in a fresh interpreter ``--repeat`` times and the fastest wall time is kept.  One
+extra run under ``-X importtime`` lists the modules the scenario imported; the report-only scenarios fail if one
+of FORBIDDEN_MODULES is among them.  Results are written as JSON and can be compared against an earlier run.
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT / "mtv_parser"))
+
+from plan_generator import PlanGenerator  # noqa: E402
+
+PARSER = ROOT / "mtv_parser" / "mtv_plan_parser.py"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+# Modules the text report must never import: plotting, and what only the chart workers, the plan cache and the
+# API source need
+FORBIDDEN_MODULES = ("matplotlib", "pandas", "multiprocessing", "sqlite3", "ssl", "http")
+
+# name: (arguments after the dump, report only)
+SCENARIOS: Dict[str, Tuple[List[str], bool]] = {
+    "help": (["--help"], True),
+    "report_no_plot": (["--no-plot", "-j", "1"], True),
+    "report": (["-j", "1"], False),
+}
+
+
+def generate_dump(plans: int, seed: int, directory: Path) -> Path:
+    path = directory / f"startup-plans-{plans}-{seed}.yaml"
+    if not path.exists():
+        with open(path, "w") as dump:
+            PlanGenerator(seed=seed).write(dump, plans)
+    return path
+
+
+def run(arguments: List[str], cwd: Path, import_time: bool = False) -> Tuple[float, str]:
+    """
+    Run the tool once in a fresh interpreter.
+
+    Args:
+        arguments (List[str]): Command line of the tool.
+        cwd (Path): Working directory, charts are written there.
+        import_time (bool, optional): Run under ``-X importtime``. Defaults to False.
+
+    Returns:
+        Tuple[float, str]: Wall time in seconds and the standard error of the run.
+    """
+    command = [sys.executable] + (["-X", "importtime"] if import_time else []) + [str(PARSER)] + arguments
+    wall = time.perf_counter()
+    completed = subprocess.run(
+        command,
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+    )
+    seconds = time.perf_counter() - wall
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed:\n{completed.stderr[-2000:]}")
+    return seconds, completed.stderr
+
+
+def imported_modules(import_log: str) -> Set[str]:
+    """Top-level packages listed in ``-X importtime`` output."""
+    modules = set()
+    for line in import_log.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            name = line.rsplit("|", 1)[1].strip()
+            if name != "package":
+                modules.add(name.split(".")[0])
+    return modules
+
+
+def run_scenario(name: str, dump: Path, args: argparse.Namespace) -> Dict[str, Any]:
+    arguments, report_only = SCENARIOS[name]
+    arguments = arguments if arguments == ["--help"] else [str(dump)] + arguments
+    timings = [run(arguments, args.dump_dir)[0] for _ in range(args.repeat)]
+    _, import_log = run(arguments, args.dump_dir, import_time=True)
+    modules = imported_modules(import_log)
+    stats: Dict[str, Any] = {"seconds": round(min(timings), 6), "modules": len(modules)}
+    if report_only:
+        stats["forbidden_modules"] = sorted(module for module in FORBIDDEN_MODULES if module in modules)
+    return stats
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """
+    Compare a run against an earlier one.
+
+    Args:
+        results (Dict[str, Any]): Current run.
+        baseline (Dict[str, Any]): Earlier run.
+        threshold (float): Relative slowdown reported as a regression, e.g. 0.2 for 20%.
+
+    Returns:
+        List[str]: Descriptions of the regressions.
+    """
+    regressions = []
+    print(f"\n{'scenario':<16} {'seconds':>10} {'baseline':>10} {'ratio':>7}")
+    for name, stats in results["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(name)
+        if old is None:
+            continue
+        ratio = stats["seconds"] / old["seconds"] if old["seconds"] else float("inf")
+        print(f"{name:<16} {stats['seconds']:10.3f} {old['seconds']:10.3f} {ratio:7.2f}")
+        if ratio > 1 + threshold:
+            regressions.append(f"{name}: {ratio:.2f}x slower")
+    return regressions
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the startup of the MTV report command")
+    parser.add_argument(
+        "--scenarios",
+        nargs="+",
+        choices=list(SCENARIOS),
+        default=list(SCENARIOS),
+        help="scenarios to run (default: all)",
+    )
+    parser.add_argument("--plans", type=int, default=20, help="plans in the generated dump (default: 20)")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per scenario, the fastest is kept (default: 5)")
+    parser.add_argument("--seed", type=int, default=0, help="generator seed (default: 0)")
+    parser.add_argument(
+        "--dump-dir",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "mtv-parser-bench",
+        help="directory the generated dump and charts are written to",
+    )
+    parser.add_argument(
+        "-o", "--output", type=Path, help="results file (default: benchmarks/results/startup-<UTC timestamp>.json)"
+    )
+    parser.add_argument("--compare", type=Path, metavar="RESULTS", help="earlier results file to compare against")
+    parser.add_argument(
+        "--threshold", type=float, default=0.2, help="relative slowdown reported as a regression (default: 0.2)"
+    )
+    args = parser.parse_args(argv)
+    if args.repeat < 1:
+        parser.error("--repeat must be at least 1")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    args.dump_dir.mkdir(parents=True, exist_ok=True)
+    dump = generate_dump(args.plans, args.seed, args.dump_dir)
+    created = datetime.now(timezone.utc)
+    results: Dict[str, Any] = {
+        "created": created.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "repeat": args.repeat,
+        "plans": args.plans,
+        "scenarios": {},
+    }
+    failures = []
+    for name in args.scenarios:
+        stats = run_scenario(name, dump, args)
+        results["scenarios"][name] = stats
+        print(f"{name:<16} {stats['seconds']:.3f}s  {stats['modules']} top-level modules")
+        if stats.get("forbidden_modules"):
+            failures.append(f"{name} imported {', '.join(stats['forbidden_modules'])}")
+
+    output = args.output or RESULTS_DIR / f"startup-{created:%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as results_file:
+        json.dump(results, results_file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            failures.extend(compare(results, json.load(baseline_file), args.threshold))
+    if failures:
+        print("\nRegressions:")
+        for failure in failures:
+            print(f"  {failure}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
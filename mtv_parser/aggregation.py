@@ -0,0 +1,234 @@
+from itertools import repeat
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from vm_records import VMRecords, as_vm_records
+
+# Keys VMs can be grouped by
+GROUP_KEYS = ("os", "plan", "namespace", "target_namespace", "provider", "state")
+# Keys plans can be grouped by, a plan has no single OS
+PLAN_GROUP_KEYS = ("plan", "namespace", "target_namespace", "provider", "state")
+# Names of the "state" key, indexed by the failure flag
+STATE_NAMES = ("successful", "failed")
+
+# Keys of one grouping, e.g. ("provider", "namespace"); () puts everything in one group
+Grouping = Tuple[str, ...]
+# Statistics per group of each grouping, groups keyed by their values in the order of the grouping's keys
+Aggregation = Dict[Grouping, Dict[Tuple[str, ...], "Stats"]]
+
+
+class Stats:
+    """
+    Statistics of a group of VMs or plans, updated one item at a time.
+
+    Attributes:
+        count (int): VMs or plans in the group.
+        vms (int): VMs in the group, for plans the VMs of the plans.
+        failed (int): Failed VMs or plans.
+        disk_size (int): Total disk size in MB.
+        duration (float): Total duration in minutes.
+        shortest (float): Shortest duration in minutes.
+        longest (float): Longest duration in minutes.
+        longest_name (Optional[str]): First VM or plan with the longest duration.
+        longest_disk_size (int): Disk size of that VM or plan in MB.
+    """
+
+    __slots__ = (
+        "count",
+        "vms",
+        "failed",
+        "disk_size",
+        "duration",
+        "shortest",
+        "longest",
+        "longest_name",
+        "longest_disk_size",
+    )
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.vms = 0
+        self.failed = 0
+        self.disk_size = 0
+        self.duration = 0
+        self.shortest = float("inf")
+        self.longest = float("-inf")
+        self.longest_name: Optional[str] = None
+        self.longest_disk_size = 0
+
+    def add(self, name: str, duration: float, disk_size: int, vms: int = 1, failed: bool = False) -> None:
+        """
+        Count one VM or plan.
+
+        Args:
+            name (str): VM or plan name.
+            duration (float): Duration in minutes.
+            disk_size (int): Disk size in MB.
+            vms (int, optional): VMs it stands for. Defaults to 1.
+            failed (bool, optional): It failed. Defaults to False.
+        """
+        self.count += 1
+        self.vms += vms
+        self.failed += failed
+        self.disk_size += disk_size
+        self.duration += duration
+        if duration < self.shortest:
+            self.shortest = duration
+        if duration > self.longest:
+            self.longest = duration
+            self.longest_name = name
+            self.longest_disk_size = disk_size
+
+    def merge(self, other: "Stats") -> None:
+        """Add the items counted by ``other``, which come after the ones counted here."""
+        self.count += other.count
+        self.vms += other.vms
+        self.failed += other.failed
+        self.disk_size += other.disk_size
+        self.duration += other.duration
+        self.shortest = min(self.shortest, other.shortest)
+        if other.longest > self.longest:
+            self.longest = other.longest
+            self.longest_name = other.longest_name
+            self.longest_disk_size = other.longest_disk_size
+
+    @property
+    def disk_size_gb(self) -> float:
+        return self.disk_size / 1024
+
+    @property
+    def mean_duration(self) -> float:
+        return self.duration / self.count if self.count else 0.0
+
+    @property
+    def mean_disk_size_gb(self) -> float:
+        return self.disk_size_gb / self.count if self.count else 0.0
+
+    @property
+    def transfer_rate(self) -> float:
+        """Average disk size over average duration, in GB per minute."""
+        mean_duration = self.mean_duration
+        return self.mean_disk_size_gb / mean_duration if mean_duration else 0.0
+
+    @property
+    def longest_disk_size_gb(self) -> float:
+        return self.longest_disk_size / 1024
+
+    @property
+    def longest_transfer_rate(self) -> float:
+        """Disk size over duration of the longest item, in GB per minute."""
+        return self.longest_disk_size_gb / self.longest if self.longest > 0 else 0.0
+
+    def __repr__(self) -> str:
+        return (
+            f"Stats(count={self.count}, vms={self.vms}, failed={self.failed}, disk_size={self.disk_size}, "
+            f"duration={self.duration}, shortest={self.shortest}, longest={self.longest}, "
+            f"longest_name={self.longest_name!r})"
+        )
+
+
+def _groupings(groupings: Iterable[Sequence[str]], allowed: Sequence[str]) -> List[Grouping]:
+    checked = []
+    for grouping in groupings:
+        grouping = tuple(grouping)
+        unknown = [key for key in grouping if key not in allowed]
+        if unknown:
+            raise ValueError(f"Cannot group by {', '.join(unknown)}, expected keys from {', '.join(allowed)}")
+        checked.append(grouping)
+    return checked
+
+
+def aggregate_vms(records: VMRecords, groupings: Iterable[Sequence[str]] = ((),)) -> Aggregation:
+    """
+    Statistics of the VMs grouped several ways at once, in a single pass over the records.
+
+    VMs are grouped on the interned integer codes of the records, names are looked up once per group at the end.
+
+    Args:
+        records (VMRecords): Migrated VMs.
+        groupings (Iterable[Sequence[str]], optional): Groupings to compute, each a sequence of keys from
+            GROUP_KEYS. Defaults to a single group of every VM.
+
+    Returns:
+        Aggregation: Statistics per group of each grouping, groups in the order of their first VM.
+    """
+    records = as_vm_records(records)
+    groupings = _groupings(groupings, GROUP_KEYS)
+    columns = [
+        [(STATE_NAMES, records.failed) if key == "state" else records.labels(key) for key in grouping]
+        for grouping in groupings
+    ]
+    groups: List[Dict[Tuple[int, ...], Stats]] = [{} for _ in groupings]
+    key_streams = [
+        zip(*(codes for _, codes in grouping_columns)) if grouping_columns else repeat(())
+        for grouping_columns in columns
+    ]
+    for name, duration, disk_size, failed, *keys in zip(
+        records.names, records.durations, records.disk_sizes, records.failed, *key_streams
+    ):
+        for grouping_groups, key in zip(groups, keys):
+            stats = grouping_groups.get(key)
+            if stats is None:
+                stats = grouping_groups[key] = Stats()
+            stats.add(name, duration, disk_size, 1, failed)
+    return {
+        grouping: {
+            tuple(names[code] for (names, _), code in zip(grouping_columns, key)): stats
+            for key, stats in grouping_groups.items()
+        }
+        for grouping, grouping_columns, grouping_groups in zip(groupings, columns, groups)
+    }
+
+
+def _plan_key(migration: Dict[str, Any], key: str) -> str:
+    if key == "plan":
+        return migration["name"]
+    if key == "state":
+        return STATE_NAMES[migration["vms_failed"] == "True"]
+    return migration.get(key, "")
+
+
+def aggregate_plans(migrations: Iterable[Dict[str, Any]], groupings: Iterable[Sequence[str]] = ((),)) -> Aggregation:
+    """
+    Statistics of plan summaries grouped several ways at once, in a single pass over the summaries.
+
+    Args:
+        migrations (Iterable[Dict[str, Any]]): Plan summaries as built by summarize_plan.
+        groupings (Iterable[Sequence[str]], optional): Groupings to compute, each a sequence of keys from
+            PLAN_GROUP_KEYS. Defaults to a single group of every plan.
+
+    Returns:
+        Aggregation: Statistics per group of each grouping, groups in the order of their first plan.
+    """
+    groupings = _groupings(groupings, PLAN_GROUP_KEYS)
+    groups: List[Dict[Tuple[str, ...], Stats]] = [{} for _ in groupings]
+    for migration in migrations:
+        failed = migration["vms_failed"] == "True"
+        for grouping, grouping_groups in zip(groupings, groups):
+            key = tuple(_plan_key(migration, key) for key in grouping)
+            stats = grouping_groups.get(key)
+            if stats is None:
+                stats = grouping_groups[key] = Stats()
+            stats.add(
+                migration["name"],
+                migration["total_duration_mins"],
+                migration["total_disk_size"],
+                migration["vms"],
+                failed,
+            )
+    return dict(zip(groupings, groups))
+
+
+def parse_grouping(text: str) -> Grouping:
+    """
+    Parse a comma separated list of group keys, as given to --group-by.
+
+    Args:
+        text (str): e.g. "provider,namespace".
+
+    Returns:
+        Grouping: The keys.
+    """
+    grouping = tuple(key.strip().replace("-", "_") for key in text.split(",") if key.strip())
+    if not grouping:
+        raise ValueError("no group key given")
+    return _groupings([grouping], GROUP_KEYS)[0]
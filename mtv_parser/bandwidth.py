@@ -0,0 +1,234 @@
+from datetime import timedelta
+from itertools import repeat
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+from concurrency import floor_time, width_seconds
+from timestamps import MISSING
+from vm_records import VMRecords, as_vm_records
+
+# Buckets at or above this fraction of the peak are part of a plateau
+PLATEAU_FRACTION = 0.8
+# Buckets below this fraction of the peak are underutilized
+UNDERUTILIZED_FRACTION = 0.25
+# Shortest plateau or underutilized window reported, in buckets
+MIN_WINDOW_BUCKETS = 3
+# Plans listed in the text report, by peak bandwidth
+TOP_PLANS = 10
+
+# (first bucket start, end in epoch seconds, mean GB per hour)
+Window = Tuple[int, int, float]
+
+
+class GroupCurves:
+    """
+    Bandwidth curves of groups of VMs (OSes or plans), each kept only over the buckets from the first start to the
+    last end of its VMs.
+
+    Attributes:
+        names (List[str]): Group names, indexed by group code.
+        firsts (np.ndarray): First bucket of each group's curve.
+        offsets (np.ndarray): Group ``g`` owns ``values[offsets[g]:offsets[g + 1]]``.
+        values (np.ndarray): Bandwidth per bucket in GB per hour, the curves of all groups one after the other.
+    """
+
+    def __init__(self, names: List[str], firsts: np.ndarray, offsets: np.ndarray, values: np.ndarray) -> None:
+        self.names = names
+        self.firsts = firsts
+        self.offsets = offsets
+        self.values = values
+
+    def __iter__(self) -> Iterator[Tuple[str, int, np.ndarray]]:
+        """(name, first bucket, curve) of every group with VMs."""
+        for code, name in enumerate(self.names):
+            curve = self.values[self.offsets[code] : self.offsets[code + 1]]
+            if len(curve):
+                yield name, int(self.firsts[code]), curve
+
+    def dense(self, buckets: int) -> np.ndarray:
+        """The curves as a groups by buckets array."""
+        curves = np.zeros((len(self.names), buckets))
+        for code, (first, begin, end) in enumerate(zip(self.firsts, self.offsets[:-1], self.offsets[1:])):
+            curves[code, first : first + end - begin] = self.values[begin:end]
+        return curves
+
+
+def _group_curves(
+    names: List[str], groups: np.ndarray, starts: np.ndarray, ends: np.ndarray, rates: np.ndarray, width: int
+) -> GroupCurves:
+    """
+    Bandwidth per bucket of each group, from difference arrays.  Times are relative to the first bucket.
+
+    The data moved up to time t is C(t) = A(t) * t - B(t), with A the sum of the rates of the VMs running at t
+    and B the sum of rate * (start or end) over the events before t.  Both only change at events, so each group's
+    events are counted at the bucket boundaries of its span with one bincount and accumulated with one cumsum;
+    the data moved in a bucket is the difference of C at its two boundaries.  A returns to zero at the end of
+    each span, so running the cumsum across spans only shifts C by a constant from one group to the next.
+    """
+    group_count = len(names)
+    firsts = np.full(group_count, np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(firsts, groups, starts // width)
+    lasts = np.zeros(group_count, dtype=np.int64)
+    np.maximum.at(lasts, groups, -(-ends // width))
+    buckets = np.where(lasts > 0, lasts - firsts, 0)
+    firsts = np.where(buckets > 0, firsts, 0)
+    # Each span holds its boundaries plus a slot for events on the last boundary
+    sizes = np.where(buckets > 0, buckets + 2, 0)
+    span_offsets = np.concatenate([[0], np.cumsum(sizes)])
+    size = int(span_offsets[-1])
+
+    times = np.concatenate([starts, ends])
+    both = np.concatenate([groups, groups])
+    # An event counts for the boundaries after it
+    slots = span_offsets[both] + times // width + 1 - firsts[both]
+    signed = np.concatenate([rates, -rates])
+    slope = np.cumsum(np.bincount(slots, weights=signed, minlength=size))
+    offset = np.cumsum(np.bincount(slots, weights=signed * times, minlength=size))
+    boundary_group = np.repeat(np.arange(group_count), sizes)
+    boundaries = (firsts[boundary_group] + np.arange(size) - span_offsets[boundary_group]) * width
+    moved = slope * boundaries - offset
+
+    # Buckets 0 .. buckets - 1 of each span are the differences at slots 1 .. buckets
+    offsets = np.concatenate([[0], np.cumsum(buckets)])
+    bucket_group = np.repeat(np.arange(group_count), buckets)
+    slot = span_offsets[bucket_group] + 1 + np.arange(int(offsets[-1])) - offsets[bucket_group]
+    values = (moved[slot] - moved[slot - 1]) * (3600 / width)
+    return GroupCurves(names, firsts, offsets, values)
+
+
+def _runs(mask: np.ndarray, min_length: int) -> List[Tuple[int, int]]:
+    """(first, last + 1) of the runs of True in mask at least min_length long."""
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], mask.astype(np.int8), [0]])))
+    return [(first, end) for first, end in zip(edges[::2].tolist(), edges[1::2].tolist()) if end - first >= min_length]
+
+
+class BandwidthCurves:
+    """
+    Transfer bandwidth over time, overall, per OS and per plan.
+
+    Each VM moves its disk at its average rate, disk size over effective migration time, from its start to its
+    end.  The curves give the mean bandwidth over each bucket of ``width`` seconds in GB per hour.
+
+    Attributes:
+        start (int): Start of the first bucket in epoch seconds.
+        width (int): Bucket width in seconds.
+        total (np.ndarray): Bandwidth per bucket.
+        by_os (GroupCurves): Bandwidth per OS.
+        by_plan (GroupCurves): Bandwidth per plan.
+        transferred (float): GB moved by all VMs.
+        active_seconds (int): Time from the first VM start to the last VM end.
+    """
+
+    def __init__(self, records: VMRecords, width: timedelta = timedelta(hours=1)) -> None:
+        """
+        Build the curves in O(VMs + buckets * groups active in them).
+
+        VMs without a start time, a positive duration or disks are left out.
+
+        Args:
+            records (VMRecords): Migrated VMs.
+            width (timedelta, optional): Bucket width, at least one second. Defaults to one hour.
+        """
+        records = as_vm_records(records)
+        self.width = width_seconds(width)
+        starts = np.frombuffer(records.start_times, dtype=np.int64)
+        ends = np.frombuffer(records.end_times, dtype=np.int64)
+        disk_sizes = np.frombuffer(records.disk_sizes, dtype=np.int64)
+        used = (starts != MISSING) & (ends > starts) & (disk_sizes > 0)
+        starts, ends = starts[used], ends[used]
+        gigabytes = disk_sizes[used] / 1024
+        self.transferred = float(gigabytes.sum())
+        self.start = floor_time(int(starts.min()), self.width) if len(starts) else 0
+        self.active_seconds = int(ends.max() - starts.min()) if len(starts) else 0
+        # GB per second over the VM's interval
+        rates = gigabytes / (ends - starts)
+        starts, ends = starts - self.start, ends - self.start
+        code_type = np.dtype(f"u{records.os_codes.itemsize}")
+        total = _group_curves([""], np.zeros(len(starts), dtype=np.int64), starts, ends, rates, self.width)
+        self.total = total.values
+        self.by_os = _group_curves(
+            records.os_names,
+            np.frombuffer(records.os_codes, dtype=code_type)[used].astype(np.int64),
+            starts,
+            ends,
+            rates,
+            self.width,
+        )
+        self.by_plan = _group_curves(
+            records.plan_names,
+            np.frombuffer(records.plan_codes, dtype=code_type)[used].astype(np.int64),
+            starts,
+            ends,
+            rates,
+            self.width,
+        )
+
+    def __len__(self) -> int:
+        return len(self.total)
+
+    @property
+    def times(self) -> np.ndarray:
+        """Start of each bucket in epoch seconds."""
+        return self.start + np.arange(len(self.total), dtype=np.int64) * self.width
+
+    @property
+    def average(self) -> float:
+        """Mean bandwidth from the first VM start to the last VM end, in GB per hour."""
+        return self.transferred / self.active_seconds * 3600 if self.active_seconds else 0.0
+
+    def peak(self, curve: Optional[np.ndarray] = None, first: int = 0) -> Tuple[float, Optional[int]]:
+        """
+        Highest bucket of a curve.
+
+        Args:
+            curve (Optional[np.ndarray], optional): A curve of ``by_os`` or ``by_plan``. Defaults to ``total``.
+            first (int, optional): Bucket the curve starts at. Defaults to 0.
+
+        Returns:
+            Tuple[float, Optional[int]]: Bandwidth in GB per hour and start of its first bucket, None if empty.
+        """
+        curve = self.total if curve is None else curve
+        if not len(curve):
+            return 0.0, None
+        bucket = int(np.argmax(curve))
+        return float(curve[bucket]), self.start + (first + bucket) * self.width
+
+    def _windows(self, mask: np.ndarray, min_buckets: int) -> List[Window]:
+        return [
+            (self.start + first * self.width, self.start + end * self.width, float(self.total[first:end].mean()))
+            for first, end in _runs(mask, min_buckets)
+        ]
+
+    def plateaus(self, fraction: float = PLATEAU_FRACTION, min_buckets: int = MIN_WINDOW_BUCKETS) -> List[Window]:
+        """Windows of at least ``min_buckets`` buckets staying at or above ``fraction`` of the peak."""
+        peak, _ = self.peak()
+        return self._windows(self.total >= fraction * peak, min_buckets) if peak > 0 else []
+
+    def underutilized(
+        self, fraction: float = UNDERUTILIZED_FRACTION, min_buckets: int = MIN_WINDOW_BUCKETS
+    ) -> List[Window]:
+        """Windows of at least ``min_buckets`` buckets below ``fraction`` of the peak."""
+        peak, _ = self.peak()
+        return self._windows(self.total < fraction * peak, min_buckets) if peak > 0 else []
+
+    def group_peaks(self, key: str) -> Iterator[Tuple[str, float, Optional[int], float]]:
+        """
+        Peak of each OS or plan curve.
+
+        Args:
+            key (str): "os" or "plan".
+
+        Yields:
+            Tuple[str, float, Optional[int], float]: Name, peak in GB per hour, its time and GB moved, for every
+            group that moved data, in order of first appearance.
+        """
+        hours = self.width / 3600
+        for name, first, curve in self.by_os if key == "os" else self.by_plan:
+            peak, when = self.peak(curve, first)
+            yield name, peak, when, float(curve.sum()) * hours
+
+    def group_buckets(self, key: str) -> Iterator[Tuple[int, str, float]]:
+        """(bucket start, name, GB per hour) of every OS or plan over the buckets it was active in, by group."""
+        for name, first, curve in self.by_os if key == "os" else self.by_plan:
+            times = self.start + (first + np.arange(len(curve), dtype=np.int64)) * self.width
+            yield from zip(times.tolist(), repeat(name), curve.tolist())
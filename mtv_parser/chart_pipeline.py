@@ -0,0 +1,211 @@
+import multiprocessing
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Tuple
+
+from vm_records import VMRecords
+
+# Chart written by the report
+DEFAULT_CHART = "migration_gantt_chart.png"
+
+
+class ChartJob:
+    """
+    One Gantt chart to render.
+
+    Attributes:
+        filename (str): Output image.
+        mode (str): Gantt chart mode, see plot_gantt_chart.
+        window (Optional[Tuple[datetime, datetime]]): Only the VMs migrating during this time range, None for all.
+        bandwidth_width (Optional[timedelta]): Bucket width of the bandwidth overlay, None for no overlay.
+    """
+
+    __slots__ = ("filename", "mode", "window", "bandwidth_width")
+
+    def __init__(
+        self,
+        filename: str,
+        mode: str = "auto",
+        window: Optional[Tuple[datetime, datetime]] = None,
+        bandwidth_width: Optional[timedelta] = None,
+    ) -> None:
+        self.filename = filename
+        self.mode = mode
+        self.window = window
+        self.bandwidth_width = bandwidth_width
+
+    def __repr__(self) -> str:
+        return (
+            f"ChartJob(filename={self.filename!r}, mode={self.mode!r}, window={self.window!r}, "
+            f"bandwidth_width={self.bandwidth_width!r})"
+        )
+
+
+def chart_jobs(
+    mode: str = "auto",
+    variants: Tuple[str, ...] = (),
+    windows: Tuple[Tuple[datetime, datetime], ...] = (),
+    bandwidth_width: Optional[timedelta] = None,
+) -> List[ChartJob]:
+    """
+    The charts of a report: the main chart, one per extra mode and one per time window.
+
+    Args:
+        mode (str, optional): Mode of the main chart and of the windowed charts. Defaults to "auto".
+        variants (Tuple[str, ...], optional): Extra modes, written to ``migration_gantt_chart_<mode>.png``.
+        windows (Tuple[Tuple[datetime, datetime], ...], optional): Time ranges, written to
+            ``migration_gantt_chart_<start>_<end>.png``.
+        bandwidth_width (Optional[timedelta], optional): Bucket width of the bandwidth overlay drawn on every
+            chart. Defaults to None, no overlay.
+
+    Returns:
+        List[ChartJob]: The charts, main chart first.
+    """
+    stem = DEFAULT_CHART.rsplit(".", 1)[0]
+    jobs = [ChartJob(DEFAULT_CHART, mode, None, bandwidth_width)]
+    jobs.extend(
+        ChartJob(f"{stem}_{variant}.png", variant, None, bandwidth_width)
+        for variant in dict.fromkeys(variants)
+        if variant != mode
+    )
+    jobs.extend(
+        ChartJob(f"{stem}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}.png", mode, (start, end), bandwidth_width)
+        for start, end in windows
+    )
+    return jobs
+
+
+def chart_records(records: VMRecords) -> VMRecords:
+    """The columns a chart reads, without the disk rate sketches and failure index, to keep what is sent small."""
+    return VMRecords.from_columns(
+        records.names,
+        records.os_names,
+        records.os_codes,
+        records.plan_names,
+        records.plan_codes,
+        records.disk_sizes,
+        records.start_times,
+        records.end_times,
+        records.durations,
+        records.failed,
+    )
+
+
+def render_chart(records: VMRecords, job: ChartJob) -> str:
+    """
+    Render one chart, e.g. in a worker process.  matplotlib is imported here, not by the report process.
+
+    Args:
+        records (VMRecords): Migrated VMs.
+        job (ChartJob): Chart to render.
+
+    Returns:
+        str: The file written.
+    """
+    from bandwidth import BandwidthCurves
+    from visualization import plot_gantt_chart
+
+    if job.window is not None:
+        from interval_index import IntervalIndex
+
+        rows = IntervalIndex(records).overlapping(*job.window)
+        window = VMRecords()
+        window.extend(records[row] for row in rows.tolist())
+        records = window
+    bandwidth = BandwidthCurves(records, job.bandwidth_width) if job.bandwidth_width is not None else None
+    plot_gantt_chart(records, mode=job.mode, filename=job.filename, bandwidth=bandwidth)
+    return job.filename
+
+
+class ChartPipeline:
+    """
+    Renders charts in worker processes while the report process carries on with the analysis and the text report.
+
+    Every chart gets its own task, so several variants render in parallel.  ``wait`` collects them with a deadline;
+    workers still rendering when it passes are terminated.  With no workers the charts are rendered in the
+    calling process when they are submitted, like before the pipeline existed, and their failures are reported by
+    ``wait`` the same way.
+    """
+
+    def __init__(self, workers: int = 1) -> None:
+        """
+        Args:
+            workers (int, optional): Worker processes, 0 to render in the calling process. Defaults to 1.
+        """
+        self.workers = workers
+        self._pool: Any = None
+        self._pending: List[Tuple[ChartJob, Any]] = []
+        self.rendered: List[str] = []
+        self.failed: List[Tuple[str, str]] = []
+
+    def __enter__(self) -> "ChartPipeline":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def submit(self, records: VMRecords, jobs: List[ChartJob]) -> None:
+        """
+        Start rendering charts of the records.
+
+        Args:
+            records (VMRecords): Migrated VMs, only the columns the charts read are sent to the workers.
+            jobs (List[ChartJob]): Charts to render.
+        """
+        if not jobs:
+            return
+        records = chart_records(records)
+        if self.workers < 1:
+            for job in jobs:
+                try:
+                    self.rendered.append(render_chart(records, job))
+                except Exception as error:
+                    self.failed.append((job.filename, f"{type(error).__name__}: {error}"))
+            return
+        if self._pool is None:
+            self._pool = multiprocessing.get_context().Pool(min(self.workers, len(jobs)))
+        self._pending.extend((job, self._pool.apply_async(render_chart, (records, job))) for job in jobs)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """
+        Wait for the submitted charts.
+
+        Charts that fail are listed in ``failed`` with their error; when the timeout passes the remaining charts
+        are listed there too and their workers are terminated.
+
+        Args:
+            timeout (Optional[float], optional): Seconds to wait for all charts. Defaults to None, no limit.
+
+        Returns:
+            bool: True if every chart was rendered.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        pending, self._pending = self._pending, []
+        for job, result in pending:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            result.wait(remaining)
+            if not result.ready():
+                self.failed.append((job.filename, f"not rendered within {timeout:g} seconds"))
+                continue
+            try:
+                self.rendered.append(result.get())
+            except Exception as error:
+                self.failed.append((job.filename, f"{type(error).__name__}: {error}"))
+        if self._pool is not None:
+            if any(not result.ready() for _, result in pending):
+                self._pool.terminate()
+            else:
+                self._pool.close()
+            self._pool.join()
+            self._pool = None
+        for filename, reason in self.failed:
+            print(f"Gantt chart {filename} failed: {reason}", file=sys.stderr)
+        return not self.failed
+
+    def close(self) -> None:
+        """Stop the workers without waiting for charts still rendering."""
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool.join()
+            self._pool = None
@@ -2,19 +2,91 @@ import io
 import sys
 import typing as t
 import weakref
+from datetime import timedelta
 
-import pandas as pd
+from aggregation import Grouping, Stats, aggregate_plans, aggregate_vms
+from concurrency import format_width
+from failure_index import KIND_NAMES, FailureIndex
+from quantile_sketch import REPORT_QUANTILES, DiskRateSketches
 from tabulate import tabulate
+from timestamps import to_datetime
+from vm_records import VMRecords, as_vm_records
+
+if t.TYPE_CHECKING:
+    from bandwidth import BandwidthCurves
+
+# Columns of the breakdown tables: header, Stats attribute or property, format
+BREAKDOWN_COLUMNS = (
+    ("VMs", "count", "d"),
+    ("Failed", "failed", "d"),
+    ("Disk size (GB)", "disk_size_gb", ".1f"),
+    ("Average minutes", "mean_duration", ".1f"),
+    ("Longest minutes", "longest", ".1f"),
+    ("Longest VM", "longest_name", ""),
+    ("GB per minute", "transfer_rate", ".2f"),
+)
+# Lines of a long table written to the buffer before it is flushed to the sink
+TABLE_CHUNK_LINES = 1000
+
+
+def _cell(value: t.Any) -> str:
+    return "" if value is None else str(value).strip()
+
+
+def plain_table(
+    rows: t.Callable[[], t.Iterable[t.Sequence[t.Any]]],
+    headers: t.Sequence[str] = (),
+    right: t.Collection[int] = (),
+) -> t.Iterator[str]:
+    """Lay out a table like tabulate's "plain" format without number parsing, one line at a time.
+
+    tabulate holds the whole table, several times over, while laying it out.  The rows are generated twice
+    instead: the first pass measures the columns and the second formats the lines, so only one row is held at a
+    time however long the table.
+
+    Args:
+        rows (t.Callable[[], t.Iterable[t.Sequence[t.Any]]]): Returns the rows, a fresh iterable on each call.
+            Values are formatted with str() and stripped, None is left empty.
+        headers (t.Sequence[str], optional): Column headers. Like in tabulate, headed columns are at least two
+            characters wider than their header. Defaults to none.
+        right (t.Collection[int], optional): Columns aligned right, the others are aligned left. Defaults to
+            none.
+
+    Yields:
+        str: The lines, without trailing whitespace or line end.
+    """
+    widths = [len(header) + 2 for header in headers]
+    for row in rows():
+        if len(row) > len(widths):
+            widths.extend([0] * (len(row) - len(widths)))
+        for column, value in enumerate(row):
+            widths[column] = max(widths[column], len(_cell(value)))
+
+    def line(row: t.Sequence[t.Any]) -> str:
+        cells = [_cell(value) for value in row]
+        cells.extend([""] * (len(widths) - len(cells)))
+        return "  ".join(
+            cell.rjust(width) if column in right else cell.ljust(width)
+            for column, (cell, width) in enumerate(zip(cells, widths))
+        ).rstrip()
+
+    if headers:
+        yield line(headers)
+    for row in rows():
+        yield line(row)
 
 
 class CLIOutput:
-    def __init__(self: t.Self) -> None:
-        # Output buffer to store output.
+    def __init__(self: t.Self, file: io.TextIOBase | None = None) -> None:
+        # Output buffer to store output.  Holds at most one section, write_report flushes it after each one.
         self.output = io.StringIO(initial_value="\n\n", newline="\n")
 
-        # Finalizer for flushing buffer to stdout.
+        # Sink the buffer is flushed to, stdout if None
+        self.file = file
+
+        # Finalizer for flushing buffer to the sink.
         # Will be called when self is deleted or when the interpreter exits
-        self._finalize = weakref.finalize(self, self.flush_output, self.output)
+        self._finalize = weakref.finalize(self, self.flush_output, self.output, file)
 
         # might need to track the state of this object to ensure it's closed or not
         self._closed = False
@@ -61,45 +133,170 @@ class CLIOutput:
             line: str = str(line)
         self.output.write(line)
 
+    def flush(self: t.Self) -> None:
+        """Write what is buffered so far to the sink and empty the buffer."""
+        if self._closed:
+            raise ValueError("CLIOutput is already closed")
+        file = sys.stdout if self.file is None else self.file
+        file.write(self.output.getvalue())
+        file.flush()
+        self.output.seek(0)
+        self.output.truncate()
+
+    def write_lines(self: t.Self, lines: t.Iterable[str]) -> None:
+        """Write lines joined by line ends, with none after the last, flushing every TABLE_CHUNK_LINES lines so a
+        long section never sits in the buffer as a whole.
+
+        Args:
+            lines (t.Iterable[str]): Lines without line ends, e.g. from plain_table.
+        """
+        for number, line in enumerate(lines):
+            if number:
+                self.write("\n")
+                if not number % TABLE_CHUNK_LINES:
+                    self.flush()
+            self.write(line)
+
     def close(self: t.Self) -> None:
         """Calls private finalizer for output buffer.  Finalizer will be closed and cannot be called again."""
         if not self._closed:
             self._finalize()
             self._closed = True
 
-    def migration_output(self, migrations: list, type_of_migration: str) -> None:
-        rows = []
-        number_of_migrations = len(migrations)
-        average_time = sum(item["total_duration_mins"] for item in migrations) / number_of_migrations
-        total_number_of_vms = sum(item["vms"] for item in migrations)
-        total_disk_size_for_migration = sum(item["total_disk_size"] for item in migrations) / 1024
-        average_disk_size_gb =  total_disk_size_for_migration / number_of_migrations 
-        average_transfer_speed = average_disk_size_gb / average_time
-        # Find max duration and corresponding plan name
-        max_minutes = max(item["total_duration_mins"] for item in migrations)
-        longest_plan = next(item for item in migrations if item["total_duration_mins"] == max_minutes)
-        longest_disk_size_gb = longest_plan["total_disk_size"] / 1024
-        longest_transfer_speed =  longest_disk_size_gb/ max_minutes
-        min_minutes = min(item["total_duration_mins"] for item in migrations)
+    def write_report(
+        self: t.Self,
+        all_vms: VMRecords,
+        successful_migrations: list,
+        failed_migrations: list,
+        concurrency_data: dict,
+        group_by: t.Sequence[Grouping] = (),
+        bandwidth: "BandwidthCurves | None" = None,
+    ) -> None:
+        """Write the migration, OS, breakdown, disk transfer rate, failure, concurrency and bandwidth sections of the
+        report, flushing each to the sink once built.
 
+        Args:
+            all_vms (VMRecords): Migrated VMs.
+            successful_migrations (list): Summaries of successful plans.
+            failed_migrations (list): Summaries of failed plans, the section is left out if there are none.
+            concurrency_data (dict): Output of analyze_concurrent_migrations.
+            group_by (t.Sequence[Grouping], optional): Groupings of the VMs to add a breakdown table for, e.g.
+                ``[("provider", "namespace")]``. Defaults to none.
+            bandwidth (BandwidthCurves | None, optional): Transfer bandwidth curves, the section is left out
+                without them. Defaults to None.
+        """
+        # One pass over the plans and one over the VMs feed every section
+        all_vms = as_vm_records(all_vms)
+        plan_stats = aggregate_plans(failed_migrations + successful_migrations, [("state",)])[("state",)]
+        vm_stats = aggregate_vms(all_vms, [("os",), *group_by])
+        if failed_migrations:
+            self.write(self.migration_section(plan_stats[("failed",)], "failed"))
+            self.write(("\n\n"))
+            self.flush()
+        self.write(self.migration_section(plan_stats.get(("successful",), Stats()), "successful"))
+        self.write(("\n\n"))
+        self.flush()
+        self.write(self.operating_system_report(all_vms, vm_stats[("os",)]))
+        self.write(("\n\n"))
+        self.flush()
+        for grouping in group_by:
+            self.write(self.breakdown_report(grouping, vm_stats[tuple(grouping)]))
+            self.write(("\n\n"))
+            self.flush()
+        if len(all_vms.disk_rates):
+            self.write(self.disk_rate_report(all_vms.disk_rates))
+            self.write(("\n\n"))
+            self.flush()
+        if len(all_vms.failures):
+            self.write(self.failure_report(all_vms.failures))
+            self.write(("\n\n"))
+            self.flush()
+        self.write_lines(self.generate_concurrency_report(concurrency_data))
+        self.flush()
+        if bandwidth is not None:
+            self.write(("\n\n"))
+            self.write_lines(self.bandwidth_report(bandwidth))
+            self.flush()
+
+    def write_vm_table(self: t.Self, all_vms: VMRecords, rows: t.Iterable[int], title: str) -> None:
+        """Write the table of selected VMs built by vm_table and flush it to the sink."""
+        self.write_lines(self.vm_table(all_vms, rows, title))
+        self.flush()
+
+    def write_failure_table(
+        self: t.Self, failures: FailureIndex, rows: t.Sequence[int], title: str, count_by: str
+    ) -> None:
+        """Write the table of selected failures built by failure_table and flush it to the sink."""
+        self.write_lines(self.failure_table(failures, rows, title, count_by))
+        self.flush()
+
+    def write_diff(self: t.Self, changes: dict) -> None:
+        """Write the changes between two dumps: the summary and plan changes, then the migrated VMs and the new
+        failures, flushing each part to the sink once built.
+
+        Args:
+            changes (dict): Output of diff_dumps.
+        """
+        self.write(self.diff_report(changes))
+        self.write(("\n\n"))
+        self.flush()
+        completed_vms = changes["completed_vms"]
+        self.write_lines(self.vm_table(completed_vms, range(len(completed_vms)), "VMs migrated since the old dump"))
+        self.flush()
+        new_failures = changes["new_failures"]
+        if len(new_failures):
+            self.write("\n")
+            self.write_lines(self.failure_table(new_failures, new_failures.rows(), "Failures since the old dump", "os"))
+            self.flush()
+
+    def write_simulation(self: t.Self, simulation: dict) -> None:
+        """Write a simulated wave: its summary and critical path, then its concurrency report.
+
+        Args:
+            simulation (dict): Output of analyze_simulation.
+        """
+        self.write(self.simulation_report(simulation))
+        self.write(("\n\n"))
+        self.flush()
+        self.write_lines(self.generate_concurrency_report(simulation))
+        self.flush()
+
+    def migration_output(self, migrations: list, type_of_migration: str) -> str:
+        return self.migration_section(aggregate_plans(migrations)[()].get((), Stats()), type_of_migration)
+
+    def migration_section(self, stats: Stats, type_of_migration: str) -> str:
+        """Migration section of the report.
+
+        Args:
+            stats (Stats): Statistics of the plans, from aggregate_plans.
+            type_of_migration (str): "successful" or "failed".
+
+        Returns:
+            str: The section.
+        """
+        rows = []
         header = f"The number of {type_of_migration} migrations:"
         sep = "-" * len(header)
-        rows.append([header, number_of_migrations])
+        rows.append([header, stats.count])
+        if not stats.count:
+            return tabulate(rows, tablefmt="plain")
         rows.append([sep])
-        rows.append(["The number of vms:", total_number_of_vms])
-        rows.append(["Plan with longest runtime: ", longest_plan["name"]])
-        rows.append(["Longest runtime in minutes: ", f"{max_minutes:.1f}"])
-        rows.append(["Total disk size in longest plan (GB): ", longest_disk_size_gb])
-        rows.append(["Transferred data per hour in longest plan (GB): ", f"{longest_transfer_speed:.1f}"])
-        rows.append(["Shortest runtime in minutes: ", f"{min_minutes:.1f}"])
-        rows.append(["Average runtime in minutes: ", f"{average_time:.1f}"])
-        rows.append(["Average disk size (GB): ", f"{average_disk_size_gb:.1f}"])
-        rows.append(["Average transfer per hour (GB): ", f"{average_transfer_speed:.1f}"])
-        rows.append(["Total Disk Size Migrated (GB): ", f"{total_disk_size_for_migration}"])
-
-        return (tabulate(rows, tablefmt="plain"))
-
-    def operating_system_report(self, all_vms: dict):
+        rows.append(["The number of vms:", stats.vms])
+        rows.append(["Plan with longest runtime: ", stats.longest_name])
+        rows.append(["Longest runtime in minutes: ", f"{stats.longest:.1f}"])
+        rows.append(["Total disk size in longest plan (GB): ", stats.longest_disk_size_gb])
+        rows.append(["Transferred data per hour in longest plan (GB): ", f"{stats.longest_transfer_rate:.1f}"])
+        rows.append(["Shortest runtime in minutes: ", f"{stats.shortest:.1f}"])
+        rows.append(["Average runtime in minutes: ", f"{stats.mean_duration:.1f}"])
+        rows.append(["Average disk size (GB): ", f"{stats.mean_disk_size_gb:.1f}"])
+        rows.append(["Average transfer per hour (GB): ", f"{stats.transfer_rate:.1f}"])
+        rows.append(["Total Disk Size Migrated (GB): ", f"{stats.disk_size_gb}"])
+
+        return tabulate(rows, tablefmt="plain")
+
+    def operating_system_report(self, all_vms: VMRecords, os_stats: dict[tuple[str, ...], Stats] | None = None):
+        if os_stats is None:
+            os_stats = aggregate_vms(all_vms, [("os",)])[("os",)]
         rows = []
         os_header = "OS REPORT"
         sep = "=" * len(os_header)
@@ -107,58 +304,481 @@ class CLIOutput:
         rows.append([os_header])
         rows.append([sep])
         rows.append([""])
-        for os in all_vms.keys():
+        for (os,), stats in os_stats.items():
             header = f"Report for {os}:"
             sep = "-" * len(header)
-            total_disk_size = 0
-            for vm in all_vms[os]:
-                total_disk_size += vm['disk_size'] / 1024
             rows.append([header])
             rows.append([sep])
-            rows.append(["Number of VMs: ", f"{len(all_vms[os])}"])
-            rows.append(["Total Disk Size (GB):", f"{total_disk_size}"])
+            rows.append(["Number of VMs: ", f"{stats.count}"])
+            rows.append(["Total Disk Size (GB):", f"{stats.disk_size_gb}"])
             rows.append([])
-            
-        return(tabulate(rows, tablefmt="plain"))
+
+        return tabulate(rows, tablefmt="plain")
+
+    def breakdown_report(self, grouping: Grouping, groups: dict[tuple[str, ...], Stats]) -> str:
+        """Table of VM statistics per group, e.g. per provider and namespace.
+
+        Args:
+            grouping (Grouping): Keys the VMs are grouped by.
+            groups (dict[tuple[str, ...], Stats]): Statistics per group, from aggregate_vms.
+
+        Returns:
+            str: The section.
+        """
+        header = f"BREAKDOWN BY {', '.join(key.replace('_', ' ') for key in grouping).upper()}"
+        table = [
+            list(key) + [format(getattr(stats, attribute), spec) for _, attribute, spec in BREAKDOWN_COLUMNS]
+            for key, stats in groups.items()
+        ]
+        lines = ["", header, "=" * len(header), ""]
+        if table:
+            headers = [key.replace("_", " ") for key in grouping] + [title for title, _, _ in BREAKDOWN_COLUMNS]
+            align = ["left"] * len(grouping) + ["right" if spec else "left" for _, _, spec in BREAKDOWN_COLUMNS]
+            lines.append(tabulate(table, headers=headers, tablefmt="plain", colalign=align, disable_numparse=True))
+        return "\n".join(lines)
+
+    def disk_rate_report(self, sketches: DiskRateSketches) -> str:
+        """Quantiles of the per-disk transfer rates, overall, per datastore and per OS.
+
+        Args:
+            sketches (DiskRateSketches): Disk transfer rates of the VMs.
+
+        Returns:
+            str: The section.
+        """
+        header = "DISK TRANSFER RATES (MB/s)"
+        headers = ["", "Disks"] + [f"p{round(fraction * 100)}" for fraction in REPORT_QUANTILES]
+        tables = {}
+        for grouping, key, sketch in sketches.groups():
+            row = [key or "All disks", sketch.n] + [f"{rate:.2f}" for rate in sketch.quantiles(REPORT_QUANTILES)]
+            tables.setdefault(grouping, []).append(row)
+        lines = ["", header, "=" * len(header)]
+        for grouping, title in (("all", None), ("datastore", "By datastore"), ("os", "By operating system")):
+            if grouping not in tables:
+                continue
+            lines.append("")
+            if title:
+                lines.extend([title, "-" * len(title)])
+            lines.append(
+                tabulate(
+                    tables[grouping],
+                    headers=headers,
+                    tablefmt="plain",
+                    colalign=["left"] + ["right"] * (len(headers) - 1),
+                    disable_numparse=True,
+                )
+            )
+        return "\n".join(lines)
+
+    def failure_report(self, failures: FailureIndex) -> str:
+        """Failed VMs and plans with Critical conditions per phase, reason and condition, and per phase and OS.
+
+        Args:
+            failures (FailureIndex): Failed VMs and plans.
+
+        Returns:
+            str: The section.
+        """
+        header = "FAILURE BREAKDOWN"
+        table = [
+            [
+                field.replace("_", " ").capitalize(),
+                value,
+                vms,
+                plans,
+                plan_count,
+                to_datetime(latest).strftime("%Y-%m-%d %H:%M:%S") if latest is not None else "",
+            ]
+            for field, value, vms, plans, plan_count, latest in failures.breakdown()
+        ]
+        lines = ["", header, "=" * len(header), ""]
+        lines.append(
+            tabulate(
+                table,
+                headers=["Field", "Value", "Failed VMs", "Critical plans", "Plans", "Latest"],
+                tablefmt="plain",
+                colalign=["left", "left", "right", "right", "right", "left"],
+                disable_numparse=True,
+            )
+        )
+        by_os = list(failures.cross_counts("phase", "os"))
+        if by_os:
+            title = "Failed phases by operating system"
+            lines.extend(["", title, "-" * len(title)])
+            lines.append(
+                tabulate(
+                    by_os,
+                    headers=["Phase", "OS", "Failed VMs"],
+                    tablefmt="plain",
+                    colalign=["left", "left", "right"],
+                    disable_numparse=True,
+                )
+            )
+        return "\n".join(lines)
+
+    def failure_table(
+        self, failures: FailureIndex, rows: t.Sequence[int], title: str, count_by: str
+    ) -> t.Iterator[str]:
+        """Table of selected failures with their plan, OS, phase and conditions, and their counts per group.
+
+        Args:
+            failures (FailureIndex): Failed VMs and plans.
+            rows (t.Sequence[int]): Indexes of the failures to list, in display order.
+            title (str): Heading of the table.
+            count_by (str): Key from FAILURE_GROUP_KEYS to count the failures by.
+
+        Yields:
+            str: The lines of the table, the last one empty.
+        """
+
+        def table() -> t.Iterator[list]:
+            for index in rows:
+                when = to_datetime(failures.times[index])
+                terms = failures.row_terms(index)
+                yield [
+                    when.strftime("%Y-%m-%d %H:%M:%S") if when else "",
+                    KIND_NAMES[failures.is_plan[index]],
+                    failures.names[index],
+                    failures.plan_names[failures.plan_codes[index]],
+                    failures.os_names[failures.os_codes[index]],
+                    ", ".join(value for field, value in terms if field == "phase"),
+                    ", ".join(value for field, value in terms if field in ("condition", "plan_condition")),
+                ]
+
+        yield from [title, "=" * len(title), f"{len(rows)} failures", ""]
+        if len(rows):
+            yield from plain_table(table, headers=["Time", "Kind", "Name", "Plan", "OS", "Phase", "Conditions"])
+            label = "OS" if count_by == "os" else count_by.replace("_", " ")
+            heading = f"By {label}"
+            yield from ["", heading, "-" * len(heading)]
+            # Plans have no OS
+            counts = [(group or "-", count) for group, count in failures.count_by(rows, count_by).items()]
+            yield tabulate(
+                counts,
+                headers=[label[0].upper() + label[1:], "Failures"],
+                tablefmt="plain",
+                colalign=["left", "right"],
+                disable_numparse=True,
+            )
+        yield ""
+
+    def diff_report(self, changes: dict) -> str:
+        """Summary, throughput change and plan changes between two dumps.
+
+        Args:
+            changes (dict): Output of diff_dumps.
+
+        Returns:
+            str: The section.
+        """
+        header = "CHANGES BETWEEN DUMPS"
+        plans = changes["plans"]
+        rows = [[""], [header], ["=" * len(header)], [""]]
+        rows.append(["Old dump:", changes["old"]])
+        rows.append(["New dump:", changes["new"]])
+        for kind in ("unchanged", "added", "changed", "removed"):
+            rows.append([f"Plans {kind}:", plans[kind]])
+        rows.append(["VMs migrated since:", len(changes["completed_vms"])])
+        rows.append(["VMs no longer reported:", changes["removed_vms"]])
+        rows.append(["New failures:", len(changes["new_failures"])])
+        rows.append(["Resolved failures:", changes["resolved_failures"]])
+        lines = [tabulate(rows, tablefmt="plain", disable_numparse=True)]
+
+        title = "Throughput of the changed plans"
+        lines.extend(["", title, "-" * len(title)])
+        table = [
+            [metric]
+            + [value if isinstance(value, int) else f"{value:.2f}" for value in (before, after)]
+            + [
+                (
+                    f"{after - before:+d}"
+                    if isinstance(before, int) and isinstance(after, int)
+                    else f"{after - before:+.2f}"
+                )
+            ]
+            for metric, before, after in changes["throughput"]
+        ]
+        lines.append(
+            tabulate(
+                table,
+                headers=["", "Before", "After", "Change"],
+                tablefmt="plain",
+                colalign=["left", "right", "right", "right"],
+                disable_numparse=True,
+            )
+        )
+        if changes["plan_changes"]:
+            title = "Plan changes"
+            lines.extend(["", title, "-" * len(title)])
+            lines.append(
+                tabulate(
+                    [
+                        [
+                            change,
+                            plan,
+                            namespace,
+                            old_phase,
+                            new_phase,
+                            "*" if old_phase and new_phase and new_phase != old_phase else "",
+                        ]
+                        for change, plan, namespace, old_phase, new_phase in changes["plan_changes"]
+                    ],
+                    headers=["Change", "Plan", "Namespace", "Old phase", "New phase", "Moved"],
+                    tablefmt="plain",
+                    disable_numparse=True,
+                )
+            )
+        return "\n".join(lines)
+
+    def simulation_report(self, simulation: dict) -> str:
+        """Summary, throughput model and critical path of a simulated wave.
+
+        Args:
+            simulation (dict): Output of analyze_simulation.
+
+        Returns:
+            str: The section.
+        """
+        from simulation import model_rows
+
+        header = "SIMULATED WAVE"
+        rows = [[""], [header], ["=" * len(header)], [""]]
+        rows.append(["Number of VMs:", simulation["vms"]])
+        for label, key in (("Predicted start:", "start"), ("Predicted end:", "end")):
+            when = to_datetime(simulation[key])
+            rows.append([label, when if when is not None else "Unknown"])
+        rows.append(["Predicted makespan in minutes:", f"{simulation['makespan_mins']:.1f}"])
+        for name, limit in simulation["limits"].items():
+            rows.append([f"{name.replace('_', ' ').capitalize()}:", limit if limit else "unlimited"])
+        lines = [tabulate(rows, tablefmt="plain"), "", "Throughput model:"]
+        lines.append(
+            tabulate(
+                [
+                    [os_name, vms, f"{overhead:.1f}", f"{rate:.2f}"]
+                    for os_name, vms, overhead, rate in model_rows(simulation["model"])
+                ],
+                headers=["OS", "VMs", "Overhead (min)", "MB/s"],
+                tablefmt="plain",
+                disable_numparse=True,
+                colalign=["left", "right", "right", "right"],
+            )
+        )
+        path = simulation["critical_path"]
+        lines.extend(
+            [
+                "",
+                f"Critical path: {len(path)} VMs, "
+                f"{sum(duration for *_, duration in path):.1f} minutes of migration",
+            ]
+        )
+        if path:
+            table = [
+                [
+                    name,
+                    plan,
+                    host,
+                    os_name,
+                    to_datetime(start).strftime("%Y-%m-%d %H:%M:%S"),
+                    to_datetime(end).strftime("%Y-%m-%d %H:%M:%S"),
+                    f"{duration:.1f}",
+                ]
+                for name, plan, host, os_name, start, end, duration in path
+            ]
+            lines.append(
+                tabulate(
+                    table,
+                    headers=["VM", "Plan", "Host", "OS", "Start", "End", "Minutes"],
+                    tablefmt="plain",
+                    disable_numparse=True,
+                )
+            )
+        return "\n".join(lines)
+
+    def vm_table(self, all_vms: VMRecords, rows: t.Iterable[int], title: str) -> t.Iterator[str]:
+        """Table of selected VMs with their plan, OS and transfer times.
+
+        Args:
+            all_vms (VMRecords): Migrated VMs.
+            rows (t.Iterable[int]): Indexes of the VMs to list, in display order.
+            title (str): Heading of the table.
+
+        Yields:
+            str: The lines of the table, the last one empty.
+        """
+        all_vms = as_vm_records(all_vms)
+        rows = rows if isinstance(rows, t.Sequence) else list(rows)
+
+        def table() -> t.Iterator[list]:
+            for index in rows:
+                start, end = to_datetime(all_vms.start_times[index]), to_datetime(all_vms.end_times[index])
+                yield [
+                    all_vms.names[index],
+                    all_vms.plan_name(index),
+                    all_vms.os_name(index),
+                    start.strftime("%Y-%m-%d %H:%M:%S") if start else "",
+                    end.strftime("%Y-%m-%d %H:%M:%S") if end else "",
+                    f"{all_vms.durations[index]:.1f}",
+                    "failed" if all_vms.failed[index] else "",
+                ]
+
+        yield from [title, "=" * len(title), f"{len(rows)} VMs", ""]
+        if len(rows):
+            yield from plain_table(table, headers=["VM", "Plan", "OS", "Start", "End", "Minutes", "State"], right={5})
+        yield ""
 
     def generate_concurrency_report(self, concurrency_data):
-        """Generate a textual report of VM concurrency."""
+        """Generate the lines of a textual report of VM concurrency."""
+        return plain_table(lambda: self.concurrency_rows(concurrency_data))
+
+    def concurrency_rows(self, concurrency_data):
+        """Rows of the concurrency report: the peaks, the significant drops and the concurrency series."""
         rows = []
         header = "CONCURRENCY REPORT"
         sep = "=" * len(header)
-        
+
         rows.append([""])
         rows.append([header])
         rows.append([sep])
         rows.append([""])
-        
+
         if not concurrency_data:
             rows.append(["No concurrency data available."])
-            return tabulate(rows, tablefmt="plain")
-        
-        rows.append(["Peak concurrent VMs:", concurrency_data.get('max_concurrent_total', 0)])
-        rows.append(["Peak time:", concurrency_data.get('peak_time', 'Unknown')])
-        rows.append(["Average concurrent VMs:", concurrency_data.get('average_concurrent_vms', 0)])
-        
+            yield from rows
+            return
+
+        rows.append(["Peak concurrent VMs:", concurrency_data.get("max_concurrent_total", 0)])
+        peak_time = to_datetime(concurrency_data.get("peak_time"))
+        rows.append(["Peak time:", peak_time if peak_time is not None else "Unknown"])
+        rows.append(["Average concurrent VMs:", concurrency_data.get("average_concurrent_vms", 0)])
+
         rows.append([""])
         rows.append(["Maximum concurrent VMs by OS type:"])
-        for os_type, count in sorted(concurrency_data.get('max_concurrent', {}).items()):
+        for os_type, count in sorted(concurrency_data.get("max_concurrent", {}).items()):
             rows.append([f" {os_type}:", count])
-        
-        if concurrency_data.get('significant_drops'):
-            rows.append([""])
-            rows.append(["Significant drops in concurrency:"])
-            for i, drop in enumerate(concurrency_data['significant_drops'], 1):
-                rows.append([f" Drop {i}:"])
-                rows.append([f"   Time:", drop['time']])
-                rows.append([f"   From {drop['from']} to {drop['to']} VMs"])
-                rows.append([f"   Minutes after peak:", f"{drop['duration_mins']:.1f}"])
-        
-        if concurrency_data.get('hourly_concurrent_vms'):
-            rows.append([""])
-            rows.append(["Hourly concurrent VMs:"])
-            for data in concurrency_data['hourly_concurrent_vms']:
-                hour_str = data['hour'].strftime('%Y-%m-%d %H:%M')
-                rows.append([f" {hour_str}:", f"{data['vms']} VMs"])
-        
-        return tabulate(rows, tablefmt="plain")
+
+        rows.extend(self.concurrency_drop_rows(concurrency_data.get("significant_drops")))
+        yield from rows
+        yield from self.concurrency_series_rows(concurrency_data)
+
+    def concurrency_drop_rows(self, drops):
+        """Rows of the concurrency report listing the significant drops."""
+        if not drops:
+            return []
+        rows = [[""], ["Significant drops in concurrency:"]]
+        for i, drop in enumerate(drops, 1):
+            rows.append([f" Drop {i}:"])
+            rows.append(["   Time:", to_datetime(drop["time"])])
+            rows.append([f"   From {drop['from']} to {drop['to']} VMs"])
+            rows.append(["   Minutes after peak:", f"{drop['duration_mins']:.1f}"])
+        return rows
+
+    def concurrency_series_rows(self, concurrency_data):
+        """Rows of the concurrency report with the concurrency series, per bucket or per hour."""
+        if concurrency_data.get("concurrency_buckets"):
+            width = concurrency_data.get("bucket_width", timedelta(hours=1))
+            title = (
+                "Hourly concurrent VMs:"
+                if width == timedelta(hours=1)
+                else f"Concurrent VMs per {format_width(width)}:"
+            )
+            yield from [[""], [title]]
+            for data in concurrency_data["concurrency_buckets"]:
+                time_str = to_datetime(data["time"]).strftime("%Y-%m-%d %H:%M")
+                row = [f" {time_str}:", f"{data['vms']} VMs"]
+                if "peak_vms" in data:
+                    row.append(f"peak {data['peak_vms']}")
+                if "os" in data:
+                    os_peaks = data.get("os_peak", {})
+                    row.append(
+                        ", ".join(
+                            f"{os_type}: {count}" + (f" (peak {os_peaks[os_type]})" if os_type in os_peaks else "")
+                            for os_type, count in data["os"].items()
+                        )
+                    )
+                yield row
+        elif concurrency_data.get("hourly_concurrent_vms"):
+            yield from [[""], ["Hourly concurrent VMs:"]]
+            for data in concurrency_data["hourly_concurrent_vms"]:
+                hour_str = to_datetime(data["hour"]).strftime("%Y-%m-%d %H:%M")
+                yield [f" {hour_str}:", f"{data['vms']} VMs"]
+
+    def bandwidth_report(self, bandwidth: "BandwidthCurves") -> t.Iterator[str]:
+        """Generate the lines of a textual report of the transfer bandwidth: peak, plateaus, underutilized windows,
+        peaks by OS and plan, and the bandwidth series."""
+        from bandwidth import (
+            MIN_WINDOW_BUCKETS,
+            PLATEAU_FRACTION,
+            TOP_PLANS,
+            UNDERUTILIZED_FRACTION,
+        )
+
+        header = "BANDWIDTH REPORT"
+        yield from ["", header, "=" * len(header), ""]
+        if not len(bandwidth):
+            yield "No bandwidth data available."
+            return
+
+        def when(seconds: int) -> str:
+            return to_datetime(seconds).strftime("%Y-%m-%d %H:%M")
+
+        def section(title: str, rows: t.Callable[[], t.Iterable[list]]) -> t.Iterator[str]:
+            yield from ["", title]
+            yield from plain_table(rows)
+
+        width = timedelta(seconds=bandwidth.width)
+        peak, peak_time = bandwidth.peak()
+        yield tabulate(
+            [
+                ["Peak bandwidth (GB/hour):", f"{peak:.1f}"],
+                ["Peak time:", to_datetime(peak_time)],
+                ["Average bandwidth (GB/hour):", f"{bandwidth.average:.1f}"],
+                ["Total transferred (GB):", f"{bandwidth.transferred:.1f}"],
+            ],
+            tablefmt="plain",
+            disable_numparse=True,
+        )
+
+        shortest = format_width(width * MIN_WINDOW_BUCKETS)
+        for title, windows in (
+            (
+                f"Sustained plateaus, at least {PLATEAU_FRACTION:.0%} of peak for {shortest} or more:",
+                bandwidth.plateaus(),
+            ),
+            (
+                f"Underutilized windows, below {UNDERUTILIZED_FRACTION:.0%} of peak for {shortest} or more:",
+                bandwidth.underutilized(),
+            ),
+        ):
+            if windows:
+                yield from section(
+                    title,
+                    lambda: (
+                        [f" {when(start)} to {when(end)}:", f"{mean:.1f} GB/hour"] for start, end, mean in windows
+                    ),
+                )
+
+        os_peaks = sorted(bandwidth.group_peaks("os"))
+        yield from section(
+            "Peak bandwidth by OS type (GB/hour):",
+            lambda: (
+                [f" {os_type}:", f"{os_peak:.1f}", f"at {when(os_peak_time)}"]
+                for os_type, os_peak, os_peak_time, _ in os_peaks
+            ),
+        )
+        plan_peaks = sorted(bandwidth.group_peaks("plan"), key=lambda plan: -plan[1])
+        yield from section(
+            f"Peak bandwidth by plan, top {min(TOP_PLANS, len(plan_peaks))} of {len(plan_peaks)} (GB/hour):",
+            lambda: (
+                [f" {plan}:", f"{plan_peak:.1f}", f"at {when(plan_peak_time)}"]
+                for plan, plan_peak, plan_peak_time, _ in plan_peaks[:TOP_PLANS]
+            ),
+        )
+        # The series is as long as the migration window is wide, read it from the arrays as it is laid out
+        yield from section(
+            (
+                "Hourly bandwidth (GB/hour):"
+                if width == timedelta(hours=1)
+                else f"Bandwidth per {format_width(width)} (GB/hour):"
+            ),
+            lambda: ([f" {when(start)}:", f"{value:.1f}"] for start, value in zip(bandwidth.times, bandwidth.total)),
+        )
@@ -0,0 +1,291 @@
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from timestamps import MISSING
+from vm_records import VMRecords
+
+
+def floor_time(when: int, width: int) -> int:
+    """
+    Round a time down to a multiple of ``width`` counted from the Unix epoch.
+
+    Args:
+        when (int): Time to round in epoch seconds.
+        width (int): Bucket width in seconds.
+
+    Returns:
+        int: Start of the bucket containing ``when``.
+    """
+    return when - when % width
+
+
+def width_seconds(width: timedelta) -> int:
+    """
+    Bucket width in whole seconds.
+
+    Args:
+        width (timedelta): Bucket width, at least one second.
+
+    Returns:
+        int: Width in seconds.
+    """
+    seconds = round(width.total_seconds())
+    if seconds < 1:
+        raise ValueError("Bucket width must be at least one second")
+    return seconds
+
+
+def format_width(width: timedelta) -> str:
+    """
+    Human readable bucket width, e.g. "5 minutes" or "hour".
+
+    Args:
+        width (timedelta): Bucket width.
+
+    Returns:
+        str: Width as text.
+    """
+    seconds = int(width.total_seconds())
+    for unit, size in (("day", 86400), ("hour", 3600), ("minute", 60), ("second", 1)):
+        if seconds % size == 0:
+            count = seconds // size
+            return unit if count == 1 else f"{count} {unit}s"
+    return str(width)
+
+
+class ConcurrencyTimeline:
+    """
+    Sweep-line view of concurrent migrations.
+
+    Only the sorted start/end events and the running total after each event are stored.  Which VMs
+    were running at a given instant is rebuilt on request instead of being snapshotted per event.
+
+    Attributes:
+        records (VMRecords): VMs the timeline was built from.
+        times (array): Event times in epoch seconds, in chronological order.
+        deltas (array): +1 for a start event, -1 for an end event.
+        vm_indexes (array): Row of the VM in ``records`` for each event.
+        totals (array): Number of concurrent migrations after each event.
+        max_concurrent (Dict[str, int]): Maximum concurrent migrations per OS.
+        max_concurrent_total (int): Maximum concurrent migrations overall.
+        peak_time (Optional[int]): Time the overall maximum was first reached, in epoch seconds.
+        total_vm_minutes (float): Sum of the running VM count before each event times the event's VM duration.
+        total_duration_minutes (float): Sum of the VM duration of every event.
+    """
+
+    def __init__(self, records: VMRecords) -> None:
+        """
+        Build the timeline from migrated VMs.
+
+        VMs without a start time or duration are ignored.  Events sharing a timestamp keep the order the VMs
+        are grouped in by OS, start before end for each VM.
+
+        Args:
+            records (VMRecords): Migrated VMs.
+        """
+        self.records = records
+        times = array("q")
+        vm_indexes = array("L")
+        start_times, end_times, durations = records.start_times, records.end_times, records.durations
+        for indexes in records.by_os().values():
+            for index in indexes:
+                if start_times[index] == MISSING or not durations[index]:
+                    continue
+                times.append(start_times[index])
+                times.append(end_times[index])
+                vm_indexes.append(index)
+                vm_indexes.append(index)
+
+        order = sorted(range(len(times)), key=times.__getitem__)
+        self.times = array("q", (times[position] for position in order))
+        self.vm_indexes = array("L", (vm_indexes[position] for position in order))
+        # start and end events alternate before sorting
+        self.deltas = array("b", (1 - 2 * (position & 1) for position in order))
+        self.totals = array("L")
+        self._sweep()
+
+    def _sweep(self) -> None:
+        """Walk the events once keeping running counters per OS."""
+        records = self.records
+        os_codes = records.os_codes
+        durations = records.durations
+        concurrent_counts = [0] * len(records.os_names)
+        max_concurrent: Dict[int, int] = {}
+        total_concurrent = 0
+        max_concurrent_total = 0
+        peak_time = None
+        total_vm_minutes = 0
+        total_duration_minutes = 0
+
+        for event_time, delta, index in zip(self.times, self.deltas, self.vm_indexes):
+            os_code = os_codes[index]
+            duration_minutes = durations[index]
+            total_vm_minutes += total_concurrent * duration_minutes
+            total_duration_minutes += duration_minutes
+
+            concurrent_counts[os_code] += delta
+            total_concurrent += delta
+            if concurrent_counts[os_code] > max_concurrent.get(os_code, 0):
+                max_concurrent[os_code] = concurrent_counts[os_code]
+            else:
+                max_concurrent.setdefault(os_code, 0)
+
+            if total_concurrent > max_concurrent_total:
+                max_concurrent_total = total_concurrent
+                peak_time = event_time
+            self.totals.append(total_concurrent)
+
+        self.max_concurrent = {records.os_names[code]: count for code, count in max_concurrent.items()}
+        self.max_concurrent_total = max_concurrent_total
+        self.peak_time: Optional[int] = peak_time
+        self.total_vm_minutes = total_vm_minutes
+        self.total_duration_minutes = total_duration_minutes
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    @property
+    def average_concurrent_vms(self) -> float:
+        if self.total_duration_minutes <= 0:
+            return 0
+        return round(self.total_vm_minutes / self.total_duration_minutes, 2)
+
+    def total_at(self, when: int) -> int:
+        """
+        Number of concurrent migrations after every event up to and including ``when``.
+
+        Args:
+            when (int): Point in time in epoch seconds.
+
+        Returns:
+            int: Concurrent migrations, 0 before the first event.
+        """
+        position = bisect_right(self.times, when)
+        return self.totals[position - 1] if position else 0
+
+    def running_at(self, when: int) -> Dict[str, List[str]]:
+        """
+        Rebuild the set of VMs migrating at ``when``.
+
+        Args:
+            when (int): Point in time in epoch seconds.
+
+        Returns:
+            Dict[str, List[str]]: Names of the running VMs per OS.
+        """
+        position = bisect_right(self.times, when)
+        running: Dict[int, int] = {}
+        for delta, index in zip(self.deltas[:position], self.vm_indexes[:position]):
+            running[index] = running.get(index, 0) + delta
+
+        current_vms: Dict[str, List[str]] = {}
+        for index, count in running.items():
+            if count > 0:
+                current_vms.setdefault(self.records.os_name(index), []).append(self.records.names[index])
+        return current_vms
+
+    def buckets(
+        self, width: timedelta = timedelta(hours=1), per_os: bool = False, peak: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Concurrency series at a fixed resolution.
+
+        Buckets start at the first event rounded down to ``width`` and continue up to the last event.  Bucket
+        boundaries are located with binary search and the events in between are walked once, so the cost is
+        O(events + buckets * log(events)).
+
+        Args:
+            width (timedelta, optional): Bucket width. Defaults to one hour.
+            per_os (bool, optional): Add per-OS counts to each bucket. Defaults to False.
+            peak (bool, optional): Add the highest concurrency reached inside each bucket. Defaults to False.
+
+        Returns:
+            List[Dict[str, Any]]: One entry per bucket with "time" (bucket start in epoch seconds) and "vms"
+            (concurrent migrations at the bucket start), plus "peak_vms" when ``peak`` is set and "os" (and "os_peak")
+            when ``per_os`` is set.
+        """
+        width = width_seconds(width)
+        times = self.times
+        if not times:
+            return []
+        totals = self.totals
+        os_buckets = _OSBuckets(self) if per_os else None
+        series = []
+        cursor = 0
+        end_time = times[-1]
+        bucket_start = floor_time(times[0], width)
+        while bucket_start <= end_time:
+            bucket_end = bucket_start + width
+            first = bisect_left(times, bucket_start, cursor)
+            at_start = bisect_right(times, bucket_start, first)
+            last = bisect_left(times, bucket_end, at_start)
+            bucket = {"time": bucket_start, "vms": totals[at_start - 1] if at_start else 0}
+            if peak:
+                bucket["peak_vms"] = self._bucket_peak(first, at_start, last)
+            if os_buckets is not None:
+                os_buckets.add(bucket, first, at_start, last if peak else None)
+            series.append(bucket)
+            cursor = last
+            bucket_start = bucket_end
+        return series
+
+    def _bucket_peak(self, first: int, at_start: int, last: int) -> int:
+        """
+        Highest concurrency inside a bucket whose events are ``[first, last)``, ``[first, at_start)`` of them at
+        its start.
+        """
+        bucket_peak = max(self.totals[first:last], default=0)
+        # The count carried into the bucket only counts if no event happens exactly at its start
+        if first == at_start and first:
+            bucket_peak = max(bucket_peak, self.totals[first - 1])
+        return bucket_peak
+
+
+class _OSBuckets:
+    """Per-OS counts of ConcurrencyTimeline.buckets, walking the timeline's events once in order."""
+
+    def __init__(self, timeline: ConcurrencyTimeline) -> None:
+        records = timeline.records
+        self.os_names = records.os_names
+        self.os_codes = records.os_codes
+        self.deltas = timeline.deltas
+        self.vm_indexes = timeline.vm_indexes
+        self.os_seen = [records.os_names.index(os_name) for os_name in timeline.max_concurrent]
+        self.os_counts = [0] * len(records.os_names)
+        self.applied = 0
+
+    def apply(self, until: int, os_peaks: Optional[List[int]] = None) -> None:
+        """Apply the events up to ``until``, raising ``os_peaks`` to the counts reached if given."""
+        os_codes, os_counts = self.os_codes, self.os_counts
+        for position in range(self.applied, until):
+            code = os_codes[self.vm_indexes[position]]
+            os_counts[code] += self.deltas[position]
+            if os_peaks is not None and os_counts[code] > os_peaks[code]:
+                os_peaks[code] = os_counts[code]
+        self.applied = max(self.applied, until)
+
+    def add(self, bucket: Dict[str, Any], first: int, at_start: int, last: Optional[int] = None) -> None:
+        """
+        Add the per-OS counts at the start of a bucket as "os", and with ``last`` the per-OS peaks inside it as
+        "os_peak".
+
+        Args:
+            bucket (Dict[str, Any]): Bucket to fill.
+            first (int): First event of the bucket.
+            at_start (int): First event after the bucket start.
+            last (Optional[int], optional): First event after the bucket, None to leave the peaks out.
+        """
+        self.apply(first)
+        os_peaks = None
+        if last is not None:
+            os_peaks = list(self.os_counts)
+            if first != at_start:
+                # the first event at the bucket start replaces its OS's carried count
+                os_peaks[self.os_codes[self.vm_indexes[first]]] = 0
+        self.apply(at_start, os_peaks)
+        bucket["os"] = {self.os_names[code]: self.os_counts[code] for code in self.os_seen}
+        if os_peaks is not None:
+            self.apply(last, os_peaks)
+            bucket["os_peak"] = {self.os_names[code]: os_peaks[code] for code in self.os_seen}
@@ -0,0 +1,450 @@
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from timestamps import MISSING
+
+# Fields failures are indexed by: the pipeline phase a VM failed in, the reasons given by the VM's error and
+# conditions, the types of the VM's failure conditions and the types of the plan's Critical conditions
+FAILURE_FIELDS = ("phase", "reason", "condition", "plan_condition")
+# Keys failures can be grouped by
+FAILURE_GROUP_KEYS = ("os", "plan", "namespace", "kind")
+# Names of the "kind" key, indexed by the plan flag: a failed VM or a plan that cannot run
+KIND_NAMES = ("vm", "plan")
+
+# (field, value), e.g. ("phase", "ConvertGuest")
+Term = Tuple[str, str]
+
+
+class FailureRecord:
+    """
+    A failed VM or a plan with Critical conditions.
+
+    Attributes:
+        name (str): VM or plan name.
+        id (str): VM id, or plan uid.
+        plan (str): Name of the plan.
+        os (str): Operating system of the VM, "" for plans.
+        namespace (str): Namespace of the plan.
+        time (Optional[int]): When the VM migration ended, or the plan's latest Critical condition, in epoch
+            seconds.
+        is_plan (bool): The record is a plan.
+        terms (Tuple[Term, ...]): (field, value) pairs the record is indexed by, fields from FAILURE_FIELDS.
+    """
+
+    __slots__ = ("name", "id", "plan", "os", "namespace", "time", "is_plan", "terms")
+
+    def __init__(
+        self,
+        name: str,
+        id: str = "",
+        plan: str = "",
+        os: str = "",
+        namespace: str = "",
+        time: Optional[int] = None,
+        is_plan: bool = False,
+        terms: Tuple[Term, ...] = (),
+    ) -> None:
+        self.name = name
+        self.id = id
+        self.plan = plan
+        self.os = os
+        self.namespace = namespace
+        self.time = time
+        self.is_plan = is_plan
+        self.terms = terms
+
+    @property
+    def kind(self) -> str:
+        return KIND_NAMES[self.is_plan]
+
+    def __repr__(self) -> str:
+        return (
+            f"FailureRecord(name={self.name!r}, id={self.id!r}, plan={self.plan!r}, os={self.os!r}, "
+            f"namespace={self.namespace!r}, time={self.time!r}, is_plan={self.is_plan}, terms={self.terms!r})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, FailureRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+
+class FailureIndex:
+    """
+    Inverted index of failed VMs and plans by failure phase, reason and condition.
+
+    Records are stored columnar like VMRecords, with interned plan, OS and namespace names, and the term codes of
+    each row.  Each (field, value) term owns a posting list of the rows indexed by it.  Posting lists are sorted by
+    time when first queried after rows were added, so a query for a term in a time window costs a binary search
+    plus the rows it returns.
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.ids: List[str] = []
+        self.is_plan = array("b")
+        self.times = array("q")
+        self.plan_names: List[str] = []
+        self.plan_codes = array("L")
+        self.os_names: List[str] = []
+        self.os_codes = array("L")
+        self.namespace_names: List[str] = []
+        self.namespace_codes = array("L")
+        self.terms: List[Term] = []
+        # Row ``i`` is indexed by terms ``term_codes[term_offsets[i]:term_offsets[i + 1]]``
+        self.term_codes = array("L")
+        self.term_offsets = array("q", [0])
+        self.postings: List[array] = []
+        self._plan_index: Dict[str, int] = {}
+        self._os_index: Dict[str, int] = {}
+        self._namespace_index: Dict[str, int] = {}
+        self._term_index: Dict[Term, int] = {}
+        # Times of each posting list once sorted, None while the list is unsorted
+        self._posting_times: List[Optional[array]] = []
+        self._all: Optional[Tuple[array, array]] = None
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> FailureRecord:
+        time = self.times[index]
+        return FailureRecord(
+            self.names[index],
+            self.ids[index],
+            self.plan_names[self.plan_codes[index]],
+            self.os_names[self.os_codes[index]],
+            self.namespace_names[self.namespace_codes[index]],
+            None if time == MISSING else time,
+            bool(self.is_plan[index]),
+            self.row_terms(index),
+        )
+
+    def __iter__(self) -> Iterator[FailureRecord]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @staticmethod
+    def _intern(value: str, names: List[str], index: Dict[str, int]) -> int:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(names)
+            names.append(value)
+        return code
+
+    def _term(self, term: Term) -> int:
+        code = self._term_index.get(term)
+        if code is None:
+            code = self._term_index[term] = len(self.terms)
+            self.terms.append(term)
+            self.postings.append(array("L"))
+            self._posting_times.append(None)
+        return code
+
+    def add(
+        self,
+        name: str,
+        id: str,
+        plan: str,
+        os: str,
+        namespace: str,
+        time: Optional[int],
+        is_plan: bool,
+        terms: Iterable[Term],
+    ) -> None:
+        """
+        Append a failed VM or plan and add it to the posting list of each of its terms.
+
+        Args:
+            name (str): VM or plan name.
+            id (str): VM id or plan uid.
+            plan (str): Plan name.
+            os (str): OS of the VM, "" for plans.
+            namespace (str): Namespace of the plan.
+            time (Optional[int]): Time of the failure in epoch seconds.
+            is_plan (bool): The record is a plan.
+            terms (Iterable[Term]): (field, value) pairs to index the record by, duplicates are indexed once.
+        """
+        row = len(self.names)
+        self.names.append(name)
+        self.ids.append(id)
+        self.is_plan.append(is_plan)
+        self.times.append(MISSING if time is None else time)
+        self.plan_codes.append(self._intern(plan, self.plan_names, self._plan_index))
+        self.os_codes.append(self._intern(os, self.os_names, self._os_index))
+        self.namespace_codes.append(self._intern(namespace, self.namespace_names, self._namespace_index))
+        for code in dict.fromkeys(self._term(term) for term in terms):
+            self.term_codes.append(code)
+            self.postings[code].append(row)
+            self._posting_times[code] = None
+        self.term_offsets.append(len(self.term_codes))
+        self._all = None
+
+    def append(self, record: FailureRecord) -> None:
+        """
+        Append a FailureRecord.
+
+        Args:
+            record (FailureRecord): record to append.
+        """
+        self.add(
+            record.name, record.id, record.plan, record.os, record.namespace, record.time, record.is_plan, record.terms
+        )
+
+    def extend(self, records: Iterable[FailureRecord]) -> None:
+        """
+        Append every record of another index or iterable of FailureRecord.
+
+        Args:
+            records (Iterable[FailureRecord]): records to append.
+        """
+        if not isinstance(records, FailureIndex):
+            for record in records:
+                self.append(record)
+            return
+
+        # Merge column by column, re-interning names and shifting the other index's posting lists
+        offset = len(self.names)
+        plan_map = [self._intern(plan, self.plan_names, self._plan_index) for plan in records.plan_names]
+        os_map = [self._intern(os_name, self.os_names, self._os_index) for os_name in records.os_names]
+        namespace_map = [
+            self._intern(namespace, self.namespace_names, self._namespace_index)
+            for namespace in records.namespace_names
+        ]
+        self.names.extend(records.names)
+        self.ids.extend(records.ids)
+        self.is_plan.extend(records.is_plan)
+        self.times.extend(records.times)
+        self.plan_codes.extend(plan_map[code] for code in records.plan_codes)
+        self.os_codes.extend(os_map[code] for code in records.os_codes)
+        self.namespace_codes.extend(namespace_map[code] for code in records.namespace_codes)
+        term_map = [self._term(term) for term in records.terms]
+        codes_offset = len(self.term_codes)
+        self.term_codes.extend(term_map[code] for code in records.term_codes)
+        self.term_offsets.extend(position + codes_offset for position in records.term_offsets[1:])
+        for code, rows in zip(term_map, records.postings):
+            self.postings[code].extend(row + offset for row in rows)
+            self._posting_times[code] = None
+        self._all = None
+
+    def row_terms(self, index: int) -> Tuple[Term, ...]:
+        """Terms one row is indexed by, in the order they were added."""
+        return tuple(
+            self.terms[code] for code in self.term_codes[self.term_offsets[index] : self.term_offsets[index + 1]]
+        )
+
+    def values(self, field: str) -> List[str]:
+        """Values of a field in order of first appearance."""
+        return [value for term_field, value in self.terms if term_field == field]
+
+    def _sorted(self, rows: array) -> Tuple[array, array]:
+        order = sorted(rows, key=lambda row: (self.times[row], row))
+        return array("L", order), array("q", (self.times[row] for row in order))
+
+    def _posting(self, term: Optional[Term]) -> Tuple[array, array]:
+        """Rows of a term, or of every record, sorted by time, and their times."""
+        if term is None:
+            if self._all is None:
+                self._all = self._sorted(array("L", range(len(self))))
+            return self._all
+        code = self._term_index.get(term)
+        if code is None:
+            return array("L"), array("q")
+        if self._posting_times[code] is None:
+            self.postings[code], self._posting_times[code] = self._sorted(self.postings[code])
+        return self.postings[code], self._posting_times[code]
+
+    def rows(
+        self,
+        field: Optional[str] = None,
+        value: Optional[str] = None,
+        start: Optional[int] = None,
+        end: Optional[int] = None,
+    ) -> array:
+        """
+        Records indexed by a term and failed in a time window, in order of time.
+
+        Args:
+            field (Optional[str], optional): Field from FAILURE_FIELDS. Defaults to None, every record.
+            value (Optional[str], optional): Value of the field, e.g. "ConvertGuest".
+            start (Optional[int], optional): Start of the window in epoch seconds. Defaults to None, unbounded.
+            end (Optional[int], optional): End of the window in epoch seconds, exclusive. Defaults to None,
+                unbounded.  Records without a time are only returned for an unbounded window.
+
+        Returns:
+            array: Row indexes of the records.
+        """
+        if field is not None and field not in FAILURE_FIELDS:
+            raise ValueError(f"Unknown failure field {field!r}, expected one of {', '.join(FAILURE_FIELDS)}")
+        rows, times = self._posting(None if field is None else (field, value))
+        if start is None and end is None:
+            return rows
+        # MISSING is the smallest int64, so records without a time sort first and fall outside any window
+        first = bisect_left(times, MISSING + 1 if start is None else max(start, MISSING + 1))
+        last = len(times) if end is None else bisect_left(times, end)
+        return rows[first:last]
+
+    def labels(self, key: str) -> Tuple[Sequence[str], Sequence[int]]:
+        """
+        Distinct names and per-record codes of one of the group keys.
+
+        Args:
+            key (str): Key from FAILURE_GROUP_KEYS.
+
+        Returns:
+            Tuple[Sequence[str], Sequence[int]]: Names indexed by code, and the code of every record.
+        """
+        if key == "kind":
+            return KIND_NAMES, self.is_plan
+        if key not in FAILURE_GROUP_KEYS:
+            raise ValueError(f"Cannot group failures by {key}, expected one of {', '.join(FAILURE_GROUP_KEYS)}")
+        return getattr(self, f"{key}_names"), getattr(self, f"{key}_codes")
+
+    def count_by(self, rows: Iterable[int], key: str) -> Dict[str, int]:
+        """
+        Count records per group.
+
+        Args:
+            rows (Iterable[int]): Row indexes, e.g. from ``rows``.
+            key (str): Key from FAILURE_GROUP_KEYS.
+
+        Returns:
+            Dict[str, int]: Records per group, largest first, ties in order of first appearance.
+        """
+        names, codes = self.labels(key)
+        counts = Counter(codes[row] for row in rows)
+        return {names[code]: count for code, count in counts.most_common()}
+
+    def breakdown(self) -> Iterator[Tuple[str, str, int, int, int, Optional[int]]]:
+        """
+        Failures per term.
+
+        Yields:
+            Tuple[str, str, int, int, int, Optional[int]]: Field, value, failed VMs, plans with Critical
+            conditions, distinct plans involved, counted by namespace and name, and time of the latest failure,
+            fields in the order of FAILURE_FIELDS and values by number of records.
+        """
+        order = {field: position for position, field in enumerate(FAILURE_FIELDS)}
+        counted = []
+        for code, ((field, value), rows) in enumerate(zip(self.terms, self.postings)):
+            plans = sum(self.is_plan[row] for row in rows)
+            latest = max(self.times[row] for row in rows)
+            counted.append(
+                (
+                    order[field],
+                    -len(rows),
+                    code,
+                    field,
+                    value,
+                    len(rows) - plans,
+                    plans,
+                    len({(self.namespace_codes[row], self.plan_codes[row]) for row in rows}),
+                    None if latest == MISSING else latest,
+                )
+            )
+        for *_, field, value, vms, plans, plan_count, latest in sorted(counted):
+            yield field, value, vms, plans, plan_count, latest
+
+    def cross_counts(self, field: str, key: str) -> Iterator[Tuple[str, str, int]]:
+        """
+        Failed VMs per value of a field and group, e.g. per failed phase and OS.
+
+        Args:
+            field (str): Field from FAILURE_FIELDS.
+            key (str): Key from FAILURE_GROUP_KEYS.
+
+        Yields:
+            Tuple[str, str, int]: Value, group and number of VMs, values in order of first appearance.
+        """
+        for term_field, value in self.terms:
+            if term_field == field:
+                rows = (row for row in self.rows(field, value) if not self.is_plan[row])
+                for group, count in self.count_by(rows, key).items():
+                    yield value, group, count
+
+    def to_columns(self) -> Dict[str, Union[List[str], array]]:
+        """The index as flat columns for ``from_columns``.  Posting lists are left out, they are rebuilt."""
+        return {
+            "names": self.names,
+            "ids": self.ids,
+            "is_plan": self.is_plan,
+            "times": self.times,
+            "plan_names": self.plan_names,
+            "plan_codes": self.plan_codes,
+            "os_names": self.os_names,
+            "os_codes": self.os_codes,
+            "namespace_names": self.namespace_names,
+            "namespace_codes": self.namespace_codes,
+            "term_fields": [field for field, _ in self.terms],
+            "term_values": [value for _, value in self.terms],
+            "term_codes": self.term_codes,
+            "term_offsets": self.term_offsets,
+        }
+
+    @classmethod
+    def from_columns(
+        cls,
+        names: List[str],
+        ids: List[str],
+        is_plan: Union[Iterable[bool], bytes],
+        times: Union[Iterable[int], bytes],
+        plan_names: List[str],
+        plan_codes: Union[Iterable[int], bytes],
+        os_names: List[str],
+        os_codes: Union[Iterable[int], bytes],
+        namespace_names: List[str],
+        namespace_codes: Union[Iterable[int], bytes],
+        term_fields: List[str],
+        term_values: List[str],
+        term_codes: Union[Iterable[int], bytes],
+        term_offsets: Union[Iterable[int], bytes],
+    ) -> "FailureIndex":
+        """
+        Build an index from the columns written by ``to_columns``, e.g. read back from a record store.
+
+        Numeric columns may also be given as the raw bytes of the matching ``array`` type.  The posting lists are
+        rebuilt in one pass over the term codes.
+
+        Returns:
+            FailureIndex: index holding the columns.
+        """
+        index = cls()
+        index.names = names
+        index.ids = ids
+        index.is_plan = array("b", is_plan)
+        index.times = array("q", times)
+        for key, label_names, codes in (
+            ("plan", plan_names, plan_codes),
+            ("os", os_names, os_codes),
+            ("namespace", namespace_names, namespace_codes),
+        ):
+            setattr(index, f"{key}_names", label_names)
+            setattr(index, f"{key}_codes", array("L", codes))
+            setattr(index, f"_{key}_index", {name: code for code, name in enumerate(label_names)})
+        for term in zip(term_fields, term_values):
+            index._term(term)
+        index.term_codes = array("L", term_codes)
+        index.term_offsets = array("q", term_offsets)
+        for row, (begin, end) in enumerate(zip(index.term_offsets[:-1], index.term_offsets[1:])):
+            for code in index.term_codes[begin:end]:
+                index.postings[code].append(row)
+        return index
+
+
+def parse_failure_term(text: str) -> Term:
+    """
+    Parse a failure term given on the command line.
+
+    Args:
+        text (str): "FIELD=VALUE" with FIELD from FAILURE_FIELDS, or a phase name.
+
+    Returns:
+        Term: (field, value).
+    """
+    field, separator, value = text.partition("=")
+    if separator and field in FAILURE_FIELDS:
+        return field, value
+    if separator and field.replace("-", "_") in FAILURE_FIELDS:
+        return field.replace("-", "_"), value
+    return "phase", text
@@ -0,0 +1,325 @@
+import functools
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, TypeVar
+
+# Environment variables enabling the instrumentation when the matching command line option is not given
+METRICS_ENV = "MTV_PARSER_METRICS"
+PROFILE_ENV = "MTV_PARSER_PROFILE"
+TRACE_MEMORY_ENV = "MTV_PARSER_TRACE_MEMORY"
+
+PROMETHEUS_PREFIX = "mtv_parser"
+# ru_maxrss is reported in bytes on macOS and in kilobytes elsewhere
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+
+def peak_rss_bytes() -> int:
+    """Highest resident set size of the process so far."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+class StageStats:
+    """
+    Accumulated measurements of one stage.
+
+    Attributes:
+        calls (int): Number of times the stage ran.
+        wall_seconds (float): Total wall time.
+        cpu_seconds (float): Total CPU time of the process.
+        items (int): Total items processed (plans, VMs, events, ...).
+        peak_rss_bytes (int): Highest process RSS observed when the stage finished.
+        peak_traced_bytes (Optional[int]): Highest Python heap growth during one call, only with memory tracing.
+    """
+
+    __slots__ = ("calls", "wall_seconds", "cpu_seconds", "items", "peak_rss_bytes", "peak_traced_bytes")
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.items = 0
+        self.peak_rss_bytes = 0
+        self.peak_traced_bytes: Optional[int] = None
+
+    def merge(self, other: Dict[str, Any]) -> None:
+        """Add the measurements of another process, as returned by ``as_dict``."""
+        self.calls += other["calls"]
+        self.wall_seconds += other["wall_seconds"]
+        self.cpu_seconds += other["cpu_seconds"]
+        self.items += other["items"]
+        self.peak_rss_bytes = max(self.peak_rss_bytes, other["peak_rss_bytes"])
+        if other.get("peak_traced_bytes") is not None:
+            self.peak_traced_bytes = max(self.peak_traced_bytes or 0, other["peak_traced_bytes"])
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Stage:
+    """Context manager measuring one run of a stage.  Use ``add_items`` to report how much work it did."""
+
+    __slots__ = ("instrumentation", "name", "items", "_wall", "_cpu", "_trace")
+
+    def __init__(self, instrumentation: "Instrumentation", name: str) -> None:
+        self.instrumentation = instrumentation
+        self.name = name
+        self.items = 0
+
+    def add_items(self, count: int) -> None:
+        self.items += count
+
+    def __enter__(self) -> "Stage":
+        self._trace = self.instrumentation._trace_enter() if self.instrumentation.trace_memory else None
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        traced = self.instrumentation._trace_exit(self._trace) if self._trace is not None else None
+        self.instrumentation._record(self.name, wall, cpu, self.items, traced)
+
+
+class _DisabledStage:
+    """Stand-in returned while the instrumentation is off, so instrumented code costs one attribute lookup."""
+
+    __slots__ = ()
+
+    def add_items(self, count: int) -> None:
+        pass
+
+    def __enter__(self) -> "_DisabledStage":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_DISABLED_STAGE = _DisabledStage()
+
+
+class Instrumentation:
+    """
+    Collects wall time, CPU time, peak memory and item counts per pipeline stage.
+
+    Disabled by default.  While disabled ``stage`` returns a shared no-op context manager and ``instrumented``
+    functions call straight through, so the hooks can stay in hot code.
+
+    Attributes:
+        enabled (bool): Whether stages are measured.
+        trace_memory (bool): Also measure the Python heap growth of each stage with tracemalloc.  Accurate but
+            slows the run down noticeably; without it only the process RSS high-water mark is recorded.
+        stages (Dict[str, StageStats]): Measurements per stage name, in first-seen order.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = False
+        self.trace_memory = False
+        self.stages: Dict[str, StageStats] = {}
+        self._trace_stack: List[List[int]] = []
+        self._started_tracing = False
+
+    def enable(self, trace_memory: bool = False) -> None:
+        """
+        Start measuring stages.
+
+        Args:
+            trace_memory (bool, optional): Trace Python heap allocations per stage. Defaults to False.
+        """
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+
+    def disable(self) -> None:
+        """Stop measuring stages.  Collected measurements are kept."""
+        self.enabled = False
+        self.trace_memory = False
+        if self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+
+    def reset(self) -> None:
+        """Drop collected measurements."""
+        self.stages = {}
+
+    def stage(self, name: str) -> Any:
+        """
+        Measure a block of code.
+
+        Args:
+            name (str): Stage name.  Measurements of stages with the same name add up.
+
+        Returns:
+            Stage: Context manager, a no-op while disabled.
+        """
+        if not self.enabled:
+            return _DISABLED_STAGE
+        return Stage(self, name)
+
+    def iterate(self, name: str, iterable: Iterable[Any]) -> Iterator[Any]:
+        """
+        Measure the time spent producing the items of a lazy iterable, e.g. parsing the plans of a dump.
+
+        Only the time spent inside the iterable is counted, not the time the consumer spends on each item.
+
+        Args:
+            name (str): Stage name.
+            iterable (Iterable[Any]): Items to produce.
+
+        Yields:
+            Any: The items of ``iterable``.
+        """
+        if not self.enabled:
+            yield from iterable
+            return
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name) as stage:
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                stage.add_items(1)
+            yield item
+
+    def _record(self, name: str, wall: float, cpu: float, items: int, traced: Optional[int]) -> None:
+        stats = self.stages.get(name)
+        if stats is None:
+            stats = self.stages[name] = StageStats()
+        stats.calls += 1
+        stats.wall_seconds += wall
+        stats.cpu_seconds += cpu
+        stats.items += items
+        stats.peak_rss_bytes = max(stats.peak_rss_bytes, peak_rss_bytes())
+        if traced is not None:
+            stats.peak_traced_bytes = max(stats.peak_traced_bytes or 0, traced)
+
+    def _trace_enter(self) -> List[int]:
+        # tracemalloc keeps a single peak, so fold it into every open stage before resetting it for this one
+        current, peak = tracemalloc.get_traced_memory()
+        for frame in self._trace_stack:
+            frame[1] = max(frame[1], peak)
+        tracemalloc.reset_peak()
+        frame = [current, current]
+        self._trace_stack.append(frame)
+        return frame
+
+    def _trace_exit(self, frame: List[int]) -> int:
+        peak = max(frame[1], tracemalloc.get_traced_memory()[1])
+        self._trace_stack.remove(frame)
+        for outer in self._trace_stack:
+            outer[1] = max(outer[1], peak)
+        return peak - frame[0]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Measurements as plain data, e.g. to send them from a worker process."""
+        return {name: stats.as_dict() for name, stats in self.stages.items()}
+
+    def merge(self, snapshot: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Add measurements taken in another process.
+
+        Args:
+            snapshot (Dict[str, Dict[str, Any]]): Output of ``snapshot`` in that process.
+        """
+        for name, other in snapshot.items():
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.merge(other)
+
+    def to_json(self) -> str:
+        """Measurements as a JSON document."""
+        return json.dumps(
+            {"timestamp": time.time(), "peak_rss_bytes": peak_rss_bytes(), "stages": self.snapshot()}, indent=2
+        )
+
+    def to_prometheus(self) -> str:
+        """Measurements in the Prometheus text exposition format, for the node_exporter textfile collector."""
+        metrics = [
+            ("calls_total", "calls", "counter", "Number of times the stage ran."),
+            ("wall_seconds", "wall_seconds", "gauge", "Wall time spent in the stage."),
+            ("cpu_seconds", "cpu_seconds", "gauge", "Process CPU time spent in the stage."),
+            ("items", "items", "gauge", "Items processed by the stage."),
+            ("peak_rss_bytes", "peak_rss_bytes", "gauge", "Process RSS high-water mark when the stage finished."),
+            ("peak_traced_bytes", "peak_traced_bytes", "gauge", "Peak Python heap growth during the stage."),
+        ]
+        lines = []
+        for metric, attribute, metric_type, description in metrics:
+            samples = [
+                (name, getattr(stats, attribute))
+                for name, stats in self.stages.items()
+                if getattr(stats, attribute) is not None
+            ]
+            if not samples:
+                continue
+            full_name = f"{PROMETHEUS_PREFIX}_stage_{metric}"
+            lines.append(f"# HELP {full_name} {description}")
+            lines.append(f"# TYPE {full_name} {metric_type}")
+            lines.extend(f'{full_name}{{stage="{name}"}} {value}' for name, value in samples)
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_peak_rss_bytes Process RSS high-water mark.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_peak_rss_bytes gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_peak_rss_bytes {peak_rss_bytes()}")
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_last_run_timestamp_seconds Time the report job finished.")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{PROMETHEUS_PREFIX}_last_run_timestamp_seconds {time.time()}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str | Path, metrics_format: Optional[str] = None) -> None:
+        """
+        Write the measurements.  The file is replaced atomically so collectors never read a partial file.
+
+        Args:
+            path (str | Path): Output file.
+            metrics_format (Optional[str], optional): "json" or "prometheus". Defaults to "prometheus" for
+                ``.prom`` files and "json" otherwise.
+        """
+        path = Path(path)
+        if metrics_format is None:
+            metrics_format = "prometheus" if path.suffix == ".prom" else "json"
+        text = self.to_prometheus() if metrics_format == "prometheus" else self.to_json()
+        partial = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        partial.write_text(text)
+        os.replace(partial, path)
+
+
+# Process-wide instrumentation used by the pipeline
+metrics = Instrumentation()
+
+
+def instrumented(name: str, items: Optional[Callable[[Any], int]] = None) -> Callable[[F], F]:
+    """
+    Measure every call of a function as a stage of the process-wide instrumentation.
+
+    Args:
+        name (str): Stage name.
+        items (Optional[Callable[[Any], int]], optional): Derives the item count from the function's result.
+
+    Returns:
+        Callable[[F], F]: Decorator.
+    """
+
+    def decorator(function: F) -> F:
+        @functools.wraps(function)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            with metrics.stage(name) as stage:
+                result = function(*args, **kwargs)
+                if items is not None:
+                    stage.add_items(items(result))
+            return result
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
@@ -0,0 +1,267 @@
+from datetime import datetime
+from typing import List, Optional, Tuple, Union
+
+import numpy as np
+from timestamps import MISSING
+from vm_records import VMRecords
+
+# Nodes holding at most this many intervals are not split further and are scanned directly
+LEAF_SIZE = 32
+
+Time = Union[datetime, float]
+
+
+def _seconds(when: Time) -> float:
+    return when.timestamp() if isinstance(when, datetime) else float(when)
+
+
+class IntervalIndex:
+    """
+    Index of VM transfers by time, answering which VMs were migrating at an instant or during a time range.
+
+    A VM counts as migrating from its start time up to, excluding, its end time.  Like the concurrency timeline,
+    VMs without a start time or duration are left out.
+
+    The index is a centered interval tree laid out in flat arrays.  Each node holds the intervals containing its
+    center, once sorted by start and once by end, so a stabbing query takes one binary search per level:
+    O(log n + k) for k results.  A range query is a stabbing query at the range start plus the intervals starting
+    inside the range, which are contiguous in start order.  Building takes O(n log n).
+
+    Attributes:
+        records (VMRecords): VMs the index was built from.
+        rows (np.ndarray): Row in ``records`` of each indexed interval, in start order.
+        starts (np.ndarray): Interval starts in Unix seconds (int64), sorted.
+        ends (np.ndarray): Interval ends in Unix seconds (int64), in the order of ``starts``.
+    """
+
+    def __init__(self, records: VMRecords) -> None:
+        """
+        Build the index.
+
+        Args:
+            records (VMRecords): Migrated VMs.
+        """
+        self.records = records
+        starts = np.frombuffer(records.start_times, dtype=np.int64)
+        ends = np.frombuffer(records.end_times, dtype=np.int64)
+        durations = np.frombuffer(records.durations, dtype=np.float64)
+        rows = np.flatnonzero((starts != MISSING) & (durations != 0))
+        starts, ends = starts[rows], ends[rows]
+        order = np.argsort(starts, kind="stable")
+        self.rows = rows.astype(np.int64)[order]
+        self.starts = starts[order]
+        self.ends = ends[order]
+        self._sorted_ends = np.sort(self.ends)
+        self._by_length = np.argsort(-(self.ends - self.starts), kind="stable")
+        self._build()
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _build(self) -> None:
+        """Lay the tree out in flat arrays, one entry per node with the root first."""
+        centers: List[float] = []
+        children: List[List[int]] = []
+        # Per node: offset and count of its intervals in the packed arrays, and whether it is a leaf
+        slices: List[Tuple[int, int, bool]] = []
+        packed_by_start: List[np.ndarray] = []
+        packed_by_end: List[np.ndarray] = []
+        packed = 0
+
+        # (parent node, side, positions in start order)
+        stack: List[Tuple[int, int, np.ndarray]] = []
+        if len(self.rows):
+            stack.append((-1, 0, np.arange(len(self.rows))))
+        while stack:
+            parent, side, positions = stack.pop()
+            node = len(centers)
+            children.append([-1, -1])
+            if parent >= 0:
+                children[parent][side] = node
+            if len(positions) <= LEAF_SIZE:
+                centers.append(np.nan)
+                slices.append((packed, len(positions), True))
+                packed_by_start.append(positions)
+                packed_by_end.append(positions)
+                packed += len(positions)
+                continue
+
+            # The median start lies inside its own interval, so every node keeps at least one interval
+            starts, ends = self.starts[positions], self.ends[positions]
+            center = float(starts[len(positions) // 2])
+            inside = positions[(starts <= center) & (ends > center)]
+            centers.append(center)
+            slices.append((packed, len(inside), False))
+            packed_by_start.append(inside)
+            packed_by_end.append(inside[np.argsort(-self.ends[inside], kind="stable")])
+            packed += len(inside)
+            left = positions[ends <= center]
+            right = positions[starts > center]
+            if len(left):
+                stack.append((node, 0, left))
+            if len(right):
+                stack.append((node, 1, right))
+
+        self._centers = np.array(centers, dtype=np.float64)
+        self._children = np.array(children, dtype=np.int64).reshape(-1, 2)
+        self._slices = slices
+        self._by_start = np.concatenate(packed_by_start) if packed_by_start else np.empty(0, dtype=np.int64)
+        self._by_end = np.concatenate(packed_by_end) if packed_by_end else np.empty(0, dtype=np.int64)
+        self._node_starts = self.starts[self._by_start]
+        self._node_ends = -self.ends[self._by_end]
+
+    def _stab(self, when: float) -> List[np.ndarray]:
+        """Positions of the intervals containing ``when``, one array per visited node."""
+        found = []
+        node = 0 if len(self._centers) else -1
+        while node >= 0:
+            offset, count, leaf = self._slices[node]
+            if leaf:
+                positions = self._by_start[offset : offset + count]
+                found.append(positions[(self.starts[positions] <= when) & (self.ends[positions] > when)])
+                return found
+            center = self._centers[node]
+            if when < center:
+                # Every interval of the node ends after the center, those starting by ``when`` contain it
+                hits = np.searchsorted(self._node_starts[offset : offset + count], when, side="right")
+                found.append(self._by_start[offset : offset + hits])
+                node = self._children[node, 0]
+            else:
+                # Every interval of the node starts by the center, those ending after ``when`` contain it
+                hits = np.searchsorted(self._node_ends[offset : offset + count], -when, side="left")
+                found.append(self._by_end[offset : offset + hits])
+                node = self._children[node, 1] if when > center else -1
+        return found
+
+    def _rows(self, parts: List[np.ndarray]) -> np.ndarray:
+        positions = np.concatenate(parts) if parts else np.empty(0, dtype=np.int64)
+        return self.rows[np.sort(positions)]
+
+    def at(self, when: Time) -> np.ndarray:
+        """
+        VMs migrating at an instant.
+
+        Args:
+            when (Time): Instant, as a datetime or Unix seconds.
+
+        Returns:
+            np.ndarray: Rows in ``records``, in start order.
+        """
+        return self._rows(self._stab(_seconds(when)))
+
+    def count_at(self, when: Time) -> int:
+        """
+        Number of VMs migrating at an instant, in O(log n) without listing them.
+
+        Args:
+            when (Time): Instant, as a datetime or Unix seconds.
+
+        Returns:
+            int: Number of VMs.
+        """
+        when = _seconds(when)
+        started = np.searchsorted(self.starts, when, side="right")
+        ended = np.searchsorted(self._sorted_ends, when, side="right")
+        return int(started - ended)
+
+    def overlapping(self, start: Time, end: Time) -> np.ndarray:
+        """
+        VMs migrating at any time during ``[start, end)``.
+
+        Args:
+            start (Time): Range start, as a datetime or Unix seconds.
+            end (Time): Range end, excluded.
+
+        Returns:
+            np.ndarray: Rows in ``records``, in start order.
+        """
+        start, end = _seconds(start), _seconds(end)
+        if end <= start:
+            return self.at(start)
+        first = np.searchsorted(self.starts, start, side="right")
+        last = np.searchsorted(self.starts, end, side="left")
+        return self._rows(self._stab(start) + [np.arange(first, last)])
+
+    def longest(self, k: int, start: Optional[Time] = None, end: Optional[Time] = None) -> np.ndarray:
+        """
+        The ``k`` longest transfers, overall or among the VMs migrating during ``[start, end)``.
+
+        Overall this is a slice of a precomputed order, O(k).  Within a range the overlapping VMs are found first
+        and the longest of them selected in linear time.
+
+        Args:
+            k (int): Number of VMs.
+            start (Optional[Time], optional): Range start. Defaults to None, every VM.
+            end (Optional[Time], optional): Range end. Defaults to ``start``, an instant.
+
+        Returns:
+            np.ndarray: Rows in ``records``, longest first.
+        """
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if start is None:
+            return self.rows[self._by_length[:k]]
+        start = _seconds(start)
+        end = start if end is None else _seconds(end)
+        first = np.searchsorted(self.starts, start, side="right")
+        last = np.searchsorted(self.starts, end, side="left") if end > start else first
+        positions = np.concatenate(self._stab(start) + [np.arange(first, last)])
+        lengths = self.ends[positions] - self.starts[positions]
+        if len(positions) > k:
+            keep = np.argpartition(-lengths, k - 1)[:k]
+            positions, lengths = positions[keep], lengths[keep]
+        order = np.lexsort((positions, -lengths))
+        return self.rows[positions[order]]
+
+    def _plan_rows(self, namespace: str, plan: str) -> np.ndarray:
+        """Mask over the indexed intervals selecting the VMs of a plan."""
+        records = self.records
+        plan_code = records.label_code("plan", plan)
+        namespace_code = records.label_code("namespace", namespace)
+        if plan_code is None or namespace_code is None:
+            return np.zeros(len(self.rows), dtype=bool)
+        plan_codes = np.frombuffer(records.plan_codes, dtype=f"u{records.plan_codes.itemsize}")
+        namespace_codes = np.frombuffer(records.namespace_codes, dtype=f"u{records.namespace_codes.itemsize}")
+        rows = (plan_codes == plan_code) & (namespace_codes == namespace_code)
+        return rows[self.rows]
+
+    def plan_span(self, namespace: str, plan: str) -> Optional[Tuple[float, float]]:
+        """
+        First start and last end of the VMs of a plan.
+
+        Args:
+            namespace (str): Namespace of the plan, plan names are only unique within a namespace.
+            plan (str): Plan name.
+
+        Returns:
+            Optional[Tuple[float, float]]: Span in Unix seconds, None if the plan has no indexed VM.
+        """
+        mine = self._plan_rows(namespace, plan)
+        if not mine.any():
+            return None
+        return float(self.starts[mine].min()), float(self.ends[mine].max())
+
+    def overlapping_plan(self, namespace: str, plan: str) -> np.ndarray:
+        """
+        VMs of other plans migrating while a plan ran.
+
+        Args:
+            namespace (str): Namespace of the plan.
+            plan (str): Plan name.
+
+        Returns:
+            np.ndarray: Rows in ``records``, in start order.
+        """
+        span = self.plan_span(namespace, plan)
+        if span is None:
+            return np.empty(0, dtype=np.int64)
+        rows = self.overlapping(*span)
+        records = self.records
+        return np.array(
+            [
+                row
+                for row in rows.tolist()
+                if records.plan_name(row) != plan or records.namespace_name(row) != namespace
+            ],
+            dtype=np.int64,
+        )
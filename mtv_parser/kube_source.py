@@ -0,0 +1,362 @@
+import base64
+import os
+import queue
+import threading
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional
+from urllib.parse import quote, urlencode, urlsplit
+
+import yaml
+from plan_loader import PLAN_FIELDS, FieldSelection, _prune_plan, json_loads
+
+if TYPE_CHECKING:
+    import http.client
+
+PLAN_GROUP_VERSION = "forklift.konveyor.io/v1beta1"
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_PREFETCH = 2
+DEFAULT_TIMEOUT = 60.0
+# Service account credentials mounted into pods
+IN_CLUSTER_TOKEN = "/var/run/secrets/kubernetes.io/serviceaccount/token"
+IN_CLUSTER_CA = "/var/run/secrets/kubernetes.io/serviceaccount/ca.crt"
+
+
+class KubeAPIError(RuntimeError):
+    """The API server answered a list request with an error status."""
+
+    def __init__(self, status: int, reason: str, body: bytes) -> None:
+        message = body.decode("utf-8", "replace")
+        try:
+            message = json_loads(body).get("message", message)
+        except (ValueError, AttributeError):
+            pass
+        super().__init__(f"API server returned {status} {reason}: {message}")
+        self.status = status
+
+
+def kubeconfig_credentials(path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Read the API server, bearer token and CA of the current context of a kubeconfig, like ``oc login`` writes it.
+
+    Only token authentication is supported, client certificates and exec plugins are not.
+
+    Args:
+        path (Optional[str], optional): kubeconfig file. Defaults to the first file of $KUBECONFIG, then
+            ~/.kube/config.
+
+    Returns:
+        Dict[str, Any]: ``server``, ``token``, ``ca_data`` (PEM text or None) and ``insecure``.  Empty if there is
+        no kubeconfig.
+    """
+    if path is None:
+        path = (os.environ.get("KUBECONFIG") or "").split(os.pathsep)[0] or os.path.expanduser("~/.kube/config")
+    if not os.path.exists(path):
+        return {}
+    with open(path) as kubeconfig_file:
+        config = yaml.safe_load(kubeconfig_file) or {}
+
+    def named(section: str, name: Optional[str]) -> Dict[str, Any]:
+        for entry in config.get(section) or []:
+            if entry.get("name") == name:
+                return entry
+        return {}
+
+    context = named("contexts", config.get("current-context")).get("context") or {}
+    cluster = named("clusters", context.get("cluster")).get("cluster") or {}
+    user = named("users", context.get("user")).get("user") or {}
+    ca_data = cluster.get("certificate-authority-data")
+    if ca_data:
+        ca_data = base64.b64decode(ca_data).decode()
+    elif cluster.get("certificate-authority"):
+        with open(cluster["certificate-authority"]) as ca_file:
+            ca_data = ca_file.read()
+    return {
+        "server": cluster.get("server"),
+        "token": user.get("token"),
+        "ca_data": ca_data,
+        "insecure": bool(cluster.get("insecure-skip-tls-verify")),
+    }
+
+
+def in_cluster_credentials() -> Dict[str, Any]:
+    """
+    Credentials of the pod's service account when running inside a cluster.
+
+    Returns:
+        Dict[str, Any]: Same keys as ``kubeconfig_credentials``, empty outside of a cluster.
+    """
+    host = os.environ.get("KUBERNETES_SERVICE_HOST")
+    if not host or not os.path.exists(IN_CLUSTER_TOKEN):
+        return {}
+    with open(IN_CLUSTER_TOKEN) as token_file:
+        token = token_file.read().strip()
+    ca_data = None
+    if os.path.exists(IN_CLUSTER_CA):
+        with open(IN_CLUSTER_CA) as ca_file:
+            ca_data = ca_file.read()
+    if ":" in host:
+        host = f"[{host}]"
+    port = os.environ.get("KUBERNETES_SERVICE_PORT", "443")
+    return {"server": f"https://{host}:{port}", "token": token, "ca_data": ca_data, "insecure": False}
+
+
+def plan_pager(
+    server: Optional[str] = None,
+    token: Optional[str] = None,
+    namespace: Optional[str] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    insecure: bool = False,
+) -> "PlanPager":
+    """
+    Build a pager, taking whatever is not given from the current kubeconfig context or the pod's service account.
+
+    Args:
+        server (Optional[str], optional): API server URL. Defaults to the kubeconfig or in-cluster server.
+        token (Optional[str], optional): Bearer token. Defaults to the kubeconfig or in-cluster token.
+        namespace (Optional[str], optional): Namespace to list, all namespaces if None. Defaults to None.
+        page_size (int, optional): Plans per page. Defaults to DEFAULT_PAGE_SIZE.
+        insecure (bool, optional): Skip TLS verification. Defaults to False.
+
+    Returns:
+        PlanPager: The pager.
+    """
+    credentials = kubeconfig_credentials() or in_cluster_credentials()
+    server = server or credentials.get("server")
+    if not server:
+        raise ValueError("No API server given and none found in the kubeconfig or the pod's service account")
+    if credentials.get("server") != server:
+        # The kubeconfig describes another cluster, only use explicit settings
+        credentials = {}
+    return PlanPager(
+        server,
+        token or credentials.get("token"),
+        namespace,
+        page_size,
+        ca_data=credentials.get("ca_data"),
+        insecure=insecure or credentials.get("insecure", False),
+    )
+
+
+class PlanPager:
+    """
+    List Plans from the Kubernetes API server one page at a time with ``limit``/``continue`` pagination.
+
+    Every page is requested over the same keep-alive connection, which is re-opened if the server closed it
+    between pages.  Pages are requested one after the other since each needs the continue token of the previous
+    one, so one connection is all the pool ever needs.
+    """
+
+    def __init__(
+        self,
+        server: str,
+        token: Optional[str] = None,
+        namespace: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        ca_data: Optional[str] = None,
+        insecure: bool = False,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        """
+        Args:
+            server (str): API server URL, e.g. ``https://api.cluster.example.com:6443``.
+            token (Optional[str], optional): Bearer token. Defaults to None.
+            namespace (Optional[str], optional): Namespace to list, all namespaces if None. Defaults to None.
+            page_size (int, optional): Plans per page. Defaults to DEFAULT_PAGE_SIZE.
+            ca_data (Optional[str], optional): PEM CA bundle to verify the server with. Defaults to the system CAs.
+            insecure (bool, optional): Skip TLS verification. Defaults to False.
+            timeout (float, optional): Socket timeout in seconds. Defaults to DEFAULT_TIMEOUT.
+        """
+        url = urlsplit(server)
+        if url.scheme not in ("http", "https") or not url.hostname:
+            raise ValueError(f"API server must be an http or https URL, got {server!r}")
+        self.scheme = url.scheme
+        self.host = url.hostname
+        self.port = url.port
+        self.path = url.path.rstrip("/") + f"/apis/{PLAN_GROUP_VERSION}/"
+        if namespace:
+            self.path += f"namespaces/{quote(namespace, safe='')}/"
+        self.path += "plans"
+        self.page_size = page_size
+        self.timeout = timeout
+        self.headers = {"Accept": "application/json", "Connection": "keep-alive"}
+        if token:
+            self.headers["Authorization"] = f"Bearer {token}"
+        self.ssl_context = None
+        if self.scheme == "https":
+            # http.client and ssl are only imported once the API server is listed
+            import ssl
+
+            self.ssl_context = ssl.create_default_context(cadata=ca_data)
+            if insecure:
+                self.ssl_context.check_hostname = False
+                self.ssl_context.verify_mode = ssl.CERT_NONE
+        self._connection: Optional["http.client.HTTPConnection"] = None
+
+    def _connect(self) -> "http.client.HTTPConnection":
+        import http.client
+
+        if self._connection is None:
+            if self.scheme == "https":
+                self._connection = http.client.HTTPSConnection(
+                    self.host, self.port, timeout=self.timeout, context=self.ssl_context
+                )
+            else:
+                self._connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return self._connection
+
+    def close(self) -> None:
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def fetch(self, continue_token: Optional[str] = None) -> bytes:
+        """
+        Request one page of the list.
+
+        Args:
+            continue_token (Optional[str], optional): ``metadata.continue`` of the previous page. Defaults to None.
+
+        Returns:
+            bytes: The JSON body of the page.
+        """
+        import http.client
+
+        query = {"limit": self.page_size}
+        if continue_token:
+            query["continue"] = continue_token
+        target = f"{self.path}?{urlencode(query)}"
+        # A kept-alive connection may have been closed by the server since the last page, retry once on a new one
+        for attempt in range(2):
+            connection = self._connect()
+            try:
+                connection.request("GET", target, headers=self.headers)
+                response = connection.getresponse()
+                body = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                self.close()
+                if attempt:
+                    raise
+        if response.will_close:
+            self.close()
+        if response.status != 200:
+            raise KubeAPIError(response.status, response.reason, body)
+        return body
+
+    def pages(self) -> Iterator[Dict[str, Any]]:
+        """
+        Yield the parsed pages of the list until the server sends no continue token.
+
+        Yields:
+            Dict[str, Any]: One ``PlanList`` page per iteration.
+        """
+        continue_token = None
+        try:
+            while True:
+                page = json_loads(self.fetch(continue_token))
+                continue_token = (page.get("metadata") or {}).get("continue")
+                yield page
+                if not continue_token:
+                    return
+        finally:
+            self.close()
+
+
+class _Prefetcher:
+    """
+    Fetches pages in a background thread into a bounded queue, at most ``size`` pages ahead of the consumer.
+
+    Errors of the fetching thread are raised in the consumer.  The thread stops early if the consumer does.
+    """
+
+    _DONE = object()
+
+    def __init__(self, pages: Iterator[Dict[str, Any]], size: int) -> None:
+        self.pages = pages
+        self.pending: queue.Queue = queue.Queue(maxsize=size)
+        self.stop = threading.Event()
+        self.thread = threading.Thread(target=self._fetch, name="plan-page-fetcher", daemon=True)
+
+    def _put(self, item: Any) -> bool:
+        """Queue an item once there is room, False if the consumer stopped first."""
+        while not self.stop.is_set():
+            try:
+                self.pending.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _fetch(self) -> None:
+        """Body of the fetching thread."""
+        try:
+            for page in self.pages:
+                if not self._put(page):
+                    return
+        except BaseException as error:
+            self._put(error)
+            return
+        finally:
+            if self.stop.is_set():
+                self.pages.close()
+        self._put(self._DONE)
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        self.thread.start()
+        try:
+            while True:
+                item = self.pending.get()
+                if item is self._DONE:
+                    return
+                if isinstance(item, BaseException):
+                    raise item
+                yield item
+        finally:
+            self.stop.set()
+            self.thread.join()
+
+
+def _prefetch(pages: Iterator[Dict[str, Any]], prefetch: int) -> Iterator[Dict[str, Any]]:
+    """
+    Fetch pages in a background thread, at most ``prefetch`` pages ahead of the consumer.
+
+    Errors of the fetching thread are raised in the consumer.  The thread stops early if the consumer does.
+    """
+    return iter(_Prefetcher(pages, prefetch))
+
+
+def iter_api_plans(
+    pager: PlanPager,
+    fields: Optional[FieldSelection] = PLAN_FIELDS,
+    skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+    prefetch: int = DEFAULT_PREFETCH,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the Plans listed by the API server one at a time, like ``iter_dump`` does for a dump.
+
+    The next pages are downloaded and parsed while the plans of the current one are processed.  At most
+    ``prefetch`` pages wait in memory besides the one being consumed, however many plans the cluster holds.
+
+    Args:
+        pager (PlanPager): The API server to list.
+        fields (Optional[FieldSelection], optional): Parts of each plan to keep. ``None`` or ``True`` keeps the
+            complete plan. Defaults to PLAN_FIELDS.
+        skip (Optional[Callable[[Dict[str, Any]], bool]], optional): Predicate on a plan's metadata.  Plans it
+            returns True for are yielded with the keys up to and including their metadata. Defaults to None.
+        prefetch (int, optional): Pages fetched ahead, 0 fetches each page when it is needed.
+            Defaults to DEFAULT_PREFETCH.
+
+    Yields:
+        Dict[str, Any]: One plan per iteration.
+    """
+    if fields is None:
+        fields = True
+    pages = pager.pages() if prefetch < 1 else _prefetch(pager.pages(), prefetch)
+    for page in pages:
+        plans: List[Dict[str, Any]] = page.get("items") or []
+        page = None
+        plans.reverse()
+        while plans:
+            plan = plans.pop()
+            # Items of a list response carry neither kind nor apiVersion
+            plan.setdefault("kind", "Plan")
+            yield _prune_plan(plan, fields, skip)
@@ -1,82 +1,827 @@
-import yaml
-from datetime import datetime, timedelta
-from collections import defaultdict
-from clioutput import CLIOutput
-from vm_information import extract_vm_information, analyze_concurrent_migrations, calculate_effective_migration_time
-from visualization import plot_gantt_chart
-
-
-
-def add_to_dict(vm_information: dict, dict_to_update: dict, effective_duration: float) -> list[dict]:
-    dict_key = next(iter(vm_information.keys()))
-    transfer_start = vm_information[dict_key]['start_time']
-    transfer_end_time = transfer_start + timedelta(minutes=effective_duration)
-    if not transfer_start or not effective_duration:
-        return
-    dict_to_update[dict_key].append({
-        'name': vm_information[dict_key]['name'],
-        'disk_size': vm_information[dict_key]['disk_size'],
-        'start_time': transfer_start,
-        'end_time': transfer_end_time,
-        'duration': effective_duration, 
-    })
-    return(dict_to_update)
-
-
-def main():
-    with open("examples/vm-plans-sample2.yaml", "r") as yaml_file:
-        mtv_plan_data = yaml.safe_load(yaml_file)
-
-    output = CLIOutput()
+import argparse
+import cProfile
+import os
+import sys
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timedelta, timezone
+from itertools import repeat
+from pathlib import Path
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Optional
+
+from aggregation import GROUP_KEYS, parse_grouping
+from failure_index import FAILURE_FIELDS, FAILURE_GROUP_KEYS, parse_failure_term
+from instrumentation import METRICS_ENV, PROFILE_ENV, TRACE_MEMORY_ENV, metrics
+from kube_source import DEFAULT_PAGE_SIZE, DEFAULT_PREFETCH
+from plan_loader import is_dump_path, iter_dump
+from structured_output import OUTPUT_FORMATS
+from timestamps import MISSING
+from vm_information import analyze_concurrent_migrations, plan_failures, summarize_plan
+from vm_records import VMRecords
+
+if TYPE_CHECKING:
+    from chart_pipeline import ChartPipeline
+    from plan_cache import PlanCache
+
+DEFAULT_DUMP = "examples/vm-plans.yaml"
+GANTT_MODES = ("auto", "vm", "lanes", "os", "plan")
+
+
+def load_dump(path: str, cache: "PlanCache | None" = None) -> tuple[VMRecords, list[dict], list[dict]]:
+    """Derive the migrated VMs and the plan summaries of a plan dump.
+
+    Args:
+        path (str): Plan dump file, YAML or JSON, optionally gzip, zstd or xz compressed.
+        cache (PlanCache | None, optional): Cache of derived plans. Plans found in it are not derived again.
+
+    Returns:
+        tuple[VMRecords, list[dict], list[dict]]: migrated VMs, successful and failed plan summaries.
+    """
+    return load_plans(iter_dump(path, skip=cache.lookup if cache else None), cache)
+
+
+def load_plans(plans: Iterable[dict], cache: "PlanCache | None" = None) -> tuple[VMRecords, list[dict], list[dict]]:
+    """Derive the migrated VMs and the plan summaries of plans as they are read.
+
+    Failed VMs and plans with Critical conditions are indexed in the returned records' ``failures`` in the same
+    pass, including plans whose migration never completed.
+
+    Args:
+        plans (Iterable[dict]): Plans, e.g. from ``iter_dump`` or ``iter_api_plans``.
+        cache (PlanCache | None, optional): Cache of derived plans. Plans found in it are not derived again.
+
+    Returns:
+        tuple[VMRecords, list[dict], list[dict]]: migrated VMs, successful and failed plan summaries.
+    """
     successful_migrations = []
     failed_migrations = []
-    all_vms = defaultdict(list)
-    for entry in mtv_plan_data["items"]:
-        total_disk_for_current_migration = 0
-        if "completed" in entry["status"]["migration"].keys():
-            for vms in entry["status"]["migration"]["vms"]:
-                
-                # Calculate effective duration using the new function
-                effective_duration = calculate_effective_migration_time(vms, entry)
-                
-                # Calculate total disk size
-                vm_information = extract_vm_information(vms)
-                total_disk_for_current_migration += next(iter(vm_information.values()))['disk_size']
-                add_to_dict(vm_information, all_vms, effective_duration)
-                
-                number_of_vms = len(entry["spec"]["vms"])
-                vms_failed = False
-                for vm in vms["conditions"]:
-                    if vm["type"] != "Succeeded":
-                        vms_failed = True
-                
-            
-            migration_dict = {
-                "name": entry["metadata"]["name"],
-                "total_duration_mins": effective_duration,
-                "vms": number_of_vms,
-                "vms_failed": f"{vms_failed}",
-                "total_disk_size": total_disk_for_current_migration,
-                "duration": effective_duration,
-                "start_time":  next(iter(vm_information.values()))['start_time']
-            }
-            
-            if vms_failed:
-                failed_migrations.append(migration_dict)
-            else:
-                successful_migrations.append(migration_dict)
-    plot_gantt_chart(all_vms)
-    concurrency_data = analyze_concurrent_migrations(all_vms)
-    if failed_migrations:
-        output.write(output.migration_output(failed_migrations, "failed"))
-        output.write(("\n\n"))
-    output.write(output.migration_output(successful_migrations, "successful"))
-    output.write(("\n\n"))
-    output.write(output.operating_system_report(all_vms))
-    output.write(("\n\n"))
-    output.write(output.generate_concurrency_report(concurrency_data))
-    output.close()
+    all_vms = VMRecords()
+    for entry in metrics.iterate("parse", plans):
+        summary = cache.get(entry) if cache else None
+        if summary is None:
+            summary = summarize_plan(entry), plan_failures(entry)
+            if cache:
+                cache.put(entry, summary)
+        migration_summary, failures = summary
+        all_vms.failures.extend(failures)
+        if migration_summary is None:
+            continue
+
+        vm_records, migration_dict = migration_summary
+        all_vms.extend(vm_records)
+        if migration_dict["vms_failed"] == "True":
+            failed_migrations.append(migration_dict)
+        else:
+            successful_migrations.append(migration_dict)
+    return all_vms, successful_migrations, failed_migrations
+
+
+def _load_dump_job(path: str, cache_path: str | None, cache_max_plans: int) -> tuple:
+    """Load one dump in a worker process, only reading the cache and sending its changes back with the result."""
+    if cache_path is None:
+        return *load_dump(path), None
+    from plan_cache import PlanCache
+
+    with PlanCache(cache_path, cache_max_plans, read_only=True) as cache:
+        return *load_dump(path, cache), cache.updates()
+
+
+def _load_dump_worker(
+    path: str, cache_path: str | None, cache_max_plans: int, instrument: bool, trace_memory: bool
+) -> tuple:
+    """Load one dump in a worker process, sending the worker's stage measurements back along with the result."""
+    if instrument:
+        metrics.reset()
+        metrics.enable(trace_memory)
+    return *_load_dump_job(path, cache_path, cache_max_plans), metrics.snapshot()
+
+
+def load_api(args: argparse.Namespace) -> tuple[VMRecords, list[dict], list[dict]]:
+    """List the plans straight from the API server, deriving each page while the next ones download.
+
+    Args:
+        args (argparse.Namespace): Command line options.
+
+    Returns:
+        tuple[VMRecords, list[dict], list[dict]]: migrated VMs, successful and failed plan summaries.
+    """
+    from kube_source import iter_api_plans, plan_pager
+
+    pager = plan_pager(
+        args.api_server or None, args.token, args.namespace, args.page_size, args.insecure_skip_tls_verify
+    )
+    if args.cache is None:
+        return load_plans(iter_api_plans(pager, prefetch=args.prefetch_pages))
+    from plan_cache import PlanCache
+
+    with PlanCache(args.cache, args.cache_max_plans) as cache:
+        result = load_plans(iter_api_plans(pager, skip=cache.lookup, prefetch=args.prefetch_pages), cache)
+        cache.prune()
+    return result
+
+
+def expand_dump_paths(paths: list[str]) -> list[str]:
+    """Expand directories to the plan dumps they contain.
+
+    Args:
+        paths (list[str]): Dump files and directories.
+
+    Returns:
+        list[str]: Dump files, directory contents in sorted order.
+    """
+    dump_files = []
+    for path in paths:
+        if os.path.isdir(path):
+            dump_files.extend(
+                str(child) for child in sorted(Path(path).iterdir()) if child.is_file() and is_dump_path(child)
+            )
+        else:
+            dump_files.append(path)
+    return dump_files
+
+
+def load_dumps(
+    paths: list[str], jobs: int = 1, cache_path: str | None = None, cache_max_plans: int = 50000
+) -> tuple[VMRecords, list[dict], list[dict]]:
+    """Derive and merge the migrated VMs and plan summaries of several dumps.
+
+    With more than one job the dumps are parsed in a process pool.  Workers only send back the compact
+    records and summaries, which are merged in the order of ``paths`` so the result does not depend on which
+    worker finishes first.  Workers only read the cache; the summaries they derive are written by this process,
+    so they never wait on each other's write lock.
+
+    Args:
+        paths (list[str]): Dump files.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        cache_path (str | None, optional): SQLite file caching derived plans. Defaults to None.
+        cache_max_plans (int, optional): Maximum number of cached plans. Defaults to 50000.
+
+    Returns:
+        tuple[VMRecords, list[dict], list[dict]]: migrated VMs, successful and failed plan summaries.
+    """
+    cache_context = nullcontext()
+    if cache_path is not None:
+        from plan_cache import PlanCache
+
+        cache_context = PlanCache(cache_path, cache_max_plans)
+    with cache_context as cache:
+        if jobs > 1 and len(paths) > 1:
+            from concurrent.futures import ProcessPoolExecutor
+
+            with ProcessPoolExecutor(max_workers=min(jobs, len(paths))) as executor:
+                results = list(
+                    executor.map(
+                        _load_dump_worker,
+                        paths,
+                        repeat(cache_path),
+                        repeat(cache_max_plans),
+                        repeat(metrics.enabled),
+                        repeat(metrics.trace_memory),
+                    )
+                )
+        else:
+            results = [(*load_dump(path, cache), None) for path in paths]
+
+        all_vms = VMRecords()
+        successful_migrations = []
+        failed_migrations = []
+        for vm_records, successful, failed, cache_updates, *worker_metrics in results:
+            all_vms.extend(vm_records)
+            successful_migrations.extend(successful)
+            failed_migrations.extend(failed)
+            if cache_updates is not None:
+                cache.apply(cache_updates)
+            if worker_metrics:
+                metrics.merge(worker_metrics[0])
+        if cache is not None:
+            cache.prune()
+    return all_vms, successful_migrations, failed_migrations
+
+
+def add_source_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options choosing where plans are read from, shared by the report and the query command."""
+    parser.add_argument(
+        "dumps",
+        nargs="*",
+        default=[DEFAULT_DUMP],
+        help="plan dumps or directories of plan dumps, YAML or JSON, optionally gzip, zstd or xz "
+        f"compressed (default: {DEFAULT_DUMP})",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="number of dumps parsed in parallel (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--cache", metavar="PATH", help="SQLite file caching derived plans by uid and resourceVersion between runs"
+    )
+    parser.add_argument(
+        "--cache-max-plans", type=int, default=50000, help="maximum number of plans kept in the cache (default: 50000)"
+    )
+    parser.add_argument(
+        "--from-store",
+        metavar="DIR",
+        nargs="+",
+        help="report on columnar stores written by --save-store instead of parsing plan dumps",
+    )
+    parser.add_argument(
+        "--api-server",
+        metavar="URL",
+        nargs="?",
+        const="",
+        help="list the plans from the Kubernetes API server instead of reading dumps, from the "
+        "current kubeconfig context or the pod's service account if no URL is given",
+    )
+    parser.add_argument("--token", help="bearer token for --api-server (default: from the kubeconfig)")
+    parser.add_argument("-n", "--namespace", help="namespace to list plans from (default: all namespaces)")
+    parser.add_argument(
+        "--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"plans per API request (default: {DEFAULT_PAGE_SIZE})"
+    )
+    parser.add_argument(
+        "--prefetch-pages",
+        type=int,
+        default=DEFAULT_PREFETCH,
+        help=f"API pages downloaded ahead of processing, 0 to disable (default: {DEFAULT_PREFETCH})",
+    )
+    parser.add_argument(
+        "--insecure-skip-tls-verify", action="store_true", help="do not verify the API server's certificate"
+    )
+    add_instrumentation_arguments(parser)
+
+
+def add_instrumentation_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options measuring or profiling the run."""
+    parser.add_argument(
+        "--metrics",
+        metavar="PATH",
+        default=os.environ.get(METRICS_ENV),
+        help="write wall time, CPU time, peak memory and item counts per pipeline stage to PATH, "
+        f"as Prometheus textfile for .prom files and JSON otherwise (default: ${METRICS_ENV})",
+    )
+    parser.add_argument(
+        "--metrics-format",
+        choices=["json", "prometheus"],
+        help="format of the --metrics file (default: from its extension)",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        default=bool(os.environ.get(TRACE_MEMORY_ENV)),
+        help="measure the Python heap growth of each stage with tracemalloc, slows the run down "
+        f"(default: ${TRACE_MEMORY_ENV})",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        default=os.environ.get(PROFILE_ENV),
+        help=f"write a cProfile dump of the run to PATH (default: ${PROFILE_ENV})",
+    )
+
+
+def add_output_arguments(parser: argparse.ArgumentParser) -> None:
+    """Options choosing how and where the report or the query result is written."""
+    parser.add_argument(
+        "--format",
+        choices=list(OUTPUT_FORMATS),
+        default="text",
+        help="text tables, or JSON lines or one CSV table of section, row, field and value for scripts (default: text)",
+    )
+    parser.add_argument("-o", "--output", metavar="PATH", help="write to PATH instead of stdout")
+
+
+@contextmanager
+def open_output(args: argparse.Namespace) -> Iterator:
+    """Output in the format chosen on the command line, writing to --output or stdout, closed on exit."""
+    file = open(args.output, "w", newline="") if args.output else None
+    output = OUTPUT_FORMATS[args.format](file)
+    try:
+        yield output
+    finally:
+        output.close()
+        if file:
+            file.close()
+
+
+def check_source_arguments(parser: argparse.ArgumentParser, args: argparse.Namespace) -> None:
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+    if args.prefetch_pages < 0:
+        parser.error("--prefetch-pages must not be negative")
+
+
+def group_by_keys(text: str) -> tuple[str, ...]:
+    try:
+        return parse_grouping(text)
+    except ValueError as error:
+        raise argparse.ArgumentTypeError(str(error))
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description="Report on MTV migration plans",
+        epilog="Run 'mtv_plan_parser.py query --help' to look up the VMs migrating at a given time, "
+        "'mtv_plan_parser.py simulate --help' to predict the schedule of a migration wave, and "
+        "'mtv_plan_parser.py diff --help' to compare two dumps",
+    )
+    add_source_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument(
+        "--bucket-minutes", type=float, default=60, help="resolution of the concurrency series in minutes (default: 60)"
+    )
+    parser.add_argument("--per-os", action="store_true", help="break the concurrency series down by OS")
+    parser.add_argument(
+        "--bucket-peak", action="store_true", help="report the peak inside each bucket next to the count at its start"
+    )
+    parser.add_argument(
+        "--bandwidth-minutes",
+        type=float,
+        help="resolution of the transfer bandwidth series in minutes (default: --bucket-minutes)",
+    )
+    parser.add_argument(
+        "--group-by",
+        type=group_by_keys,
+        action="append",
+        default=[],
+        metavar="KEYS",
+        help="add a table of VM counts, sizes and durations per group of comma separated keys from "
+        f"{', '.join(GROUP_KEYS)}, e.g. provider,namespace. Can be given several times, all "
+        "tables are computed in one pass",
+    )
+    parser.add_argument(
+        "--gantt-mode",
+        choices=GANTT_MODES,
+        default="auto",
+        help="one row per VM, VMs packed into shared lanes, or lanes grouped by OS or plan "
+        "(default: auto, one row per VM for small charts)",
+    )
+    parser.add_argument(
+        "--gantt-bandwidth", action="store_true", help="overlay the transfer bandwidth curve on the Gantt chart"
+    )
+    parser.add_argument(
+        "--gantt-variant",
+        choices=GANTT_MODES[1:],
+        action="append",
+        default=[],
+        metavar="MODE",
+        help="also draw the Gantt chart in MODE to migration_gantt_chart_MODE.png. Can be given several times",
+    )
+    parser.add_argument(
+        "--gantt-window",
+        type=parse_time,
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("START", "END"),
+        help="also draw the Gantt chart of the VMs migrating between START and END to "
+        "migration_gantt_chart_START_END.png. Can be given several times",
+    )
+    parser.add_argument(
+        "--chart-workers",
+        type=int,
+        default=min(2, (os.cpu_count() or 1) - 1),
+        help="processes drawing the Gantt charts while the report is written, 0 to draw them "
+        "before the report (default: 2, or one per spare CPU)",
+    )
+    parser.add_argument(
+        "--chart-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="stop drawing Gantt charts not finished SECONDS after the report was written (default: wait for them)",
+    )
+    parser.add_argument(
+        "--no-plot",
+        action="store_true",
+        help="only write the text report, without drawing the Gantt chart or loading matplotlib",
+    )
+    parser.add_argument(
+        "--save-store", metavar="DIR", help="write the derived VM records and plan summaries to a columnar store in DIR"
+    )
+    parser.add_argument(
+        "--watch",
+        metavar="SOURCE",
+        help="keep the report current from a stream of plans instead of reading dumps: JSON lines "
+        "or concatenated JSON such as 'oc get plans -w -o json', read from a pipe ('-' for "
+        "stdin) or followed in a growing file. No Gantt chart is drawn",
+    )
+    parser.add_argument(
+        "--watch-interval", type=float, default=60, help="minimum seconds between reports in --watch mode (default: 60)"
+    )
+    args = parser.parse_args(argv)
+    check_source_arguments(parser, args)
+    if args.watch_interval <= 0:
+        parser.error("--watch-interval must be positive")
+    if args.bucket_minutes <= 0:
+        parser.error("--bucket-minutes must be positive")
+    if args.bandwidth_minutes is None:
+        args.bandwidth_minutes = args.bucket_minutes
+    elif args.bandwidth_minutes <= 0:
+        parser.error("--bandwidth-minutes must be positive")
+    if args.chart_workers < 0:
+        parser.error("--chart-workers must not be negative")
+    if args.chart_timeout is not None and args.chart_timeout <= 0:
+        parser.error("--chart-timeout must be positive")
+    if args.watch and (args.format != "text" or args.output):
+        parser.error("--format and --output do not apply to --watch")
+    args.command = "watch" if args.watch else "report"
+    return args
+
+
+def parse_time(text: str) -> datetime:
+    """Parse an ISO 8601 time given on the command line, UTC unless it names an offset."""
+    try:
+        when = datetime.fromisoformat(text)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"invalid time {text!r}, expected e.g. 2024-07-01T02:15 or 2024-07-01T02:15:00+02:00"
+        )
+    return when if when.tzinfo else when.replace(tzinfo=timezone.utc)
+
+
+def parse_query_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="mtv_plan_parser.py query",
+        description="List the VMs migrating at a time, during a time range or alongside a plan, or the failures of a "
+        "phase, reason or condition. Times are ISO 8601, UTC unless they carry an offset",
+    )
+    add_source_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument("--at", type=parse_time, metavar="TIME", help="VMs migrating at TIME")
+    parser.add_argument(
+        "--between",
+        type=parse_time,
+        nargs=2,
+        metavar=("START", "END"),
+        help="VMs migrating at any time from START up to END",
+    )
+    parser.add_argument(
+        "--plan",
+        metavar="[NAMESPACE/]PLAN",
+        help="VMs of other plans migrating while PLAN ran, NAMESPACE is only needed when several namespaces have "
+        "a plan of that name",
+    )
+    parser.add_argument(
+        "--longest", type=int, metavar="K", help="only the K longest transfers, among the selected VMs or of all VMs"
+    )
+    parser.add_argument(
+        "--failure",
+        type=parse_failure_term,
+        metavar="[FIELD=]VALUE",
+        help="failed VMs and plans with Critical conditions indexed by VALUE, FIELD one of "
+        f"{', '.join(FAILURE_FIELDS)} (default: phase), e.g. ConvertGuest or "
+        "plan_condition=VMNotFound. With --between only the failures in that range",
+    )
+    parser.add_argument(
+        "--count-by",
+        choices=FAILURE_GROUP_KEYS,
+        default="os",
+        help="count the --failure results by this key (default: os)",
+    )
+    args = parser.parse_args(argv)
+    check_source_arguments(parser, args)
+    if args.failure is not None:
+        if args.at is not None or args.plan is not None or args.longest is not None:
+            parser.error("--failure can only be combined with --between")
+        args.command = "query"
+        return args
+    if sum(option is not None for option in (args.at, args.between, args.plan)) > 1:
+        parser.error("--at, --between and --plan are mutually exclusive")
+    if args.at is None and args.between is None and args.plan is None and args.longest is None:
+        parser.error("one of --at, --between, --plan or --longest is required")
+    if args.longest is not None and args.longest < 1:
+        parser.error("--longest must be at least 1")
+    if args.longest is not None and args.plan is not None:
+        parser.error("--longest cannot be combined with --plan")
+    args.command = "query"
+    return args
+
+
+def positive_int(text: str) -> int:
+    value = int(text)
+    if value < 1:
+        raise argparse.ArgumentTypeError(f"expected a positive number, got {text}")
+    return value
+
+
+def parse_simulate_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="mtv_plan_parser.py simulate",
+        description="Predict the schedule of a migration wave under concurrency limits. Migration times per OS "
+        "and datastore are calibrated from the observed runs read from the dumps, store or API server",
+    )
+    add_source_arguments(parser)
+    add_output_arguments(parser)
+    parser.add_argument(
+        "--vms",
+        metavar="CSV",
+        help="candidate VMs to simulate, a CSV with columns name, os, plan, disk_size (MB), host and "
+        "datastore, started in file order (default: replay the observed VMs)",
+    )
+    parser.add_argument("--max-concurrent", type=positive_int, metavar="N", help="VMs migrating at once")
+    parser.add_argument("--max-per-plan", type=positive_int, metavar="N", help="VMs of one plan migrating at once")
+    parser.add_argument(
+        "--max-per-host", type=positive_int, metavar="N", help="VMs of one source host migrating at once"
+    )
+    parser.add_argument(
+        "--start",
+        type=parse_time,
+        metavar="TIME",
+        help="start of the wave (default: start of the first observed migration, so replays line up "
+        "with the observed run)",
+    )
+    parser.add_argument(
+        "--bucket-minutes", type=float, default=60, help="resolution of the concurrency series in minutes (default: 60)"
+    )
+    parser.add_argument("--per-os", action="store_true", help="break the concurrency series down by OS")
+    parser.add_argument(
+        "--bucket-peak", action="store_true", help="report the peak inside each bucket next to the count at its start"
+    )
+    args = parser.parse_args(argv)
+    check_source_arguments(parser, args)
+    if args.bucket_minutes <= 0:
+        parser.error("--bucket-minutes must be positive")
+    if args.max_per_host and not args.vms:
+        parser.error("--max-per-host requires --vms, plans do not record the source host of the observed VMs")
+    args.command = "simulate"
+    return args
+
+
+def parse_diff_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        prog="mtv_plan_parser.py diff",
+        description="Report what changed between two dumps of the same cluster: added, changed and removed plans, "
+        "plans that moved phase, VMs migrated and failures since the old dump, and the change in "
+        "throughput and concurrency. Plans are matched by uid and unchanged plans (same "
+        "resourceVersion) are skipped without being derived",
+    )
+    parser.add_argument("old", help="earlier plan dump, YAML or JSON, optionally gzip, zstd or xz compressed")
+    parser.add_argument("new", help="later plan dump of the same cluster")
+    add_output_arguments(parser)
+    add_instrumentation_arguments(parser)
+    args = parser.parse_args(argv)
+    args.command = "diff"
+    return args
+
+
+def load_records(args: argparse.Namespace) -> tuple[VMRecords, list[dict], list[dict]]:
+    """Derive the migrated VMs and plan summaries from the source chosen on the command line.
+
+    Args:
+        args (argparse.Namespace): Command line options.
+
+    Returns:
+        tuple[VMRecords, list[dict], list[dict]]: migrated VMs, successful and failed plan summaries.
+    """
+    with metrics.stage("load") as stage:
+        if args.from_store:
+            from record_store import load_stores
+
+            loaded = load_stores(args.from_store)
+        elif args.api_server is not None:
+            loaded = load_api(args)
+        else:
+            loaded = load_dumps(expand_dump_paths(args.dumps), args.jobs, args.cache, args.cache_max_plans)
+        stage.add_items(len(loaded[0]))
+    return loaded
+
+
+def report(args: argparse.Namespace) -> int:
+    """Write the report and the Gantt charts, returns the exit status: 1 if a chart could not be rendered."""
+    from bandwidth import BandwidthCurves
+
+    all_vms, successful_migrations, failed_migrations = load_records(args)
+    if args.save_store:
+        from record_store import save_store
+
+        with metrics.stage("save_store"):
+            save_store(args.save_store, all_vms, successful_migrations, failed_migrations)
+    with metrics.stage("bandwidth") as stage:
+        bandwidth = BandwidthCurves(all_vms, timedelta(minutes=args.bandwidth_minutes))
+        stage.add_items(len(all_vms))
+    charts_context = nullcontext()
+    if not args.no_plot:
+        # The charts render in worker processes, matplotlib is only imported there
+        from chart_pipeline import ChartPipeline
+
+        charts_context = ChartPipeline(args.chart_workers)
+    with charts_context as charts:
+        if charts is not None:
+            submit_charts(args, all_vms, charts)
+        concurrency_data = analyze_concurrent_migrations(
+            all_vms, timedelta(minutes=args.bucket_minutes), per_os=args.per_os, bucket_peak=args.bucket_peak
+        )
+        with metrics.stage("report") as stage, open_output(args) as output:
+            output.write_report(
+                all_vms, successful_migrations, failed_migrations, concurrency_data, args.group_by, bandwidth
+            )
+            stage.add_items(len(successful_migrations) + len(failed_migrations))
+        if charts is None:
+            return 0
+        with metrics.stage("gantt_chart_wait") as stage:
+            rendered = charts.wait(args.chart_timeout)
+            stage.add_items(len(charts.rendered))
+    return 0 if rendered else 1
+
+
+def submit_charts(args: argparse.Namespace, all_vms: VMRecords, charts: "ChartPipeline") -> None:
+    """Start rendering the Gantt charts asked for on the command line."""
+    from chart_pipeline import chart_jobs
+
+    jobs = chart_jobs(
+        args.gantt_mode,
+        args.gantt_variant,
+        args.gantt_window,
+        timedelta(minutes=args.bandwidth_minutes) if args.gantt_bandwidth else None,
+    )
+    with metrics.stage("gantt_chart") as stage:
+        charts.submit(all_vms, jobs)
+        stage.add_items(len(jobs))
+
+
+def query_failures(args: argparse.Namespace) -> None:
+    all_vms, _, _ = load_records(args)
+    failures = all_vms.failures
+    field, value = args.failure
+    with metrics.stage("query") as stage:
+        title = f"Failures with {field.replace('_', ' ')} {value}"
+        start = end = None
+        if args.between is not None:
+            start, end = (int(when.timestamp()) for when in args.between)
+            title += f" between {args.between[0]:%Y-%m-%d %H:%M:%S %Z} and {args.between[1]:%Y-%m-%d %H:%M:%S %Z}"
+        rows = failures.rows(field, value, start, end)
+        with open_output(args) as output:
+            output.write_failure_table(failures, rows, title, args.count_by)
+        stage.add_items(len(rows))
+
+
+def plan_namespace(all_vms: VMRecords, text: str) -> tuple[str | None, str]:
+    """
+    Split a ``--plan`` value into namespace and plan name, looking up the namespace when it is left out.
+
+    Args:
+        all_vms (VMRecords): Migrated VMs.
+        text (str): "NAMESPACE/PLAN" or "PLAN".
+
+    Returns:
+        tuple[str | None, str]: Namespace and plan name.  The namespace is None, and the error was written to
+        stderr, when the plan name is found in several namespaces.
+    """
+    namespace, _, plan = text.rpartition("/")
+    if namespace:
+        return namespace, plan
+    namespaces = all_vms.plan_namespaces(plan)
+    if len(namespaces) > 1:
+        print(
+            f"Plan {plan} exists in namespaces {', '.join(namespaces)}, give it as NAMESPACE/{plan}",
+            file=sys.stderr,
+        )
+        return None, plan
+    return namespaces[0] if namespaces else "", plan
+
+
+def query(args: argparse.Namespace) -> int | None:
+    from interval_index import IntervalIndex
+
+    if args.failure is not None:
+        return query_failures(args)
+    all_vms, _, _ = load_records(args)
+    with metrics.stage("interval_index") as stage:
+        index = IntervalIndex(all_vms)
+        stage.add_items(len(index))
+    with metrics.stage("query") as stage:
+        if args.at is not None:
+            title = f"VMs migrating at {args.at:%Y-%m-%d %H:%M:%S %Z}"
+            rows = index.longest(args.longest, args.at) if args.longest else index.at(args.at)
+        elif args.between is not None:
+            start, end = args.between
+            title = f"VMs migrating between {start:%Y-%m-%d %H:%M:%S %Z} and {end:%Y-%m-%d %H:%M:%S %Z}"
+            rows = index.longest(args.longest, start, end) if args.longest else index.overlapping(start, end)
+        elif args.plan is not None:
+            namespace, plan = plan_namespace(all_vms, args.plan)
+            if namespace is None:
+                return 2
+            title = f"VMs of other plans migrating while {namespace}/{plan} ran"
+            rows = index.overlapping_plan(namespace, plan)
+        else:
+            title = "All VMs"
+            rows = index.longest(args.longest)
+        if args.longest:
+            title += f", {args.longest} longest"
+        with open_output(args) as output:
+            output.write_vm_table(all_vms, rows.tolist(), title)
+        stage.add_items(len(rows))
+
+
+def simulate(args: argparse.Namespace) -> None:
+    from simulation import (
+        ThroughputModel,
+        analyze_simulation,
+        observed_candidates,
+        read_candidates,
+        simulate_waves,
+    )
+
+    all_vms, _, _ = load_records(args)
+    with metrics.stage("calibrate") as stage:
+        model = ThroughputModel.fit(all_vms)
+        stage.add_items(len(all_vms))
+    if args.vms:
+        with open(args.vms, newline="") as file:
+            candidates = read_candidates(file)
+    else:
+        candidates = observed_candidates(all_vms)
+    start = args.start
+    if start is None:
+        observed = [time for time in all_vms.start_times if time != MISSING]
+        start = min(observed) if observed else int(datetime.now(timezone.utc).timestamp())
+    else:
+        start = int(start.timestamp())
+    limits = {
+        "max_concurrent": args.max_concurrent,
+        "max_per_plan": args.max_per_plan,
+        "max_per_host": args.max_per_host,
+    }
+    with metrics.stage("simulate") as stage:
+        schedule = simulate_waves(candidates, model, start, **limits)
+        stage.add_items(len(candidates))
+    simulation = analyze_simulation(
+        schedule,
+        model,
+        timedelta(minutes=args.bucket_minutes),
+        per_os=args.per_os,
+        bucket_peak=args.bucket_peak,
+        limits=limits,
+    )
+    with metrics.stage("report") as stage, open_output(args) as output:
+        output.write_simulation(simulation)
+        stage.add_items(len(candidates))
+
+
+def diff(args: argparse.Namespace) -> None:
+    from snapshot_diff import diff_dumps
+
+    changes = diff_dumps(args.old, args.new)
+    with metrics.stage("report") as stage, open_output(args) as output:
+        output.write_diff(changes)
+        stage.add_items(len(changes["plan_changes"]))
+
+
+def watch_plans(args: argparse.Namespace) -> None:
+    from watch import watch
+
+    options = dict(
+        interval=args.watch_interval,
+        bucket_width=timedelta(minutes=args.bucket_minutes),
+        per_os=args.per_os,
+        bucket_peak=args.bucket_peak,
+        group_by=args.group_by,
+        bandwidth_width=timedelta(minutes=args.bandwidth_minutes),
+    )
+    if args.watch == "-":
+        watch(sys.stdin.buffer, **options)
+    else:
+        with open(args.watch, "rb") as source:
+            watch(source, **options)
+
+
+# Parser of each subcommand, the report arguments are parsed by parse_args
+SUBCOMMAND_PARSERS: Dict[str, Callable[[List[str]], argparse.Namespace]] = {
+    "query": parse_query_args,
+    "simulate": parse_simulate_args,
+    "diff": parse_diff_args,
+}
+# Handler of each ``args.command``, returning the exit status or None for 0
+COMMANDS: Dict[str, Callable[[argparse.Namespace], Optional[int]]] = {
+    "query": query,
+    "simulate": simulate,
+    "diff": diff,
+    "watch": watch_plans,
+    "report": report,
+}
+
+
+def main(argv: list[str] | None = None) -> int:
+    if argv is None:
+        argv = sys.argv[1:]
+    parse = SUBCOMMAND_PARSERS.get(argv[0]) if argv else None
+    args = parse(argv[1:]) if parse else parse_args(argv)
+    if args.metrics:
+        metrics.enable(trace_memory=args.trace_memory)
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+    try:
+        with metrics.stage("total"):
+            return COMMANDS[args.command](args) or 0
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+        if args.metrics:
+            metrics.write(args.metrics, args.metrics_format)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,227 @@
+import pickle
+import sqlite3
+import time
+import typing as t
+from pathlib import Path
+
+# Bump when the layout of the cached summaries changes so stale entries are dropped
+CACHE_VERSION = 5
+
+# (VM records and migration summary, None for plans without results; failed VMs and plans for the failure index)
+PlanSummary = t.Tuple[t.Tuple[t.List[t.Any], t.Dict[str, t.Any]] | None, t.List[t.Any]]
+# (uids seen, uids found in the cache, new (uid, resourceVersion, pickled summary) rows) of a read-only cache
+CacheUpdates = t.Tuple[t.Set[str], t.List[str], t.List[t.Tuple[str, str, bytes]]]
+
+
+class PlanCache:
+    """On-disk cache of derived plan summaries keyed by plan uid and resourceVersion.
+
+    A plan's resourceVersion changes whenever the plan object changes, so a cached summary is valid as long as
+    both match.  Entries are stored in a single SQLite file.
+
+    Every summary is committed as soon as it is stored, so the write lock is never held between plans.  Hits
+    only record the plan's last use in memory; those are written in one batch by ``prune`` or ``close``.  A read-only cache, as
+    opened by worker processes, never writes: it collects its new summaries and hits for the process owning a
+    writable cache to ``apply``, so workers never wait on each other's write lock.
+    """
+
+    def __init__(self: t.Self, path: str | Path, max_plans: int = 50000, read_only: bool = False) -> None:
+        """Open (or create) the cache.
+
+        Args:
+            path (str | Path): SQLite file holding the cache.
+            max_plans (int, optional): Maximum number of cached plans. Least recently used plans are evicted
+                first. Defaults to 50000.
+            read_only (bool, optional): Only read the file, collecting the changes for ``updates``. The file must
+                have been opened writable before. Defaults to False.
+        """
+        self.max_plans = max_plans
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._seen: set[str] = set()
+        self._used: list[str] = []
+        self._new: list[tuple[str, str, bytes]] = []
+        # (uid, resourceVersion) and pickled summary of the plan found by the last lookup
+        self._found: tuple[tuple[str, str], bytes] | None = None
+        self._connection = sqlite3.connect(path, timeout=60)
+        if read_only:
+            return
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        # Commits in WAL mode then only sync at checkpoints
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+        version = self._connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is None or version[0] != CACHE_VERSION:
+            self._connection.execute("DROP TABLE IF EXISTS plans")
+            self._connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (CACHE_VERSION,))
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            "uid TEXT PRIMARY KEY, resource_version TEXT NOT NULL, last_used REAL NOT NULL, summary BLOB)"
+        )
+        self._connection.commit()
+
+    def __enter__(self: t.Self) -> t.Self:
+        return self
+
+    def __exit__(self: t.Self, *exc_info: t.Any) -> None:
+        self.close()
+
+    @staticmethod
+    def key(entry: t.Dict[str, t.Any]) -> t.Tuple[str, str] | None:
+        """Return the (uid, resourceVersion) of a plan, None if the plan has neither."""
+        metadata = entry.get("metadata") or {}
+        if "uid" not in metadata or "resourceVersion" not in metadata:
+            return None
+        return metadata["uid"], metadata["resourceVersion"]
+
+    def contains(self: t.Self, metadata: t.Dict[str, t.Any]) -> bool:
+        """Check if the summary of a plan is cached.
+
+        Args:
+            metadata (Dict[str, Any]): The plan's metadata.
+
+        Returns:
+            bool: True if a summary for this uid and resourceVersion is cached.
+        """
+        key = self.key({"metadata": metadata})
+        if key is None:
+            return False
+        row = self._connection.execute("SELECT 1 FROM plans WHERE uid = ? AND resource_version = ?", key).fetchone()
+        return row is not None
+
+    def lookup(self: t.Self, metadata: t.Dict[str, t.Any]) -> bool:
+        """Check if the summary of a plan is cached, keeping it for the ``get`` of the same plan that follows.
+
+        Meant as the ``skip`` predicate of ``iter_dump`` or ``iter_api_plans``, so a cached plan is looked up
+        once while it is read and once more only if another plan was looked up in between.
+
+        Args:
+            metadata (Dict[str, Any]): The plan's metadata.
+
+        Returns:
+            bool: True if a summary for this uid and resourceVersion is cached.
+        """
+        key = self.key({"metadata": metadata})
+        self._found = None
+        if key is None:
+            return False
+        row = self._connection.execute(
+            "SELECT summary FROM plans WHERE uid = ? AND resource_version = ?", key
+        ).fetchone()
+        if row is None:
+            return False
+        self._found = key, row[0]
+        return True
+
+    def get(self: t.Self, entry: t.Dict[str, t.Any]) -> PlanSummary | None:
+        """Look up the cached summary of a plan.
+
+        The plan's last use is recorded in memory and written by ``prune`` or ``close``, so a hit does not
+        write to the file.
+
+        Args:
+            entry (Dict[str, Any]): The plan, only its metadata is read.
+
+        Returns:
+            PlanSummary | None: The cached summary, None if the plan is not cached.
+        """
+        key = self.key(entry)
+        if key is None:
+            return None
+        self._seen.add(key[0])
+        found, self._found = self._found, None
+        if found is not None and found[0] == key:
+            summary = found[1]
+        else:
+            row = self._connection.execute(
+                "SELECT summary FROM plans WHERE uid = ? AND resource_version = ?", key
+            ).fetchone()
+            summary = None if row is None else row[0]
+        if summary is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._used.append(key[0])
+        return pickle.loads(summary)
+
+    def put(self: t.Self, entry: t.Dict[str, t.Any], summary: PlanSummary) -> None:
+        """Store the summary of a plan, replacing older versions of the same plan.
+
+        Args:
+            entry (Dict[str, Any]): The plan, only its metadata is read.
+            summary (PlanSummary): Derived VM records and migration summary, and failure records.
+        """
+        key = self.key(entry)
+        if key is None:
+            return
+        self._seen.add(key[0])
+        row = (*key, pickle.dumps(summary, protocol=pickle.HIGHEST_PROTOCOL))
+        if self.read_only:
+            self._new.append(row)
+            return
+        self._connection.execute("INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?)", (*key, time.time(), row[2]))
+        self._connection.commit()
+
+    def updates(self: t.Self) -> CacheUpdates:
+        """The changes collected by a read-only cache, to ``apply`` to a writable one."""
+        return set(self._seen), list(self._used), list(self._new)
+
+    def apply(self: t.Self, updates: CacheUpdates) -> None:
+        """Write the changes collected by a read-only cache, e.g. in a worker process, and commit them.
+
+        Args:
+            updates (CacheUpdates): The read-only cache's ``updates()``.
+        """
+        seen, used, new = updates
+        self._seen.update(seen)
+        now = time.time()
+        self._connection.executemany("UPDATE plans SET last_used = ? WHERE uid = ?", ((now, uid) for uid in used))
+        self._connection.executemany(
+            "INSERT OR REPLACE INTO plans VALUES (?, ?, ?, ?)",
+            ((uid, version, now, summary) for uid, version, summary in new),
+        )
+        self._connection.commit()
+
+    @property
+    def seen(self: t.Self) -> set[str]:
+        """uids of the plans looked up or stored since the cache was opened."""
+        return set(self._seen)
+
+    def prune(self: t.Self) -> int:
+        """Evict plans that were not looked up since the cache was opened, then enforce the size cap.
+
+        Only call this after every plan of the current run went through get() or put().
+
+        Returns:
+            int: Number of evicted plans.
+        """
+        self._write_last_used()
+        connection = self._connection
+        connection.execute("CREATE TEMP TABLE IF NOT EXISTS seen (uid TEXT PRIMARY KEY)")
+        connection.execute("DELETE FROM seen")
+        connection.executemany("INSERT OR IGNORE INTO seen VALUES (?)", ((uid,) for uid in self._seen))
+        evicted = connection.execute("DELETE FROM plans WHERE uid NOT IN (SELECT uid FROM seen)").rowcount
+        evicted += connection.execute(
+            "DELETE FROM plans WHERE uid IN (SELECT uid FROM plans ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_plans,),
+        ).rowcount
+        connection.commit()
+        return evicted
+
+    def _write_last_used(self: t.Self) -> None:
+        """Write the last use of the plans found by ``get`` since the last call, in one statement."""
+        if self.read_only or not self._used:
+            return
+        now = time.time()
+        self._connection.executemany("UPDATE plans SET last_used = ? WHERE uid = ?", ((now, uid) for uid in self._used))
+        self._used.clear()
+
+    def close(self: t.Self) -> None:
+        """Write the last uses, commit pending entries and close the cache."""
+        if self._connection is not None:
+            if not self.read_only:
+                self._write_last_used()
+                self._connection.commit()
+            self._connection.close()
+            self._connection = None
@@ -0,0 +1,336 @@
+"""Generate synthetic Forklift Plan dumps shaped like ``oc get plans -o yaml`` output."""
+
+import argparse
+import json
+import random
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Dict, List, Optional
+
+import yaml
+
+try:
+    from yaml import CSafeDumper as _Dumper
+except ImportError:  # pragma: no cover - depends on how PyYAML was built
+    from yaml import SafeDumper as _Dumper
+
+
+class PlanDumper(_Dumper):
+    """Dumper writing shared objects out in full, like the API server does, instead of as anchors and aliases."""
+
+    def ignore_aliases(self, data):
+        return True
+
+
+OPERATING_SYSTEMS = [
+    "rhel8_64Guest",
+    "rhel9_64Guest",
+    "centos7_64Guest",
+    "windows2019srv_64Guest",
+    "windows2022srvNext_64Guest",
+    "sles15_64Guest",
+]
+FAILURE_PHASES = {
+    "DiskTransfer": "Unable to transfer disks.",
+    "ConvertGuest": "Guest conversion failed. See pod logs for details.",
+    "CreateVM": "Unable to create the VirtualMachine.",
+}
+DATASTORES = ["VM-PROD-001", "VM-PROD-002", "VM-DEV-001", "VM-DEV-002", "VM-NFS-01"]
+DISK_SIZES_GB = [10, 20, 40, 60, 100, 200, 500, 1024]
+
+
+def _timestamp(value: datetime) -> str:
+    return value.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class PlanGenerator:
+    """
+    Build synthetic plans.
+
+    Attributes:
+        vms_per_plan (int): Maximum VMs per plan, each plan gets between 1 and this many.
+        disks_per_vm (int): Maximum disks per VM.
+        warm_ratio (float): Fraction of plans running warm migrations.
+        precopies (int): Maximum precopies per warm VM.
+        failure_rate (float): Fraction of VMs whose migration fails.
+        not_started_rate (float): Fraction of plans that never ran (empty ``status.migration``).
+        spread (timedelta): Window over which plan start times are spread.
+        start (datetime): Start of that window.
+    """
+
+    def __init__(
+        self,
+        vms_per_plan: int = 4,
+        disks_per_vm: int = 2,
+        warm_ratio: float = 0.3,
+        precopies: int = 8,
+        failure_rate: float = 0.1,
+        not_started_rate: float = 0.02,
+        spread: timedelta = timedelta(hours=72),
+        start: datetime = datetime(2024, 7, 1, tzinfo=timezone.utc),
+        seed: Optional[int] = None,
+    ) -> None:
+        self.vms_per_plan = vms_per_plan
+        self.disks_per_vm = disks_per_vm
+        self.warm_ratio = warm_ratio
+        self.precopies = precopies
+        self.failure_rate = failure_rate
+        self.not_started_rate = not_started_rate
+        self.spread = spread
+        self.start = start
+        self.random = random.Random(seed)
+        self._resource_version = 2000000000
+
+    def _uid(self) -> str:
+        return str(uuid.UUID(int=self.random.getrandbits(128), version=4))
+
+    def _condition(self, condition_type: str, when: datetime, message: str, category: str = "Advisory") -> Dict:
+        return {
+            "category": category,
+            "durable": True,
+            "lastTransitionTime": _timestamp(when),
+            "message": message,
+            "status": "True",
+            "type": condition_type,
+        }
+
+    def _phase(self, name: str, description: str, started: datetime, completed: datetime, total: int) -> Dict:
+        return {
+            "completed": _timestamp(completed),
+            "description": description,
+            "name": name,
+            "phase": "Completed",
+            "progress": {"completed": total, "total": total},
+            "started": _timestamp(started),
+        }
+
+    def _precopies(self, started: datetime) -> List[Dict[str, str]]:
+        """Warm precopies: a long first copy followed by shorter incremental copies an hour apart."""
+        precopies = []
+        current = started
+        duration = timedelta(minutes=self.random.randint(20, 120))
+        for _ in range(self.random.randint(1, self.precopies)):
+            precopies.append({"start": _timestamp(current), "end": _timestamp(current + duration)})
+            current += max(duration, timedelta(hours=1))
+            duration = timedelta(minutes=max(1, int(duration.total_seconds() / 60 * self.random.uniform(0.2, 0.9))))
+        return precopies
+
+    def vm(self, index: int, plan_name: str, started: datetime, warm: bool) -> Dict[str, Any]:
+        """
+        Build one VM of ``status.migration.vms``.
+
+        Args:
+            index (int): VM number inside the plan.
+            plan_name (str): Plan name, used to derive the VM name.
+            started (datetime): Plan start.
+            warm (bool): Warm migration.
+
+        Returns:
+            Dict[str, Any]: The VM status.
+        """
+        rng = self.random
+        name = f"{plan_name.removesuffix('-plan')}-{index}"
+        failed = rng.random() < self.failure_rate
+        initialize_end = started + timedelta(seconds=rng.randint(20, 120))
+        allocation_end = initialize_end + timedelta(seconds=rng.randint(20, 90))
+        datastore = rng.choice(DATASTORES)
+
+        # Disk sizes in MB and a per-VM transfer rate in MB/s
+        disk_sizes = [rng.choice(DISK_SIZES_GB) * 1024 for _ in range(rng.randint(1, self.disks_per_vm))]
+        rate = rng.uniform(40, 400)
+        transfer_start = allocation_end
+        transfer_end = transfer_start + timedelta(seconds=int(sum(disk_sizes) / rate) + 1)
+        tasks = []
+        task_start = transfer_start
+        for disk, size in enumerate(disk_sizes, 1):
+            task_end = task_start + timedelta(seconds=int(size / rate) + 1)
+            tasks.append(
+                {
+                    "annotations": {"unit": "MB"},
+                    "completed": _timestamp(task_end),
+                    "name": f"[{datastore}] {name}/{name}_{disk}.vmdk",
+                    "phase": "Completed",
+                    "progress": {"completed": size, "total": size},
+                    "reason": "Transfer completed.",
+                    "started": _timestamp(task_start),
+                }
+            )
+            task_start = task_end
+        disk_transfer = self._phase("DiskTransfer", "Transfer disks.", transfer_start, transfer_end, sum(disk_sizes))
+        disk_transfer["annotations"] = {"unit": "MB"}
+        disk_transfer["tasks"] = tasks
+
+        conversion_end = transfer_end + timedelta(minutes=rng.randint(3, 30))
+        completed = conversion_end + timedelta(seconds=rng.randint(10, 60))
+        vm = {
+            "completed": _timestamp(completed),
+            "conditions": [
+                (
+                    self._condition("Failed", completed, "The VM migration has FAILED.")
+                    if failed
+                    else self._condition("Succeeded", completed, "The VM migration has SUCCEEDED.")
+                )
+            ],
+            "id": f"vm-{rng.randint(1000, 9999999)}",
+            "name": name,
+            "operatingSystem": rng.choice(OPERATING_SYSTEMS),
+            "phase": "Completed",
+            "pipeline": [
+                self._phase("Initialize", "Initialize migration.", started, initialize_end, 1),
+                self._phase("DiskAllocation", "Allocate disks.", initialize_end, allocation_end, sum(disk_sizes)),
+                disk_transfer,
+                self._phase("ImageConversion", "Convert image to kubevirt.", transfer_end, conversion_end, 1),
+                self._phase("VirtualMachineCreation", "Create VM.", conversion_end, completed, 1),
+            ],
+            "restorePowerState": "On",
+            "started": _timestamp(started),
+        }
+        if failed:
+            phase = rng.choice(list(FAILURE_PHASES))
+            vm["error"] = {"phase": phase, "reasons": [FAILURE_PHASES[phase]]}
+        if warm:
+            vm["warm"] = {"consecutiveFailures": 0, "precopies": self._precopies(transfer_start), "successes": 1}
+        return vm
+
+    def plan(self, index: int) -> Dict[str, Any]:
+        """
+        Build one Plan.
+
+        Args:
+            index (int): Plan number, used for its name.
+
+        Returns:
+            Dict[str, Any]: The Plan object.
+        """
+        rng = self.random
+        self._resource_version += rng.randint(1, 5000)
+        name = f"vm-{index}-plan"
+        namespace = "openshift-mtv"
+        created = self.start + timedelta(seconds=rng.randint(0, int(self.spread.total_seconds())))
+        warm = rng.random() < self.warm_ratio
+        vms_count = rng.randint(1, self.vms_per_plan)
+        plan: Dict[str, Any] = {
+            "apiVersion": "forklift.konveyor.io/v1beta1",
+            "kind": "Plan",
+            "metadata": {
+                "creationTimestamp": _timestamp(created),
+                "generation": 1,
+                "name": name,
+                "namespace": namespace,
+                "resourceVersion": str(self._resource_version),
+                "uid": self._uid(),
+            },
+            "spec": {
+                "archived": False,
+                "description": "",
+                "map": {
+                    "network": {"name": f"vm-{index}-network", "namespace": namespace},
+                    "storage": {"name": f"vm-{index}-storage", "namespace": namespace},
+                },
+                "provider": {
+                    "destination": {"name": "host", "namespace": namespace},
+                    "source": {"name": rng.choice(["vmdc", "vmdc-east", "vmdc-west"]), "namespace": namespace},
+                },
+                "targetNamespace": f"vm-{rng.randint(100000, 100050)}",
+                "vms": [{"hooks": [], "id": f"vm-{index}-{vm}"} for vm in range(vms_count)],
+                "warm": warm,
+            },
+        }
+
+        if rng.random() < self.not_started_rate:
+            plan["status"] = {
+                "conditions": [
+                    self._condition("VMNotFound", created, "VM not found.", "Critical") | {"reason": "NotFound"},
+                    self._condition(
+                        "StorageMapNotReady", created, "Map.Storage does not have Ready condition.", "Critical"
+                    ),
+                ],
+                "migration": {},
+                "observedGeneration": 1,
+            }
+            return plan
+
+        started = created + timedelta(seconds=rng.randint(10, 600))
+        vms = [self.vm(vm, name, started + timedelta(seconds=rng.randint(0, 120)), warm) for vm in range(vms_count)]
+        completed = max(datetime.fromisoformat(vm["completed"]) for vm in vms)
+        failed = any(vm["conditions"][0]["type"] == "Failed" for vm in vms)
+        condition = (
+            self._condition("Failed", completed, "The plan execution has FAILED.")
+            if failed
+            else self._condition("Succeeded", completed, "The plan execution has SUCCEEDED.")
+        )
+        plan["status"] = {
+            "conditions": [condition],
+            "migration": {
+                "completed": _timestamp(completed),
+                "history": [
+                    {
+                        "conditions": [condition],
+                        "map": plan["spec"]["map"],
+                        "migration": {"generation": 1, "name": f"{name}-{index:05x}", "namespace": namespace},
+                        "plan": {"generation": 1, "name": name, "namespace": namespace},
+                        "provider": plan["spec"]["provider"],
+                    }
+                ],
+                "started": _timestamp(started),
+                "vms": vms,
+            },
+            "observedGeneration": 1,
+        }
+        return plan
+
+    def write(self, stream: IO[str], plans: int, output_format: str = "yaml") -> None:
+        """
+        Write a ``List`` of plans, one plan at a time.
+
+        Args:
+            stream (IO[str]): Output stream.
+            plans (int): Number of plans.
+            output_format (str, optional): "yaml" (``oc get -o yaml``) or "json" (``oc get -o json``).
+                Defaults to "yaml".
+        """
+        if output_format == "json":
+            stream.write('{"apiVersion": "v1", "items": [')
+            for index in range(plans):
+                stream.write((",\n" if index else "\n") + json.dumps(self.plan(index)))
+            stream.write('\n], "kind": "List", "metadata": {"resourceVersion": ""}}\n')
+            return
+        stream.write("apiVersion: v1\nitems:\n")
+        for index in range(plans):
+            stream.write(yaml.dump([self.plan(index)], Dumper=PlanDumper, default_flow_style=False))
+        stream.write("kind: List\nmetadata:\n  resourceVersion: ''\n")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic MTV plan dump")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    parser.add_argument("--plans", type=int, default=500, help="number of plans (default: 500)")
+    parser.add_argument("--vms-per-plan", type=int, default=4, help="maximum VMs per plan (default: 4)")
+    parser.add_argument("--disks-per-vm", type=int, default=2, help="maximum disks per VM (default: 2)")
+    parser.add_argument("--warm-ratio", type=float, default=0.3, help="fraction of warm plans (default: 0.3)")
+    parser.add_argument("--precopies", type=int, default=8, help="maximum precopies per warm VM (default: 8)")
+    parser.add_argument("--failure-rate", type=float, default=0.1, help="fraction of failed VMs (default: 0.1)")
+    parser.add_argument("--spread-hours", type=float, default=72, help="hours plan starts are spread over")
+    parser.add_argument("--seed", type=int, help="random seed for reproducible dumps")
+    parser.add_argument("--format", choices=["yaml", "json"], default="yaml", help="output format (default: yaml)")
+    args = parser.parse_args(argv)
+
+    generator = PlanGenerator(
+        vms_per_plan=args.vms_per_plan,
+        disks_per_vm=args.disks_per_vm,
+        warm_ratio=args.warm_ratio,
+        precopies=args.precopies,
+        failure_rate=args.failure_rate,
+        spread=timedelta(hours=args.spread_hours),
+        seed=args.seed,
+    )
+    if args.output:
+        with open(args.output, "w") as output:
+            generator.write(output, args.plans, args.format)
+    else:
+        generator.write(sys.stdout, args.plans, args.format)
+
+
+if __name__ == "__main__":
+    main()
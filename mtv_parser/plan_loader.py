@@ -0,0 +1,471 @@
+import gzip
+import io
+import lzma
+import os
+from contextlib import contextmanager
+from typing import IO, Any, Callable, Dict, Iterator, Optional, Union
+
+from yaml.composer import ComposerError
+from yaml.events import (
+    AliasEvent,
+    MappingEndEvent,
+    MappingStartEvent,
+    ScalarEvent,
+    SequenceEndEvent,
+    SequenceStartEvent,
+    StreamEndEvent,
+)
+from yaml.nodes import MappingNode, Node, ScalarNode, SequenceNode
+
+try:
+    # libyaml bindings are an order of magnitude faster than the pure python parser
+    from yaml import CSafeLoader as PlanLoader
+except ImportError:  # pragma: no cover - depends on how PyYAML was built
+    from yaml import SafeLoader as PlanLoader
+
+try:
+    # orjson parses plan exports several times faster than the standard library
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+DUMP_SUFFIXES = (".yaml", ".yml", ".json")
+COMPRESSION_SUFFIXES = (".gz", ".zst", ".xz")
+# Leading bytes of each supported compression format
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gz",
+    b"\x28\xb5\x2f\xfd": "zst",
+    b"\xfd7zXZ\x00": "xz",
+}
+READ_BUFFER_SIZE = 1 << 20
+
+# A field selection is a nested dict of the keys to keep.  ``True`` keeps the whole subtree,
+# a dict keeps only the listed keys.  Selections applied to a sequence apply to every element.
+FieldSelection = Union[bool, Dict[str, Any]]
+
+# Everything extract_vm_information, calculate_effective_migration_time and plan_failures read from a VM
+VM_FIELDS: Dict[str, FieldSelection] = {
+    "id": True,
+    "name": True,
+    "operatingSystem": True,
+    "started": True,
+    "completed": True,
+    "conditions": {"type": True, "reason": True, "category": True, "lastTransitionTime": True},
+    "error": {"phase": True, "reasons": True},
+    "pipeline": {
+        "name": True,
+        "started": True,
+        "completed": True,
+        "progress": True,
+        "tasks": {"name": True, "started": True, "completed": True, "progress": True},
+    },
+    "warm": {"precopies": {"start": True, "end": True}},
+}
+
+# Everything the report reads from a Plan.  spec.map and migration.history are never built.
+PLAN_FIELDS: Dict[str, FieldSelection] = {
+    "kind": True,
+    "metadata": {"name": True, "namespace": True, "uid": True, "resourceVersion": True},
+    "spec": {"vms": {"id": True}, "targetNamespace": True, "provider": {"source": {"name": True}}},
+    "status": {
+        "conditions": {"type": True, "reason": True, "category": True, "lastTransitionTime": True},
+        "migration": {"started": True, "completed": True, "vms": VM_FIELDS},
+    },
+}
+
+
+def iter_plans(
+    stream: Union[str, bytes, IO],
+    fields: Optional[FieldSelection] = PLAN_FIELDS,
+    skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the plans of a plan dump one at a time.
+
+    The dump is walked as a stream of parser events, so only one plan is held in memory at a time.
+    Subtrees that are not part of ``fields`` are skipped without being built.
+
+    Args:
+        stream (Union[str, bytes, IO]): YAML document or open file containing a ``List`` of plans
+            (``oc get plans -o yaml``) or a single ``Plan``.
+        fields (Optional[FieldSelection], optional): Parts of each plan to build. ``None`` or ``True``
+            builds the complete plan. Defaults to PLAN_FIELDS.
+        skip (Optional[Callable[[Dict[str, Any]], bool]], optional): Called with a plan's metadata as soon as it
+            is read.  If it returns True the rest of the plan is skipped and the plan is yielded with the keys
+            read so far (metadata and anything before it).  Defaults to None.
+
+    Yields:
+        Dict[str, Any]: One plan (``items[]`` entry) per iteration.
+    """
+    if fields is None:
+        fields = True
+    loader = PlanLoader(stream)
+    try:
+        loader.get_event()  # StreamStartEvent
+        while not loader.check_event(StreamEndEvent):
+            loader.get_event()  # DocumentStartEvent
+            yield from _iter_document(loader, fields, skip)
+            loader.get_event()  # DocumentEndEvent
+        loader.get_event()
+    finally:
+        loader.dispose()
+
+
+def _iter_document(
+    loader: Any, fields: FieldSelection, skip: Optional[Callable[[Dict[str, Any]], bool]]
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the plans of the document the loader is positioned at.
+
+    Args:
+        loader (Any): Loader positioned after a DocumentStartEvent.
+        fields (FieldSelection): Parts of each plan to build.
+        skip (Optional[Callable[[Dict[str, Any]], bool]]): Predicate on a plan's metadata to skip the rest of it.
+
+    Yields:
+        Dict[str, Any]: One plan per iteration.
+    """
+    anchors: Dict[str, Node] = {}
+    if not loader.check_event(MappingStartEvent):
+        _skip(loader, anchors)
+        return
+
+    # Top level keys other than items are kept in case the document is a single Plan
+    event = loader.get_event()
+    root = MappingNode("tag:yaml.org,2002:map", [], event.start_mark, event.end_mark)
+    found_items = False
+    while not loader.check_event(MappingEndEvent):
+        key = _compose(loader, anchors)
+        if isinstance(key, ScalarNode) and key.value == "items" and loader.check_event(SequenceStartEvent):
+            found_items = True
+            loader.get_event()
+            while not loader.check_event(SequenceEndEvent):
+                yield loader.construct_document(_select_plan(loader, fields, anchors, skip))
+            loader.get_event()
+        elif not found_items and isinstance(key, ScalarNode) and _wanted(fields, key.value):
+            root.value.append((key, _select(loader, _subfields(fields, key.value), anchors)))
+        else:
+            _skip(loader, anchors)
+    loader.get_event()
+
+    if not found_items:
+        plan = loader.construct_document(root)
+        if plan.get("kind") == "Plan":
+            yield plan
+
+
+def _select_plan(
+    loader: Any,
+    fields: FieldSelection,
+    anchors: Dict[str, Node],
+    skip: Optional[Callable[[Dict[str, Any]], bool]],
+) -> Node:
+    """
+    Compose the next plan, skipping everything after its metadata if ``skip`` says so.
+
+    Args:
+        loader (Any): Loader positioned at a plan.
+        fields (FieldSelection): Parts of the plan to build.
+        anchors (Dict[str, Node]): Anchored nodes of the current document.
+        skip (Optional[Callable[[Dict[str, Any]], bool]]): Predicate on the plan's metadata.
+
+    Returns:
+        Node: The composed plan.
+    """
+    event = loader.peek_event()
+    if skip is None or not isinstance(event, MappingStartEvent) or event.anchor is not None:
+        return _select(loader, fields, anchors)
+
+    loader.get_event()
+    node = MappingNode(
+        _resolve_tag(loader, event, MappingNode), [], event.start_mark, None, flow_style=event.flow_style
+    )
+    skipping = False
+    while not loader.check_event(MappingEndEvent):
+        key = _compose(loader, anchors)
+        if skipping or not isinstance(key, ScalarNode) or not _wanted(fields, key.value):
+            _skip(loader, anchors)
+            continue
+        value = _select(loader, _subfields(fields, key.value), anchors)
+        node.value.append((key, value))
+        if key.value == "metadata":
+            skipping = skip(loader.construct_document(value))
+    node.end_mark = loader.get_event().end_mark
+    return node
+
+
+def _wanted(fields: FieldSelection, key: str) -> bool:
+    return fields is True or key in fields
+
+
+def _subfields(fields: FieldSelection, key: str) -> FieldSelection:
+    return True if fields is True else fields[key]
+
+
+def _resolve_tag(loader: Any, event: Any, kind: type) -> str:
+    """Return the explicit tag of a node event or resolve its implicit tag like the Composer does."""
+    if event.tag is None or event.tag == "!":
+        if kind is ScalarNode:
+            return loader.resolve(ScalarNode, event.value, event.implicit)
+        return loader.resolve(kind, None, event.implicit)
+    return event.tag
+
+
+def _alias(event: AliasEvent, anchors: Dict[str, Node]) -> Node:
+    if event.anchor not in anchors:
+        raise ComposerError(None, None, f"found undefined alias {event.anchor!r}", event.start_mark)
+    return anchors[event.anchor]
+
+
+def _compose(loader: Any, anchors: Dict[str, Node]) -> Node:
+    """
+    Compose the next node and all of its children.
+
+    Args:
+        loader (Any): Loader positioned at a node event.
+        anchors (Dict[str, Node]): Anchored nodes of the current document.
+
+    Returns:
+        Node: The composed node.
+    """
+    return _select(loader, True, anchors)
+
+
+def _select(loader: Any, fields: FieldSelection, anchors: Dict[str, Node]) -> Node:
+    """
+    Compose the next node, keeping only the mapping keys listed in ``fields``.
+
+    Args:
+        loader (Any): Loader positioned at a node event.
+        fields (FieldSelection): Parts of the node to build.
+        anchors (Dict[str, Node]): Anchored nodes of the current document.
+
+    Returns:
+        Node: The composed node.
+    """
+    event = loader.get_event()
+    if isinstance(event, AliasEvent):
+        return _alias(event, anchors)
+
+    # Anchored nodes may be referenced anywhere later in the document, so they are always built whole
+    if event.anchor is not None:
+        fields = True
+
+    if isinstance(event, ScalarEvent):
+        node = ScalarNode(
+            _resolve_tag(loader, event, ScalarNode), event.value, event.start_mark, event.end_mark, style=event.style
+        )
+    elif isinstance(event, SequenceStartEvent):
+        node = SequenceNode(
+            _resolve_tag(loader, event, SequenceNode), [], event.start_mark, None, flow_style=event.flow_style
+        )
+        while not loader.check_event(SequenceEndEvent):
+            node.value.append(_select(loader, fields, anchors))
+        node.end_mark = loader.get_event().end_mark
+    else:
+        node = MappingNode(
+            _resolve_tag(loader, event, MappingNode), [], event.start_mark, None, flow_style=event.flow_style
+        )
+        while not loader.check_event(MappingEndEvent):
+            if fields is True:
+                node.value.append((_select(loader, True, anchors), _select(loader, True, anchors)))
+                continue
+            key = _select(loader, True, anchors)
+            if isinstance(key, ScalarNode) and key.value in fields:
+                node.value.append((key, _select(loader, fields[key.value], anchors)))
+            else:
+                _skip(loader, anchors)
+        node.end_mark = loader.get_event().end_mark
+
+    if event.anchor is not None:
+        anchors[event.anchor] = node
+    return node
+
+
+def _skip(loader: Any, anchors: Dict[str, Node]) -> None:
+    """
+    Consume the events of the next node without building it.
+
+    Args:
+        loader (Any): Loader positioned at a node event.
+        anchors (Dict[str, Node]): Anchored nodes of the current document.
+    """
+    depth = 0
+    while True:
+        event = loader.peek_event()
+        if getattr(event, "anchor", None) is not None and not isinstance(event, AliasEvent):
+            # keep anchored nodes so later aliases still resolve
+            _compose(loader, anchors)
+        else:
+            loader.get_event()
+            if isinstance(event, (SequenceStartEvent, MappingStartEvent)):
+                depth += 1
+            elif isinstance(event, (SequenceEndEvent, MappingEndEvent)):
+                depth -= 1
+        if depth == 0:
+            return
+
+
+def is_dump_path(path: Union[str, os.PathLike]) -> bool:
+    """Check if a file name looks like a plan dump, optionally compressed (e.g. ``plans.json.gz``)."""
+    name = os.fspath(path)
+    root, suffix = os.path.splitext(name)
+    if suffix in COMPRESSION_SUFFIXES:
+        suffix = os.path.splitext(root)[1]
+    return suffix in DUMP_SUFFIXES
+
+
+def _decompress(raw: io.BufferedReader) -> IO[bytes]:
+    """Wrap a file in a streaming decompressor if it starts with the magic bytes of a supported format."""
+    head = raw.peek(8)[:8]
+    compression = next((name for magic, name in COMPRESSION_MAGIC.items() if head.startswith(magic)), None)
+    if compression == "gz":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    if compression == "xz":
+        return lzma.LZMAFile(raw, mode="rb")
+    if compression == "zst":
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError("Reading zstd compressed dumps requires the zstandard package") from error
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_size=READ_BUFFER_SIZE)
+    return raw
+
+
+@contextmanager
+def open_dump(path: Union[str, os.PathLike]) -> Iterator[io.BufferedReader]:
+    """
+    Open a plan dump for reading, decompressing gzip, zstd and xz files on the fly without temporary files.
+
+    The compression is detected from the file's magic bytes, so it does not depend on the file name.
+
+    Args:
+        path (Union[str, os.PathLike]): Dump file.
+
+    Yields:
+        io.BufferedReader: The uncompressed dump.
+    """
+    with open(path, "rb", buffering=READ_BUFFER_SIZE) as raw:
+        stream = _decompress(raw)
+        try:
+            yield stream if stream is raw else io.BufferedReader(stream, READ_BUFFER_SIZE)
+        finally:
+            if stream is not raw:
+                stream.close()
+
+
+def dump_format(path: Union[str, os.PathLike], stream: io.BufferedReader) -> str:
+    """
+    Detect whether a dump is JSON or YAML.
+
+    The extension decides when it is known (``.json``, ``.yaml``, ``.yml``, before any compression suffix).
+    Otherwise a dump whose first non-blank character opens a JSON object or array is JSON.
+
+    Args:
+        path (Union[str, os.PathLike]): Dump file.
+        stream (io.BufferedReader): The uncompressed dump, only peeked at.
+
+    Returns:
+        str: "json" or "yaml".
+    """
+    root, suffix = os.path.splitext(os.fspath(path))
+    if suffix in COMPRESSION_SUFFIXES:
+        suffix = os.path.splitext(root)[1]
+    if suffix == ".json":
+        return "json"
+    if suffix in (".yaml", ".yml"):
+        return "yaml"
+    head = stream.peek(READ_BUFFER_SIZE).lstrip(b" \t\r\n\xef\xbb\xbf")
+    return "json" if head[:1] in (b"{", b"[") else "yaml"
+
+
+def iter_dump(
+    path: Union[str, os.PathLike],
+    fields: Optional[FieldSelection] = PLAN_FIELDS,
+    skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the plans of a YAML or JSON plan dump file, compressed or not.
+
+    Args:
+        path (Union[str, os.PathLike]): Dump file.
+        fields (Optional[FieldSelection], optional): Parts of each plan to keep. Defaults to PLAN_FIELDS.
+        skip (Optional[Callable[[Dict[str, Any]], bool]], optional): Predicate on a plan's metadata, see
+            ``iter_plans``. Defaults to None.
+
+    Yields:
+        Dict[str, Any]: One plan per iteration.
+    """
+    with open_dump(path) as stream:
+        if dump_format(path, stream) == "json":
+            yield from iter_json_plans(stream, fields, skip)
+        else:
+            yield from iter_plans(stream, fields, skip)
+
+
+def iter_json_plans(
+    stream: Union[str, bytes, IO],
+    fields: Optional[FieldSelection] = PLAN_FIELDS,
+    skip: Optional[Callable[[Dict[str, Any]], bool]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the plans of a JSON plan dump (``oc get plans -o json``) one at a time.
+
+    JSON parsers build the whole document at once, so unlike ``iter_plans`` the complete dump is held in memory
+    while it is parsed.  Each plan is released once the consumer moves on to the next one.  The plans are trimmed
+    to ``fields`` and ``skip`` behaves like in ``iter_plans``, so both loaders yield the same plans.
+
+    Args:
+        stream (Union[str, bytes, IO]): JSON document or open file containing a ``List`` of plans or a single
+            ``Plan``.
+        fields (Optional[FieldSelection], optional): Parts of each plan to keep. ``None`` or ``True`` keeps the
+            complete plan. Defaults to PLAN_FIELDS.
+        skip (Optional[Callable[[Dict[str, Any]], bool]], optional): Predicate on a plan's metadata.  Plans it
+            returns True for are yielded with the keys up to and including their metadata. Defaults to None.
+
+    Yields:
+        Dict[str, Any]: One plan (``items[]`` entry) per iteration.
+    """
+    if fields is None:
+        fields = True
+    document = json_loads(stream if isinstance(stream, (str, bytes)) else stream.read())
+    if not isinstance(document, dict):
+        return
+    if "items" not in document:
+        if document.get("kind") == "Plan":
+            yield _prune_plan(document, fields, skip)
+        return
+
+    plans = document["items"]
+    document = None
+    # Pop the plans so each is freed as soon as the consumer is done with it
+    plans.reverse()
+    while plans:
+        yield _prune_plan(plans.pop(), fields, skip)
+
+
+def _prune_plan(
+    plan: Dict[str, Any], fields: FieldSelection, skip: Optional[Callable[[Dict[str, Any]], bool]]
+) -> Dict[str, Any]:
+    """Trim a parsed plan to ``fields``, dropping everything after its metadata if ``skip`` says so."""
+    if skip is None or not isinstance(plan, dict):
+        return _prune(plan, fields)
+    pruned = {}
+    for key, value in plan.items():
+        if not _wanted(fields, key):
+            continue
+        pruned[key] = _prune(value, _subfields(fields, key))
+        if key == "metadata" and skip(pruned[key]):
+            break
+    return pruned
+
+
+def _prune(value: Any, fields: FieldSelection) -> Any:
+    """Keep only the mapping keys of a parsed value listed in ``fields``."""
+    if fields is True:
+        return value
+    if isinstance(value, list):
+        return [_prune(item, fields) for item in value]
+    if isinstance(value, dict):
+        return {key: _prune(item, fields[key]) for key, item in value.items() if key in fields}
+    return value
@@ -0,0 +1,261 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+from failure_index import FailureIndex
+from quantile_sketch import DiskRateSketches
+from timestamps import MISSING, as_epoch
+from vm_records import VMRecords
+
+# Bump when the layout of the store changes
+STORE_VERSION = 6
+
+StoreDumps = Tuple[VMRecords, List[Dict[str, Any]], List[Dict[str, Any]]]
+
+_CODE_DTYPE = np.dtype(f"u{array('L').itemsize}")
+
+
+def _strings(values: List[str]) -> np.ndarray:
+    return np.array(values, dtype=str) if values else np.empty(0, dtype="U1")
+
+
+def save_store(
+    path: Union[str, Path],
+    all_vms: VMRecords,
+    successful_migrations: List[Dict[str, Any]],
+    failed_migrations: List[Dict[str, Any]],
+) -> None:
+    """
+    Write derived VM records and plan summaries to a columnar store: a directory of ``.npy`` files, one per column,
+    and the disk transfer rate sketches as JSON.  The failure index is stored as columns too, with the terms of each
+    failure rather than the posting lists, which are rebuilt on load.
+
+    The store is written next to ``path`` and moved into place, so readers never see a partly written store.
+
+    Args:
+        path (Union[str, Path]): Store directory, replaced if it exists.
+        all_vms (VMRecords): Migrated VMs.
+        successful_migrations (List[Dict[str, Any]]): Summaries of successful plans.
+        failed_migrations (List[Dict[str, Any]]): Summaries of failed plans.
+    """
+    path = Path(path)
+    plans = successful_migrations + failed_migrations
+    columns = {
+        "vms.name": _strings(all_vms.names),
+        "vms.os_code": np.frombuffer(all_vms.os_codes, dtype=_CODE_DTYPE),
+        "vms.plan_code": np.frombuffer(all_vms.plan_codes, dtype=_CODE_DTYPE),
+        "vms.disk_size": np.frombuffer(all_vms.disk_sizes, dtype=np.int64),
+        "vms.start": np.frombuffer(all_vms.start_times, dtype=np.int64),
+        "vms.end": np.frombuffer(all_vms.end_times, dtype=np.int64),
+        "vms.duration": np.frombuffer(all_vms.durations, dtype=np.float64),
+        "vms.failed": np.frombuffer(all_vms.failed, dtype=np.int8),
+        "vms.namespace_code": np.frombuffer(all_vms.namespace_codes, dtype=_CODE_DTYPE),
+        "vms.target_namespace_code": np.frombuffer(all_vms.target_namespace_codes, dtype=_CODE_DTYPE),
+        "vms.provider_code": np.frombuffer(all_vms.provider_codes, dtype=_CODE_DTYPE),
+        "vms.datastore_code": np.frombuffer(all_vms.datastore_codes, dtype=_CODE_DTYPE),
+        "os_names": _strings(all_vms.os_names),
+        "plan_names": _strings(all_vms.plan_names),
+        "namespace_names": _strings(all_vms.namespace_names),
+        "target_namespace_names": _strings(all_vms.target_namespace_names),
+        "provider_names": _strings(all_vms.provider_names),
+        "datastore_names": _strings(all_vms.datastore_names),
+        "plans.name": _strings([plan["name"] for plan in plans]),
+        "plans.total_duration_mins": np.array([plan["total_duration_mins"] for plan in plans], dtype=np.float64),
+        "plans.vms": np.array([plan["vms"] for plan in plans], dtype=np.int64),
+        "plans.failed": np.array([plan["vms_failed"] == "True" for plan in plans], dtype=np.int8),
+        "plans.total_disk_size": np.array([plan["total_disk_size"] for plan in plans], dtype=np.int64),
+        "plans.duration": np.array([plan["duration"] for plan in plans], dtype=np.float64),
+        "plans.start": np.array([as_epoch(plan["start_time"]) for plan in plans], dtype=np.int64),
+        "plans.namespace": _strings([plan["namespace"] for plan in plans]),
+        "plans.target_namespace": _strings([plan["target_namespace"] for plan in plans]),
+        "plans.provider": _strings([plan["provider"] for plan in plans]),
+    }
+    for name, values in all_vms.failures.to_columns().items():
+        columns[f"failures.{name}"] = _strings(values) if isinstance(values, list) else np.array(values)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        for name, column in columns.items():
+            np.save(partial / f"{name}.npy", column, allow_pickle=False)
+        meta = {
+            "version": STORE_VERSION,
+            "created": time.time(),
+            "vms": len(all_vms),
+            "plans": len(plans),
+            "successful_plans": len(successful_migrations),
+        }
+        (partial / "meta.json").write_text(json.dumps(meta, indent=2))
+        (partial / "disk_rates.json").write_text(json.dumps(all_vms.disk_rates.to_dict()))
+        if path.exists():
+            previous = path.with_name(f".{path.name}.old")
+            os.replace(path, previous)
+            os.replace(partial, path)
+            shutil.rmtree(previous)
+        else:
+            os.replace(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+
+def load_store(path: Union[str, Path]) -> StoreDumps:
+    """
+    Read a store written by ``save_store``.
+
+    Columns are memory-mapped and copied straight into the VMRecords arrays, nothing is parsed.
+
+    Args:
+        path (Union[str, Path]): Store directory.
+
+    Returns:
+        StoreDumps: migrated VMs, successful and failed plan summaries, in the order they were saved.
+    """
+    path = Path(path)
+    meta = json.loads((path / "meta.json").read_text())
+    if meta.get("version") != STORE_VERSION:
+        raise ValueError(f"{path} is a version {meta.get('version')} record store, expected {STORE_VERSION}")
+
+    def column(name: str) -> np.ndarray:
+        return np.load(path / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+    all_vms = VMRecords.from_columns(
+        column("vms.name").tolist(),
+        column("os_names").tolist(),
+        column("vms.os_code").tobytes(),
+        column("plan_names").tolist(),
+        column("vms.plan_code").tobytes(),
+        column("vms.disk_size").tobytes(),
+        column("vms.start").tobytes(),
+        column("vms.end").tobytes(),
+        column("vms.duration").tobytes(),
+        column("vms.failed").tobytes(),
+        column("namespace_names").tolist(),
+        column("vms.namespace_code").tobytes(),
+        column("target_namespace_names").tolist(),
+        column("vms.target_namespace_code").tobytes(),
+        column("provider_names").tolist(),
+        column("vms.provider_code").tobytes(),
+        column("datastore_names").tolist(),
+        column("vms.datastore_code").tobytes(),
+        DiskRateSketches.from_dict(json.loads((path / "disk_rates.json").read_text())),
+        FailureIndex.from_columns(
+            column("failures.names").tolist(),
+            column("failures.ids").tolist(),
+            column("failures.is_plan").tobytes(),
+            column("failures.times").tobytes(),
+            column("failures.plan_names").tolist(),
+            column("failures.plan_codes").tobytes(),
+            column("failures.os_names").tolist(),
+            column("failures.os_codes").tobytes(),
+            column("failures.namespace_names").tolist(),
+            column("failures.namespace_codes").tobytes(),
+            column("failures.term_fields").tolist(),
+            column("failures.term_values").tolist(),
+            column("failures.term_codes").tobytes(),
+            column("failures.term_offsets").tobytes(),
+        ),
+    )
+
+    plans = [
+        {
+            "name": name,
+            "total_duration_mins": total_duration,
+            "vms": vms,
+            "vms_failed": f"{bool(failed)}",
+            "total_disk_size": disk_size,
+            "duration": duration,
+            "start_time": None if start_time == MISSING else start_time,
+            "namespace": namespace,
+            "target_namespace": target_namespace,
+            "provider": provider,
+        }
+        for name, total_duration, vms, failed, disk_size, duration, start_time, namespace, target_namespace, provider in zip(
+            column("plans.name").tolist(),
+            column("plans.total_duration_mins").tolist(),
+            column("plans.vms").tolist(),
+            column("plans.failed").tolist(),
+            column("plans.total_disk_size").tolist(),
+            column("plans.duration").tolist(),
+            column("plans.start").tolist(),
+            column("plans.namespace").tolist(),
+            column("plans.target_namespace").tolist(),
+            column("plans.provider").tolist(),
+        )
+    ]
+    successful = meta["successful_plans"]
+    return all_vms, plans[:successful], plans[successful:]
+
+
+def load_stores(paths: List[Union[str, Path]]) -> StoreDumps:
+    """
+    Read and merge several stores, e.g. one per report run over months of migrations.
+
+    Args:
+        paths (List[Union[str, Path]]): Store directories.
+
+    Returns:
+        StoreDumps: migrated VMs, successful and failed plan summaries, in the order of ``paths``.
+    """
+    if len(paths) == 1:
+        return load_store(paths[0])
+    all_vms = VMRecords()
+    successful_migrations: List[Dict[str, Any]] = []
+    failed_migrations: List[Dict[str, Any]] = []
+    for path in paths:
+        vm_records, successful, failed = load_store(path)
+        all_vms.extend(vm_records)
+        successful_migrations.extend(successful)
+        failed_migrations.extend(failed)
+    return all_vms, successful_migrations, failed_migrations
+
+
+def vm_frame(path: Union[str, Path], tz: Optional[str] = "UTC") -> Any:
+    """
+    Load the VMs of a store as a pandas DataFrame for ad-hoc analysis (throughput by OS, by plan, by week, ...).
+
+    Args:
+        path (Union[str, Path]): Store directory.
+        tz (Optional[str], optional): Timezone the start and end columns are converted to. Defaults to "UTC".
+
+    Returns:
+        pandas.DataFrame: One row per VM with name, os, plan, namespace, target_namespace, provider, datastore,
+        disk_size, start_time, end_time, duration and failed.
+    """
+    import pandas as pd
+
+    path = Path(path)
+
+    def column(name: str) -> np.ndarray:
+        return np.load(path / f"{name}.npy", mmap_mode="r", allow_pickle=False)
+
+    def times(name: str) -> Any:
+        # Missing times are stored as MISSING, the int64 value of NaT
+        return pd.to_datetime(np.asarray(column(f"vms.{name}")).view("datetime64[s]"), utc=True).tz_convert(tz)
+
+    def labels(key: str) -> Any:
+        codes = np.asarray(column(f"vms.{key}_code")).astype(np.int64)
+        return pd.Categorical.from_codes(codes, categories=column(f"{key}_names").tolist())
+
+    return pd.DataFrame(
+        {
+            "name": column("vms.name"),
+            "os": labels("os"),
+            "plan": labels("plan"),
+            "namespace": labels("namespace"),
+            "target_namespace": labels("target_namespace"),
+            "provider": labels("provider"),
+            "datastore": labels("datastore"),
+            "disk_size": column("vms.disk_size"),
+            "start_time": times("start"),
+            "end_time": times("end"),
+            "duration": column("vms.duration"),
+            "failed": np.asarray(column("vms.failed")).astype(bool),
+        }
+    )
@@ -0,0 +1,204 @@
+from array import array
+from typing import Optional
+
+# Positions are Unix timestamps in seconds, 2**34 seconds reach well past the year 2500
+DEFAULT_SIZE_BITS = 34
+
+
+class SegmentTree:
+    """
+    Sparse segment tree over the integer positions ``[0, 2**size_bits)`` with range add, range max and range sum.
+
+    Nodes are only created along the boundaries of the ranges that were updated, so the tree costs
+    O(updates * size_bits) memory however large the position space is, and every operation takes
+    O(size_bits) steps.  Every position starts at 0.
+
+    Range adds are kept on the node that covers the range instead of being pushed down, so a node's max and sum
+    include the pending adds of the node itself but not of its ancestors.
+    """
+
+    def __init__(self, size_bits: int = DEFAULT_SIZE_BITS) -> None:
+        self.size = 1 << size_bits
+        # Node 0 stands in for every missing child and always holds zeros, node 1 is the root
+        self._left = array("q", [0, 0])
+        self._right = array("q", [0, 0])
+        self._pending = array("d", [0.0, 0.0])
+        self._max = array("d", [0.0, 0.0])
+        self._sum = array("d", [0.0, 0.0])
+
+    def __len__(self) -> int:
+        """Number of allocated nodes."""
+        return len(self._pending) - 1
+
+    def _new_node(self) -> int:
+        self._left.append(0)
+        self._right.append(0)
+        self._pending.append(0.0)
+        self._max.append(0.0)
+        self._sum.append(0.0)
+        return len(self._pending) - 1
+
+    def _check(self, lo: int, hi: int) -> None:
+        if not 0 <= lo <= hi <= self.size:
+            raise ValueError(f"Range [{lo}, {hi}) is outside of [0, {self.size})")
+
+    def add(self, lo: int, hi: int, delta: float) -> None:
+        """
+        Add ``delta`` to every position in ``[lo, hi)``.
+
+        Args:
+            lo (int): First position.
+            hi (int): Position after the last one.
+            delta (float): Value to add.
+        """
+        self._check(lo, hi)
+        if lo < hi:
+            self._add(1, 0, self.size, lo, hi, delta)
+
+    def _add(self, node: int, node_lo: int, node_hi: int, lo: int, hi: int, delta: float) -> None:
+        if lo <= node_lo and node_hi <= hi:
+            self._pending[node] += delta
+            self._max[node] += delta
+            self._sum[node] += delta * (node_hi - node_lo)
+            return
+        mid = (node_lo + node_hi) // 2
+        if lo < mid:
+            if not self._left[node]:
+                self._left[node] = self._new_node()
+            self._add(self._left[node], node_lo, mid, lo, hi, delta)
+        if hi > mid:
+            if not self._right[node]:
+                self._right[node] = self._new_node()
+            self._add(self._right[node], mid, node_hi, lo, hi, delta)
+        left, right = self._left[node], self._right[node]
+        pending = self._pending[node]
+        self._max[node] = pending + max(self._max[left], self._max[right])
+        self._sum[node] = pending * (node_hi - node_lo) + self._sum[left] + self._sum[right]
+
+    def max(self, lo: int = 0, hi: Optional[int] = None) -> float:
+        """
+        Highest value in ``[lo, hi)``.
+
+        Args:
+            lo (int, optional): First position. Defaults to 0.
+            hi (Optional[int], optional): Position after the last one. Defaults to the end of the tree.
+
+        Returns:
+            float: The maximum, 0 for an empty range.
+        """
+        hi = self.size if hi is None else hi
+        self._check(lo, hi)
+        if lo >= hi:
+            return 0.0
+        return self._range_max(1, 0, self.size, lo, hi)
+
+    def _range_max(self, node: int, node_lo: int, node_hi: int, lo: int, hi: int) -> float:
+        if lo <= node_lo and node_hi <= hi:
+            return self._max[node]
+        if not node:
+            return 0.0
+        mid = (node_lo + node_hi) // 2
+        if hi <= mid:
+            best = self._range_max(self._left[node], node_lo, mid, lo, hi)
+        elif lo >= mid:
+            best = self._range_max(self._right[node], mid, node_hi, lo, hi)
+        else:
+            best = max(
+                self._range_max(self._left[node], node_lo, mid, lo, hi),
+                self._range_max(self._right[node], mid, node_hi, lo, hi),
+            )
+        return self._pending[node] + best
+
+    def sum(self, lo: int = 0, hi: Optional[int] = None) -> float:
+        """
+        Sum of the values in ``[lo, hi)``.
+
+        Args:
+            lo (int, optional): First position. Defaults to 0.
+            hi (Optional[int], optional): Position after the last one. Defaults to the end of the tree.
+
+        Returns:
+            float: The sum.
+        """
+        hi = self.size if hi is None else hi
+        self._check(lo, hi)
+        if lo >= hi:
+            return 0.0
+        return self._range_sum(1, 0, self.size, lo, hi)
+
+    def _range_sum(self, node: int, node_lo: int, node_hi: int, lo: int, hi: int) -> float:
+        if not node:
+            return 0.0
+        if lo <= node_lo and node_hi <= hi:
+            return self._sum[node]
+        mid = (node_lo + node_hi) // 2
+        total = self._pending[node] * (min(hi, node_hi) - max(lo, node_lo))
+        if lo < mid:
+            total += self._range_sum(self._left[node], node_lo, mid, lo, hi)
+        if hi > mid:
+            total += self._range_sum(self._right[node], mid, node_hi, lo, hi)
+        return total
+
+    def value(self, position: int) -> float:
+        """
+        Value at one position.
+
+        Args:
+            position (int): The position.
+
+        Returns:
+            float: Its value.
+        """
+        return self.max(position, position + 1)
+
+    def argmax(self) -> Optional[int]:
+        """
+        First position holding the maximum of the whole tree.
+
+        Returns:
+            Optional[int]: The position, None if no value is positive.
+        """
+        if self._max[1] <= 0:
+            return None
+        node, node_lo, node_hi = 1, 0, self.size
+        target = self._max[1]
+        while node and node_hi - node_lo > 1:
+            target -= self._pending[node]
+            left = self._left[node]
+            mid = (node_lo + node_hi) // 2
+            if self._max[left] == target:
+                node, node_hi = left, mid
+            else:
+                node, node_lo = self._right[node], mid
+        return node_lo
+
+    def first_positive(self) -> Optional[int]:
+        """First position with a positive value, None if there is none.  Assumes values are never negative."""
+        return self._positive_edge(leftmost=True)
+
+    def last_positive(self) -> Optional[int]:
+        """Last position with a positive value, None if there is none.  Assumes values are never negative."""
+        return self._positive_edge(leftmost=False)
+
+    def _positive_edge(self, leftmost: bool) -> Optional[int]:
+        if self._max[1] <= 0:
+            return None
+        node, node_lo, node_hi = 1, 0, self.size
+        carried = 0.0
+        while node and node_hi - node_lo > 1:
+            carried += self._pending[node]
+            if carried > 0:
+                # Every position below this node is positive
+                return node_lo if leftmost else node_hi - 1
+            mid = (node_lo + node_hi) // 2
+            left, right = self._left[node], self._right[node]
+            first, second = (left, right) if leftmost else (right, left)
+            if self._max[first] + carried > 0:
+                node = first
+            else:
+                node = second
+            if node == left:
+                node_hi = mid
+            else:
+                node_lo = mid
+        return node_lo
@@ -0,0 +1,471 @@
+import csv
+import heapq
+from datetime import timedelta
+from typing import IO, Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from timestamps import MISSING
+from vm_information import analyze_concurrent_migrations
+from vm_records import VMRecords
+
+# VMs of an OS needed to fit its own model, OSes with fewer VMs use the model of all VMs
+MIN_FIT_VMS = 3
+
+
+class Throughput:
+    """
+    Migration time model of a group of VMs: a fixed overhead plus a transfer time proportional to the disk size.
+
+    Attributes:
+        overhead (float): Minutes spent on a VM regardless of its size.
+        minutes_per_mb (float): Transfer minutes per MB of disk.
+        vms (int): VMs the model was fitted to.
+    """
+
+    __slots__ = ("overhead", "minutes_per_mb", "vms")
+
+    def __init__(self, overhead: float, minutes_per_mb: float, vms: int = 0) -> None:
+        self.overhead = overhead
+        self.minutes_per_mb = minutes_per_mb
+        self.vms = vms
+
+    @property
+    def mb_per_second(self) -> float:
+        return 1 / (self.minutes_per_mb * 60) if self.minutes_per_mb > 0 else float("inf")
+
+    @classmethod
+    def fit(cls, disk_sizes: np.ndarray, durations: np.ndarray) -> Optional["Throughput"]:
+        """
+        Least squares fit of duration = overhead + minutes_per_mb * disk_size.
+
+        A negative overhead is not physical and a non-positive slope means size explains nothing, both fall back
+        to a fit through the origin (no overhead).
+
+        Args:
+            disk_sizes (np.ndarray): Disk size per VM in MB.
+            durations (np.ndarray): Effective migration time per VM in minutes.
+
+        Returns:
+            Optional[Throughput]: The model, None without VMs to fit.
+        """
+        if not len(disk_sizes):
+            return None
+        if len(disk_sizes) >= 2 and np.ptp(disk_sizes) > 0:
+            minutes_per_mb, overhead = np.polyfit(disk_sizes, durations, 1)
+            if overhead >= 0 and minutes_per_mb > 0:
+                return cls(float(overhead), float(minutes_per_mb), len(disk_sizes))
+        total_size = float(np.dot(disk_sizes, disk_sizes))
+        if total_size > 0:
+            return cls(0.0, float(np.dot(disk_sizes, durations)) / total_size, len(disk_sizes))
+        # Only empty disks, the migration time is all overhead
+        return cls(float(np.mean(durations)), 0.0, len(disk_sizes))
+
+    def __repr__(self) -> str:
+        return f"Throughput(overhead={self.overhead}, minutes_per_mb={self.minutes_per_mb}, vms={self.vms})"
+
+
+class ThroughputModel:
+    """
+    Migration times learned from observed runs: a Throughput per OS, and a speed factor per datastore from the
+    median per-disk transfer rates.
+
+    Attributes:
+        overall (Throughput): Model of all VMs, used for OSes without enough observed VMs.
+        by_os (Dict[str, Throughput]): Model per OS.
+        datastore_speed (Dict[str, float]): Median disk rate of each datastore over the median of all disks.
+    """
+
+    def __init__(
+        self,
+        overall: Throughput,
+        by_os: Optional[Dict[str, Throughput]] = None,
+        datastore_speed: Optional[Dict[str, float]] = None,
+    ) -> None:
+        self.overall = overall
+        self.by_os = by_os or {}
+        self.datastore_speed = datastore_speed or {}
+
+    @classmethod
+    def fit(cls, records: VMRecords) -> "ThroughputModel":
+        """
+        Calibrate the model from derived records: extract_vm_information disk sizes and effective migration times.
+        Failed VMs and VMs without a duration are left out.
+
+        Args:
+            records (VMRecords): Observed migrations.
+
+        Returns:
+            ThroughputModel: The model.
+        """
+        disk_sizes = np.frombuffer(records.disk_sizes, dtype=np.int64).astype(np.float64)
+        durations = np.frombuffer(records.durations, dtype=np.float64)
+        os_codes = np.frombuffer(records.os_codes, dtype=np.dtype(f"u{records.os_codes.itemsize}"))
+        usable = (durations > 0) & (np.frombuffer(records.failed, dtype=np.int8) == 0)
+        overall = Throughput.fit(disk_sizes[usable], durations[usable])
+        if overall is None:
+            raise ValueError("No completed VM migrations to calibrate the simulation from")
+        by_os = {}
+        for code, os_name in enumerate(records.os_names):
+            selected = usable & (os_codes == code)
+            if selected.sum() >= MIN_FIT_VMS:
+                by_os[os_name] = Throughput.fit(disk_sizes[selected], durations[selected])
+        datastore_speed = {}
+        overall_rate = records.disk_rates.all.quantile(0.5)
+        if overall_rate:
+            for datastore, sketch in records.disk_rates.by_datastore.items():
+                datastore_speed[datastore] = sketch.quantile(0.5) / overall_rate
+        return cls(overall, by_os, datastore_speed)
+
+    def minutes(self, os: str, disk_size: float, datastore: str = "") -> float:
+        """
+        Predicted effective migration time of a VM.
+
+        Args:
+            os (str): Operating system.
+            disk_size (float): Disk size in MB.
+            datastore (str, optional): Datastore of the disks, "" if unknown. Defaults to "".
+
+        Returns:
+            float: Minutes.
+        """
+        model = self.by_os.get(os, self.overall)
+        return model.overhead + model.minutes_per_mb * disk_size / self.datastore_speed.get(datastore, 1.0)
+
+
+class PlannedVM:
+    """
+    A VM of a candidate wave.
+
+    Attributes:
+        name (str): VM name.
+        os (str): Operating system.
+        plan (str): Plan the VM is migrated by, "" for no per-plan limit.
+        disk_size (int): Disk size in MB.
+        host (str): Source host, "" for no per-host limit.
+        datastore (str): Datastore of the disks, "" if unknown.
+    """
+
+    __slots__ = ("name", "os", "plan", "disk_size", "host", "datastore")
+
+    def __init__(
+        self, name: str, os: str = "unknown", plan: str = "", disk_size: int = 0, host: str = "", datastore: str = ""
+    ) -> None:
+        self.name = name
+        self.os = os
+        self.plan = plan
+        self.disk_size = disk_size
+        self.host = host
+        self.datastore = datastore
+
+    def __repr__(self) -> str:
+        return (
+            f"PlannedVM(name={self.name!r}, os={self.os!r}, plan={self.plan!r}, disk_size={self.disk_size}, "
+            f"host={self.host!r}, datastore={self.datastore!r})"
+        )
+
+
+def read_candidates(file: IO[str]) -> List[PlannedVM]:
+    """
+    Read a candidate VM list from CSV with a header row.  Columns are name, os, plan, disk_size (MB), host and
+    datastore; only name and disk_size are required.  VMs are started in the order of the file.
+
+    Args:
+        file (IO[str]): The CSV.
+
+    Returns:
+        List[PlannedVM]: The VMs.
+    """
+    reader = csv.DictReader(file)
+    missing = {"name", "disk_size"} - set(reader.fieldnames or ())
+    if missing:
+        raise ValueError(f"Candidate VM list is missing the column(s) {', '.join(sorted(missing))}")
+    return [
+        PlannedVM(
+            row["name"],
+            row.get("os") or "unknown",
+            row.get("plan") or "",
+            int(float(row["disk_size"])),
+            row.get("host") or "",
+            row.get("datastore") or "",
+        )
+        for row in reader
+    ]
+
+
+def observed_candidates(records: VMRecords) -> List[PlannedVM]:
+    """The observed VMs as a candidate list in start order, to replay them against the model.  Plans do not
+    record the source host of their VMs, so the candidates have none."""
+    starts = np.frombuffer(records.start_times, dtype=np.int64)
+    rows = np.flatnonzero(starts != MISSING)
+    rows = rows[np.argsort(starts[rows], kind="stable")]
+    return [
+        PlannedVM(
+            records.names[row],
+            records.os_name(row),
+            records.plan_name(row),
+            records.disk_sizes[row],
+            datastore=records.datastore_name(row),
+        )
+        for row in rows.tolist()
+    ]
+
+
+class Schedule:
+    """
+    Outcome of simulate_waves.
+
+    Attributes:
+        records (VMRecords): The VMs with their predicted start and end times.
+        hosts (List[str]): Source host of each VM, in the order of ``records``.
+        predecessors (List[int]): For each VM, the VM whose end let it start, -1 for VMs started right away.
+        makespan (float): Minutes from the start of the wave to the end of its last VM.
+    """
+
+    def __init__(self, records: VMRecords, hosts: List[str], predecessors: List[int], makespan: float) -> None:
+        self.records = records
+        self.hosts = hosts
+        self.predecessors = predecessors
+        self.makespan = makespan
+
+    def critical_path(self) -> List[int]:
+        """
+        Chain of VMs that determines the makespan: the VM ending last, the VM whose end let it start, and so on
+        back to a VM started right away.  Shortening any of them ends the wave earlier, unless another chain is
+        nearly as long.
+
+        Returns:
+            List[int]: Rows of ``records`` in start order.
+        """
+        if not len(self.records):
+            return []
+        row = max(range(len(self.records)), key=self.records.end_times.__getitem__)
+        path = []
+        while row >= 0:
+            path.append(row)
+            row = self.predecessors[row]
+        return path[::-1]
+
+
+def _check_limits(limits: Dict[str, Optional[int]]) -> None:
+    """Reject concurrency limits below 1, None is no limit."""
+    for name, limit in limits.items():
+        if limit is not None and limit < 1:
+            raise ValueError(f"{name} must be at least 1")
+
+
+class _Wave:
+    """
+    Discrete-event state of simulate_waves.
+
+    Pending VMs are kept in one queue per plan and host pair; the queue heads sit in ``ready``, a heap ordered by
+    list position, and queues whose plan or host is full are parked on that plan or host until one of its VMs
+    ends.  Running VMs are counted per plan and host, "" is not limited.
+    """
+
+    def __init__(
+        self, vms: List[PlannedVM], durations: List[float], global_limit: int, plan_limit: int, host_limit: int
+    ) -> None:
+        self.vms = vms
+        self.durations = durations
+        self.global_limit = global_limit
+        self.plan_limit = plan_limit
+        self.host_limit = host_limit
+        self.queues: Dict[Tuple[str, str], List[int]] = {}
+        for index, vm in enumerate(vms):
+            self.queues.setdefault((vm.plan, vm.host), []).append(index)
+        # Position of the next pending VM of each queue
+        self.heads = dict.fromkeys(self.queues, 0)
+        self.ready = [(queue[0], key) for key, queue in self.queues.items()]
+        heapq.heapify(self.ready)
+        self.running_plan: Dict[str, int] = {}
+        self.running_host: Dict[str, int] = {}
+        self.parked_plan: Dict[str, List[Tuple[int, Tuple[str, str]]]] = {}
+        self.parked_host: Dict[str, List[Tuple[int, Tuple[str, str]]]] = {}
+        self.running = 0
+        self.ends: List[Tuple[float, int]] = []
+        self.starts = [0.0] * len(vms)
+        self.predecessors = [-1] * len(vms)
+
+    def _release(self, parked: Dict[str, List[Tuple[int, Tuple[str, str]]]], name: str) -> None:
+        waiting = parked.get(name)
+        if waiting:
+            heapq.heappush(self.ready, heapq.heappop(waiting))
+
+    def _park(self, index: int, key: Tuple[str, str]) -> bool:
+        """Park the queue of a VM on its plan or host if that one is full, returns whether it was parked."""
+        plan, host = key
+        if plan and self.running_plan.get(plan, 0) >= self.plan_limit:
+            heapq.heappush(self.parked_plan.setdefault(plan, []), (index, key))
+            # The slot of the host may still go to a queue of another plan
+            if not host or self.running_host.get(host, 0) < self.host_limit:
+                self._release(self.parked_host, host)
+            return True
+        if host and self.running_host.get(host, 0) >= self.host_limit:
+            heapq.heappush(self.parked_host.setdefault(host, []), (index, key))
+            if not plan or self.running_plan.get(plan, 0) < self.plan_limit:
+                self._release(self.parked_plan, plan)
+            return True
+        return False
+
+    def _start(self, now: float, index: int, key: Tuple[str, str], predecessor: int) -> None:
+        plan, host = key
+        self.running += 1
+        if plan:
+            self.running_plan[plan] = self.running_plan.get(plan, 0) + 1
+        if host:
+            self.running_host[host] = self.running_host.get(host, 0) + 1
+        self.starts[index] = now
+        self.predecessors[index] = predecessor
+        heapq.heappush(self.ends, (now + self.durations[index], index))
+        queue = self.queues[key]
+        self.heads[key] += 1
+        if self.heads[key] < len(queue):
+            heapq.heappush(self.ready, (queue[self.heads[key]], key))
+
+    def fill(self, now: float, predecessor: int, freed: Dict[str, int], freed_hosts: Dict[str, int]) -> None:
+        """Start the first pending VMs whose plan and host are below their limits, until the wave is full."""
+        while self.running < self.global_limit and self.ready:
+            index, key = heapq.heappop(self.ready)
+            if not self._park(index, key):
+                plan, host = key
+                # Credit the VM whose end freed the binding slot
+                self._start(now, index, key, freed.get(plan, freed_hosts.get(host, predecessor)))
+
+    def _finish(self, finished: List[int]) -> Tuple[Dict[str, int], Dict[str, int]]:
+        """End VMs, returns the first VM ended on each plan and host."""
+        freed: Dict[str, int] = {}
+        freed_hosts: Dict[str, int] = {}
+        for index in finished:
+            self.running -= 1
+            plan, host = self.vms[index].plan, self.vms[index].host
+            if plan:
+                self.running_plan[plan] -= 1
+                freed.setdefault(plan, index)
+                self._release(self.parked_plan, plan)
+            if host:
+                self.running_host[host] -= 1
+                freed_hosts.setdefault(host, index)
+                self._release(self.parked_host, host)
+        return freed, freed_hosts
+
+    def run(self) -> float:
+        """Run the wave to its end, returns its makespan in seconds."""
+        self.fill(0.0, -1, {}, {})
+        makespan = 0.0
+        while self.ends:
+            now, index = heapq.heappop(self.ends)
+            finished = [index]
+            while self.ends and self.ends[0][0] == now:
+                finished.append(heapq.heappop(self.ends)[1])
+            freed, freed_hosts = self._finish(finished)
+            makespan = now
+            self.fill(now, finished[0], freed, freed_hosts)
+        return makespan
+
+
+def simulate_waves(
+    vms: List[PlannedVM],
+    model: ThroughputModel,
+    start: int,
+    max_concurrent: Optional[int] = None,
+    max_per_plan: Optional[int] = None,
+    max_per_host: Optional[int] = None,
+) -> Schedule:
+    """
+    Simulate the schedule of a wave under concurrency limits with a discrete-event loop.
+
+    Whenever VMs end, the freed slots go to the first VMs of the list whose plan and host are below their limits,
+    as the controller starts the next pending VM.  Pending VMs are kept in one queue per plan and host pair; the
+    queue heads sit in a heap ordered by list position, and queues whose plan or host is full are parked on that
+    plan or host until one of its VMs ends.  Each VM is started and ended once, so the loop takes O(n log n).
+
+    Args:
+        vms (List[PlannedVM]): The VMs, in the order they should be started.
+        model (ThroughputModel): Predicted migration times.
+        start (int): Start of the wave in epoch seconds.
+        max_concurrent (Optional[int], optional): VMs migrating at once. Defaults to None, no limit.
+        max_per_plan (Optional[int], optional): VMs of a plan migrating at once. Defaults to None, no limit.
+        max_per_host (Optional[int], optional): VMs of a source host migrating at once. Defaults to None, no limit.
+
+    Returns:
+        Schedule: Predicted start and end of every VM.
+    """
+    _check_limits({"max_concurrent": max_concurrent, "max_per_plan": max_per_plan, "max_per_host": max_per_host})
+    unlimited = len(vms) + 1
+    durations = [model.minutes(vm.os, vm.disk_size, vm.datastore) * 60 for vm in vms]
+    wave = _Wave(vms, durations, max_concurrent or unlimited, max_per_plan or unlimited, max_per_host or unlimited)
+    makespan = wave.run()
+
+    records = VMRecords()
+    for vm, started, duration in zip(vms, wave.starts, durations):
+        # Round the end from the exact time, so a VM started by the end of another starts on the same second
+        records.add(
+            vm.name,
+            vm.os,
+            vm.plan,
+            vm.disk_size,
+            start + round(started),
+            duration / 60,
+            end_time=start + round(started + duration),
+        )
+    return Schedule(records, [vm.host for vm in vms], wave.predecessors, makespan / 60)
+
+
+def critical_path_rows(schedule: Schedule) -> Iterator[Tuple[Any, ...]]:
+    """(name, plan, host, os, start, end, minutes) of each VM of the critical path, times in epoch seconds."""
+    records = schedule.records
+    for row in schedule.critical_path():
+        yield (
+            records.names[row],
+            records.plan_name(row),
+            schedule.hosts[row],
+            records.os_name(row),
+            records.start_times[row],
+            records.end_times[row],
+            records.durations[row],
+        )
+
+
+def analyze_simulation(
+    schedule: Schedule,
+    model: ThroughputModel,
+    bucket_width: timedelta = timedelta(hours=1),
+    per_os: bool = False,
+    bucket_peak: bool = False,
+    limits: Optional[Dict[str, Optional[int]]] = None,
+) -> Dict[str, Any]:
+    """
+    Concurrency analysis of a simulated wave, in the format of analyze_concurrent_migrations so predicted and
+    observed runs are reported and compared the same way.
+
+    Args:
+        schedule (Schedule): The simulated wave.
+        model (ThroughputModel): Model the wave was simulated with.
+        bucket_width (timedelta, optional): Resolution of the concurrency series. Defaults to one hour.
+        per_os (bool, optional): Include per-OS counts in the concurrency series. Defaults to False.
+        bucket_peak (bool, optional): Include the peak inside each bucket. Defaults to False.
+        limits (Optional[Dict[str, Optional[int]]], optional): Limits the wave was simulated with, for the
+            report. Defaults to None.
+
+    Returns:
+        Dict[str, Any]: The output of analyze_concurrent_migrations on the predicted VMs, plus "vms",
+        "makespan_mins", "start", "end", "limits", "model" and "critical_path" (see critical_path_rows).
+    """
+    records = schedule.records
+    analysis = analyze_concurrent_migrations(records, bucket_width, per_os=per_os, bucket_peak=bucket_peak)
+    analysis.update(
+        vms=len(records),
+        makespan_mins=schedule.makespan,
+        start=min(records.start_times) if len(records) else None,
+        end=max(records.end_times) if len(records) else None,
+        limits=limits or {},
+        model=model,
+        critical_path=list(critical_path_rows(schedule)),
+    )
+    return analysis
+
+
+def model_rows(model: ThroughputModel) -> Iterable[Tuple[Any, ...]]:
+    """(os, vms, overhead minutes, MB/s) of the overall model, then of each OS."""
+    for os_name, throughput in [("all", model.overall), *model.by_os.items()]:
+        yield os_name, throughput.vms, throughput.overhead, throughput.mb_per_second
@@ -0,0 +1,272 @@
+import hashlib
+import os
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+
+from aggregation import Stats, aggregate_vms
+from concurrency import ConcurrencyTimeline
+from failure_index import FailureIndex, FailureRecord
+from instrumentation import metrics
+from plan_loader import iter_dump
+from vm_information import plan_failures, summarize_plan
+from vm_records import VMRecords
+
+try:
+    from orjson import OPT_SORT_KEYS
+    from orjson import dumps as _orjson_dumps
+
+    def _canonical(entry: Dict[str, Any]) -> bytes:
+        return _orjson_dumps(entry, option=OPT_SORT_KEYS)
+
+except ImportError:
+    import json
+
+    def _canonical(entry: Dict[str, Any]) -> bytes:
+        return json.dumps(entry, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+# Phases of a plan, see plan_phase
+PLAN_PHASES = ("Pending", "Blocked", "Running", "Succeeded", "Failed")
+# Kinds of plan changes, in report order
+CHANGE_KINDS = ("added", "changed", "removed")
+
+# (change, plan, namespace, phase in the old dump, phase in the new dump), "" for a side without the plan
+PlanChange = Tuple[str, str, str, str, str]
+
+
+def plan_key(metadata: Dict[str, Any]) -> str:
+    """Identity of a plan across dumps: its uid, or namespace/name for plans without one."""
+    return metadata.get("uid") or f"{metadata.get('namespace')}/{metadata.get('name')}"
+
+
+def plan_version(entry: Dict[str, Any]) -> str:
+    """
+    Version of a plan: its resourceVersion, or a hash of its content for plans without one.
+
+    Args:
+        entry (Dict[str, Any]): The plan, trimmed to PLAN_FIELDS.
+
+    Returns:
+        str: The version, equal for two dumps of the same plan object.
+    """
+    version = (entry.get("metadata") or {}).get("resourceVersion")
+    if version is not None:
+        return str(version)
+    return "blake2b:" + hashlib.blake2b(_canonical(entry), digest_size=16).hexdigest()
+
+
+class PlanVersion:
+    """
+    A plan as derived from one of the two dumps.
+
+    Attributes:
+        name (str): Plan name.
+        namespace (str): Plan namespace.
+        phase (str): Phase of the plan, see plan_phase.
+        vm_records (List[VMRecord]): Migrated VMs, empty until the plan's migration completed.
+        failures (List[FailureRecord]): Failed VMs and the plan itself if it has Critical conditions.
+    """
+
+    __slots__ = ("name", "namespace", "phase", "vm_records", "failures")
+
+    def __init__(self, entry: Dict[str, Any]) -> None:
+        metadata = entry["metadata"]
+        self.name = metadata["name"]
+        self.namespace = metadata.get("namespace") or ""
+        summary = summarize_plan(entry) if (entry.get("status") or {}).get("migration") else None
+        self.failures = plan_failures(entry)
+        self.vm_records = summary[0] if summary else []
+        self.phase = plan_phase(entry, summary, self.failures)
+
+
+def plan_phase(
+    entry: Dict[str, Any], summary: Optional[Tuple[List[Any], Dict[str, Any]]], failures: List[FailureRecord]
+) -> str:
+    """
+    Phase of a plan from PLAN_PHASES: Succeeded or Failed once its migration completed, Running while it runs,
+    Blocked while Critical conditions keep it from starting and Pending otherwise.
+    """
+    if summary is not None:
+        return "Failed" if summary[1]["vms_failed"] == "True" else "Succeeded"
+    if ((entry.get("status") or {}).get("migration") or {}).get("started"):
+        return "Running"
+    if any(failure.is_plan for failure in failures):
+        return "Blocked"
+    return "Pending"
+
+
+def scan_versions(path: Union[str, os.PathLike]) -> Dict[str, str]:
+    """
+    Versions of the plans of a dump, without deriving them.
+
+    Plans with a resourceVersion are skipped right after their metadata.  Plans without one are read to be
+    hashed.
+
+    Args:
+        path (Union[str, os.PathLike]): Dump file, compressed or not.
+
+    Returns:
+        Dict[str, str]: Version per plan key.
+    """
+    versions = {}
+    for entry in metrics.iterate("scan", iter_dump(path, skip=lambda metadata: "resourceVersion" in metadata)):
+        versions[plan_key(entry["metadata"])] = plan_version(entry)
+    return versions
+
+
+def derive_changed(
+    path: Union[str, os.PathLike], other_versions: Dict[str, str], only: Optional[Set[str]] = None
+) -> Tuple[Dict[str, PlanVersion], Dict[str, str]]:
+    """
+    Derive the plans of a dump that differ from another dump.
+
+    Plans whose resourceVersion matches the other dump are skipped right after their metadata, plans without one
+    are derived only if their content hash differs.
+
+    Args:
+        path (Union[str, os.PathLike]): Dump file, compressed or not.
+        other_versions (Dict[str, str]): Version per plan key in the other dump, see scan_versions.
+        only (Optional[Set[str]], optional): Only derive these plans, skip the others after their metadata.
+            Defaults to None, every changed plan.
+
+    Returns:
+        Tuple[Dict[str, PlanVersion], Dict[str, str]]: The derived plans, and the version of every plan of the
+        dump, both per plan key.
+    """
+    versions: Dict[str, str] = {}
+    skipped: Set[str] = set()
+
+    def skip(metadata: Dict[str, Any]) -> bool:
+        key = plan_key(metadata)
+        version = metadata.get("resourceVersion")
+        unchanged = version is not None and other_versions.get(key) == str(version)
+        if unchanged or (only is not None and key not in only):
+            skipped.add(key)
+            return True
+        return False
+
+    derived = {}
+    for entry in metrics.iterate("parse", iter_dump(path, skip=skip)):
+        key = plan_key(entry["metadata"])
+        if key in skipped:
+            versions[key] = str(entry["metadata"].get("resourceVersion"))
+            continue
+        version = versions[key] = plan_version(entry)
+        if other_versions.get(key) != version:
+            derived[key] = PlanVersion(entry)
+    return derived, versions
+
+
+def _vm_identities(plans: Dict[str, PlanVersion], keys: Iterable[str]) -> Set[Tuple[str, str, Any]]:
+    return {(key, record.name, record.start_time) for key in keys if key in plans for record in plans[key].vm_records}
+
+
+def _failure_identities(plans: Dict[str, PlanVersion], keys: Iterable[str]) -> Set[Tuple[Any, ...]]:
+    return {
+        (key, failure.is_plan, failure.name, failure.terms)
+        for key in keys
+        if key in plans
+        for failure in plans[key].failures
+    }
+
+
+def _side_stats(plans: Dict[str, PlanVersion]) -> Tuple[Stats, ConcurrencyTimeline]:
+    records = VMRecords()
+    for plan in plans.values():
+        records.extend(plan.vm_records)
+    stats = aggregate_vms(records)[()].get((), Stats())
+    return stats, ConcurrencyTimeline(records)
+
+
+def diff_dumps(old_path: Union[str, os.PathLike], new_path: Union[str, os.PathLike]) -> Dict[str, Any]:
+    """
+    Compare two dumps of the same cluster, e.g. consecutive hourly dumps.
+
+    Plans are matched by uid and compared by resourceVersion (a content hash for plans without one).  The old
+    dump is first scanned for versions only; the new dump is then read skipping every unchanged plan after its
+    metadata and deriving the others; finally only the changed and removed plans of the old dump are derived, a
+    pass left out when there are none.  Extraction therefore scales with the number of changed plans, the
+    unchanged ones only cost the parser skipping over them.
+
+    Throughput and concurrency are compared between the old and the new versions of the changed plans.  Unchanged
+    plans contribute the same VMs to both dumps, so the VM and disk size deltas hold for the whole dumps; peaks and
+    rates are those of the changed plans.
+
+    Args:
+        old_path (Union[str, os.PathLike]): Earlier dump file, compressed or not.
+        new_path (Union[str, os.PathLike]): Later dump file, compressed or not.
+
+    Returns:
+        Dict[str, Any]: "old" and "new" paths, "plans" (plans per change kind and "unchanged"), "plan_changes"
+        (see PlanChange, by change kind then name), "completed_vms" (VMRecords of the VMs migrated since the old
+        dump), "removed_vms", "new_failures" (FailureIndex of the failures since the old dump),
+        "resolved_failures" and "throughput" ((metric, before, after) rows).
+    """
+    with metrics.stage("scan_old"):
+        old_versions = scan_versions(old_path)
+    with metrics.stage("derive_new") as stage:
+        new_plans, new_versions = derive_changed(new_path, old_versions)
+        stage.add_items(len(new_plans))
+    stale = {key for key, version in old_versions.items() if new_versions.get(key) != version}
+    old_plans: Dict[str, PlanVersion] = {}
+    if stale:
+        with metrics.stage("derive_old") as stage:
+            old_plans, _ = derive_changed(old_path, new_versions, only=stale)
+            stage.add_items(len(old_plans))
+
+    changes: List[PlanChange] = []
+    for key, plan in new_plans.items():
+        changes.append(
+            (
+                "changed" if key in old_versions else "added",
+                plan.name,
+                plan.namespace,
+                old_plans[key].phase if key in old_plans else "",
+                plan.phase,
+            )
+        )
+    for key, plan in old_plans.items():
+        if key not in new_versions:
+            changes.append(("removed", plan.name, plan.namespace, plan.phase, ""))
+    changes.sort(key=lambda change: (CHANGE_KINDS.index(change[0]), change[1], change[2]))
+    counts = {kind: sum(change[0] == kind for change in changes) for kind in CHANGE_KINDS}
+    counts["unchanged"] = len(new_versions) - counts["added"] - counts["changed"]
+
+    keys = set(new_plans) | set(old_plans)
+    old_vms = _vm_identities(old_plans, keys)
+    new_vms = _vm_identities(new_plans, keys)
+    completed_vms = VMRecords()
+    for key, plan in new_plans.items():
+        completed_vms.extend(
+            record for record in plan.vm_records if (key, record.name, record.start_time) not in old_vms
+        )
+    old_failures = _failure_identities(old_plans, keys)
+    new_failures = FailureIndex()
+    for key, plan in new_plans.items():
+        new_failures.extend(
+            failure
+            for failure in plan.failures
+            if (key, failure.is_plan, failure.name, failure.terms) not in old_failures
+        )
+
+    before, before_timeline = _side_stats(old_plans)
+    after, after_timeline = _side_stats(new_plans)
+    throughput = [
+        ("VMs migrated", before.count, after.count),
+        ("Failed VMs", before.failed, after.failed),
+        ("Disk size (GB)", before.disk_size_gb, after.disk_size_gb),
+        ("Average minutes", before.mean_duration, after.mean_duration),
+        ("GB per minute", before.transfer_rate, after.transfer_rate),
+        ("Peak concurrent VMs", before_timeline.max_concurrent_total, after_timeline.max_concurrent_total),
+        ("Average concurrent VMs", before_timeline.average_concurrent_vms, after_timeline.average_concurrent_vms),
+    ]
+    return {
+        "old": os.fspath(old_path),
+        "new": os.fspath(new_path),
+        "plans": counts,
+        "plan_changes": changes,
+        "completed_vms": completed_vms,
+        "removed_vms": len(old_vms - new_vms),
+        "new_failures": new_failures,
+        "resolved_failures": len(old_failures - _failure_identities(new_plans, keys)),
+        "throughput": throughput,
+    }
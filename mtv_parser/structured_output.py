@@ -0,0 +1,474 @@
+import csv
+import json
+import sys
+from typing import (
+    IO,
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from aggregation import Grouping, Stats, aggregate_plans, aggregate_vms
+from clioutput import CLIOutput
+from failure_index import KIND_NAMES, FailureIndex
+from quantile_sketch import REPORT_QUANTILES
+from timestamps import to_datetime
+from vm_records import VMRecords, as_vm_records
+
+if TYPE_CHECKING:
+    from bandwidth import BandwidthCurves
+
+# (section name, field names, rows with one value per field)
+Section = Tuple[str, Sequence[str], Iterable[Sequence[Any]]]
+# Header of the CSV output: one line per value of a section row
+CSV_FIELDS = ("section", "row", "field", "value")
+
+# Field name and Stats attribute or property of the plan and VM statistics
+MIGRATION_FIELDS = (
+    ("plans", "count"),
+    ("vms", "vms"),
+    ("longest_plan", "longest_name"),
+    ("longest_minutes", "longest"),
+    ("longest_disk_size_gb", "longest_disk_size_gb"),
+    ("longest_transfer_rate", "longest_transfer_rate"),
+    ("shortest_minutes", "shortest"),
+    ("average_minutes", "mean_duration"),
+    ("average_disk_size_gb", "mean_disk_size_gb"),
+    ("average_transfer_rate", "transfer_rate"),
+    ("total_disk_size_gb", "disk_size_gb"),
+)
+BREAKDOWN_FIELDS = (
+    ("vms", "count"),
+    ("failed", "failed"),
+    ("disk_size_gb", "disk_size_gb"),
+    ("average_minutes", "mean_duration"),
+    ("shortest_minutes", "shortest"),
+    ("longest_minutes", "longest"),
+    ("longest_vm", "longest_name"),
+    ("transfer_rate", "transfer_rate"),
+)
+DISK_RATE_FIELDS = ("grouping", "key", "disks") + tuple(f"p{round(q * 100)}_mb_s" for q in REPORT_QUANTILES)
+SIMULATION_MODEL_FIELDS = ("os", "vms", "overhead_minutes", "mb_per_second")
+CRITICAL_PATH_FIELDS = ("name", "plan", "host", "os", "start_time", "end_time", "duration_mins")
+VM_FIELDS = ("name", "plan", "os", "start_time", "end_time", "duration_mins", "failed")
+DIFF_PLAN_FIELDS = ("change", "plan", "namespace", "old_phase", "new_phase")
+DIFF_THROUGHPUT_FIELDS = ("metric", "before", "after", "change")
+FAILURE_BREAKDOWN_FIELDS = ("field", "value", "failed_vms", "critical_plans", "plans", "latest")
+FAILURE_PHASE_OS_FIELDS = ("phase", "os", "failed_vms")
+FAILURE_FIELDS = ("time", "kind", "name", "id", "plan", "os", "namespace", "phases", "conditions", "reasons")
+
+
+def _iso(seconds: Optional[int]) -> Optional[str]:
+    when = to_datetime(seconds)
+    return None if when is None else when.isoformat()
+
+
+def _stats_row(stats: Stats, fields: Sequence[Tuple[str, str]]) -> Tuple[Any, ...]:
+    return tuple(getattr(stats, attribute) for _, attribute in fields)
+
+
+def _bucket_sections(concurrency_data: Dict[str, Any]) -> Iterator[Section]:
+    buckets = concurrency_data.get("concurrency_buckets")
+    if not buckets:
+        # Same fallback as the text report
+        hourly = concurrency_data.get("hourly_concurrent_vms") or []
+        if hourly:
+            yield "concurrency_buckets", ("time", "vms"), ((_iso(data["hour"]), data["vms"]) for data in hourly)
+        return
+    peak = "peak_vms" in buckets[0]
+    yield (
+        "concurrency_buckets",
+        ("time", "vms", "peak_vms") if peak else ("time", "vms"),
+        ((_iso(data["time"]), data["vms"]) + ((data["peak_vms"],) if peak else ()) for data in buckets),
+    )
+    if "os" in buckets[0]:
+        yield (
+            "concurrency_os_buckets",
+            ("time", "os", "vms", "peak_vms") if peak else ("time", "os", "vms"),
+            (
+                (_iso(data["time"]), os_type, count) + ((data["os_peak"][os_type],) if peak else ())
+                for data in buckets
+                for os_type, count in data["os"].items()
+            ),
+        )
+
+
+def report_sections(
+    all_vms: VMRecords,
+    successful_migrations: List[Dict[str, Any]],
+    failed_migrations: List[Dict[str, Any]],
+    concurrency_data: Dict[str, Any],
+    group_by: Sequence[Grouping] = (),
+    bandwidth: Optional["BandwidthCurves"] = None,
+) -> Iterator[Section]:
+    """
+    The report as flat sections of rows for machine readable output.
+
+    Sections and rows are generated lazily, a renderer writing them as they come holds one row at a time.
+
+    Args:
+        all_vms (VMRecords): Migrated VMs.
+        successful_migrations (List[Dict[str, Any]]): Summaries of successful plans.
+        failed_migrations (List[Dict[str, Any]]): Summaries of failed plans.
+        concurrency_data (Dict[str, Any]): Output of analyze_concurrent_migrations.
+        group_by (Sequence[Grouping], optional): Groupings of the VMs to add a "vms_by_<keys>" section for, e.g.
+            "vms_by_provider_and_namespace". Defaults to none.
+        bandwidth (Optional[BandwidthCurves], optional): Transfer bandwidth curves for the "bandwidth" sections.
+            Defaults to None, no bandwidth sections.
+
+    Yields:
+        Section: "migrations", "os", the "vms_by_" sections, "disk_rates", the sections of failure_sections,
+        "concurrency", "concurrency_by_os",
+        "concurrency_drops", "concurrency_buckets", "concurrency_os_buckets" (with --per-os) and the sections of
+        bandwidth_sections.  Times are ISO 8601 in UTC, sizes in GB, durations in minutes, transfer rates in GB
+        per minute and disk transfer rates in MB per second.
+    """
+    all_vms = as_vm_records(all_vms)
+    plan_stats = aggregate_plans(failed_migrations + successful_migrations, [("state",)])[("state",)]
+    yield (
+        "migrations",
+        ("state",) + tuple(field for field, _ in MIGRATION_FIELDS),
+        [(state,) + _stats_row(stats, MIGRATION_FIELDS) for (state,), stats in sorted(plan_stats.items())],
+    )
+    vm_stats = aggregate_vms(all_vms, [("os",), *group_by])
+    yield "os", ("os", "vms", "disk_size_gb"), [
+        (os_name, stats.count, stats.disk_size_gb) for (os_name,), stats in vm_stats[("os",)].items()
+    ]
+    for grouping in group_by:
+        yield (
+            f"vms_by_{'_and_'.join(grouping)}",
+            tuple(grouping) + tuple(field for field, _ in BREAKDOWN_FIELDS),
+            [key + _stats_row(stats, BREAKDOWN_FIELDS) for key, stats in vm_stats[tuple(grouping)].items()],
+        )
+    if len(all_vms.disk_rates):
+        yield "disk_rates", DISK_RATE_FIELDS, [
+            (grouping, key, sketch.n, *sketch.quantiles(REPORT_QUANTILES))
+            for grouping, key, sketch in all_vms.disk_rates.groups()
+        ]
+    if len(all_vms.failures):
+        yield from failure_sections(all_vms.failures)
+    yield from concurrency_sections(concurrency_data)
+    if bandwidth is not None:
+        yield from bandwidth_sections(bandwidth)
+
+
+def failure_sections(failures: FailureIndex) -> Iterator[Section]:
+    """
+    Failure breakdown as flat sections of rows.
+
+    Args:
+        failures (FailureIndex): Failed VMs and plans.
+
+    Yields:
+        Section: "failures_breakdown", failed VMs and plans with Critical conditions per phase, reason and
+        condition, and "failures_by_phase_and_os", failed VMs per phase and OS.
+    """
+    yield "failures_breakdown", FAILURE_BREAKDOWN_FIELDS, (
+        (field, value, vms, plans, plan_count, _iso(latest))
+        for field, value, vms, plans, plan_count, latest in failures.breakdown()
+    )
+    yield "failures_by_phase_and_os", FAILURE_PHASE_OS_FIELDS, failures.cross_counts("phase", "os")
+
+
+def bandwidth_sections(bandwidth: "BandwidthCurves") -> Iterator[Section]:
+    """
+    Transfer bandwidth as flat sections of rows, bandwidths in GB per hour.
+
+    Yields:
+        Section: "bandwidth", "bandwidth_plateaus", "bandwidth_underutilized", "bandwidth_by_os",
+        "bandwidth_by_plan", "bandwidth_buckets", and "bandwidth_os_buckets" and "bandwidth_plan_buckets" over
+        the buckets each OS or plan was active in.
+    """
+    peak, peak_time = bandwidth.peak()
+    yield (
+        "bandwidth",
+        ("peak_gb_per_hour", "peak_time", "average_gb_per_hour", "transferred_gb", "bucket_seconds"),
+        [(peak, _iso(peak_time), bandwidth.average, bandwidth.transferred, bandwidth.width)],
+    )
+    for name, windows in (
+        ("bandwidth_plateaus", bandwidth.plateaus()),
+        ("bandwidth_underutilized", bandwidth.underutilized()),
+    ):
+        yield name, ("start", "end", "average_gb_per_hour"), [
+            (_iso(start), _iso(end), mean) for start, end, mean in windows
+        ]
+    for key in ("os", "plan"):
+        yield f"bandwidth_by_{key}", (key, "peak_gb_per_hour", "peak_time", "transferred_gb"), (
+            (name, group_peak, _iso(when), moved) for name, group_peak, when, moved in bandwidth.group_peaks(key)
+        )
+    yield "bandwidth_buckets", ("time", "gb_per_hour"), (
+        (_iso(start), value) for start, value in zip(bandwidth.times.tolist(), bandwidth.total.tolist())
+    )
+    for key in ("os", "plan"):
+        yield f"bandwidth_{key}_buckets", ("time", key, "gb_per_hour"), (
+            (_iso(start), name, value) for start, name, value in bandwidth.group_buckets(key)
+        )
+
+
+def concurrency_sections(concurrency_data: Dict[str, Any]) -> Iterator[Section]:
+    """The "concurrency" sections of report_sections, none without concurrency data."""
+    if not concurrency_data:
+        return
+    width = concurrency_data.get("bucket_width")
+    yield (
+        "concurrency",
+        ("max_concurrent_vms", "peak_time", "average_concurrent_vms", "bucket_seconds"),
+        [
+            (
+                concurrency_data.get("max_concurrent_total", 0),
+                _iso(concurrency_data.get("peak_time")),
+                concurrency_data.get("average_concurrent_vms", 0),
+                None if width is None else int(width.total_seconds()),
+            )
+        ],
+    )
+    yield "concurrency_by_os", ("os", "max_concurrent_vms"), sorted(concurrency_data.get("max_concurrent", {}).items())
+    yield (
+        "concurrency_drops",
+        ("time", "from_vms", "to_vms", "minutes_after_peak"),
+        (
+            (_iso(drop["time"]), drop["from"], drop["to"], drop["duration_mins"])
+            for drop in concurrency_data.get("significant_drops") or []
+        ),
+    )
+    yield from _bucket_sections(concurrency_data)
+
+
+def simulation_sections(simulation: Dict[str, Any]) -> Iterator[Section]:
+    """
+    A simulated wave as flat sections of rows.
+
+    Args:
+        simulation (Dict[str, Any]): Output of analyze_simulation.
+
+    Yields:
+        Section: "simulation", "simulation_model", "critical_path" and the concurrency sections of
+        report_sections.  Units are those of report_sections, limits are None when unlimited.
+    """
+    from simulation import model_rows
+
+    limits = simulation["limits"]
+    yield (
+        "simulation",
+        ("vms", "start", "end", "makespan_minutes") + tuple(limits),
+        [
+            (simulation["vms"], _iso(simulation["start"]), _iso(simulation["end"]), simulation["makespan_mins"])
+            + tuple(limits.values())
+        ],
+    )
+    yield "simulation_model", SIMULATION_MODEL_FIELDS, model_rows(simulation["model"])
+    yield (
+        "critical_path",
+        CRITICAL_PATH_FIELDS,
+        (
+            (name, plan, host, os_name, _iso(start), _iso(end), duration)
+            for name, plan, host, os_name, start, end, duration in simulation["critical_path"]
+        ),
+    )
+    yield from concurrency_sections(simulation)
+
+
+def diff_sections(changes: Dict[str, Any]) -> Iterator[Section]:
+    """
+    The changes between two dumps as flat sections of rows.
+
+    Args:
+        changes (Dict[str, Any]): Output of diff_dumps.
+
+    Yields:
+        Section: "diff" (counts), "diff_throughput" (old and new versions of the changed plans), "diff_plans"
+        (added, changed and removed plans with their phases), "diff_vms" (VMs migrated since the old dump, see
+        VM_FIELDS) and "diff_failures" (failures since the old dump, see FAILURE_FIELDS).
+    """
+    plans = changes["plans"]
+    yield (
+        "diff",
+        (
+            "old",
+            "new",
+            "plans_unchanged",
+            "plans_added",
+            "plans_changed",
+            "plans_removed",
+            "vms_migrated",
+            "vms_removed",
+            "new_failures",
+            "resolved_failures",
+        ),
+        [
+            (
+                changes["old"],
+                changes["new"],
+                plans["unchanged"],
+                plans["added"],
+                plans["changed"],
+                plans["removed"],
+                len(changes["completed_vms"]),
+                changes["removed_vms"],
+                len(changes["new_failures"]),
+                changes["resolved_failures"],
+            )
+        ],
+    )
+    yield "diff_throughput", DIFF_THROUGHPUT_FIELDS, (
+        (metric, before, after, after - before) for metric, before, after in changes["throughput"]
+    )
+    yield "diff_plans", DIFF_PLAN_FIELDS, changes["plan_changes"]
+    completed_vms = changes["completed_vms"]
+    yield "diff_vms", VM_FIELDS, vm_rows(completed_vms, range(len(completed_vms)))
+    new_failures = changes["new_failures"]
+    yield "diff_failures", FAILURE_FIELDS, failure_rows(new_failures, new_failures.rows())
+
+
+def vm_rows(all_vms: VMRecords, rows: Iterable[int]) -> Iterator[Sequence[Any]]:
+    """Rows of VM_FIELDS for selected VMs, in the order of ``rows``."""
+    all_vms = as_vm_records(all_vms)
+    for index in rows:
+        yield (
+            all_vms.names[index],
+            all_vms.plan_name(index),
+            all_vms.os_name(index),
+            _iso(all_vms.start_times[index]),
+            _iso(all_vms.end_times[index]),
+            all_vms.durations[index],
+            bool(all_vms.failed[index]),
+        )
+
+
+def failure_rows(failures: FailureIndex, rows: Iterable[int]) -> Iterator[Sequence[Any]]:
+    """Rows of FAILURE_FIELDS for selected failures, in the order of ``rows``; several values are joined by "; "."""
+    for index in rows:
+        values: Dict[str, List[str]] = {"phase": [], "condition": [], "plan_condition": [], "reason": []}
+        for field, value in failures.row_terms(index):
+            values[field].append(value)
+        yield (
+            _iso(failures.times[index]),
+            KIND_NAMES[failures.is_plan[index]],
+            failures.names[index],
+            failures.ids[index],
+            failures.plan_names[failures.plan_codes[index]],
+            failures.os_names[failures.os_codes[index]],
+            failures.namespace_names[failures.namespace_codes[index]],
+            "; ".join(values["phase"]),
+            "; ".join(values["condition"] + values["plan_condition"]),
+            "; ".join(values["reason"]),
+        )
+
+
+class StructuredOutput:
+    """
+    Base of the machine readable renderers.  Sections are written to the sink row by row as they are generated
+    and the sink is flushed after each section, nothing is buffered and tabulate is not involved.
+
+    Subclasses implement ``write_section``.  The interface matches the one of CLIOutput used by the commands.
+    """
+
+    def __init__(self, file: Optional[IO[str]] = None) -> None:
+        """
+        Args:
+            file (Optional[IO[str]], optional): Sink. Defaults to None, stdout at the time of writing.
+        """
+        self.file = file
+
+    @property
+    def sink(self) -> IO[str]:
+        return sys.stdout if self.file is None else self.file
+
+    def write_section(self, name: str, fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+        raise NotImplementedError
+
+    def write_sections(self, sections: Iterable[Section]) -> None:
+        """Write the sections of one command one after the other, flushing the sink after each."""
+        for section in sections:
+            self.write_section(*section)
+            self.sink.flush()
+
+    def write_report(
+        self,
+        all_vms: VMRecords,
+        successful_migrations: List[Dict[str, Any]],
+        failed_migrations: List[Dict[str, Any]],
+        concurrency_data: Dict[str, Any],
+        group_by: Sequence[Grouping] = (),
+        bandwidth: Optional["BandwidthCurves"] = None,
+    ) -> None:
+        """Write every section of the report, see report_sections."""
+        self.write_sections(
+            report_sections(all_vms, successful_migrations, failed_migrations, concurrency_data, group_by, bandwidth)
+        )
+
+    def write_simulation(self, simulation: Dict[str, Any]) -> None:
+        """Write a simulated wave, see simulation_sections."""
+        self.write_sections(simulation_sections(simulation))
+
+    def write_diff(self, changes: Dict[str, Any]) -> None:
+        """Write the changes between two dumps, see diff_sections."""
+        self.write_sections(diff_sections(changes))
+
+    def write_vm_table(self, all_vms: VMRecords, rows: Iterable[int], title: str) -> None:
+        """Write selected VMs as a "vms" section.  The title is only used by the text output."""
+        self.write_sections([("vms", VM_FIELDS, vm_rows(all_vms, rows))])
+
+    def write_failure_table(self, failures: FailureIndex, rows: Sequence[int], title: str, count_by: str) -> None:
+        """Write selected failures as a "failures" section and their counts as a "failures_by_<count_by>" section."""
+        self.write_sections(
+            [
+                ("failures", FAILURE_FIELDS, failure_rows(failures, rows)),
+                (f"failures_by_{count_by}", (count_by, "failures"), failures.count_by(rows, count_by).items()),
+            ]
+        )
+
+    def close(self) -> None:
+        self.sink.flush()
+
+
+class JSONLinesOutput(StructuredOutput):
+    """One JSON object per row, with the section name under "section"."""
+
+    def write_section(self, name: str, fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+        sink = self.sink
+        for row in rows:
+            record = {"section": name}
+            record.update(zip(fields, row))
+            sink.write(json.dumps(record))
+            sink.write("\n")
+
+
+class CSVOutput(StructuredOutput):
+    """
+    All the sections of a command as one CSV table in long form, so any CSV reader can load it and every row is
+    written as soon as it is generated.  The header is always CSV_FIELDS: each value of a section row is one line
+    with the section name, the position of the row in its section, the field name and the value.  Fields of
+    different sections never share a column, whatever their names.
+    """
+
+    def __init__(self, file: Optional[IO[str]] = None) -> None:
+        super().__init__(file)
+        self._writer = csv.writer(self.sink, lineterminator="\n")
+        self._header = False
+
+    def _write_header(self) -> None:
+        if not self._header:
+            self._writer.writerow(CSV_FIELDS)
+            self._header = True
+
+    def write_section(self, name: str, fields: Sequence[str], rows: Iterable[Sequence[Any]]) -> None:
+        self._write_header()
+        writerows = self._writer.writerows
+        for number, row in enumerate(rows):
+            writerows((name, number, field, value) for field, value in zip(fields, row))
+
+    def close(self) -> None:
+        # A command without any section still writes a loadable table
+        self._write_header()
+        super().close()
+
+
+# --format choices
+OUTPUT_FORMATS = {"text": CLIOutput, "jsonl": JSONLinesOutput, "csv": CSVOutput}
@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, Union
+
+# Marks a missing time in epoch columns.  It is the int64 value NumPy uses for NaT, so columns viewed as
+# datetime64[s] show missing times as NaT.
+MISSING = -(1 << 63)
+
+# Distinct timestamps remembered by parse_epoch.  Plan level timestamps repeat for every VM of a plan.
+PARSE_CACHE_SIZE = 1 << 16
+
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def parse_epoch(timestamp: str) -> int:
+    """
+    Parse an ISO 8601 timestamp to whole seconds since the Unix epoch.
+
+    Kubernetes writes timestamps with second resolution, fractions of a second are dropped.  Timestamps without
+    an offset are taken as UTC.
+
+    Args:
+        timestamp (str): ISO 8601 timestamp, e.g. "2024-07-01T06:26:11Z".
+
+    Returns:
+        int: Seconds since 1970-01-01 UTC.
+    """
+    when = datetime.fromisoformat(timestamp)
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return int(when.timestamp() // 1)
+
+
+def as_epoch(when: Union[datetime, int, None]) -> int:
+    """
+    Convert a datetime (naive datetimes are taken as UTC) or epoch seconds to epoch seconds.
+
+    Args:
+        when (Union[datetime, int, None]): Time, None for a missing time.
+
+    Returns:
+        int: Seconds since the epoch, MISSING for None.
+    """
+    if when is None:
+        return MISSING
+    if isinstance(when, datetime):
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=timezone.utc)
+        return int(when.timestamp() // 1)
+    return int(when)
+
+
+def to_datetime(seconds: Optional[int], tz: timezone = timezone.utc) -> Optional[datetime]:
+    """
+    Convert epoch seconds back to a datetime, for reports and charts.
+
+    Args:
+        seconds (Optional[int]): Seconds since the epoch, None or MISSING for a missing time.
+        tz (timezone, optional): Timezone of the result. Defaults to UTC.
+
+    Returns:
+        Optional[datetime]: Timezone aware datetime, None for a missing time.
+    """
+    if seconds is None or seconds == MISSING:
+        return None
+    return datetime.fromtimestamp(seconds, tz)
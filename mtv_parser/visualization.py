@@ -1,79 +1,257 @@
-import matplotlib.pyplot as plt
+import heapq
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple
+
+import matplotlib
 import matplotlib.dates as mdates
+import numpy as np
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import PatchCollection
+from matplotlib.figure import Figure
+from matplotlib.patches import Patch, PathPatch
+from matplotlib.path import Path
+from timestamps import MISSING
+from vm_records import VMRecords, as_vm_records
+
+if TYPE_CHECKING:
+    from bandwidth import BandwidthCurves
+
+# Charts with more VMs than this are packed into shared lanes instead of one labelled row per VM
+MAX_LABELLED_VMS = 100
+# Figure size caps in inches
+FIGURE_WIDTH = 12
+MAX_FIGURE_HEIGHT = 30
+MIN_FIGURE_HEIGHT = 3
+BAR_HEIGHT = 0.5
 
-def plot_gantt_chart(data):
+
+def assign_lanes(starts: Sequence[float], ends: Sequence[float]) -> List[int]:
     """
-    Plots a Gantt chart for the given dictionary of tasks.
-    
+    Pack intervals into as few lanes as possible so that intervals sharing a lane never overlap.
+
+    Intervals are visited by start time and put in the lane that frees up first (interval graph greedy colouring),
+    which uses exactly as many lanes as the maximum number of overlapping intervals.
+
     Parameters:
-    - data (dict): A dictionary where each key represents an OS type, and the value is a list of VM dictionaries.
+    - starts (Sequence[float]): Interval starts.
+    - ends (Sequence[float]): Interval ends.
+
+    Returns:
+    - List[int]: Lane of each interval.
+    """
+    lanes = [0] * len(starts)
+    free_at: List[Tuple[float, int]] = []
+    lane_count = 0
+    for index in sorted(range(len(starts)), key=starts.__getitem__):
+        if free_at and free_at[0][0] <= starts[index]:
+            lane = heapq.heappop(free_at)[1]
+        else:
+            lane = lane_count
+            lane_count += 1
+        lanes[index] = lane
+        heapq.heappush(free_at, (ends[index], lane))
+    return lanes
+
+
+def _bar_path(starts: np.ndarray, ends: np.ndarray, rows: np.ndarray, height: float) -> Path:
+    """Build one compound path holding the rectangles of all given bars."""
+    bottoms = rows - height / 2
+    tops = rows + height / 2
+    vertices = np.stack(
+        [
+            np.column_stack([starts, bottoms]),
+            np.column_stack([starts, tops]),
+            np.column_stack([ends, tops]),
+            np.column_stack([ends, bottoms]),
+            np.column_stack([starts, bottoms]),
+        ],
+        axis=1,
+    ).reshape(-1, 2)
+    codes = np.tile([Path.MOVETO, Path.LINETO, Path.LINETO, Path.LINETO, Path.CLOSEPOLY], len(starts))
+    return Path(vertices, codes)
+
+
+def _group_rows(
+    starts: np.ndarray, ends: np.ndarray, group_codes: np.ndarray, group_names: List[str]
+) -> Tuple[np.ndarray, List[float], List[str]]:
+    """
+    Rows of the VMs packed into one band of lanes per group, bands in order of each group's first VM.
+
+    Returns:
+    - Tuple[np.ndarray, List[float], List[str]]: Row of each VM, and the position and label of each band.
+    """
+    rows = np.empty(len(starts), dtype=float)
+    tick_positions: List[float] = []
+    tick_labels: List[str] = []
+    offset = 0
+    # Split the VMs by group with one stable sort, then lay out bands in order of each group's first VM
+    order = np.argsort(group_codes, kind="stable")
+    codes, group_starts, group_sizes = np.unique(group_codes[order], return_index=True, return_counts=True)
+    group_members = {
+        code: order[start : start + size] for code, start, size in zip(codes.tolist(), group_starts, group_sizes)
+    }
+    for code in dict.fromkeys(group_codes.tolist()):
+        members = group_members[code]
+        lanes = np.asarray(assign_lanes(starts[members], ends[members]))
+        rows[members] = offset + lanes
+        band_height = int(lanes.max()) + 1
+        tick_positions.append(offset + (band_height - 1) / 2)
+        tick_labels.append(group_names[code])
+        offset += band_height + 1
+    return rows, tick_positions, tick_labels
+
+
+def _row_layout(
+    data: VMRecords, indexes: List[int], mode: str, starts: np.ndarray, ends: np.ndarray, os_codes: np.ndarray
+) -> Tuple[np.ndarray, List[float], List[str], str]:
+    """
+    Row of each bar for a chart mode.
+
+    Returns:
+    - Tuple[np.ndarray, List[float], List[str], str]: Row of each VM, y tick positions and labels, y-axis label.
+    """
+    if mode == "vm":
+        tick_labels = [f"{data.os_name(index)} - {data.names[index]}" for index in indexes]
+        return np.arange(len(indexes), dtype=float), list(range(len(indexes))), tick_labels, "Tasks"
+    if mode == "lanes":
+        return np.asarray(assign_lanes(starts, ends), dtype=float), [], [], "Lane"
+    if mode == "os":
+        return (*_group_rows(starts, ends, os_codes, data.os_names), "OS")
+    plan_codes = np.asarray([data.plan_codes[index] for index in indexes])
+    return (*_group_rows(starts, ends, plan_codes, data.plan_names), "Plan")
+
+
+def _bar_collection(
+    ax, data: VMRecords, mode: str, starts: np.ndarray, ends: np.ndarray, rows: np.ndarray, os_codes: np.ndarray
+) -> PatchCollection:
     """
-    # Prepare task data
-    all_tasks = []
-    for os_key, tasks in data.items():
-        for task in tasks:
-            all_tasks.append({
-                'label': f"{os_key} - {task['name']}",
-                'start': task['start_time'],
-                'end': task['end_time']
-            })
-    
-    # Sort tasks by start time
-    all_tasks.sort(key=lambda x: x['start'])
-    
-    # Create figure
-    fig, ax = plt.subplots(figsize=(12, len(all_tasks) * 0.5))
-    
-    # Create positions and collect time limits
-    task_labels = []
-    all_starts = []
-    all_ends = []
-    
-    for task in all_tasks:
-        task_labels.append(task['label'])
-        all_starts.append(task['start'])
-        all_ends.append(task['end'])
-    
-    # Convert datetimes to numerical values for plotting
-    start_dates_num = mdates.date2num(all_starts)
-    end_dates_num = mdates.date2num(all_ends)
-    
-    # Calculate durations properly in matplotlib's date units
-    durations = [end - start for start, end in zip(start_dates_num, end_dates_num)]
-    
-    # Plot each task bar
-    for i, (start, duration) in enumerate(zip(start_dates_num, durations)):
-        ax.barh(i, duration, left=start, height=0.5, color='skyblue')
-    
-    # Set y-axis labels
-    ax.set_yticks(range(len(task_labels)))
-    ax.set_yticklabels(task_labels)
-    
-    # Configure x-axis to show times properly
+    One colour per OS, with a legend, except in "vm" mode where rows are labelled.  The bars of each colour form a
+    single compound path and all paths go into one collection, so matplotlib handles a handful of artists no
+    matter how many VMs there are.
+    """
+    if mode == "vm":
+        return PatchCollection(
+            [PathPatch(_bar_path(starts, ends, rows, BAR_HEIGHT), facecolor="skyblue", edgecolor="none")],
+            match_original=True,
+        )
+    palette = matplotlib.colormaps["tab10"]
+    used_codes = sorted(set(os_codes.tolist()))
+    patches = []
+    for code in used_codes:
+        members = os_codes == code
+        patches.append(
+            PathPatch(
+                _bar_path(starts[members], ends[members], rows[members], BAR_HEIGHT),
+                facecolor=palette(code % palette.N),
+                edgecolor="none",
+            )
+        )
+    ax.legend(
+        handles=[Patch(color=palette(code % palette.N), label=data.os_names[code]) for code in used_codes],
+        loc="upper right",
+        fontsize="small",
+    )
+    return PatchCollection(patches, match_original=True)
+
+
+def _format_time_axis(fig: Figure, ax, starts: np.ndarray, ends: np.ndarray) -> None:
+    """Date ticks and limits of the x-axis."""
     ax.xaxis_date()
-    
-    # Format x-axis ticks
-    hours = mdates.HourLocator(interval=1)
-    ax.xaxis.set_major_locator(hours)
-    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-    
-    # Set axis limits properly
-    ax.set_xlim(min(start_dates_num), max(end_dates_num))
-    
+
+    # Hourly ticks for short windows, automatic ticks for migration waves lasting days
+    if ends.max() - starts.min() <= 1:
+        ax.xaxis.set_major_locator(mdates.HourLocator(interval=1))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+    else:
+        locator = mdates.AutoDateLocator()
+        ax.xaxis.set_major_locator(locator)
+        ax.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+
+    ax.set_xlim(starts.min(), ends.max())
     # Rotate tick labels for better readability
     fig.autofmt_xdate(rotation=45)
-    
-    # Add grid lines for readability
-    ax.grid(axis='x', linestyle='-', alpha=0.2)
-    
-    # Labels and title
-    plt.xlabel('Time')
-    plt.ylabel('Tasks')
-    plt.title('Gantt Chart')
-    
-    # Adjust layout
-    plt.tight_layout()
-    
+    ax.grid(axis="x", linestyle="-", alpha=0.2)
+
+
+def _draw_bandwidth(ax, bandwidth: "BandwidthCurves") -> None:
+    """Draw the total bandwidth as a step curve on a second y-axis."""
+    overlay = ax.twinx()
+    times = bandwidth.times
+    # Each bucket's value holds until the end of the bucket
+    edges = mdates.date2num(np.append(times, times[-1] + bandwidth.width).astype("datetime64[s]"))
+    overlay.stairs(bandwidth.total, edges, color="darkred", linewidth=1.2, baseline=None)
+    overlay.set_ylim(bottom=0)
+    overlay.set_ylabel("Bandwidth (GB/hour)", color="darkred")
+    overlay.tick_params(axis="y", colors="darkred")
+
+
+def plot_gantt_chart(
+    data: VMRecords,
+    mode: str = "auto",
+    filename: str = "migration_gantt_chart.png",
+    dpi: int = 300,
+    max_labelled: int = MAX_LABELLED_VMS,
+    bandwidth: Optional["BandwidthCurves"] = None,
+):
+    """
+    Plots a Gantt chart for the given migrated VMs.
+
+    All bars are drawn by one collection and the figure size is capped, so render time and memory stay roughly
+    flat as the number of VMs grows.
+
+    Parameters:
+    - data (VMRecords): Migrated VMs.
+    - mode (str): "vm" draws one labelled row per VM, "lanes" packs non-overlapping VMs into shared lanes,
+      "os" and "plan" pack the VMs of each OS or plan into their own labelled band.  "auto" uses "vm" for up to
+      ``max_labelled`` VMs and "lanes" above that.
+    - filename (str): Output image.
+    - dpi (int): Output resolution.
+    - max_labelled (int): Largest VM count drawn one row per VM in "auto" mode.
+    - bandwidth (Optional[BandwidthCurves]): Transfer bandwidth to draw over the bars as a step curve on a
+      second y-axis, None for no overlay.
+    """
+    data = as_vm_records(data)
+    if mode == "auto":
+        mode = "vm" if len(data) <= max_labelled else "lanes"
+    if mode not in ("vm", "lanes", "os", "plan"):
+        raise ValueError(f"Unknown Gantt chart mode: {mode}")
+
+    # Tasks are ordered by start time, VMs grouped by OS for equal starts
+    indexes = [index for group in data.by_os().values() for index in group if data.start_times[index] != MISSING]
+    indexes.sort(key=data.start_times.__getitem__)
+    if not indexes:
+        return
+    start_dates_num = mdates.date2num(np.array([data.start_times[index] for index in indexes], dtype="datetime64[s]"))
+    end_dates_num = mdates.date2num(np.array([data.end_times[index] for index in indexes], dtype="datetime64[s]"))
+    os_codes = np.asarray([data.os_codes[index] for index in indexes])
+    rows, tick_positions, tick_labels, y_label = _row_layout(
+        data, indexes, mode, start_dates_num, end_dates_num, os_codes
+    )
+
+    row_count = int(rows.max()) + 1
+    # Create the figure on an Agg canvas directly, charts are only written to files so pyplot and whatever
+    # interactive backend it would pick are never loaded
+    fig = Figure(figsize=(FIGURE_WIDTH, min(MAX_FIGURE_HEIGHT, max(MIN_FIGURE_HEIGHT, row_count * 0.5))))
+    FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    bars = _bar_collection(ax, data, mode, start_dates_num, end_dates_num, rows, os_codes)
+
+    # Set y-axis labels when they fit
+    ax.set_ylim(-1, row_count)
+    if tick_labels and len(tick_labels) <= max_labelled:
+        ax.set_yticks(tick_positions)
+        ax.set_yticklabels(tick_labels)
+
+    _format_time_axis(fig, ax, start_dates_num, end_dates_num)
+    ax.set_xlabel("Time")
+    ax.set_ylabel(y_label)
+    ax.set_title("Gantt Chart")
+
+    if bandwidth is not None and len(bandwidth):
+        _draw_bandwidth(ax, bandwidth)
+
+    # Adjust layout.  Bars are added afterwards so the layout pass does not render them a second time.
+    fig.tight_layout()
+    ax.add_collection(bars, autolim=False)
+
     # Save the plot
-    plt.savefig('migration_gantt_chart.png', dpi=300)
-    plt.close()
+    fig.savefig(filename, dpi=dpi)
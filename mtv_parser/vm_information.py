@@ -1,316 +1,473 @@
-from datetime import datetime
+import re
 from datetime import timedelta
-from collections import defaultdict
-from typing import Dict, List, Tuple, Optional, Any, Union
+from typing import Any, Dict, List, Optional, Tuple
 
-def calculate_effective_migration_time(vm: Dict[str, Any], entry: Dict[str, Any]) -> float:
+import numpy as np
+from concurrency import ConcurrencyTimeline
+from failure_index import FailureRecord
+from instrumentation import instrumented, metrics
+from timestamps import parse_epoch
+from vm_records import VMRecord, VMRecords, as_vm_records
+
+# Below this many precopies per plan the per-VM loop is faster than setting up the arrays
+VECTORIZE_MIN_PRECOPIES = 64
+# Disk transfer tasks are named after the disk's datastore path, e.g. "[datastore1] vm/vm.vmdk"
+DATASTORE_PATTERN = re.compile(r"^\[([^\]]+)\]")
+
+
+@instrumented("effective_migration_time", items=lambda _: 1)
+def calculate_effective_migration_time(
+    vm: Dict[str, Any], entry: Dict[str, Any], significant_drop_threshold: float = 0.5
+) -> float:
     """
     Calculate the effective migration time based on when the precopy duration drops significantly.
 
     Args:
         vm (Dict[str, Any]): A dictionary containing VM information.
         entry (Dict[str, Any]): A dictionary containing migration status.
+        significant_drop_threshold (float, optional): Fraction of the first precopy's duration a later precopy
+            has to drop below to end the migration. Defaults to 0.5 (50% drop).
 
     Returns:
         float: The effective migration time in minutes.
     """
-    significant_drop_threshold = 0.5  # 50% drop
-
     # Find all precopies for this VM
     all_precopies = []
     if "warm" in vm and "precopies" in vm["warm"]:
         for precopy in vm["warm"]["precopies"]:
             if "start" in precopy and "end" in precopy:
-                start_time = datetime.fromisoformat(precopy["start"])
-                end_time = datetime.fromisoformat(precopy["end"])
-                duration = (end_time - start_time).total_seconds() / 60  # Minutes
-                all_precopies.append({
-                    "start": start_time,
-                    "end": end_time,
-                    "duration": duration
-                })
-    
+                start_time = parse_epoch(precopy["start"])
+                end_time = parse_epoch(precopy["end"])
+                duration = (end_time - start_time) / 60  # Minutes
+                all_precopies.append({"start": start_time, "end": end_time, "duration": duration})
+
     # Sort precopies by start time
     all_precopies.sort(key=lambda x: x["start"])
-    
+
     if not all_precopies:
         # Fallback to regular migration times if no precopies
-        start = datetime.fromisoformat(entry["status"]["migration"]["started"])
-        end = datetime.fromisoformat(entry["status"]["migration"]["completed"])
-        return (end - start).total_seconds() / 60
-    
+        start = parse_epoch(entry["status"]["migration"]["started"])
+        end = parse_epoch(entry["status"]["migration"]["completed"])
+        return (end - start) / 60
+
     # Get the start time from the first precopy
     migration_start = all_precopies[0]["start"]
-    
+
     # Get the initial duration
     initial_duration = all_precopies[0]["duration"]
-    
+
     # Find when the precopy duration drops significantly
     migration_end = all_precopies[-1]["end"]  # Default to the last precopy
-    
+
     for i in range(1, len(all_precopies)):
         current_duration = all_precopies[i]["duration"]
-        
+
         # If we find a significant drop from the initial duration
         if current_duration < initial_duration * significant_drop_threshold:
             migration_end = all_precopies[i]["end"]
             break
-    
+
     # Calculate effective migration time in minutes
-    effective_minutes = (migration_end - migration_start).total_seconds() / 60
-    
+    effective_minutes = (migration_end - migration_start) / 60
+
+    return effective_minutes
+
+
+def parse_timestamps(timestamps: List[str]) -> np.ndarray:
+    """
+    Parse ISO 8601 timestamps to integer seconds since the Unix epoch.
+
+    UTC timestamps ending in "Z" (what Kubernetes writes) are parsed by NumPy in one call; anything else goes
+    through parse_epoch.
+
+    Args:
+        timestamps (List[str]): ISO 8601 timestamps.
+
+    Returns:
+        np.ndarray: int64 seconds since the epoch.
+    """
+    if all(timestamp.endswith("Z") for timestamp in timestamps):
+        return np.array([timestamp[:-1] for timestamp in timestamps], dtype="datetime64[s]").astype(np.int64)
+    return np.array([parse_epoch(timestamp) for timestamp in timestamps], dtype=np.int64)
+
+
+def collect_precopies(vms: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Flatten the precopies of several VMs into arrays for calculate_effective_migration_times.
+
+    Args:
+        vms (List[Dict[str, Any]]): VMs of a migration (``status.migration.vms``).
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Precopy starts and ends in seconds since the epoch,
+        and per-VM offsets (VM ``i`` owns precopies ``offsets[i]:offsets[i + 1]``).
+    """
+    starts = []
+    ends = []
+    offsets = [0]
+    for vm in vms:
+        for precopy in vm.get("warm", {}).get("precopies", []):
+            if "start" in precopy and "end" in precopy:
+                starts.append(precopy["start"])
+                ends.append(precopy["end"])
+        offsets.append(len(starts))
+    return parse_timestamps(starts), parse_timestamps(ends), np.array(offsets, dtype=np.int64)
+
+
+@instrumented("effective_migration_times_batch", items=len)
+def calculate_effective_migration_times(
+    starts: np.ndarray,
+    ends: np.ndarray,
+    offsets: np.ndarray,
+    fallback_minutes: Any = np.nan,
+    significant_drop_threshold: float = 0.5,
+) -> np.ndarray:
+    """
+    Calculate the effective migration time of many VMs at once.
+
+    Gives the same result as calling calculate_effective_migration_time for every VM: precopies are ordered by
+    start time, and a VM's migration runs from its first precopy start to the end of the first later precopy
+    shorter than ``significant_drop_threshold`` times the first precopy (or to the end of the last precopy).
+
+    Args:
+        starts (np.ndarray): Precopy start times of all VMs, in seconds since the epoch.
+        ends (np.ndarray): Precopy end times, same order as ``starts``.
+        offsets (np.ndarray): VM ``i`` owns precopies ``offsets[i]:offsets[i + 1]``.
+        fallback_minutes (Any, optional): Effective time (scalar or per VM) of VMs without precopies.
+            Defaults to NaN.
+        significant_drop_threshold (float, optional): Drop threshold. Defaults to 0.5 (50% drop).
+
+    Returns:
+        np.ndarray: Effective migration time in minutes per VM.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.asarray(ends, dtype=np.int64)
+    offsets = np.asarray(offsets, dtype=np.int64)
+    counts = np.diff(offsets)
+    effective_minutes = np.empty(len(counts), dtype=np.float64)
+    effective_minutes[:] = fallback_minutes
+    has_precopies = counts > 0
+    if not has_precopies.any():
+        return effective_minutes
+
+    # Order precopies by VM, then start time.  lexsort is stable so equal starts keep their order.
+    vm_of_precopy = np.repeat(np.arange(len(counts)), counts)
+    order = np.lexsort((starts, vm_of_precopy))
+    starts = starts[order]
+    ends = ends[order]
+    durations = (ends - starts) / 60
+
+    first = offsets[:-1][has_precopies]
+    last = offsets[1:][has_precopies] - 1
+    group_counts = counts[has_precopies]
+    initial = np.repeat(durations[first], group_counts)
+    position = np.arange(len(starts))
+    drops = (durations < initial * significant_drop_threshold) & (position != np.repeat(first, group_counts))
+    first_drop = np.minimum.reduceat(np.where(drops, position, len(starts)), first)
+    migration_end = np.where(first_drop < len(starts), first_drop, last)
+
+    effective_minutes[has_precopies] = (ends[migration_end] - starts[first]) / 60
     return effective_minutes
 
 
-def extract_vm_information(vm: Dict[str, Any]) -> Dict[str, Dict[str, Union[int, timedelta]]]:
+def calculate_plan_effective_migration_times(
+    entry: Dict[str, Any], significant_drop_threshold: float = 0.5
+) -> List[float]:
     """
-    Calculate the total disk size for a migration plan.
+    Calculate the effective migration time of every VM of a plan.
+
+    Plans with many precopies go through the vectorized calculate_effective_migration_times, others through
+    calculate_effective_migration_time per VM where the array setup would cost more than it saves.
+
+    Args:
+        entry (Dict[str, Any]): A plan (``items[]`` entry of a plan dump).
+        significant_drop_threshold (float, optional): Drop threshold. Defaults to 0.5 (50% drop).
+
+    Returns:
+        List[float]: Effective migration time in minutes per VM of ``status.migration.vms``.
+    """
+    vms = entry["status"]["migration"]["vms"]
+    precopies = sum(len(vm.get("warm", {}).get("precopies", [])) for vm in vms)
+    if precopies < VECTORIZE_MIN_PRECOPIES:
+        return [calculate_effective_migration_time(vm, entry, significant_drop_threshold) for vm in vms]
+
+    starts, ends, offsets = collect_precopies(vms)
+    fallback = np.nan
+    if np.any(np.diff(offsets) == 0):
+        start = parse_epoch(entry["status"]["migration"]["started"])
+        end = parse_epoch(entry["status"]["migration"]["completed"])
+        fallback = (end - start) / 60
+    return calculate_effective_migration_times(starts, ends, offsets, fallback, significant_drop_threshold).tolist()
+
+
+def extract_vm_information(
+    vm: Dict[str, Any], plan_name: str = "", namespace: str = "", target_namespace: str = "", provider: str = ""
+) -> VMRecord:
+    """
+    Calculate the total disk size and disk transfer window of a migrated VM.
 
     Args:
         vm (Dict[str, Any]): A dictionary containing VM information.
+        plan_name (str, optional): Name of the plan that migrated the VM. Defaults to "".
+        namespace (str, optional): Namespace of the plan. Defaults to "".
+        target_namespace (str, optional): Namespace the plan migrates to. Defaults to "".
+        provider (str, optional): Source provider of the plan. Defaults to "".
 
     Returns:
-        Dict[str, Dict[str, Union[int, timedelta]]]: A dictionary with disk size and transfer details.
+        VMRecord: The VM with its disk size, transfer start and transfer duration in minutes, and the datastore
+        and transfer rate in MB/s of each of its disk transfer tasks.
     """
     total_disk_size = 0
-    total_disk_transfer_time = timedelta(seconds=0)
-    disk_transfer_start_time = timedelta(seconds=0)
-    vm_information = {}
-    # for vm in entry["status"]["migration"]["vms"]:
-    os_name = vm.get('operatingSystem', "unknown")
-    vm_name = vm.get('name')
+    total_disk_transfer_seconds = 0
+    disk_transfer_start_time = None
+    disk_transfer_end_time = None
+    os_name = vm.get("operatingSystem", "unknown")
+    vm_name = vm.get("name")
+    disk_tasks = []
 
     for phase in vm["pipeline"]:
         if phase["name"] == "DiskTransfer" and "progress" in phase and "total" in phase["progress"]:
             total_disk_size += phase["progress"]["total"]
-            disk_transfer_start_time = datetime.fromisoformat(phase['started'])
-            disk_transfer_end_time = datetime.fromisoformat(phase["completed"])
-            total_disk_transfer_time = disk_transfer_end_time - disk_transfer_start_time
-    vm_information.update({os_name: {'name': vm_name, 'disk_size': total_disk_size, 
-                                        'start_time': disk_transfer_start_time,
-                                        'duration': total_disk_transfer_time.total_seconds() /60}})
-    return vm_information
+            disk_transfer_start_time = parse_epoch(phase["started"])
+            disk_transfer_end_time = parse_epoch(phase["completed"])
+            total_disk_transfer_seconds = disk_transfer_end_time - disk_transfer_start_time
+            for task in phase.get("tasks") or ():
+                if "started" not in task or "completed" not in task or "total" not in task.get("progress", {}):
+                    continue
+                seconds = parse_epoch(task["completed"]) - parse_epoch(task["started"])
+                if seconds > 0:
+                    datastore = DATASTORE_PATTERN.match(task.get("name", ""))
+                    disk_tasks.append(
+                        (datastore.group(1) if datastore else "unknown", task["progress"]["total"] / seconds)
+                    )
+    vms_failed = any(condition["type"] != "Succeeded" for condition in vm.get("conditions", []))
+    return VMRecord(
+        vm_name,
+        os_name,
+        plan_name,
+        total_disk_size,
+        disk_transfer_start_time,
+        disk_transfer_end_time,
+        total_disk_transfer_seconds / 60,
+        vms_failed,
+        namespace,
+        target_namespace,
+        provider,
+        tuple(disk_tasks),
+    )
 
 
-def sort_migration_events(all_vms: Dict[str, List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+@instrumented("summarize_plan", items=lambda summary: len(summary[0]) if summary else 0)
+def summarize_plan(entry: Dict[str, Any]) -> Optional[Tuple[List[VMRecord], Dict[str, Any]]]:
     """
-    Sort migration events by start time.
+    Derive the migrated VMs and the migration summary of a plan.
 
     Args:
-        all_vms (Dict[str, List[Dict[str, Any]]]): A dictionary of VMs with their migration details.
+        entry (Dict[str, Any]): A plan (``items[]`` entry of a plan dump).
 
     Returns:
-        List[Dict[str, Any]]: A list of sorted migration events.
+        Optional[Tuple[List[VMRecord], Dict[str, Any]]]: The VMs with a disk transfer and an effective duration,
+        and the plan summary used by the migration report.  None if the plan's migration has not completed.
     """
-    events = []
-    
-    # Process the all_vms dictionary
-    for os_type, vms in all_vms.items():
-        for vm in vms:
-            vm_name = vm['name']
-            # Extract start time and calculate end time
-            start_time = vm.get('start_time')
-            transfer_time_minutes = vm.get('duration')
-            
-            # Skip if we don't have the necessary time data
-            if not start_time or not transfer_time_minutes:
-                continue
-                
-            # Calculate end time by adding transfer time (in minutes) to start time
-            end_time = start_time + timedelta(minutes=transfer_time_minutes)
-            
-            # Add a single event with both start and end times
-            events.append({
-                "time": start_time,
-                "type": "start",
-                "os": os_type,
-                "name": vm_name,
-                "duration": transfer_time_minutes
-            })
-            events.append({
-                "time": end_time,
-                "type": "end",
-                "os": os_type,
-                "name": vm_name,
-                "duration": transfer_time_minutes
-            })
-    
-    # Sort events by start time
-    events.sort(key=lambda x: x["time"])
-    return events
-
-def create_timeline(event_list: List[Dict[str, Any]], concurrent_counts: Dict[str, int], 
-                    current_vms: Dict[str, List[str]], max_concurrent: Dict[str, int]) -> Tuple[List[Dict[str, Any]], int, Optional[datetime], float, float]:
+    migration = entry["status"]["migration"]
+    if "completed" not in migration.keys() or not migration.get("vms"):
+        return None
+
+    plan_name = entry["metadata"]["name"]
+    namespace = entry["metadata"].get("namespace") or ""
+    spec = entry["spec"]
+    target_namespace = spec.get("targetNamespace") or ""
+    provider = ((spec.get("provider") or {}).get("source") or {}).get("name") or ""
+    number_of_vms = len(entry["spec"]["vms"])
+    total_disk_for_current_migration = 0
+    vm_records = []
+    for vms, effective_duration in zip(migration["vms"], calculate_plan_effective_migration_times(entry)):
+        vm_record = extract_vm_information(vms, plan_name, namespace, target_namespace, provider)
+        total_disk_for_current_migration += vm_record.disk_size
+        transfer_start = vm_record.start_time
+        if transfer_start and effective_duration:
+            vm_record.duration = effective_duration
+            vm_record.end_time = transfer_start + round(effective_duration * 60)
+            vm_records.append(vm_record)
+
+    # The plan reports the duration and failure state of its last VM
+    migration_dict = {
+        "name": plan_name,
+        "total_duration_mins": effective_duration,
+        "vms": number_of_vms,
+        "vms_failed": f"{vm_record.failed}",
+        "total_disk_size": total_disk_for_current_migration,
+        "duration": effective_duration,
+        "start_time": vm_record.start_time,
+        "namespace": namespace,
+        "target_namespace": target_namespace,
+        "provider": provider,
+    }
+    return vm_records, migration_dict
+
+
+def _condition_time(conditions: List[Dict[str, Any]]) -> Optional[int]:
+    times = [
+        parse_epoch(condition["lastTransitionTime"]) for condition in conditions if condition.get("lastTransitionTime")
+    ]
+    return max(times) if times else None
+
+
+@instrumented("plan_failures", items=len)
+def plan_failures(entry: Dict[str, Any]) -> List[FailureRecord]:
     """
-    Create a timeline of migration events and track concurrent migrations.
+    Derive the failed VMs of a plan and the plan itself if it has Critical conditions, for the failure index.
+
+    A VM is indexed by the phase and reasons of its error and by the type and reason of its conditions that are
+    not Succeeded.  The plan is indexed by the type and reason of its Critical conditions (VMNotFound,
+    StorageMapNotReady, ...), which keep a plan from running, so plans are indexed whether or not their
+    migration completed.
 
     Args:
-        event_list (List[Dict[str, Any]]): A list of sorted migration events.
-        concurrent_counts (Dict[str, int]): A dictionary to track concurrent counts by OS.
-        current_vms (Dict[str, List[str]]): A dictionary to track currently migrating VMs by OS.
-        max_concurrent (Dict[str, int]): A dictionary to track maximum concurrent migrations by OS.
+        entry (Dict[str, Any]): A plan (``items[]`` entry of a plan dump).
 
     Returns:
-        Tuple[List[Dict[str, Any]], int, Optional[datetime], float, float]: A tuple containing the timeline, max concurrent total, peak time, total VM minutes, and total duration minutes.
+        List[FailureRecord]: The plan first if it has Critical conditions, then its failed VMs.
     """
-    total_vm_minutes = 0
-    total_duration_minutes = 0
-    peak_time = None
-    max_concurrent_total = 0
-    temp_list = []
-    for event in event_list:
-        os_type = event["os"]
-        event_time = event["time"]
-        
-        duration_minutes = event['duration']
-        current_vms_count = sum(concurrent_counts.values())
-        total_vm_minutes += current_vms_count * duration_minutes
-        total_duration_minutes += duration_minutes
-        
-        if event["type"] == "start":
-            concurrent_counts[os_type] += 1
-            current_vms[os_type].append(event["name"])
-        else:  # end event
-            concurrent_counts[os_type] -= 1
-            if event["name"] in current_vms[os_type]:
-                current_vms[os_type].remove(event["name"])
-        
-        # Update maximum concurrency for this OS type
-        max_concurrent[os_type] = max(max_concurrent[os_type], concurrent_counts[os_type])
-        
-        # Calculate total concurrent VMs across all OS types
-        total_concurrent = sum(concurrent_counts.values())
-        
-        # Update overall peak concurrency
-        if total_concurrent > max_concurrent_total:
-            max_concurrent_total = total_concurrent
-            peak_time = event_time
-        
-        # Record the state at this point in time
-        timeline_point = {
-            "time": event_time,
-            "concurrent_counts": dict(concurrent_counts),
-            "current_vms": {k: list(v) for k, v in current_vms.items()},
-            "total_concurrent": total_concurrent
-        }
-        temp_list.append(timeline_point)
-    return(temp_list, max_concurrent_total, peak_time, total_vm_minutes, total_duration_minutes)
+    metadata = entry["metadata"]
+    plan_name = metadata["name"]
+    namespace = metadata.get("namespace") or ""
+    status = entry.get("status") or {}
+    migration = status.get("migration") or {}
+    failures = []
+
+    critical = [condition for condition in status.get("conditions") or () if condition.get("category") == "Critical"]
+    if critical:
+        terms = []
+        for condition in critical:
+            terms.append(("plan_condition", condition["type"]))
+            if condition.get("reason"):
+                terms.append(("reason", condition["reason"]))
+        failures.append(
+            FailureRecord(
+                plan_name,
+                metadata.get("uid") or "",
+                plan_name,
+                "",
+                namespace,
+                _condition_time(critical),
+                True,
+                tuple(terms),
+            )
+        )
+
+    for vm in migration.get("vms") or ():
+        error = vm.get("error") or {}
+        failed = [condition for condition in vm.get("conditions") or () if condition["type"] != "Succeeded"]
+        if not error and not failed:
+            continue
+        terms = []
+        if error.get("phase"):
+            terms.append(("phase", error["phase"]))
+        terms.extend(("reason", reason) for reason in error.get("reasons") or ())
+        for condition in failed:
+            terms.append(("condition", condition["type"]))
+            if condition.get("reason"):
+                terms.append(("reason", condition["reason"]))
+        ended = vm.get("completed") or vm.get("started") or migration.get("completed") or migration.get("started")
+        failures.append(
+            FailureRecord(
+                vm.get("name") or "",
+                vm.get("id") or "",
+                plan_name,
+                vm.get("operatingSystem", "unknown"),
+                namespace,
+                parse_epoch(ended) if ended else _condition_time(failed),
+                False,
+                tuple(terms),
+            )
+        )
+    return failures
 
-def significant_drops(timeline_data: List[Dict[str, Any]], peak_time: Optional[datetime], max_concurrent_total: int) -> List[Dict[str, Any]]:
+
+def significant_drops(
+    timeline: ConcurrencyTimeline, peak_time: Optional[int], max_concurrent_total: int
+) -> List[Dict[str, Any]]:
     """
     Identify significant drops in concurrent migrations after the peak.
 
     Args:
-        timeline_data (List[Dict[str, Any]]): A list of timeline points.
-        peak_time (Optional[datetime]): The time of the peak concurrency.
+        timeline (ConcurrencyTimeline): The concurrency timeline.
+        peak_time (Optional[int]): The time of the peak concurrency in epoch seconds.
         max_concurrent_total (int): The maximum total concurrency.
 
     Returns:
-        List[Dict[str, Any]]: A list of significant drops.
+        List[Dict[str, Any]]: A list of significant drops, times in epoch seconds.
     """
     drop_threshold = 0.5  # 50% drop
     drop_list = []
-    for i in range(1, len(timeline_data)):
-        prev_count = timeline_data[i-1]["total_concurrent"]
-        curr_count = timeline_data[i]["total_concurrent"]
-        
+    totals = timeline.totals
+    for i in range(1, len(totals)):
+        prev_count = totals[i - 1]
+        curr_count = totals[i]
+
         # Only consider significant drops from near-peak levels
         if prev_count > max_concurrent_total * 0.8 and curr_count < prev_count * (1 - drop_threshold):
-            minutes_after_peak = (timeline_data[i]["time"] - peak_time).total_seconds() / 60 if peak_time else 0
-            drop_list.append({
-                "time": timeline_data[i]["time"],
-                "from": prev_count,
-                "to": curr_count,
-                "duration_mins": minutes_after_peak
-            })
+            minutes_after_peak = (timeline.times[i] - peak_time) / 60 if peak_time is not None else 0
+            drop_list.append(
+                {"time": timeline.times[i], "from": prev_count, "to": curr_count, "duration_mins": minutes_after_peak}
+            )
     return drop_list
 
-def get_hourly_counts(hourly_snapshots: List[datetime], timeline_data: List[Dict[str, Any]]) -> Dict[datetime, int]:
-    """
-    Calculate the number of concurrent migrations at each hour.
-
-    Args:
-        hourly_snapshots (List[datetime]): A list of hourly timestamps.
-        timeline_data (List[Dict[str, Any]]): A list of timeline points.
 
-    Returns:
-        Dict[datetime, int]: A dictionary mapping each hour to the number of concurrent migrations.
-    """
-    hourly_counts = {}
-    for hour in hourly_snapshots:
-        # Find the last event before this hour
-        last_event_before = None
-        for event_data in timeline_data:
-            if event_data["time"] <= hour:
-                last_event_before = event_data
-            else:
-                break
-        
-        if last_event_before:
-            hourly_counts[hour] = last_event_before["total_concurrent"]
-        else:
-            hourly_counts[hour] = 0
-    return hourly_counts
-
-def analyze_concurrent_migrations(all_vms: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+@instrumented("analyze_concurrent_migrations")
+def analyze_concurrent_migrations(
+    all_vms: VMRecords, bucket_width: timedelta = timedelta(hours=1), per_os: bool = False, bucket_peak: bool = False
+) -> Dict[str, Any]:
     """
     Analyze concurrent VM migrations based on transfer start times and durations.
 
     Args:
-        all_vms (Dict[str, List[Dict[str, Any]]]): A dictionary of VMs with their migration details.
+        all_vms (VMRecords): Migrated VMs.
+        bucket_width (timedelta, optional): Resolution of the bucketed concurrency series. Defaults to one hour.
+        per_os (bool, optional): Include per-OS counts in the bucketed series. Defaults to False.
+        bucket_peak (bool, optional): Include the peak inside each bucket in the bucketed series. Defaults to False.
 
     Returns:
-        Dict[str, Any]: A dictionary containing analysis results.
+        Dict[str, Any]: A dictionary containing analysis results.  Times are epoch seconds, the report converts
+        them to datetimes.
     """
-    # Create a list to store all VM migration events
-    events = sort_migration_events(all_vms)
+    # Build the sweep-line timeline of all start and end events
+    with metrics.stage("concurrency_timeline") as stage:
+        timeline = ConcurrencyTimeline(as_vm_records(all_vms))
+        stage.add_items(len(timeline))
     # No events? Return empty data
-    if not events:
+    if not len(timeline):
         return {
             "max_concurrent": {},
             "max_concurrent_total": 0,
-            "timeline": [],
+            "timeline": timeline,
             "average_concurrent_vms": 0,
-            "hourly_concurrent_vms": []
+            "hourly_concurrent_vms": [],
+            "bucket_width": bucket_width,
+            "concurrency_buckets": [],
         }
-    
-    # Track concurrent migrations
-    concurrent_counts = defaultdict(int)
-    max_concurrent = defaultdict(int)
-    current_vms = defaultdict(list)
-    timeline_data = []
-        
-    # Get the start and end time range for hourly calculations
-    start_time = events[0]["time"]
-    end_time = events[-1]["time"]
-    
-    # Calculate hourly snapshots
-    hourly_snapshots = []
-    current_hour = start_time.replace(minute=0, second=0, microsecond=0)
-    
-    while current_hour <= end_time:
-        hourly_snapshots.append(current_hour)
-        current_hour += timedelta(hours=1)
-    
-    total_duration_minutes = 0
-    
-    # Process events in chronological order
-    timeline_data, max_concurrent_total, peak_time, total_vm_minutes, total_duration_minutes = create_timeline(events, concurrent_counts, current_vms, max_concurrent)
-    # Calculate average concurrent VMs
-    avg_concurrent_vms = round(total_vm_minutes / total_duration_minutes, 2) if total_duration_minutes > 0 else 0
-    
-    # Calculate VM count at each hourly snapshot
-    hourly_counts = get_hourly_counts(hourly_snapshots, timeline_data)
-    
+
+    max_concurrent_total = timeline.max_concurrent_total
+    peak_time = timeline.peak_time
+
+    # Calculate the VM count for every bucket between the first and the last event
+    with metrics.stage("concurrency_buckets") as stage:
+        concurrency_buckets = timeline.buckets(bucket_width, per_os=per_os, peak=bucket_peak)
+        hourly_buckets = concurrency_buckets if bucket_width == timedelta(hours=1) else timeline.buckets()
+        stage.add_items(len(concurrency_buckets))
+
     # Format hourly data for report
-    hourly_concurrent_vms = [{"hour": hour, "vms": count} for hour, count in sorted(hourly_counts.items())]    
-    
+    hourly_concurrent_vms = [{"hour": bucket["time"], "vms": bucket["vms"]} for bucket in hourly_buckets]
+
     return {
-        "max_concurrent": dict(max_concurrent),
+        "max_concurrent": timeline.max_concurrent,
         "max_concurrent_total": max_concurrent_total,
         "peak_time": peak_time,
-        "average_concurrent_vms": avg_concurrent_vms,
-        "timeline": timeline_data,
-        "significant_drops": significant_drops(timeline_data, peak_time, max_concurrent_total),
-        "hourly_concurrent_vms": hourly_concurrent_vms
+        "average_concurrent_vms": timeline.average_concurrent_vms,
+        "timeline": timeline,
+        "significant_drops": significant_drops(timeline, peak_time, max_concurrent_total),
+        "hourly_concurrent_vms": hourly_concurrent_vms,
+        "bucket_width": bucket_width,
+        "concurrency_buckets": concurrency_buckets,
     }
@@ -0,0 +1,492 @@
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
+
+from failure_index import FailureIndex
+from quantile_sketch import DiskRateSketches
+from timestamps import MISSING, as_epoch
+
+# Columns interned to integer codes, see VMRecords.labels
+LABEL_KEYS = ("os", "plan", "namespace", "target_namespace", "provider")
+
+
+class VMRecord:
+    """
+    A single migrated VM.
+
+    Attributes:
+        name (str): VM name.
+        os (str): Operating system reported by the migration, "unknown" if not reported.
+        plan (str): Name of the plan that migrated the VM.
+        disk_size (int): Total transferred disk size in MB.
+        start_time (Optional[int]): Start of the disk transfer in seconds since the Unix epoch.
+        end_time (Optional[int]): End of the effective migration in seconds since the Unix epoch.
+        duration (float): Effective migration time in minutes.
+        failed (bool): True if any of the VM's conditions is not Succeeded.
+        namespace (str): Namespace of the plan.
+        target_namespace (str): Namespace the VM was migrated to.
+        provider (str): Name of the plan's source provider.
+        disk_tasks (Tuple[Tuple[str, float], ...]): Datastore and transfer rate in MB/s of each disk transfer task.
+    """
+
+    __slots__ = (
+        "name",
+        "os",
+        "plan",
+        "disk_size",
+        "start_time",
+        "end_time",
+        "duration",
+        "failed",
+        "namespace",
+        "target_namespace",
+        "provider",
+        "disk_tasks",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        os: str = "unknown",
+        plan: str = "",
+        disk_size: int = 0,
+        start_time: Optional[int] = None,
+        end_time: Optional[int] = None,
+        duration: float = 0.0,
+        failed: bool = False,
+        namespace: str = "",
+        target_namespace: str = "",
+        provider: str = "",
+        disk_tasks: Tuple[Tuple[str, float], ...] = (),
+    ) -> None:
+        self.name = name
+        self.os = os
+        self.plan = plan
+        self.disk_size = disk_size
+        self.start_time = start_time
+        self.end_time = end_time
+        self.duration = duration
+        self.failed = failed
+        self.namespace = namespace
+        self.target_namespace = target_namespace
+        self.provider = provider
+        self.disk_tasks = disk_tasks
+
+    def __repr__(self) -> str:
+        return (
+            f"VMRecord(name={self.name!r}, os={self.os!r}, plan={self.plan!r}, disk_size={self.disk_size}, "
+            f"start_time={self.start_time!r}, end_time={self.end_time!r}, duration={self.duration}, "
+            f"failed={self.failed}, namespace={self.namespace!r}, target_namespace={self.target_namespace!r}, "
+            f"provider={self.provider!r}, disk_tasks={self.disk_tasks!r})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, VMRecord):
+            return NotImplemented
+        return all(getattr(self, slot) == getattr(other, slot) for slot in self.__slots__)
+
+
+class VMRecords:
+    """
+    Columnar container of migrated VMs.
+
+    Numeric columns are stored in typed arrays and the OS, plan, namespace, target namespace, provider and
+    datastore names are interned to integer codes, so a record costs a few dozen bytes instead of a dict per VM.  Times are int64
+    seconds since the Unix epoch, MISSING for a missing time.  Rows keep insertion order.
+
+    The per-disk transfer tasks are not kept as rows, their rates are summarized in the ``disk_rates`` quantile
+    sketches as VMs are added and only the datastore of the first one is kept per VM.  Failed VMs and plans that cannot run are indexed in ``failures`` as plans are
+    read, including VMs that never transferred a disk and so have no row here.
+    """
+
+    def __init__(self) -> None:
+        self.names: List[str] = []
+        self.os_names: List[str] = []
+        self.os_codes = array("L")
+        self.plan_names: List[str] = []
+        self.plan_codes = array("L")
+        self.disk_sizes = array("q")
+        self.start_times = array("q")
+        self.end_times = array("q")
+        self.durations = array("d")
+        self.failed = array("b")
+        self.namespace_names: List[str] = []
+        self.namespace_codes = array("L")
+        self.target_namespace_names: List[str] = []
+        self.target_namespace_codes = array("L")
+        self.provider_names: List[str] = []
+        self.provider_codes = array("L")
+        self.datastore_names: List[str] = []
+        self.datastore_codes = array("L")
+        self._os_index: Dict[str, int] = {}
+        self._plan_index: Dict[str, int] = {}
+        self._namespace_index: Dict[str, int] = {}
+        self._target_namespace_index: Dict[str, int] = {}
+        self._provider_index: Dict[str, int] = {}
+        self._datastore_index: Dict[str, int] = {}
+        self.disk_rates = DiskRateSketches()
+        self.failures = FailureIndex()
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def __getitem__(self, index: int) -> VMRecord:
+        start_time, end_time = self.start_times[index], self.end_times[index]
+        return VMRecord(
+            self.names[index],
+            self.os_names[self.os_codes[index]],
+            self.plan_names[self.plan_codes[index]],
+            self.disk_sizes[index],
+            None if start_time == MISSING else start_time,
+            None if end_time == MISSING else end_time,
+            self.durations[index],
+            bool(self.failed[index]),
+            self.namespace_names[self.namespace_codes[index]],
+            self.target_namespace_names[self.target_namespace_codes[index]],
+            self.provider_names[self.provider_codes[index]],
+        )
+
+    def __iter__(self) -> Iterator[VMRecord]:
+        for index in range(len(self)):
+            yield self[index]
+
+    @staticmethod
+    def _intern(value: str, names: List[str], index: Dict[str, int]) -> int:
+        code = index.get(value)
+        if code is None:
+            code = index[value] = len(names)
+            names.append(value)
+        return code
+
+    def add(
+        self,
+        name: str,
+        os: str,
+        plan: str,
+        disk_size: int,
+        start_time: Optional[int],
+        duration: float,
+        failed: bool = False,
+        end_time: Optional[int] = None,
+        namespace: str = "",
+        target_namespace: str = "",
+        provider: str = "",
+        disk_tasks: Iterable[Sequence[Any]] = (),
+    ) -> None:
+        """
+        Append a VM.
+
+        Args:
+            name (str): VM name.
+            os (str): Operating system name.
+            plan (str): Plan name.
+            disk_size (int): Total disk size in MB.
+            start_time (Optional[int]): Start of the disk transfer in epoch seconds.
+            duration (float): Effective migration time in minutes.
+            failed (bool, optional): VM migration failed. Defaults to False.
+            end_time (Optional[int], optional): End of the migration in epoch seconds. Defaults to start_time +
+                duration.
+            namespace (str, optional): Namespace of the plan. Defaults to "".
+            target_namespace (str, optional): Namespace the VM was migrated to. Defaults to "".
+            provider (str, optional): Source provider of the plan. Defaults to "".
+            disk_tasks (Iterable[Sequence[Any]], optional): (datastore, MB/s) of each disk transfer task, added
+                to ``disk_rates``. The first one's datastore is the VM's. Defaults to none, datastore "".
+        """
+        disk_tasks = tuple(disk_tasks)
+        if start_time is None:
+            start_time = MISSING
+        if end_time is None:
+            end_time = MISSING if start_time == MISSING else start_time + round(duration * 60)
+        self.names.append(name)
+        self.os_codes.append(self._intern(os, self.os_names, self._os_index))
+        self.plan_codes.append(self._intern(plan, self.plan_names, self._plan_index))
+        self.disk_sizes.append(disk_size)
+        self.start_times.append(start_time)
+        self.end_times.append(end_time)
+        self.durations.append(duration)
+        self.failed.append(failed)
+        self.namespace_codes.append(self._intern(namespace, self.namespace_names, self._namespace_index))
+        self.target_namespace_codes.append(
+            self._intern(target_namespace, self.target_namespace_names, self._target_namespace_index)
+        )
+        self.provider_codes.append(self._intern(provider, self.provider_names, self._provider_index))
+        self.datastore_codes.append(
+            self._intern(disk_tasks[0][0] if disk_tasks else "", self.datastore_names, self._datastore_index)
+        )
+        self.disk_rates.add_tasks(os, disk_tasks)
+
+    def append(self, record: VMRecord) -> None:
+        """
+        Append a VMRecord.
+
+        Args:
+            record (VMRecord): record to append.
+        """
+        self.add(
+            record.name,
+            record.os,
+            record.plan,
+            record.disk_size,
+            record.start_time,
+            record.duration,
+            record.failed,
+            record.end_time,
+            record.namespace,
+            record.target_namespace,
+            record.provider,
+            record.disk_tasks,
+        )
+
+    def extend(self, records: Iterable[VMRecord]) -> None:
+        """
+        Append every record of another container or iterable of VMRecord.
+
+        Args:
+            records (Iterable[VMRecord]): records to append.
+        """
+        if not isinstance(records, VMRecords):
+            for record in records:
+                self.append(record)
+            return
+
+        # Merge column by column, re-interning the other container's name codes
+        os_map = [self._intern(os_name, self.os_names, self._os_index) for os_name in records.os_names]
+        plan_map = [self._intern(plan, self.plan_names, self._plan_index) for plan in records.plan_names]
+        namespace_map = [
+            self._intern(namespace, self.namespace_names, self._namespace_index)
+            for namespace in records.namespace_names
+        ]
+        target_namespace_map = [
+            self._intern(namespace, self.target_namespace_names, self._target_namespace_index)
+            for namespace in records.target_namespace_names
+        ]
+        provider_map = [
+            self._intern(provider, self.provider_names, self._provider_index) for provider in records.provider_names
+        ]
+        datastore_map = [
+            self._intern(datastore, self.datastore_names, self._datastore_index)
+            for datastore in records.datastore_names
+        ]
+        self.names.extend(records.names)
+        self.os_codes.extend(os_map[code] for code in records.os_codes)
+        self.plan_codes.extend(plan_map[code] for code in records.plan_codes)
+        self.disk_sizes.extend(records.disk_sizes)
+        self.start_times.extend(records.start_times)
+        self.end_times.extend(records.end_times)
+        self.durations.extend(records.durations)
+        self.failed.extend(records.failed)
+        self.namespace_codes.extend(namespace_map[code] for code in records.namespace_codes)
+        self.target_namespace_codes.extend(target_namespace_map[code] for code in records.target_namespace_codes)
+        self.provider_codes.extend(provider_map[code] for code in records.provider_codes)
+        self.datastore_codes.extend(datastore_map[code] for code in records.datastore_codes)
+        self.disk_rates.merge(records.disk_rates)
+        self.failures.extend(records.failures)
+
+    def os_name(self, index: int) -> str:
+        return self.os_names[self.os_codes[index]]
+
+    def plan_name(self, index: int) -> str:
+        return self.plan_names[self.plan_codes[index]]
+
+    def namespace_name(self, index: int) -> str:
+        return self.namespace_names[self.namespace_codes[index]]
+
+    def target_namespace_name(self, index: int) -> str:
+        return self.target_namespace_names[self.target_namespace_codes[index]]
+
+    def provider_name(self, index: int) -> str:
+        return self.provider_names[self.provider_codes[index]]
+
+    def datastore_name(self, index: int) -> str:
+        return self.datastore_names[self.datastore_codes[index]]
+
+    def labels(self, key: str) -> Tuple[List[str], array]:
+        """
+        Distinct names and per-VM codes of one of the interned columns.
+
+        Args:
+            key (str): "os", "plan", "namespace", "target_namespace" or "provider".
+
+        Returns:
+            Tuple[List[str], array]: Names indexed by code, and the code of every VM.
+        """
+        if key not in LABEL_KEYS:
+            raise ValueError(f"Unknown VM label {key!r}, expected one of {', '.join(LABEL_KEYS)}")
+        return getattr(self, f"{key}_names"), getattr(self, f"{key}_codes")
+
+    def label_code(self, key: str, name: str) -> Optional[int]:
+        """
+        Code of a name in one of the interned columns.
+
+        Args:
+            key (str): "os", "plan", "namespace", "target_namespace" or "provider".
+            name (str): The name.
+
+        Returns:
+            Optional[int]: Its code in the ``<key>_codes`` column, None if no VM has that name.
+        """
+        if key not in LABEL_KEYS:
+            raise ValueError(f"Unknown VM label {key!r}, expected one of {', '.join(LABEL_KEYS)}")
+        return getattr(self, f"_{key}_index").get(name)
+
+    def plan_namespaces(self, plan: str) -> List[str]:
+        """
+        Namespaces with VMs of a plan of this name, plan names being only unique within a namespace.
+
+        Args:
+            plan (str): Plan name.
+
+        Returns:
+            List[str]: The namespaces, in order of first appearance.
+        """
+        code = self._plan_index.get(plan)
+        if code is None:
+            return []
+        codes = dict.fromkeys(
+            namespace for plan_code, namespace in zip(self.plan_codes, self.namespace_codes) if plan_code == code
+        )
+        return [self.namespace_names[namespace] for namespace in codes]
+
+    def by_os(self) -> Dict[str, List[int]]:
+        """
+        Group row indexes by operating system.
+
+        Returns:
+            Dict[str, List[int]]: Row indexes per OS, OS in order of first appearance.
+        """
+        groups: List[List[int]] = [[] for _ in self.os_names]
+        for index, code in enumerate(self.os_codes):
+            groups[code].append(index)
+        return {os_name: group for os_name, group in zip(self.os_names, groups) if group}
+
+    @classmethod
+    def from_columns(
+        cls,
+        names: List[str],
+        os_names: List[str],
+        os_codes: Union[Iterable[int], bytes],
+        plan_names: List[str],
+        plan_codes: Union[Iterable[int], bytes],
+        disk_sizes: Union[Iterable[int], bytes],
+        start_times: Union[Iterable[int], bytes],
+        end_times: Union[Iterable[int], bytes],
+        durations: Union[Iterable[float], bytes],
+        failed: Union[Iterable[bool], bytes],
+        namespace_names: Optional[List[str]] = None,
+        namespace_codes: Union[Iterable[int], bytes, None] = None,
+        target_namespace_names: Optional[List[str]] = None,
+        target_namespace_codes: Union[Iterable[int], bytes, None] = None,
+        provider_names: Optional[List[str]] = None,
+        provider_codes: Union[Iterable[int], bytes, None] = None,
+        datastore_names: Optional[List[str]] = None,
+        datastore_codes: Union[Iterable[int], bytes, None] = None,
+        disk_rates: Optional[DiskRateSketches] = None,
+        failures: Optional[FailureIndex] = None,
+    ) -> "VMRecords":
+        """
+        Build a container from whole columns, e.g. read back from a record store.
+
+        Numeric columns may also be given as the raw bytes of the matching ``array`` type, which is copied
+        without converting element by element.
+
+        Args:
+            names (List[str]): VM names.
+            os_names (List[str]): Distinct OS names, indexed by ``os_codes``.
+            os_codes (Iterable[int]): OS code per VM.
+            plan_names (List[str]): Distinct plan names, indexed by ``plan_codes``.
+            plan_codes (Iterable[int]): Plan code per VM.
+            disk_sizes (Iterable[int]): Disk size per VM in MB.
+            start_times (Iterable[int]): Disk transfer start per VM in epoch seconds, MISSING if unknown.
+            end_times (Iterable[int]): Migration end per VM in epoch seconds, MISSING if unknown.
+            durations (Iterable[float]): Effective migration time per VM in minutes.
+            failed (Iterable[bool]): Failure state per VM.
+            namespace_names (Optional[List[str]], optional): Distinct plan namespaces, indexed by
+                ``namespace_codes``. Defaults to None, every VM in namespace "".
+            namespace_codes (Iterable[int], optional): Plan namespace code per VM.
+            target_namespace_names (Optional[List[str]], optional): Distinct target namespaces. Defaults to None.
+            target_namespace_codes (Iterable[int], optional): Target namespace code per VM.
+            provider_names (Optional[List[str]], optional): Distinct source providers. Defaults to None.
+            provider_codes (Iterable[int], optional): Source provider code per VM.
+            datastore_names (Optional[List[str]], optional): Distinct datastores. Defaults to None.
+            datastore_codes (Iterable[int], optional): Datastore code per VM.
+            disk_rates (Optional[DiskRateSketches], optional): Disk transfer rates of the VMs. Defaults to None,
+                no disk tasks.
+            failures (Optional[FailureIndex], optional): Failed VMs and plans. Defaults to None, no failures.
+
+        Returns:
+            VMRecords: container holding the columns.
+        """
+        records = cls()
+        records.names = names
+        records.os_names = os_names
+        records.os_codes = array("L", os_codes)
+        records.plan_names = plan_names
+        records.plan_codes = array("L", plan_codes)
+        records.disk_sizes = array("q", disk_sizes)
+        records.start_times = array("q", start_times)
+        records.end_times = array("q", end_times)
+        records.durations = array("d", durations)
+        records.failed = array("b", failed)
+        records._os_index = {os_name: code for code, os_name in enumerate(os_names)}
+        records._plan_index = {plan: code for code, plan in enumerate(plan_names)}
+        for key, label_names, codes in (
+            ("namespace", namespace_names, namespace_codes),
+            ("target_namespace", target_namespace_names, target_namespace_codes),
+            ("provider", provider_names, provider_codes),
+            ("datastore", datastore_names, datastore_codes),
+        ):
+            if label_names is None:
+                label_names = [""] if names else []
+                codes = bytes(len(names) * records.os_codes.itemsize)
+            setattr(records, f"{key}_names", label_names)
+            setattr(records, f"{key}_codes", array("L", codes))
+            setattr(records, f"_{key}_index", {name: code for code, name in enumerate(label_names)})
+        if disk_rates is not None:
+            records.disk_rates = disk_rates
+        if failures is not None:
+            records.failures = failures
+        return records
+
+    @classmethod
+    def from_os_dict(cls, all_vms: Dict[str, List[Dict[str, Any]]]) -> "VMRecords":
+        """
+        Build a container from the legacy dict of VM dicts keyed by OS name.  Times may be datetimes or epoch
+        seconds.
+
+        Args:
+            all_vms (Dict[str, List[Dict[str, Any]]]): VMs keyed by OS name.
+
+        Returns:
+            VMRecords: container holding the same VMs.
+        """
+        records = cls()
+        for os_name, vms in all_vms.items():
+            for vm in vms:
+                records.add(
+                    vm["name"],
+                    os_name,
+                    vm.get("plan", ""),
+                    vm.get("disk_size", 0),
+                    as_epoch(vm.get("start_time")),
+                    vm.get("duration", 0.0),
+                    vm.get("failed", False),
+                    None if vm.get("end_time") is None else as_epoch(vm["end_time"]),
+                    vm.get("namespace", ""),
+                    vm.get("target_namespace", ""),
+                    vm.get("provider", ""),
+                )
+        return records
+
+
+def as_vm_records(all_vms: Union[VMRecords, Dict[str, List[Dict[str, Any]]]]) -> VMRecords:
+    """
+    Return all_vms as a VMRecords container, converting the legacy dict layout if needed.
+
+    Args:
+        all_vms (Union[VMRecords, Dict[str, List[Dict[str, Any]]]]): VMs as a container or dict keyed by OS.
+
+    Returns:
+        VMRecords: VMs as a container.
+    """
+    if isinstance(all_vms, VMRecords):
+        return all_vms
+    return VMRecords.from_os_dict(all_vms)
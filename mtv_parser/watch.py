@@ -0,0 +1,459 @@
+import codecs
+import os
+import re
+import select
+import stat
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from typing import IO, Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from aggregation import Grouping
+from bandwidth import BandwidthCurves
+from clioutput import CLIOutput
+from concurrency import floor_time, width_seconds
+from failure_index import FailureRecord
+from plan_loader import json_loads
+from segment_tree import SegmentTree
+from vm_information import plan_failures, summarize_plan
+from vm_records import VMRecord, VMRecords
+
+READ_SIZE = 1 << 16
+
+_NON_SPACE = re.compile(r"\S")
+_TOKENS = re.compile(r'[{}\[\]"]')
+_STRING_TOKENS = re.compile(r'["\\]')
+
+# (start second, end second, OS, duration in minutes) of an applied VM
+VMSpan = Tuple[int, int, str, float]
+
+
+class JSONStreamSplitter:
+    """
+    Split a stream of concatenated JSON documents into complete documents as the text arrives.
+
+    Handles both one document per line (JSON lines) and pretty printed documents following each other, which is
+    what ``oc get plans -w -o json`` writes.  Text is scanned once; a document split across chunks is completed
+    by the chunks that follow.
+    """
+
+    def __init__(self) -> None:
+        self._buffer = ""
+        self._position = 0
+        self._start: Optional[int] = None
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add text to the stream.
+
+        Args:
+            text (str): Next part of the stream.
+
+        Returns:
+            List[str]: The documents completed by this text.
+        """
+        buffer = self._buffer = self._buffer + text
+        position = self._position
+        documents = []
+        while position < len(buffer):
+            if self._in_string:
+                position = self._skip_string(buffer, position)
+                continue
+            if self._depth == 0:
+                position = self._document_start(buffer, position)
+                if position == len(buffer):
+                    break
+            match = _TOKENS.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            token = match.group()
+            position = match.end()
+            if token == '"':
+                self._in_string = True
+            elif token in "{[":
+                self._depth += 1
+            else:
+                self._depth -= 1
+                if self._depth == 0:
+                    documents.append(buffer[self._start : position])
+                    self._start = None
+
+        # Drop the text of completed documents
+        keep = self._start if self._start is not None else position
+        self._buffer = buffer[keep:]
+        self._position = position - keep
+        if self._start is not None:
+            self._start = 0
+        return documents
+
+    def _document_start(self, buffer: str, position: int) -> int:
+        """Find the start of the next document from ``position``, the end of the buffer if only whitespace follows."""
+        match = _NON_SPACE.search(buffer, position)
+        if match is None:
+            return len(buffer)
+        position = match.start()
+        if buffer[position] not in "{[":
+            found = buffer[position : position + 40]
+            raise ValueError(f"Expected a JSON object in the plan stream, got {found!r}")
+        self._start = position
+        return position
+
+    def _skip_string(self, buffer: str, position: int) -> int:
+        """
+        Skip the rest of a string from ``position``, to just after its closing quote or to the end of the buffer
+        with the string (and an escape at its very end) still open.
+        """
+        while position < len(buffer):
+            if self._escape:
+                self._escape = False
+                position += 1
+                continue
+            match = _STRING_TOKENS.search(buffer, position)
+            if match is None:
+                return len(buffer)
+            position = match.end()
+            if match.group() == "\\":
+                self._escape = True
+            else:
+                self._in_string = False
+                return position
+        return position
+
+
+def read_stream(source: IO[bytes], poll_interval: float = 1.0) -> Iterator[Optional[str]]:
+    """
+    Yield the text of a pipe or a growing file as it arrives.
+
+    Regular files are followed like ``tail -f`` and never end, pipes end when the writer closes them.
+
+    Args:
+        source (IO[bytes]): Open binary file or pipe.
+        poll_interval (float, optional): Seconds to wait for new data. Defaults to 1.0.
+
+    Yields:
+        Optional[str]: New text, or None when nothing arrived within ``poll_interval``.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    fd = source.fileno()
+    regular_file = stat.S_ISREG(os.fstat(fd).st_mode)
+    while True:
+        if regular_file:
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                time.sleep(poll_interval)
+                yield None
+                continue
+        else:
+            readable, _, _ = select.select([fd], [], [], poll_interval)
+            if not readable:
+                yield None
+                continue
+            data = os.read(fd, READ_SIZE)
+            if not data:
+                return
+        yield decoder.decode(data)
+
+
+def plans_in(document: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the plans of a stream document: a Plan, a List of plans or a watch event wrapping a plan.
+
+    Args:
+        document (Any): Parsed JSON document.
+
+    Yields:
+        Dict[str, Any]: Plans.  Plans of DELETED watch events are dropped, the report keeps their migrations.
+    """
+    if not isinstance(document, dict):
+        return
+    if "object" in document and "type" in document:
+        if document["type"] != "DELETED":
+            yield from plans_in(document["object"])
+    elif document.get("kind") == "Plan":
+        yield document
+    elif isinstance(document.get("items"), list):
+        for item in document["items"]:
+            yield from plans_in(item)
+
+
+class IncrementalConcurrency:
+    """
+    Concurrency of migrations kept current as VMs are added and removed one at a time.
+
+    Concurrency over time is held in sparse segment trees over Unix seconds, one overall and one per OS, so adding
+    or removing a VM is a range add and peaks are range max queries, each logarithmic in the time span instead of
+    linear in the number of VMs.  A VM counts as migrating from its start second up to, excluding, its end second.
+
+    The average follows analyze_concurrent_migrations: every start and end event adds the number of VMs migrating
+    just before it, weighted by the duration of the event's VM, divided by the summed durations.  A third tree
+    holds those weights at the seconds just before each event, so the events a new VM overlaps are summed with one
+    range query.  Results match the batch analysis except for the order of events falling on the same second.
+    """
+
+    def __init__(self) -> None:
+        self.total = SegmentTree()
+        self.by_os: Dict[str, SegmentTree] = {}
+        self._weights = SegmentTree()
+        self._weighted_events = 0.0
+        self._event_durations = 0.0
+        self.vms = 0
+
+    def _apply(self, span: VMSpan, sign: int) -> None:
+        start, end, os_name, duration = span
+        os_tree = self.by_os.get(os_name)
+        if os_tree is None:
+            os_tree = self.by_os[os_name] = SegmentTree()
+        if sign > 0:
+            self.total.add(start, end, 1)
+            os_tree.add(start, end, 1)
+            own = self.total.value(start - 1) + self.total.value(end - 1)
+            self._weighted_events += duration * own + self._weights.sum(start, end)
+            self._weights.add(start - 1, start, duration)
+            self._weights.add(end - 1, end, duration)
+        else:
+            self._weights.add(start - 1, start, -duration)
+            self._weights.add(end - 1, end, -duration)
+            own = self.total.value(start - 1) + self.total.value(end - 1)
+            self._weighted_events -= duration * own + self._weights.sum(start, end)
+            self.total.add(start, end, -1)
+            os_tree.add(start, end, -1)
+        self._event_durations += 2 * duration * sign
+        self.vms += sign
+
+    def add(self, span: VMSpan) -> None:
+        """Start counting a VM."""
+        self._apply(span, 1)
+
+    def remove(self, span: VMSpan) -> None:
+        """Stop counting a VM added before."""
+        self._apply(span, -1)
+
+    @property
+    def average_concurrent_vms(self) -> float:
+        if self._event_durations <= 0:
+            return 0
+        return round(self._weighted_events / self._event_durations, 2)
+
+    def analysis(
+        self, bucket_width: timedelta = timedelta(hours=1), per_os: bool = False, bucket_peak: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Current concurrency in the layout of analyze_concurrent_migrations, without significant drops.
+
+        Args:
+            bucket_width (timedelta, optional): Resolution of the bucketed series. Defaults to one hour.
+            per_os (bool, optional): Include per-OS counts in the buckets. Defaults to False.
+            bucket_peak (bool, optional): Include the peak inside each bucket. Defaults to False.
+
+        Returns:
+            Dict[str, Any]: The analysis, times in epoch seconds.
+        """
+        first = self.total.first_positive()
+        if first is None:
+            return {
+                "max_concurrent": {},
+                "max_concurrent_total": 0,
+                "average_concurrent_vms": 0,
+                "hourly_concurrent_vms": [],
+                "bucket_width": bucket_width,
+                "concurrency_buckets": [],
+            }
+        last_end = self.total.last_positive() + 1
+        # OS in the order of their first migration, like the batch analysis
+        os_trees = dict(
+            sorted(
+                ((os_name, tree) for os_name, tree in self.by_os.items() if tree.max() > 0),
+                key=lambda item: item[1].first_positive(),
+            )
+        )
+
+        def series(width: timedelta, with_os: bool, with_peak: bool) -> List[Dict[str, Any]]:
+            step = width_seconds(width)
+            buckets = []
+            bucket_start = floor_time(first, step)
+            while bucket_start <= last_end:
+                bucket = {"time": bucket_start, "vms": int(self.total.value(bucket_start))}
+                if with_peak:
+                    bucket["peak_vms"] = int(self.total.max(bucket_start, bucket_start + step))
+                if with_os:
+                    bucket["os"] = {os_name: int(tree.value(bucket_start)) for os_name, tree in os_trees.items()}
+                    if with_peak:
+                        bucket["os_peak"] = {
+                            os_name: int(tree.max(bucket_start, bucket_start + step))
+                            for os_name, tree in os_trees.items()
+                        }
+                buckets.append(bucket)
+                bucket_start += step
+            return buckets
+
+        concurrency_buckets = series(bucket_width, per_os, bucket_peak)
+        hourly = concurrency_buckets if bucket_width == timedelta(hours=1) else series(timedelta(hours=1), False, False)
+        return {
+            "max_concurrent": {os_name: int(tree.max()) for os_name, tree in os_trees.items()},
+            "max_concurrent_total": int(self.total.max()),
+            "peak_time": int(self.total.argmax()),
+            "average_concurrent_vms": self.average_concurrent_vms,
+            "hourly_concurrent_vms": [{"hour": bucket["time"], "vms": bucket["vms"]} for bucket in hourly],
+            "bucket_width": bucket_width,
+            "concurrency_buckets": concurrency_buckets,
+        }
+
+
+class PlanWatcher:
+    """
+    Keeps the report state current as plan objects stream in.
+
+    Each plan is summarized once per resourceVersion.  Only the VMs that appeared, disappeared or changed since
+    the plan's previous version touch the concurrency state.  Plans are applied once their migration completed;
+    a plan that starts a new migration keeps reporting its previous one until the new one completes.  Failures
+    always follow the latest version of a plan, so Critical conditions show up before anything migrated.
+    """
+
+    def __init__(self) -> None:
+        self.concurrency = IncrementalConcurrency()
+        self._versions: Dict[str, str] = {}
+        self._plans: Dict[str, Tuple[Dict[str, Tuple[VMRecord, VMSpan]], Dict[str, Any]]] = {}
+        self._failures: Dict[str, List[FailureRecord]] = {}
+        self.changed = False
+
+    def apply(self, entry: Dict[str, Any]) -> bool:
+        """
+        Apply a new version of a plan.
+
+        Args:
+            entry (Dict[str, Any]): The plan.
+
+        Returns:
+            bool: True if the report changed.
+        """
+        metadata = entry.get("metadata") or {}
+        key = metadata.get("uid") or f"{metadata.get('namespace')}/{metadata.get('name')}"
+        version = metadata.get("resourceVersion")
+        if version is not None and self._versions.get(key) == version:
+            return False
+        self._versions[key] = version
+        failures = plan_failures(entry)
+        failures_changed = self._failures.get(key, []) != failures
+        if failures_changed:
+            self._failures[key] = failures
+            self.changed = True
+        migration = (entry.get("status") or {}).get("migration") or {}
+        if "completed" not in migration:
+            return failures_changed
+        summary = summarize_plan(entry)
+        if summary is None:
+            return failures_changed
+
+        vm_records, migration_dict = summary
+        previous_vms = self._plans[key][0] if key in self._plans else {}
+        vms: Dict[str, Tuple[VMRecord, VMSpan]] = {}
+        for record in vm_records:
+            start = record.start_time
+            span = (start, max(start + 1, record.end_time), record.os, record.duration)
+            vms[record.name] = (record, span)
+        for name, (_, span) in previous_vms.items():
+            if name not in vms or vms[name][1] != span:
+                self.concurrency.remove(span)
+        for name, (_, span) in vms.items():
+            if name not in previous_vms or previous_vms[name][1] != span:
+                self.concurrency.add(span)
+        self._plans[key] = (vms, migration_dict)
+        self.changed = True
+        return True
+
+    def records(self) -> Tuple[VMRecords, List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Current migrated VMs and plan summaries, plans in the order they were first applied.
+
+        Returns:
+            Tuple[VMRecords, List[Dict[str, Any]], List[Dict[str, Any]]]: VMs, successful and failed plans.
+        """
+        all_vms = VMRecords()
+        successful_migrations = []
+        failed_migrations = []
+        for vms, migration_dict in self._plans.values():
+            all_vms.extend(record for record, _ in vms.values())
+            if migration_dict["vms_failed"] == "True":
+                failed_migrations.append(migration_dict)
+            else:
+                successful_migrations.append(migration_dict)
+        for failures in self._failures.values():
+            all_vms.failures.extend(failures)
+        return all_vms, successful_migrations, failed_migrations
+
+    def report(
+        self,
+        bucket_width: timedelta = timedelta(hours=1),
+        per_os: bool = False,
+        bucket_peak: bool = False,
+        group_by: Sequence[Grouping] = (),
+        bandwidth_width: timedelta = timedelta(hours=1),
+    ) -> None:
+        """Write the report for the current state to stdout."""
+        all_vms, successful_migrations, failed_migrations = self.records()
+        output = CLIOutput()
+        output.writeline(
+            f"Report at {datetime.now(timezone.utc):%Y-%m-%d %H:%M:%S} UTC: "
+            f"{len(self._plans)} plans, {len(all_vms)} VMs"
+        )
+        concurrency_data = self.concurrency.analysis(bucket_width, per_os, bucket_peak)
+        output.write_report(
+            all_vms,
+            successful_migrations,
+            failed_migrations,
+            concurrency_data,
+            group_by,
+            BandwidthCurves(all_vms, bandwidth_width),
+        )
+        output.write("\n")
+        output.close()
+        sys.stdout.flush()
+        self.changed = False
+
+
+def watch(
+    source: IO[bytes],
+    interval: float = 60.0,
+    bucket_width: timedelta = timedelta(hours=1),
+    per_os: bool = False,
+    bucket_peak: bool = False,
+    group_by: Sequence[Grouping] = (),
+    bandwidth_width: timedelta = timedelta(hours=1),
+) -> PlanWatcher:
+    """
+    Consume a stream of plans and re-emit the report every ``interval`` seconds while plans change.
+
+    Args:
+        source (IO[bytes]): JSON stream: ``oc get plans -w -o json`` output, JSON lines of plans or watch events,
+            or a growing file.
+        interval (float, optional): Minimum seconds between reports. Defaults to 60.
+        bucket_width (timedelta, optional): Resolution of the bucketed series. Defaults to one hour.
+        per_os (bool, optional): Include per-OS counts in the buckets. Defaults to False.
+        bucket_peak (bool, optional): Include the peak inside each bucket. Defaults to False.
+        group_by (Sequence[Grouping], optional): Groupings of the VMs to add a breakdown table for. Defaults to none.
+        bandwidth_width (timedelta, optional): Resolution of the bandwidth series. Defaults to one hour.
+
+    Returns:
+        PlanWatcher: The final state, once the stream ended or the watch was interrupted.
+    """
+    watcher = PlanWatcher()
+    splitter = JSONStreamSplitter()
+    next_report = time.monotonic() + interval
+    try:
+        for text in read_stream(source, min(1.0, interval)):
+            if text:
+                for document in splitter.feed(text):
+                    for entry in plans_in(json_loads(document)):
+                        watcher.apply(entry)
+            if watcher.changed and time.monotonic() >= next_report:
+                watcher.report(bucket_width, per_os, bucket_peak, group_by, bandwidth_width)
+                next_report = time.monotonic() + interval
+    except KeyboardInterrupt:
+        pass
+    if watcher.changed:
+        watcher.report(bucket_width, per_os, bucket_peak, group_by, bandwidth_width)
+    return watcher
@@ -0,0 +1,41 @@
+"""
+Shared fixtures: the modules of mtv_parser import each other by name, so the package directory goes on sys.path,
+along with the tests directory for the stub API server.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "mtv_parser"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from plan_generator import PlanGenerator  # noqa: E402
+
+# Plans in the sample dump, enough for warm VMs, failures and plans that never ran
+SAMPLE_PLANS = 40
+
+
+def _write_dump(path: Path, count: int, seed: int, dump_format: str = "yaml") -> Path:
+    with path.open("w") as stream:
+        PlanGenerator(seed=seed).write(stream, count, dump_format)
+    return path
+
+
+@pytest.fixture(scope="session")
+def sample_dump(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A YAML plan dump of SAMPLE_PLANS synthetic plans."""
+    return _write_dump(tmp_path_factory.mktemp("dumps") / "plans.yaml", SAMPLE_PLANS, 7)
+
+
+@pytest.fixture(scope="session")
+def sample_json_dump(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """The plans of ``sample_dump`` as a JSON dump."""
+    return _write_dump(tmp_path_factory.mktemp("dumps") / "plans.json", SAMPLE_PLANS, 7, "json")
+
+
+@pytest.fixture(scope="session")
+def second_sample_dump(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    """A YAML plan dump of 15 other synthetic plans."""
+    return _write_dump(tmp_path_factory.mktemp("dumps") / "more-plans.yaml", 15, 8)
@@ -0,0 +1,175 @@
+"""
+Stand-in for the Kubernetes API server listing Plans from a plan dump, to exercise the API source without a cluster.
+
+    PYTHONPATH=mtv_parser python tests/stub_apiserver.py examples/vm-plans.yaml --port 8001
+    python mtv_parser/mtv_plan_parser.py --api-server http://127.0.0.1:8001 --page-size 50
+
+Only the Plan list endpoints are served, with ``limit``/``continue`` pagination and HTTP/1.1 keep-alive.
+"""
+
+import argparse
+import base64
+import json
+import threading
+import time
+from datetime import date, datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+from kube_source import PLAN_GROUP_VERSION
+from plan_loader import iter_dump
+
+PLANS_PATH = f"/apis/{PLAN_GROUP_VERSION}/plans"
+NAMESPACED_PREFIX = f"/apis/{PLAN_GROUP_VERSION}/namespaces/"
+
+
+def _json_default(value: Any) -> str:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat().replace("+00:00", "Z")
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _status(code: int, reason: str, message: str) -> Dict[str, Any]:
+    return {
+        "kind": "Status",
+        "apiVersion": "v1",
+        "status": "Failure",
+        "message": message,
+        "reason": reason,
+        "code": code,
+    }
+
+
+class StubAPIServer(ThreadingHTTPServer):
+    """
+    HTTP server answering Plan list requests from the plans of a dump.
+
+    Attributes:
+        plans (List[Dict[str, Any]]): Every plan of the dump, complete.
+        token (Optional[str]): Bearer token requests must carry, None to accept any request.
+        latency (float): Seconds every page is delayed by, to make prefetching visible.
+        requests (int): Pages served so far.
+        connections (int): Connections accepted so far.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], dump: str, token: Optional[str] = None, latency: float = 0.0) -> None:
+        super().__init__(address, StubAPIHandler)
+        self.plans: List[Dict[str, Any]] = list(iter_dump(dump, fields=None))
+        self.token = token
+        self.latency = latency
+        # Continue tokens only stay valid for the list they were issued for, like etcd's compaction expires them
+        self.list_version = str(int(time.time()))
+        self.requests = 0
+        self.connections = 0
+        self._lock = threading.Lock()
+
+    def get_request(self) -> Any:
+        request = super().get_request()
+        with self._lock:
+            self.connections += 1
+        return request
+
+    def page(self, namespace: Optional[str], limit: int, continue_token: Optional[str]) -> Tuple[int, Dict[str, Any]]:
+        """
+        Build one page of the list.
+
+        Args:
+            namespace (Optional[str]): Namespace to list, all namespaces if None.
+            limit (int): Maximum plans on the page, 0 for all.
+            continue_token (Optional[str]): Token of the previous page.
+
+        Returns:
+            Tuple[int, Dict[str, Any]]: HTTP status and body.
+        """
+        with self._lock:
+            self.requests += 1
+        offset = 0
+        if continue_token:
+            try:
+                list_version, offset_text = base64.urlsafe_b64decode(continue_token).decode().split(":")
+                offset = int(offset_text)
+            except ValueError:
+                return 400, _status(400, "BadRequest", "invalid continue token")
+            if list_version != self.list_version:
+                return 410, _status(410, "Expired", "The provided continue parameter is too old")
+        plans = self.plans
+        if namespace:
+            plans = [plan for plan in plans if (plan.get("metadata") or {}).get("namespace") == namespace]
+        end = offset + limit if limit > 0 else len(plans)
+        items = [
+            {key: value for key, value in plan.items() if key not in ("kind", "apiVersion")}
+            for plan in plans[offset:end]
+        ]
+        metadata: Dict[str, Any] = {"resourceVersion": self.list_version}
+        if end < len(plans):
+            metadata["continue"] = base64.urlsafe_b64encode(f"{self.list_version}:{end}".encode()).decode()
+            metadata["remainingItemCount"] = len(plans) - end
+        return 200, {"apiVersion": PLAN_GROUP_VERSION, "kind": "PlanList", "metadata": metadata, "items": items}
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubAPIServer
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        namespace = None
+        if url.path.startswith(NAMESPACED_PREFIX) and url.path.endswith("/plans"):
+            namespace = url.path[len(NAMESPACED_PREFIX) : -len("/plans")]
+        elif url.path != PLANS_PATH:
+            self._send(404, _status(404, "NotFound", f"{url.path} not found"))
+            return
+        if self.server.token and self.headers.get("Authorization") != f"Bearer {self.server.token}":
+            self._send(401, _status(401, "Unauthorized", "Unauthorized"))
+            return
+        query = parse_qs(url.query)
+        try:
+            limit = int(query.get("limit", ["0"])[0])
+        except ValueError:
+            self._send(400, _status(400, "BadRequest", "invalid limit"))
+            return
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self._send(*self.server.page(namespace, limit, query.get("continue", [None])[0]))
+
+    def _send(self, code: int, body: Dict[str, Any]) -> None:
+        payload = json.dumps(body, default=_json_default).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Serve the plans of a dump like the Kubernetes API server lists them")
+    parser.add_argument(
+        "dump", nargs="?", default="examples/vm-plans.yaml", help="plan dump to serve (default: examples/vm-plans.yaml)"
+    )
+    parser.add_argument("--host", default="127.0.0.1", help="address to listen on (default: 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=8001, help="port to listen on, 0 for any (default: 8001)")
+    parser.add_argument("--token", help="bearer token clients must send (default: accept any client)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds every page is delayed by (default: 0)")
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    server = StubAPIServer((args.host, args.port), args.dump, args.token, args.latency)
+    print(f"Serving {len(server.plans)} plans on http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""The single-pass aggregation checked against brute force grouping of random VMs and plans."""
+
+import random
+
+import pytest
+from aggregation import (
+    STATE_NAMES,
+    Stats,
+    aggregate_plans,
+    aggregate_vms,
+    parse_grouping,
+)
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+GROUPINGS = [(), ("os",), ("os", "namespace", "provider", "state"), ("state", "target_namespace", "plan")]
+PLAN_GROUPINGS = [(), ("namespace", "provider", "state"), ("plan",), ("target_namespace", "state")]
+
+
+def _vms(seed, count=300):
+    """Random VMs, durations drawn from a few values so that the longest is often tied."""
+    rnd = random.Random(seed)
+    vms = []
+    for index in range(count):
+        vms.append(
+            {
+                "name": f"vm-{index}",
+                "os": rnd.choice(["rhel9", "windows2019", "ubuntu"]),
+                "plan": f"plan-{rnd.randrange(12)}",
+                "namespace": rnd.choice(["ns-a", "ns-b"]),
+                "target_namespace": rnd.choice(["target-a", "target-b", "target-c"]),
+                "provider": rnd.choice(["vcenter-1", "vcenter-2"]),
+                "failed": rnd.random() < 0.2,
+                "duration": rnd.choice([0.0, 5.0, 12.5, 30.0, 60.0]),
+                "disk_size": rnd.choice([0, 1024, 40960, 512000]),
+            }
+        )
+    return vms
+
+
+def _records(vms):
+    records = VMRecords()
+    for vm in vms:
+        records.add(
+            vm["name"],
+            vm["os"],
+            vm["plan"],
+            vm["disk_size"],
+            None,
+            vm["duration"],
+            vm["failed"],
+            namespace=vm["namespace"],
+            target_namespace=vm["target_namespace"],
+            provider=vm["provider"],
+        )
+    return records
+
+
+def _key(item, key):
+    return STATE_NAMES[item["failed"]] if key == "state" else item[key]
+
+
+def _brute_force(items, grouping):
+    """Items per group, groups in the order of their first item."""
+    groups = {}
+    for item in items:
+        groups.setdefault(tuple(_key(item, key) for key in grouping), []).append(item)
+    return groups
+
+
+def _check(stats, items):
+    durations = [item["duration"] for item in items]
+    disk_size = sum(item["disk_size"] for item in items)
+    longest = max(durations)
+    argmax = items[durations.index(longest)]
+    assert stats.count == len(items)
+    assert stats.vms == sum(item.get("vms", 1) for item in items)
+    assert stats.failed == sum(item["failed"] for item in items)
+    assert stats.disk_size == disk_size
+    assert stats.duration == pytest.approx(sum(durations))
+    assert stats.shortest == min(durations)
+    assert stats.longest == longest
+    assert stats.longest_name == argmax["name"]
+    assert stats.longest_disk_size == argmax["disk_size"]
+    mean_duration = sum(durations) / len(items)
+    mean_disk_size_gb = disk_size / 1024 / len(items)
+    assert stats.mean_duration == pytest.approx(mean_duration)
+    assert stats.mean_disk_size_gb == pytest.approx(mean_disk_size_gb)
+    assert stats.transfer_rate == pytest.approx(mean_disk_size_gb / mean_duration if mean_duration else 0.0)
+    assert stats.longest_transfer_rate == pytest.approx(argmax["disk_size"] / 1024 / longest if longest else 0.0)
+
+
+@pytest.mark.parametrize("seed", [1, 2])
+def test_vm_groupings_match_brute_force(seed):
+    vms = _vms(seed)
+    result = aggregate_vms(_records(vms), GROUPINGS)
+    assert list(result) == GROUPINGS
+    for grouping in GROUPINGS:
+        expected = _brute_force(vms, grouping)
+        assert list(result[grouping]) == list(expected)
+        for key, items in expected.items():
+            _check(result[grouping][key], items)
+
+
+def test_merged_stats_match_one_pass():
+    vms = _vms(3)
+    grouping = ("os", "state")
+    whole = aggregate_vms(_records(vms), [grouping])[grouping]
+    first = aggregate_vms(_records(vms[:120]), [grouping])[grouping]
+    second = aggregate_vms(_records(vms[120:]), [grouping])[grouping]
+    for key, stats in second.items():
+        first.setdefault(key, Stats()).merge(stats)
+    assert {key: repr(stats) for key, stats in first.items()} == {key: repr(stats) for key, stats in whole.items()}
+    for key, items in _brute_force(vms, grouping).items():
+        _check(first[key], items)
+
+
+def test_plan_groupings_match_brute_force():
+    rnd = random.Random(4)
+    plans = [
+        {
+            "name": f"plan-{index}",
+            "namespace": rnd.choice(["ns-a", "ns-b"]),
+            "target_namespace": rnd.choice(["target-a", "target-b"]),
+            "provider": rnd.choice(["vcenter-1", "vcenter-2"]),
+            "failed": rnd.random() < 0.3,
+            "duration": rnd.choice([10.0, 45.0, 90.0]),
+            "disk_size": rnd.choice([1024, 81920]),
+            "vms": rnd.randint(1, 6),
+        }
+        for index in range(80)
+    ]
+    migrations = [
+        {
+            "name": plan["name"],
+            "namespace": plan["namespace"],
+            "target_namespace": plan["target_namespace"],
+            "provider": plan["provider"],
+            "vms_failed": str(plan["failed"]),
+            "total_duration_mins": plan["duration"],
+            "total_disk_size": plan["disk_size"],
+            "vms": plan["vms"],
+        }
+        for plan in plans
+    ]
+    plans = [dict(plan, plan=plan["name"]) for plan in plans]
+    result = aggregate_plans(migrations, PLAN_GROUPINGS)
+    for grouping in PLAN_GROUPINGS:
+        expected = _brute_force(plans, grouping)
+        assert list(result[grouping]) == list(expected)
+        for key, items in expected.items():
+            _check(result[grouping][key], items)
+
+
+def test_empty_and_unknown_groupings():
+    assert aggregate_vms(VMRecords(), GROUPINGS) == {grouping: {} for grouping in GROUPINGS}
+    with pytest.raises(ValueError):
+        aggregate_vms(VMRecords(), [("os", "colour")])
+    with pytest.raises(ValueError):
+        aggregate_plans([], [("os",)])
+
+
+def test_parse_grouping():
+    assert parse_grouping("provider, target-namespace") == ("provider", "target_namespace")
+    with pytest.raises(ValueError):
+        parse_grouping(" , ")
+    with pytest.raises(ValueError):
+        parse_grouping("os,colour")
@@ -0,0 +1,119 @@
+from datetime import datetime, timedelta, timezone
+
+import chart_pipeline
+import pytest
+from chart_pipeline import (
+    DEFAULT_CHART,
+    ChartJob,
+    ChartPipeline,
+    chart_jobs,
+    chart_records,
+)
+from mtv_plan_parser import load_dump
+from timestamps import MISSING
+
+pytestmark = pytest.mark.unit
+
+START = datetime(2024, 7, 1, 2, 15, tzinfo=timezone.utc)
+END = datetime(2024, 7, 1, 4, 0, tzinfo=timezone.utc)
+
+
+@pytest.fixture(scope="module")
+def records(sample_dump):
+    return load_dump(str(sample_dump))[0]
+
+
+def test_chart_jobs():
+    width = timedelta(minutes=10)
+    jobs = chart_jobs("lanes", ("os", "lanes", "os", "plan"), ((START, END),), width)
+    assert [job.filename for job in jobs] == [
+        DEFAULT_CHART,
+        "migration_gantt_chart_os.png",
+        "migration_gantt_chart_plan.png",
+        "migration_gantt_chart_20240701T0215_20240701T0400.png",
+    ]
+    assert [job.mode for job in jobs] == ["lanes", "os", "plan", "lanes"]
+    assert [job.window for job in jobs] == [None, None, None, (START, END)]
+    assert all(job.bandwidth_width == width for job in jobs)
+    assert [job.filename for job in chart_jobs()] == [DEFAULT_CHART]
+
+
+def test_chart_records_keep_the_charted_columns(records):
+    charted = chart_records(records)
+    columns = ("names", "os_codes", "plan_codes", "disk_sizes", "start_times", "end_times", "durations", "failed")
+    assert all(list(getattr(charted, column)) == list(getattr(records, column)) for column in columns)
+    assert charted.os_names == records.os_names and charted.plan_names == records.plan_names
+    assert not len(charted.failures) and not len(charted.disk_rates)
+
+
+def test_render_in_process(tmp_path, records):
+    jobs = chart_jobs("os", ("plan",), bandwidth_width=timedelta(minutes=30))
+    for job in jobs:
+        job.filename = str(tmp_path / job.filename)
+    with ChartPipeline(0) as charts:
+        charts.submit(records, jobs)
+        # Rendered when submitted
+        assert charts.rendered == [job.filename for job in jobs]
+        assert charts.wait()
+    assert all((tmp_path / job.filename).stat().st_size > 0 for job in jobs)
+
+
+def test_render_in_workers_in_submission_order(tmp_path, records):
+    first = min(when for when in records.start_times if when != MISSING)
+    last = max(records.end_times)
+    window = tuple(datetime.fromtimestamp(int(when), timezone.utc) for when in (first, (first + last) // 2))
+    jobs = [ChartJob(str(tmp_path / "all.png"), "lanes"), ChartJob(str(tmp_path / "window.png"), "vm", window)]
+    with ChartPipeline(2) as charts:
+        charts.submit(records, jobs)
+        assert charts.wait()
+        assert charts.rendered == [job.filename for job in jobs] and not charts.failed
+        assert charts._pool is None
+    assert all((tmp_path / job.filename).stat().st_size > 0 for job in jobs)
+
+
+def test_failed_charts_are_reported(tmp_path, records, capsys):
+    jobs = [ChartJob(str(tmp_path / "bad.png"), "bogus"), ChartJob(str(tmp_path / "good.png"), "lanes")]
+    with ChartPipeline(1) as charts:
+        charts.submit(records, jobs)
+        assert not charts.wait()
+    assert charts.rendered == [jobs[1].filename]
+    assert charts.failed == [(jobs[0].filename, "ValueError: Unknown Gantt chart mode: bogus")]
+    assert f"Gantt chart {jobs[0].filename} failed: ValueError" in capsys.readouterr().err
+
+
+def test_timeout_terminates_the_workers(tmp_path, records):
+    jobs = chart_jobs("vm", ("lanes", "os", "plan"))
+    for job in jobs:
+        job.filename = str(tmp_path / job.filename)
+    with ChartPipeline(1) as charts:
+        charts.submit(records, jobs)
+        pool = charts._pool
+        assert not charts.wait(1e-6)
+    assert charts._pool is None and pool._state != "RUN"
+    assert [filename for filename, _ in charts.failed][-1] == jobs[-1].filename
+    assert all(reason.startswith("not rendered within") for _, reason in charts.failed[len(charts.rendered) :])
+
+
+def test_close_without_wait_stops_the_workers(records, tmp_path):
+    with ChartPipeline(1) as charts:
+        charts.submit(records, [ChartJob(str(tmp_path / "chart.png"))])
+        pool = charts._pool
+    assert charts._pool is None and pool._state != "RUN"
+
+
+def test_no_jobs_start_no_workers(records):
+    with ChartPipeline(2) as charts:
+        charts.submit(records, [])
+        assert charts._pool is None and charts.wait()
+
+
+def test_in_process_failures_are_reported(monkeypatch, records, capsys):
+    def render_chart(records, job):
+        raise RuntimeError("no display")
+
+    monkeypatch.setattr(chart_pipeline, "render_chart", render_chart)
+    with ChartPipeline(0) as charts:
+        charts.submit(records, chart_jobs())
+        assert not charts.wait()
+    assert charts.failed == [(DEFAULT_CHART, "RuntimeError: no display")]
+    assert f"Gantt chart {DEFAULT_CHART} failed: RuntimeError: no display" in capsys.readouterr().err
@@ -0,0 +1,190 @@
+"""The failure index checked on a hand-built index and against brute force over random failures."""
+
+import random
+
+import pytest
+from failure_index import FailureIndex, FailureRecord, parse_failure_term
+
+pytestmark = pytest.mark.unit
+
+T0 = 1719792000
+
+RECORDS = [
+    FailureRecord(
+        "vm-a",
+        "id-a",
+        "plan-1",
+        "rhel9",
+        "ns-1",
+        T0 + 100,
+        False,
+        (("phase", "ConvertGuest"), ("reason", "Timeout"), ("condition", "Failed")),
+    ),
+    FailureRecord(
+        "vm-b",
+        "id-b",
+        "plan-1",
+        "windows2019",
+        "ns-1",
+        T0 + 50,
+        False,
+        (("phase", "DiskTransfer"), ("reason", "Timeout")),
+    ),
+    FailureRecord("plan-2", "uid-2", "plan-2", "", "ns-2", T0 + 200, True, (("plan_condition", "VMNotFound"),)),
+    FailureRecord(
+        "vm-c", "id-c", "plan-2", "rhel9", "ns-2", None, False, (("phase", "ConvertGuest"), ("reason", "Timeout"))
+    ),
+    FailureRecord("vm-d", "id-d", "plan-3", "rhel9", "ns-1", T0 + 300, False, (("phase", "ConvertGuest"),)),
+]
+
+
+@pytest.fixture
+def index():
+    index = FailureIndex()
+    index.extend(RECORDS)
+    return index
+
+
+def test_records_round_trip(index):
+    assert len(index) == len(RECORDS) and list(index) == RECORDS
+    assert index[1].kind == "vm" and index[2].kind == "plan"
+    assert index.values("phase") == ["ConvertGuest", "DiskTransfer"]
+    # Duplicate terms are indexed once
+    index.add("vm-e", "id-e", "plan-3", "rhel9", "ns-1", T0, False, [("reason", "Timeout"), ("reason", "Timeout")])
+    assert index.row_terms(5) == (("reason", "Timeout"),)
+
+
+def test_term_lookup_in_time_order(index):
+    # The record without a time sorts first
+    assert list(index.rows()) == [3, 1, 0, 2, 4]
+    assert list(index.rows("phase", "ConvertGuest")) == [3, 0, 4]
+    assert list(index.rows("reason", "Timeout")) == [3, 1, 0]
+    assert list(index.rows("phase", "NoSuchPhase")) == []
+    with pytest.raises(ValueError):
+        index.rows("colour", "red")
+
+
+def test_time_window(index):
+    assert list(index.rows("phase", "ConvertGuest", T0 + 100)) == [0, 4]
+    assert list(index.rows("phase", "ConvertGuest", T0 + 101)) == [4]
+    # The end is exclusive, and records without a time fall outside any bounded window
+    assert list(index.rows("phase", "ConvertGuest", end=T0 + 300)) == [0]
+    assert list(index.rows(start=T0, end=T0 + 201)) == [1, 0, 2]
+    assert list(index.rows(start=T0 + 1000)) == []
+
+
+def test_rows_added_after_a_query_are_sorted_in(index):
+    assert list(index.rows("phase", "ConvertGuest")) == [3, 0, 4]
+    index.add("vm-e", "id-e", "plan-3", "rhel9", "ns-1", T0, False, [("phase", "ConvertGuest")])
+    assert list(index.rows("phase", "ConvertGuest")) == [3, 5, 0, 4]
+    assert list(index.rows(start=T0, end=T0 + 60)) == [5, 1]
+
+
+def test_count_by(index):
+    assert index.count_by(index.rows("reason", "Timeout"), "os") == {"rhel9": 2, "windows2019": 1}
+    assert index.count_by(index.rows(), "kind") == {"vm": 4, "plan": 1}
+    assert index.count_by(index.rows(), "namespace") == {"ns-1": 3, "ns-2": 2}
+    with pytest.raises(ValueError):
+        index.count_by([], "colour")
+
+
+def test_cross_counts(index):
+    assert list(index.cross_counts("phase", "os")) == [
+        ("ConvertGuest", "rhel9", 3),
+        ("DiskTransfer", "windows2019", 1),
+    ]
+    # Plans are not counted as failed VMs
+    assert list(index.cross_counts("plan_condition", "plan")) == []
+
+
+def test_breakdown(index):
+    assert list(index.breakdown()) == [
+        ("phase", "ConvertGuest", 3, 0, 3, T0 + 300),
+        ("phase", "DiskTransfer", 1, 0, 1, T0 + 50),
+        ("reason", "Timeout", 3, 0, 2, T0 + 100),
+        ("condition", "Failed", 1, 0, 1, T0 + 100),
+        ("plan_condition", "VMNotFound", 0, 1, 1, T0 + 200),
+    ]
+
+
+def test_breakdown_counts_plans_by_namespace_and_name(index):
+    # A plan of the same name in another namespace is another plan
+    index.add("vm-e", "id-e", "plan-1", "rhel9", "ns-2", T0, False, [("reason", "Timeout")])
+    assert [row for row in index.breakdown() if row[:2] == ("reason", "Timeout")] == [
+        ("reason", "Timeout", 4, 0, 3, T0 + 100)
+    ]
+
+
+def test_extend_merges_postings(index):
+    first, second = FailureIndex(), FailureIndex()
+    first.extend(RECORDS[:2])
+    second.extend(RECORDS[2:])
+    # Query first so the merged posting lists have to be sorted again
+    assert list(first.rows("phase", "ConvertGuest")) == [0]
+    first.extend(second)
+    assert list(first) == RECORDS
+    for field, value in index.terms:
+        assert list(first.rows(field, value)) == list(index.rows(field, value))
+    assert list(first.breakdown()) == list(index.breakdown())
+
+
+def test_columns_round_trip(index):
+    columns = index.to_columns()
+    restored = FailureIndex.from_columns(
+        **{key: value.tobytes() if hasattr(value, "tobytes") else value for key, value in columns.items()}
+    )
+    assert list(restored) == RECORDS
+    assert list(restored.rows("reason", "Timeout", T0)) == list(index.rows("reason", "Timeout", T0))
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_rows_match_brute_force(seed):
+    rnd = random.Random(seed)
+    records = [
+        FailureRecord(
+            f"vm-{row}",
+            f"id-{row}",
+            f"plan-{rnd.randrange(5)}",
+            rnd.choice(["rhel9", "windows2019"]),
+            rnd.choice(["ns-1", "ns-2"]),
+            None if rnd.random() < 0.1 else T0 + rnd.randrange(0, 86400, 60),
+            False,
+            tuple(
+                {
+                    ("phase", rnd.choice(["ConvertGuest", "DiskTransfer", "CreateVM"])),
+                    ("reason", rnd.choice(["Timeout", "NotFound", "Forbidden"])),
+                }
+            ),
+        )
+        for row in range(300)
+    ]
+    parts = [FailureIndex() for _ in range(3)]
+    for row, record in enumerate(records):
+        parts[row % 3 if row < 150 else 2].append(record)
+    index = parts[0]
+    index.extend(parts[1])
+    index.extend(parts[2])
+    order = [records.index(record) for record in index]
+    for _ in range(30):
+        term = (rnd.choice(["phase", "reason"]), rnd.choice(["ConvertGuest", "DiskTransfer", "Timeout", "Forbidden"]))
+        start = rnd.choice([None, T0 + rnd.randrange(86400)])
+        end = rnd.choice([None, T0 + rnd.randrange(86400)])
+        expected = sorted(
+            (-(1 << 63) if records[source].time is None else records[source].time, row)
+            for row, source in enumerate(order)
+            if term in records[source].terms
+            and (
+                (start is None and end is None)
+                or records[source].time is not None
+                and (start is None or records[source].time >= start)
+                and (end is None or records[source].time < end)
+            )
+        )
+        assert list(index.rows(*term, start, end)) == [row for _, row in expected]
+
+
+def test_parse_failure_term():
+    assert parse_failure_term("ConvertGuest") == ("phase", "ConvertGuest")
+    assert parse_failure_term("reason=Timeout") == ("reason", "Timeout")
+    assert parse_failure_term("plan-condition=VMNotFound") == ("plan_condition", "VMNotFound")
+    assert parse_failure_term("colour=red") == ("phase", "colour=red")
@@ -0,0 +1,101 @@
+import json
+
+import instrumentation
+import pytest
+from instrumentation import Instrumentation, instrumented
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture
+def process_metrics():
+    """The process-wide instrumentation, switched off and emptied again after the test."""
+    yield instrumentation.metrics
+    instrumentation.metrics.disable()
+    instrumentation.metrics.reset()
+
+
+def test_disabled_instrumentation_records_nothing(process_metrics):
+    recorder = Instrumentation()
+    assert recorder.stage("load") is recorder.stage("report")
+    with recorder.stage("load") as stage:
+        stage.add_items(5)
+    assert list(recorder.iterate("parse", range(3))) == [0, 1, 2]
+
+    @instrumented("double", items=len)
+    def double(values):
+        return values * 2
+
+    assert double([1]) == [1, 1]
+    assert recorder.stages == {} and process_metrics.stages == {}
+
+
+def test_stages_add_up():
+    recorder = Instrumentation()
+    recorder.enable()
+    for count in (2, 3):
+        with recorder.stage("load") as stage:
+            stage.add_items(count)
+    assert list(recorder.iterate("parse", "abcd")) == ["a", "b", "c", "d"]
+    load, parse = recorder.stages["load"], recorder.stages["parse"]
+    assert (load.calls, load.items) == (2, 5)
+    # one call per item plus the one that hits the end of the iterable
+    assert (parse.calls, parse.items) == (5, 4)
+    assert load.wall_seconds >= 0 and load.cpu_seconds >= 0 and load.peak_rss_bytes > 0
+    assert load.peak_traced_bytes is None
+
+
+def test_decorator_counts_items(process_metrics):
+    @instrumented("double", items=len)
+    def double(values):
+        return values * 2
+
+    process_metrics.enable()
+    double([1, 2])
+    double([3])
+    assert (process_metrics.stages["double"].calls, process_metrics.stages["double"].items) == (2, 6)
+
+
+def test_trace_memory_measures_heap_growth():
+    recorder = Instrumentation()
+    recorder.enable(trace_memory=True)
+    try:
+        with recorder.stage("allocate"):
+            block = bytearray(4 * 1024 * 1024)
+        del block
+    finally:
+        recorder.disable()
+    assert recorder.stages["allocate"].peak_traced_bytes >= 4 * 1024 * 1024
+
+
+def test_merge_worker_snapshots():
+    worker = Instrumentation()
+    worker.enable()
+    with worker.stage("parse") as stage:
+        stage.add_items(7)
+    recorder = Instrumentation()
+    recorder.enable()
+    with recorder.stage("parse") as stage:
+        stage.add_items(1)
+    recorder.merge(json.loads(json.dumps(worker.snapshot())))
+    assert (recorder.stages["parse"].calls, recorder.stages["parse"].items) == (2, 8)
+
+
+def test_json_and_prometheus_output(tmp_path):
+    recorder = Instrumentation()
+    recorder.enable()
+    with recorder.stage("load") as stage:
+        stage.add_items(3)
+
+    recorder.write(tmp_path / "metrics.json")
+    document = json.loads((tmp_path / "metrics.json").read_text())
+    assert document["stages"]["load"]["items"] == 3 and document["peak_rss_bytes"] > 0
+
+    recorder.write(tmp_path / "metrics.prom")
+    lines = (tmp_path / "metrics.prom").read_text().splitlines()
+    assert 'mtv_parser_stage_items{stage="load"} 3' in lines
+    assert 'mtv_parser_stage_calls_total{stage="load"} 1' in lines
+    assert "# TYPE mtv_parser_stage_calls_total counter" in lines
+    assert not any("peak_traced_bytes" in line for line in lines)
+    # the partial files written before the atomic rename are gone
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["metrics.json", "metrics.prom"]
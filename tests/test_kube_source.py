@@ -0,0 +1,167 @@
+import http.client
+import threading
+import time
+
+import pytest
+from kube_source import KubeAPIError, PlanPager, _Prefetcher, iter_api_plans
+from mtv_plan_parser import load_api, load_dump, parse_args
+from plan_loader import iter_dump, json_loads
+from stub_apiserver import StubAPIServer
+
+pytestmark = pytest.mark.unit
+
+PAGE_SIZE = 7
+
+
+@pytest.fixture(scope="module")
+def stub(sample_json_dump):
+    server = StubAPIServer(("127.0.0.1", 0), str(sample_json_dump))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+@pytest.fixture
+def url(stub):
+    return f"http://127.0.0.1:{stub.server_address[1]}"
+
+
+def _fetcher_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "plan-page-fetcher"]
+
+
+def _state(result):
+    all_vms, successful, failed = result
+    return list(all_vms), successful, failed
+
+
+def test_fetch_pages_with_limit_and_continue(stub, url):
+    pager = PlanPager(url, page_size=PAGE_SIZE)
+    sizes = []
+    continue_token = None
+    while True:
+        page = json_loads(pager.fetch(continue_token))
+        sizes.append(len(page["items"]))
+        continue_token = page["metadata"].get("continue")
+        if not continue_token:
+            break
+    pager.close()
+    plans = len(stub.plans)
+    assert sum(sizes) == plans
+    assert sizes == [PAGE_SIZE] * (plans // PAGE_SIZE) + ([plans % PAGE_SIZE] if plans % PAGE_SIZE else [])
+
+
+def test_pages_share_one_connection(stub, url):
+    connections = stub.connections
+    pages = list(PlanPager(url, page_size=PAGE_SIZE).pages())
+    assert len(pages) > 1
+    assert stub.connections == connections + 1
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_api_plans_match_the_dump(url, sample_json_dump, prefetch):
+    expected = list(iter_dump(str(sample_json_dump)))
+    found = list(iter_api_plans(PlanPager(url, page_size=PAGE_SIZE), prefetch=prefetch))
+    for plan in expected:
+        # Items of a list response carry no apiVersion
+        plan.pop("apiVersion", None)
+    for plan in found:
+        plan.pop("apiVersion", None)
+    assert found == expected
+    assert not _fetcher_threads()
+
+
+@pytest.mark.parametrize("prefetch", ["0", "2"])
+def test_load_api_matches_load_dump(url, sample_json_dump, prefetch):
+    args = parse_args(["--api-server", url, "--page-size", str(PAGE_SIZE), "--prefetch-pages", prefetch])
+    assert _state(load_api(args)) == _state(load_dump(str(sample_json_dump)))
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_error_status_raises(stub, url, prefetch):
+    stub.token = "secret"
+    try:
+        with pytest.raises(KubeAPIError) as error:
+            list(iter_api_plans(PlanPager(url, token="wrong", page_size=PAGE_SIZE), prefetch=prefetch))
+        assert error.value.status == 401
+        assert "Unauthorized" in str(error.value)
+        plans = list(iter_api_plans(PlanPager(url, token="secret", page_size=PAGE_SIZE), prefetch=prefetch))
+        assert len(plans) == len(stub.plans)
+    finally:
+        stub.token = None
+    assert not _fetcher_threads()
+
+
+def test_early_break_stops_the_fetch_thread(stub, url):
+    requests = stub.requests
+    plans = iter_api_plans(PlanPager(url, page_size=1), prefetch=1)
+    next(plans)
+    assert len(_fetcher_threads()) == 1
+    plans.close()
+    assert not _fetcher_threads()
+    # The page being consumed, one waiting in the queue and one held by the blocked thread at most
+    assert stub.requests - requests <= 3 < len(stub.plans)
+
+
+class _ClosedConnection:
+    """A kept-alive connection the server has closed since the last request."""
+
+    def request(self, *args, **kwargs):
+        raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+    def close(self):
+        pass
+
+
+def test_fetch_reconnects_once_when_the_server_closed_the_connection(stub, url, monkeypatch):
+    pager = PlanPager(url, page_size=PAGE_SIZE)
+    pager._connection = _ClosedConnection()
+    assert len(json_loads(pager.fetch())["items"]) == PAGE_SIZE
+    pager.close()
+
+    monkeypatch.setattr(pager, "_connect", _ClosedConnection)
+    with pytest.raises(http.client.RemoteDisconnected):
+        pager.fetch()
+
+
+def _pages(count, produced, fail_at=None, closed=None):
+    try:
+        for number in range(count):
+            if number == fail_at:
+                raise ValueError("page failed")
+            produced.append(number)
+            yield {"items": [number]}
+    finally:
+        if closed is not None:
+            closed.set()
+
+
+def test_prefetcher_yields_pages_in_order():
+    produced = []
+    assert [page["items"][0] for page in _Prefetcher(_pages(10, produced), 2)] == list(range(10))
+    assert not _fetcher_threads()
+
+
+def test_prefetcher_stays_a_bounded_number_of_pages_ahead():
+    produced = []
+    closed = threading.Event()
+    pages = iter(_Prefetcher(_pages(100, produced, closed=closed), 2))
+    next(pages)
+    time.sleep(0.3)
+    # The page consumed, two in the queue and one waiting to be queued
+    assert len(produced) <= 4
+    pages.close()
+    assert closed.is_set()
+    assert not _fetcher_threads()
+
+
+def test_prefetcher_raises_fetch_errors_in_the_consumer():
+    produced = []
+    pages = iter(_Prefetcher(_pages(10, produced, fail_at=3), 2))
+    assert [next(pages)["items"][0] for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(ValueError, match="page failed"):
+        next(pages)
+    assert not _fetcher_threads()
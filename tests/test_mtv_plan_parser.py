@@ -0,0 +1,268 @@
+import copy as copy_module
+import csv
+import json
+import pstats
+import subprocess
+import sys
+from pathlib import Path
+
+import chart_pipeline
+import instrumentation
+import pytest
+import yaml
+from chart_pipeline import DEFAULT_CHART
+from interval_index import IntervalIndex
+from mtv_plan_parser import load_dump, main
+from plan_loader import iter_plans
+
+pytestmark = pytest.mark.e2e
+
+PACKAGE = Path(__file__).resolve().parent.parent / "mtv_parser"
+# Modules a text report without charts, cache or API server must not import
+UNUSED_MODULES = {"matplotlib", "pandas", "multiprocessing", "sqlite3", "ssl", "http.client"}
+# Results of the sample dump, known since the generator is seeded: plans and VMs per state, VMs and peak
+SUCCESSFUL_PLANS, SUCCESSFUL_VMS = 30, 83
+FAILED_PLANS, FAILED_VMS = 7, 13
+SAMPLE_VMS = SUCCESSFUL_VMS + FAILED_VMS
+PEAK_CONCURRENT_VMS = 13
+# Sections of the structured report of the sample dump, in order
+REPORT_SECTIONS = [
+    "migrations",
+    "os",
+    "disk_rates",
+    "failures_breakdown",
+    "failures_by_phase_and_os",
+    "concurrency",
+    "concurrency_by_os",
+    "concurrency_buckets",
+    "bandwidth",
+    "bandwidth_underutilized",
+    "bandwidth_by_os",
+    "bandwidth_by_plan",
+    "bandwidth_buckets",
+    "bandwidth_os_buckets",
+    "bandwidth_plan_buckets",
+]
+
+
+def _values(lines, label):
+    """The values printed after a label of the text report."""
+    return [line[len(label) :].strip() for line in lines if line.startswith(label)]
+
+
+def _value(lines, label):
+    (value,) = _values(lines, label)
+    return value
+
+
+def test_text_report(tmp_path, monkeypatch, capsys, sample_dump):
+    monkeypatch.chdir(tmp_path)
+    main(
+        [
+            "-j1",
+            "--per-os",
+            "--bucket-peak",
+            "--bucket-minutes",
+            "30",
+            "--group-by",
+            "os,provider",
+            "--gantt-bandwidth",
+            str(sample_dump),
+        ]
+    )
+    report = capsys.readouterr().out
+    lines = report.splitlines()
+    headers = [line for line, underline in zip(lines, lines[1:]) if underline and set(underline) == {"="}]
+    assert headers == [
+        "OS REPORT",
+        "BREAKDOWN BY OS, PROVIDER",
+        "DISK TRANSFER RATES (MB/s)",
+        "FAILURE BREAKDOWN",
+        "CONCURRENCY REPORT",
+        "BANDWIDTH REPORT",
+    ]
+    assert _value(lines, "The number of successful migrations:") == str(SUCCESSFUL_PLANS)
+    assert _value(lines, "The number of failed migrations:") == str(FAILED_PLANS)
+    assert sorted(int(value) for value in _values(lines, "The number of vms:")) == [FAILED_VMS, SUCCESSFUL_VMS]
+    assert sum(int(value) for value in _values(lines, "Number of VMs:")) == SAMPLE_VMS
+    assert _value(lines, "Peak concurrent VMs:") == str(PEAK_CONCURRENT_VMS)
+    assert "Concurrent VMs per 30 minutes:" in report
+    assert (tmp_path / "migration_gantt_chart.png").stat().st_size > 0
+
+
+def test_metrics_and_profile(tmp_path, monkeypatch, capsys, sample_dump):
+    monkeypatch.chdir(tmp_path)
+    try:
+        main(["-j1", "--metrics", "metrics.json", "--profile", "run.prof", str(sample_dump)])
+    finally:
+        instrumentation.metrics.disable()
+        instrumentation.metrics.reset()
+    stages = json.loads((tmp_path / "metrics.json").read_text())["stages"]
+    assert {"total", "load", "parse", "gantt_chart", "report"} <= set(stages)
+    with sample_dump.open("rb") as stream:
+        assert stages["parse"]["items"] == sum(1 for _ in iter_plans(stream))
+    assert stages["total"]["calls"] == 1
+    assert "report" in {function for _, _, function in pstats.Stats(str(tmp_path / "run.prof")).stats}
+
+
+def test_query_longest(capsys, sample_dump):
+    main(["query", "--longest", "3", str(sample_dump)])
+    output = capsys.readouterr().out.splitlines()
+    assert output[0] == "All VMs, 3 longest" and output[2] == "3 VMs"
+    column = output[4].index("Minutes") + len("Minutes")
+    minutes = [float(line[:column].split()[-1]) for line in output[5:8]]
+    assert minutes == sorted(minutes, reverse=True)
+
+
+def test_query_plan_in_one_of_two_namespaces(tmp_path, capsys, sample_dump):
+    all_vms = load_dump(str(sample_dump))[0]
+    with sample_dump.open("rb") as stream:
+        plans = list(iter_plans(stream, fields=None))
+    # A plan with migrated VMs, copied to a second namespace with the same VMs and times
+    (plan,) = [plan for plan in plans if plan["metadata"]["name"] == all_vms.plan_name(0)]
+    copy = copy_module.deepcopy(plan)
+    copy["metadata"]["namespace"] = "second"
+    copy["metadata"]["uid"] += "-second"
+    dump = tmp_path / "plans.yaml"
+    with dump.open("w") as stream:
+        yaml.safe_dump({"apiVersion": "v1", "kind": "List", "items": plans + [copy]}, stream)
+    name, namespace = plan["metadata"]["name"], plan["metadata"]["namespace"]
+    vms = {all_vms.names[row] for row in IntervalIndex(all_vms).rows.tolist() if all_vms.plan_name(row) == name}
+
+    assert main(["query", "--plan", name, str(dump)]) == 2
+    assert f"Plan {name} exists in namespaces {namespace}, second" in capsys.readouterr().err
+    for plan_namespace in (namespace, "second"):
+        output = tmp_path / f"{plan_namespace}.jsonl"
+        main(["query", "--plan", f"{plan_namespace}/{name}", "--format", "jsonl", "-o", str(output), str(dump)])
+        rows = [json.loads(line) for line in output.read_text().splitlines()]
+        # Only the VMs of the plan in the other namespace, which ran at the same times
+        assert sorted(row["name"] for row in rows if row["plan"] == name) == sorted(vms)
+
+
+def test_query_failures(tmp_path, sample_dump):
+    failures = load_dump(str(sample_dump))[0].failures
+    field, value, vms, plans, _, _ = max(failures.breakdown(), key=lambda row: row[2] + row[3])
+    output = tmp_path / "failures.jsonl"
+    main(
+        [
+            "query",
+            "--failure",
+            f"{field}={value}",
+            "--count-by",
+            "plan",
+            "--format",
+            "jsonl",
+            "-o",
+            str(output),
+            str(sample_dump),
+        ]
+    )
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    found = [row for row in rows if row["section"] == "failures"]
+    assert len(found) == vms + plans > 0
+    assert all(value in row[f"{field}s" if field in ("phase", "reason") else "conditions"] for row in found)
+    counts = {row["plan"]: row["failures"] for row in rows if row["section"] == "failures_by_plan"}
+    assert sum(counts.values()) == len(found)
+
+
+def test_diff(tmp_path, sample_dump, sample_json_dump):
+    output = tmp_path / "diff.txt"
+    main(["diff", str(sample_dump), str(sample_json_dump), "-o", str(output)])
+    lines = [line.split() for line in output.read_text().splitlines()]
+    assert ["CHANGES", "BETWEEN", "DUMPS"] in lines
+    assert ["Plans", "unchanged:", "40"] in lines and ["Plans", "changed:", "0"] in lines
+    assert ["VMs", "migrated", "since:", "0"] in lines
+
+
+def test_charts_are_rendered(tmp_path, monkeypatch, sample_dump):
+    monkeypatch.chdir(tmp_path)
+    assert main(["-j1", "--chart-workers", "1", "--gantt-variant", "os", "-o", "report.txt", str(sample_dump)]) == 0
+    assert "CONCURRENCY REPORT" in (tmp_path / "report.txt").read_text()
+    assert (tmp_path / DEFAULT_CHART).stat().st_size > 0
+    assert (tmp_path / DEFAULT_CHART.replace(".png", "_os.png")).stat().st_size > 0
+
+
+def test_failed_chart_sets_exit_status(tmp_path, monkeypatch, capsys, sample_dump):
+    def render_chart(records, job):
+        raise RuntimeError("no display")
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(chart_pipeline, "render_chart", render_chart)
+    assert main(["-j1", "--chart-workers", "0", "-o", "report.txt", str(sample_dump)]) == 1
+    assert f"Gantt chart {DEFAULT_CHART} failed: RuntimeError: no display" in capsys.readouterr().err
+    assert "CONCURRENCY REPORT" in (tmp_path / "report.txt").read_text()
+
+
+def test_text_report_does_not_import_unused_modules(tmp_path, sample_dump):
+    script = (
+        "import sys\n"
+        f"sys.path.insert(0, {str(PACKAGE)!r})\n"
+        "from mtv_plan_parser import main\n"
+        f"main(['-j1', '--no-plot', {str(sample_dump)!r}])\n"
+        f"print(sorted({UNUSED_MODULES!r} & set(sys.modules)), file=sys.stderr)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=tmp_path, capture_output=True, text=True, check=True)
+    assert "CONCURRENCY REPORT" in result.stdout
+    assert result.stderr.splitlines()[-1] == "[]"
+    assert not (tmp_path / "migration_gantt_chart.png").exists()
+
+
+def test_jsonl_report(tmp_path, sample_dump):
+    output = tmp_path / "report.jsonl"
+    main(["-j1", "--no-plot", "--format", "jsonl", "-o", str(output), str(sample_dump)])
+    rows = [json.loads(line) for line in output.read_text().splitlines()]
+    assert list(dict.fromkeys(row["section"] for row in rows)) == REPORT_SECTIONS
+    migrations = {row["state"]: (row["plans"], row["vms"]) for row in rows if row["section"] == "migrations"}
+    assert migrations == {"successful": (SUCCESSFUL_PLANS, SUCCESSFUL_VMS), "failed": (FAILED_PLANS, FAILED_VMS)}
+    assert sum(row["vms"] for row in rows if row["section"] == "os") == SAMPLE_VMS
+    (concurrency,) = [row for row in rows if row["section"] == "concurrency"]
+    assert concurrency["max_concurrent_vms"] == PEAK_CONCURRENT_VMS
+
+
+def test_csv_report(tmp_path, sample_dump):
+    output = tmp_path / "report.csv"
+    main(["-j1", "--no-plot", "--format", "csv", "-o", str(output), str(sample_dump)])
+    with output.open(newline="") as stream:
+        header, *lines = csv.reader(stream)
+    assert header == ["section", "row", "field", "value"]
+    assert all(len(line) == len(header) for line in lines)
+    assert list(dict.fromkeys(section for section, _, _, _ in lines)) == REPORT_SECTIONS
+    values = {(section, int(row), field): value for section, row, field, value in lines}
+    assert values["migrations", 0, "state"] == "failed" and values["migrations", 0, "vms"] == str(FAILED_VMS)
+    assert values["migrations", 1, "state"] == "successful" and values["migrations", 1, "vms"] == str(SUCCESSFUL_VMS)
+    assert values["concurrency", 0, "max_concurrent_vms"] == str(PEAK_CONCURRENT_VMS)
+
+
+def test_simulate_candidates(tmp_path, sample_dump):
+    candidates = tmp_path / "wave.csv"
+    candidates.write_text(
+        "name,os,plan,disk_size,host\n" + "".join(f"vm-{i},rhel9,p{i % 2},10240,h{i % 3}\n" for i in range(12))
+    )
+    output = tmp_path / "wave.txt"
+    main(
+        [
+            "simulate",
+            "--vms",
+            str(candidates),
+            "--max-concurrent",
+            "4",
+            "--max-per-host",
+            "1",
+            "-o",
+            str(output),
+            str(sample_dump),
+        ]
+    )
+    report = output.read_text()
+    assert "SIMULATED WAVE" in report
+    assert "Number of VMs:                  12" in report
+    assert "Max per host:                   1" in report
+    assert "Critical path:" in report
+
+
+def test_simulate_replay_rejects_a_host_limit(capsys, sample_dump):
+    # The observed VMs have no source host, a host limit would not hold any of them back
+    with pytest.raises(SystemExit) as error:
+        main(["simulate", "--max-per-host", "1", str(sample_dump)])
+    assert error.value.code == 2
+    assert "--max-per-host requires --vms" in capsys.readouterr().err
@@ -0,0 +1,137 @@
+import sqlite3
+
+import plan_cache
+import pytest
+from mtv_plan_parser import load_dump, load_dumps
+from plan_cache import PlanCache
+from plan_loader import iter_plans
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+
+def _state(loaded):
+    all_vms, successful_migrations, failed_migrations = loaded
+    return (
+        list(all_vms),
+        list(all_vms.failures),
+        all_vms.disk_rates.to_dict(),
+        successful_migrations,
+        failed_migrations,
+    )
+
+
+@pytest.fixture(scope="module")
+def plans(sample_dump):
+    with sample_dump.open("rb") as stream:
+        return list(iter_plans(stream))
+
+
+def test_miss_then_hit(tmp_path, sample_dump, plans):
+    expected = _state(load_dump(sample_dump))
+    with PlanCache(tmp_path / "cache.db") as cache:
+        assert _state(load_dump(sample_dump, cache)) == expected
+        assert (cache.hits, cache.misses) == (0, len(plans))
+    with PlanCache(tmp_path / "cache.db") as cache:
+        assert _state(load_dump(sample_dump, cache)) == expected
+        assert (cache.hits, cache.misses) == (len(plans), 0)
+
+
+def test_new_resource_version_is_a_miss(tmp_path, plans):
+    plan = plans[0]
+    with PlanCache(tmp_path / "cache.db") as cache:
+        cache.put(plan, ("summary", []))
+        assert cache.contains(plan["metadata"])
+        changed = {**plan, "metadata": {**plan["metadata"], "resourceVersion": "changed"}}
+        assert not cache.contains(changed["metadata"])
+        assert cache.get(changed) is None
+        assert cache.get(plan) == ("summary", [])
+
+
+def test_plans_without_uid_are_not_cached(tmp_path):
+    with PlanCache(tmp_path / "cache.db") as cache:
+        cache.put({"metadata": {"name": "no-uid"}}, ("summary", []))
+        assert cache.get({"metadata": {"name": "no-uid"}}) is None
+        assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_read_only_cache_collects_updates(tmp_path, plans):
+    path = tmp_path / "cache.db"
+    with PlanCache(path) as cache:
+        cache.put(plans[0], ("first", []))
+    with PlanCache(path, read_only=True) as worker:
+        assert worker.get(plans[0]) == ("first", [])
+        worker.put(plans[1], ("second", []))
+        assert not worker.contains(plans[1]["metadata"])
+        updates = worker.updates()
+    uids = [plan["metadata"]["uid"] for plan in plans[:2]]
+    assert updates[0] == set(uids) and updates[1] == uids[:1]
+    assert [row[0] for row in updates[2]] == uids[1:]
+    with PlanCache(path, max_plans=10) as cache:
+        cache.apply(updates)
+        assert cache.seen == set(uids)
+        assert cache.get(plans[1]) == ("second", [])
+        # Plans looked up by the worker survive the prune
+        assert cache.prune() == 0
+
+
+def test_cached_plans_are_read_once_without_writes(tmp_path, sample_dump, plans):
+    path = tmp_path / "cache.db"
+    with PlanCache(path) as cache:
+        load_dump(sample_dump, cache)
+    with PlanCache(path) as cache:
+        statements = []
+        cache._connection.set_trace_callback(statements.append)
+        load_dump(sample_dump, cache)
+        assert cache.hits == len(plans)
+        # The lookup of the loader's skip predicate is kept for get
+        assert sum(statement.startswith("SELECT summary") for statement in statements) == len(plans)
+        assert not [statement for statement in statements if not statement.startswith("SELECT")]
+
+
+def test_last_use_is_written_at_close(tmp_path, plans, monkeypatch):
+    path = tmp_path / "cache.db"
+    monkeypatch.setattr(plan_cache.time, "time", lambda: 1000.0)
+    with PlanCache(path) as cache:
+        for plan in plans[:2]:
+            cache.put(plan, ("summary", []))
+    monkeypatch.setattr(plan_cache.time, "time", lambda: 2000.0)
+    with PlanCache(path) as cache:
+        assert cache.get(plans[1]) == ("summary", [])
+        assert cache.get({**plans[0], "metadata": {**plans[0]["metadata"], "resourceVersion": "changed"}}) is None
+    with sqlite3.connect(path) as connection:
+        last_used = dict(connection.execute("SELECT uid, last_used FROM plans"))
+    assert last_used == {plans[0]["metadata"]["uid"]: 1000.0, plans[1]["metadata"]["uid"]: 2000.0}
+
+
+def test_prune_evicts_unseen_and_excess_plans(tmp_path, plans):
+    path = tmp_path / "cache.db"
+    with PlanCache(path) as cache:
+        for plan in plans[:5]:
+            cache.put(plan, ("summary", []))
+    with PlanCache(path, max_plans=2) as cache:
+        for plan in plans[:3]:
+            cache.get(plan)
+        assert cache.prune() == 3
+        assert sum(cache.contains(plan["metadata"]) for plan in plans[:5]) == 2
+        assert not any(cache.contains(plan["metadata"]) for plan in plans[3:5])
+
+
+def test_parallel_dumps_merge_in_order(tmp_path, sample_dump, second_sample_dump):
+    paths = [str(sample_dump), str(second_sample_dump)]
+    all_vms = VMRecords()
+    successful_migrations, failed_migrations = [], []
+    for path in paths:
+        vms, successful, failed = load_dump(path)
+        all_vms.extend(vms)
+        successful_migrations += successful
+        failed_migrations += failed
+    expected = _state((all_vms, successful_migrations, failed_migrations))
+    assert _state(load_dumps(paths)) == expected
+    cache_path = str(tmp_path / "cache.db")
+    assert _state(load_dumps(paths, jobs=2, cache_path=cache_path)) == expected
+    with PlanCache(cache_path) as cache:
+        for path in paths:
+            with open(path, "rb") as stream:
+                assert all(cache.contains(plan["metadata"]) for plan in iter_plans(stream))
+    assert _state(load_dumps(paths, jobs=2, cache_path=cache_path)) == expected
@@ -0,0 +1,49 @@
+import io
+
+import pytest
+import yaml
+from plan_generator import PlanGenerator, main
+from plan_loader import iter_plans
+
+pytestmark = pytest.mark.unit
+
+
+def _dump(plans=20, **options):
+    stream = io.StringIO()
+    PlanGenerator(**options).write(stream, plans)
+    return stream.getvalue()
+
+
+def test_seed_makes_dumps_reproducible():
+    assert _dump(seed=1) == _dump(seed=1)
+    assert _dump(seed=1) != _dump(seed=2)
+
+
+def test_dump_is_a_list_of_plans():
+    document = yaml.safe_load(_dump(seed=3))
+    assert document["kind"] == "List"
+    plans = document["items"]
+    assert len(plans) == 20 and all(plan["kind"] == "Plan" for plan in plans)
+    assert len({plan["metadata"]["uid"] for plan in plans}) == 20
+    for plan in plans:
+        migration = plan["status"]["migration"]
+        if migration:
+            assert len(plan["spec"]["vms"]) == len(migration["vms"])
+            assert migration["started"] <= min(vm["started"] for vm in migration["vms"])
+    assert list(iter_plans(_dump(seed=3))) == list(iter_plans(yaml.safe_dump(document)))
+
+
+def test_options_shape_the_plans():
+    plans = yaml.safe_load(_dump(seed=4, warm_ratio=1.0, failure_rate=0.0, vms_per_plan=2, not_started_rate=0.0))
+    vms = [vm for plan in plans["items"] for vm in plan["status"]["migration"]["vms"]]
+    assert all(vm["warm"]["precopies"] for vm in vms)
+    assert all(vm["conditions"][0]["type"] == "Succeeded" for vm in vms)
+    assert all(1 <= len(plan["spec"]["vms"]) <= 2 for plan in plans["items"])
+    never_run = yaml.safe_load(_dump(seed=5, not_started_rate=1.0))
+    assert all(plan["status"]["migration"] == {} for plan in never_run["items"])
+
+
+def test_command_line(tmp_path):
+    path = tmp_path / "plans.yaml"
+    main(["--plans", "5", "--seed", "6", "-o", str(path)])
+    assert path.read_text() == _dump(5, seed=6)
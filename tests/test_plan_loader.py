@@ -0,0 +1,105 @@
+import gzip
+import lzma
+
+import pytest
+import yaml
+from plan_loader import PLAN_FIELDS, iter_dump, iter_json_plans, iter_plans
+
+pytestmark = pytest.mark.unit
+
+
+def _selected(value, fields):
+    """Reference field selection on a fully parsed value."""
+    if fields is True:
+        return value
+    if isinstance(value, list):
+        return [_selected(item, fields) for item in value]
+    if isinstance(value, dict):
+        return {key: _selected(item, fields[key]) for key, item in value.items() if key in fields}
+    return value
+
+
+@pytest.fixture(scope="module")
+def full_plans(sample_dump):
+    with sample_dump.open() as stream:
+        return yaml.load(stream, Loader=yaml.CSafeLoader)["items"]
+
+
+def test_selects_plan_fields(sample_dump, full_plans):
+    with sample_dump.open("rb") as stream:
+        plans = list(iter_plans(stream))
+    assert plans == [_selected(plan, PLAN_FIELDS) for plan in full_plans]
+    assert all("map" not in plan["spec"] and set(plan["spec"]["provider"]) == {"source"} for plan in plans)
+
+
+def test_without_fields_builds_complete_plans(sample_dump, full_plans):
+    with sample_dump.open("rb") as stream:
+        assert list(iter_plans(stream, fields=None)) == full_plans
+
+
+def test_skip_stops_after_metadata(sample_dump, full_plans):
+    skipped = {plan["metadata"]["uid"] for plan in full_plans[::3]}
+    seen = []
+
+    def skip(metadata):
+        seen.append(metadata["name"])
+        return metadata["uid"] in skipped
+
+    with sample_dump.open("rb") as stream:
+        plans = list(iter_plans(stream, skip=skip))
+    assert seen == [plan["metadata"]["name"] for plan in full_plans]
+    for plan, full_plan in zip(plans, full_plans):
+        if full_plan["metadata"]["uid"] in skipped:
+            assert "status" not in plan and "spec" not in plan
+            assert plan["metadata"] == _selected(full_plan["metadata"], PLAN_FIELDS["metadata"])
+        else:
+            assert plan == _selected(full_plan, PLAN_FIELDS)
+
+
+def test_single_plan_document(full_plans):
+    plan = full_plans[1]
+    assert list(iter_plans(yaml.safe_dump(plan))) == [_selected(plan, PLAN_FIELDS)]
+    assert list(iter_plans(yaml.safe_dump({"kind": "ConfigMap", "data": {}}))) == []
+
+
+def test_aliases_resolve_into_skipped_subtrees():
+    document = """
+items:
+- kind: Plan
+  metadata: &meta {name: a, namespace: ns, uid: "1", resourceVersion: "5", labels: {x: y}}
+  spec: {map: {network: &target big}, targetNamespace: *target}
+- kind: Plan
+  metadata: *meta
+"""
+    fields = {"kind": True, "metadata": {"name": True}, "spec": {"targetNamespace": True}}
+    plans = list(iter_plans(document, fields))
+    # Anchored nodes are built whole since later aliases may select any part of them
+    assert plans[0]["metadata"]["labels"] == {"x": "y"}
+    assert plans[0]["spec"] == {"targetNamespace": "big"}
+    assert plans[1]["metadata"] == plans[0]["metadata"]
+
+
+def test_json_loader_matches_yaml_loader(sample_dump, sample_json_dump):
+    def skip(metadata):
+        return metadata["name"].endswith("5-plan")
+
+    for skip_plans in (None, skip):
+        with sample_dump.open("rb") as stream:
+            from_yaml = list(iter_plans(stream, skip=skip_plans))
+        with sample_json_dump.open("rb") as stream:
+            from_json = list(iter_json_plans(stream, skip=skip_plans))
+        assert [plan["metadata"] for plan in from_json] == [plan["metadata"] for plan in from_yaml]
+        assert [list(plan) for plan in from_json] == [list(plan) for plan in from_yaml]
+
+
+@pytest.mark.parametrize("suffix, compress", [(".gz", gzip.compress), (".xz", lzma.compress)])
+def test_compressed_dumps(tmp_path, sample_dump, suffix, compress):
+    path = tmp_path / f"plans.yaml{suffix}"
+    path.write_bytes(compress(sample_dump.read_bytes()))
+    assert list(iter_dump(path)) == list(iter_dump(sample_dump))
+
+
+def test_format_is_sniffed_without_suffix(tmp_path, sample_json_dump):
+    path = tmp_path / "plans"
+    path.write_bytes(sample_json_dump.read_bytes())
+    assert list(iter_dump(path)) == list(iter_dump(sample_json_dump))
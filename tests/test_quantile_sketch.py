@@ -0,0 +1,134 @@
+import bisect
+import json
+import random
+
+import pytest
+from quantile_sketch import DiskRateSketches, KLLSketch
+
+pytestmark = pytest.mark.unit
+
+FRACTIONS = [0.01, 0.1, 0.25, 0.5, 0.75, 0.9, 0.95, 0.99]
+# Rank error allowed, a few times the ~1.7 / k expected for k = 200
+RANK_ERROR = 0.025
+
+
+def _samples(seed, count):
+    rnd = random.Random(seed)
+    return [rnd.lognormvariate(4, 1) for _ in range(count)]
+
+
+def _assert_ranks(sketch, samples):
+    exact = sorted(samples)
+    for fraction, estimate in zip(FRACTIONS, sketch.quantiles(FRACTIONS)):
+        rank = bisect.bisect_right(exact, estimate) / len(exact)
+        assert abs(rank - fraction) <= RANK_ERROR, (fraction, rank)
+
+
+def _stored(sketch):
+    return sum(len(values) for values in sketch.to_dict()["levels"])
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_rank_error_against_exact_quantiles(seed):
+    samples = _samples(seed, 20000)
+    sketch = KLLSketch()
+    for value in samples:
+        sketch.add(value)
+    assert sketch.n == len(samples)
+    assert sketch.min == min(samples) and sketch.max == max(samples)
+    assert sketch.quantiles([0, 1]) == [min(samples), max(samples)]
+    _assert_ranks(sketch, samples)
+    assert _stored(sketch) < 1000
+
+
+def test_small_sketches_are_exact():
+    samples = _samples(4, 101)
+    sketch = KLLSketch()
+    for value in samples:
+        sketch.add(value)
+    assert sketch.quantile(0.5) == sorted(samples)[50]
+    assert KLLSketch().quantiles([0.5, 0.99]) == [None, None]
+    with pytest.raises(ValueError):
+        KLLSketch(k=1)
+
+
+def test_merge():
+    samples = _samples(5, 30000)
+    parts = [KLLSketch(seed=part) for part in range(5)]
+    for index, value in enumerate(samples):
+        parts[index % 5].add(value)
+    merged = KLLSketch()
+    for part in parts:
+        merged.merge(part)
+    merged.merge(KLLSketch())
+    assert merged.n == len(samples)
+    assert merged.min == min(samples) and merged.max == max(samples)
+    _assert_ranks(merged, samples)
+    assert _stored(merged) < 1000
+    with pytest.raises(ValueError):
+        merged.merge(KLLSketch(k=100))
+
+
+def test_sketches_are_reproducible():
+    samples = _samples(6, 5000)
+    first, second = KLLSketch(seed=3), KLLSketch(seed=3)
+    for value in samples:
+        first.add(value)
+        second.add(value)
+    assert first.to_dict() == second.to_dict()
+
+
+def test_dict_round_trip():
+    samples = _samples(7, 5000)
+    sketch = KLLSketch(seed=9)
+    for value in samples[:4000]:
+        sketch.add(value)
+    restored = KLLSketch.from_dict(json.loads(json.dumps(sketch.to_dict())))
+    assert restored.to_dict() == sketch.to_dict()
+    assert restored.quantiles(FRACTIONS) == sketch.quantiles(FRACTIONS)
+    # The restored sketch carries on exactly like the original
+    for value in samples[4000:]:
+        sketch.add(value)
+        restored.add(value)
+    assert restored.to_dict() == sketch.to_dict()
+
+
+def test_disk_rates_group_by_datastore_and_os():
+    sketches = DiskRateSketches()
+    sketches.add_tasks("rhel9", [("ds-1", 10.0), ("ds-2", 30.0)])
+    sketches.add_tasks("windows2019", [("ds-2", 20.0), ("ds-3", 40.0), ("ds-1", 50.0)])
+    sketches.add_tasks("rhel9", [])
+    assert len(sketches) == 5
+    assert list(sketches.by_datastore) == ["ds-1", "ds-2", "ds-3"]
+    assert list(sketches.by_os) == ["rhel9", "windows2019"]
+    assert {key: sketch.n for key, sketch in sketches.by_datastore.items()} == {"ds-1": 2, "ds-2": 2, "ds-3": 1}
+    assert sketches.by_os["rhel9"].quantiles([0, 1]) == [10.0, 30.0]
+    assert sketches.by_os["windows2019"].quantile(0.5) == 40.0
+    assert sketches.all.quantile(0.5) == 30.0
+    assert [(grouping, key) for grouping, key, _ in sketches.groups()] == [
+        ("all", ""),
+        ("datastore", "ds-1"),
+        ("datastore", "ds-2"),
+        ("datastore", "ds-3"),
+        ("os", "rhel9"),
+        ("os", "windows2019"),
+    ]
+
+
+def test_disk_rates_merge_and_round_trip():
+    whole, first, second = DiskRateSketches(), DiskRateSketches(), DiskRateSketches()
+    rnd = random.Random(8)
+    for index in range(3000):
+        task = (f"ds-{rnd.randrange(4)}", rnd.uniform(5, 400))
+        os = rnd.choice(["rhel9", "windows2019"])
+        whole.add_tasks(os, [task])
+        (first if index < 1000 else second).add_tasks(os, [task])
+    first.merge(second)
+    assert len(first) == len(whole)
+    assert sorted(group[:2] for group in first.groups()) == sorted(group[:2] for group in whole.groups())
+    for (_, _, merged), (_, _, sketch) in zip(
+        sorted(first.groups(), key=lambda group: group[:2]), sorted(whole.groups(), key=lambda group: group[:2])
+    ):
+        assert merged.n == sketch.n and merged.min == sketch.min and merged.max == sketch.max
+    restored = DiskRateSketches.from_dict(json.loads(json.dumps(first.to_dict())))
+    assert restored.to_dict() == first.to_dict()
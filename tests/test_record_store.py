@@ -0,0 +1,69 @@
+import json
+
+import pytest
+from mtv_plan_parser import load_dump
+from record_store import STORE_VERSION, load_store, load_stores, save_store, vm_frame
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(scope="module")
+def loaded(sample_dump):
+    return load_dump(sample_dump)
+
+
+def _state(loaded):
+    all_vms, successful_migrations, failed_migrations = loaded
+    return (
+        list(all_vms),
+        [all_vms.datastore_name(index) for index in range(len(all_vms))],
+        list(all_vms.failures),
+        all_vms.disk_rates.to_dict(),
+        successful_migrations,
+        failed_migrations,
+    )
+
+
+def test_round_trip(tmp_path, loaded):
+    all_vms, successful_migrations, failed_migrations = loaded
+    assert len(all_vms) and successful_migrations and failed_migrations
+    save_store(tmp_path / "store", *loaded)
+    assert _state(load_store(tmp_path / "store")) == _state(loaded)
+    failures = load_store(tmp_path / "store")[0].failures
+    assert len(failures) and list(failures.breakdown()) == list(all_vms.failures.breakdown())
+
+
+def test_save_replaces_store(tmp_path, loaded):
+    all_vms, successful_migrations, failed_migrations = loaded
+    save_store(tmp_path / "store", *loaded)
+    save_store(tmp_path / "store", all_vms, successful_migrations[:1], [])
+    assert load_store(tmp_path / "store")[1:] == (successful_migrations[:1], [])
+    assert [path.name for path in tmp_path.iterdir()] == ["store"]
+
+
+def test_load_stores_merges_in_order(tmp_path, loaded):
+    save_store(tmp_path / "first", *loaded)
+    save_store(tmp_path / "second", *loaded)
+    all_vms, successful_migrations, failed_migrations = load_stores([tmp_path / "first", tmp_path / "second"])
+    assert list(all_vms) == list(loaded[0]) * 2
+    assert len(all_vms.disk_rates) == 2 * len(loaded[0].disk_rates)
+    assert successful_migrations == loaded[1] * 2
+    assert failed_migrations == loaded[2] * 2
+
+
+def test_other_versions_are_rejected(tmp_path, loaded):
+    save_store(tmp_path / "store", *loaded)
+    meta_path = tmp_path / "store" / "meta.json"
+    meta = json.loads(meta_path.read_text())
+    meta_path.write_text(json.dumps({**meta, "version": STORE_VERSION - 1}))
+    with pytest.raises(ValueError, match="record store"):
+        load_store(tmp_path / "store")
+
+
+def test_vm_frame(tmp_path, loaded):
+    pytest.importorskip("pandas")
+    all_vms = loaded[0]
+    save_store(tmp_path / "store", *loaded)
+    frame = vm_frame(tmp_path / "store")
+    assert frame["name"].tolist() == all_vms.names
+    assert frame["plan"].tolist() == [all_vms.plan_name(row) for row in range(len(all_vms))]
@@ -0,0 +1,189 @@
+"""The wave scheduler checked on hand-built candidate lists and against a brute force simulation."""
+
+import io
+import random
+
+import numpy as np
+import pytest
+from simulation import (
+    PlannedVM,
+    Throughput,
+    ThroughputModel,
+    observed_candidates,
+    read_candidates,
+    simulate_waves,
+)
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+T0 = 1719792000
+# One minute per MB of disk and no overhead, so a VM of n MB takes n minutes
+MODEL = ThroughputModel(Throughput(0.0, 1.0))
+
+
+def _vm(name, minutes, plan="", host=""):
+    return PlannedVM(name, "rhel9", plan, minutes, host)
+
+
+def _starts(schedule):
+    return [(start - T0) // 60 for start in schedule.records.start_times]
+
+
+def _brute_force(vms, max_concurrent=None, max_per_plan=None, max_per_host=None):
+    """Start minute of each VM: whenever VMs end, start the first pending VMs of the list the limits allow."""
+    unlimited = len(vms) + 1
+    limits = (max_concurrent or unlimited, max_per_plan or unlimited, max_per_host or unlimited)
+    starts = [None] * len(vms)
+    running = []
+    now = 0
+    while True:
+        for index, vm in enumerate(vms):
+            if starts[index] is not None:
+                continue
+            plans = sum(1 for other in running if vm.plan and vms[other].plan == vm.plan)
+            hosts = sum(1 for other in running if vm.host and vms[other].host == vm.host)
+            if len(running) < limits[0] and plans < limits[1] and hosts < limits[2]:
+                starts[index] = now
+                running.append(index)
+        if not running:
+            return starts
+        now = min(starts[index] + vms[index].disk_size for index in running)
+        running = [index for index in running if starts[index] + vms[index].disk_size > now]
+
+
+def _peak(schedule, group=None):
+    """Most VMs running at once, per value of ``group`` (a function of the row) if given."""
+    records = schedule.records
+    events = sorted(
+        (time, delta, row)
+        for row in range(len(records))
+        for time, delta in ((records.start_times[row], 1), (records.end_times[row], -1))
+    )
+    running, peak = {}, {}
+    for _, delta, row in events:
+        key = group(row) if group else None
+        running[key] = running.get(key, 0) + delta
+        peak[key] = max(peak.get(key, 0), running[key])
+    return peak
+
+
+def test_global_limit():
+    vms = [_vm("a", 10), _vm("b", 20), _vm("c", 30), _vm("d", 5)]
+    schedule = simulate_waves(vms, MODEL, T0, max_concurrent=2)
+    assert _starts(schedule) == [0, 0, 10, 20]
+    assert schedule.makespan == 40
+    # c started when a ended and ends last
+    assert schedule.critical_path() == [0, 2]
+
+
+def test_per_plan_limit():
+    vms = [_vm("a", 10, "p1"), _vm("b", 10, "p1"), _vm("c", 15, "p2"), _vm("d", 10, "p1")]
+    schedule = simulate_waves(vms, MODEL, T0, max_per_plan=1)
+    assert _starts(schedule) == [0, 10, 0, 20]
+    assert schedule.makespan == 30
+    assert schedule.critical_path() == [0, 1, 3]
+
+
+def test_per_host_limit_lets_other_hosts_pass():
+    vms = [_vm("a", 20, host="h1"), _vm("b", 5, host="h1"), _vm("c", 5, host="h2"), _vm("d", 5, host="h2")]
+    schedule = simulate_waves(vms, MODEL, T0, max_concurrent=2, max_per_host=1)
+    assert _starts(schedule) == [0, 20, 0, 5]
+    assert schedule.makespan == 25
+    assert schedule.critical_path() == [0, 1]
+
+
+def test_no_limits_start_everything():
+    vms = [_vm(f"vm-{index}", minutes) for index, minutes in enumerate([7, 3, 12])]
+    schedule = simulate_waves(vms, MODEL, T0)
+    assert _starts(schedule) == [0, 0, 0]
+    assert schedule.makespan == 12 and schedule.critical_path() == [2]
+    assert simulate_waves([], MODEL, T0).critical_path() == []
+
+
+@pytest.mark.parametrize("seed", range(6))
+def test_matches_brute_force(seed):
+    rnd = random.Random(seed)
+    vms = [
+        _vm(
+            f"vm-{index}",
+            rnd.choice([5, 10, 15, 30, rnd.randint(1, 60)]),
+            rnd.choice(["", "p1", "p2", "p3"]),
+            rnd.choice(["", "h1", "h2", "h3", "h4"]),
+        )
+        for index in range(80)
+    ]
+    limits = {
+        "max_concurrent": rnd.choice([None, 4, 10]),
+        "max_per_plan": rnd.choice([None, 2, 3]),
+        "max_per_host": rnd.choice([None, 1, 2]),
+    }
+    schedule = simulate_waves(vms, MODEL, T0, **limits)
+    assert _starts(schedule) == _brute_force(vms, **limits)
+
+    records = schedule.records
+    assert schedule.makespan == pytest.approx((max(records.end_times) - T0) / 60)
+    unlimited = len(vms)
+    assert _peak(schedule)[None] <= (limits["max_concurrent"] or unlimited)
+    for key, peak in _peak(schedule, lambda row: vms[row].plan).items():
+        assert not key or peak <= (limits["max_per_plan"] or unlimited)
+    for key, peak in _peak(schedule, lambda row: vms[row].host).items():
+        assert not key or peak <= (limits["max_per_host"] or unlimited)
+
+    path = schedule.critical_path()
+    assert records.start_times[path[0]] == T0
+    assert records.end_times[path[-1]] == max(records.end_times)
+    assert all(records.end_times[first] == records.start_times[second] for first, second in zip(path, path[1:]))
+
+
+def test_limits_must_be_positive():
+    with pytest.raises(ValueError, match="max_per_host"):
+        simulate_waves([_vm("a", 1)], MODEL, T0, max_per_host=0)
+
+
+def test_throughput_fit():
+    disk_sizes = np.array([1024.0, 2048.0, 4096.0, 8192.0])
+    throughput = Throughput.fit(disk_sizes, 3 + disk_sizes / 100)
+    assert throughput.overhead == pytest.approx(3) and throughput.minutes_per_mb == pytest.approx(0.01)
+    # A negative overhead falls back to a fit through the origin
+    throughput = Throughput.fit(disk_sizes, disk_sizes / 100 - 3)
+    assert throughput.overhead == 0 and throughput.minutes_per_mb > 0
+    assert Throughput.fit(np.array([]), np.array([])) is None
+
+
+def test_model_fit_per_os():
+    records = VMRecords()
+    for index in range(8):
+        disk_size = 1024 * (index + 1)
+        records.add(f"rhel-{index}", "rhel9", "p", disk_size, T0, 2 + disk_size / 512)
+        records.add(f"win-{index}", "windows2019", "p", disk_size, T0, 10 + disk_size / 256)
+    records.add("odd", "solaris", "p", 1024, T0, 500.0)
+    records.add("failed", "rhel9", "p", 1024, T0, 900.0, failed=True)
+    model = ThroughputModel.fit(records)
+    assert set(model.by_os) == {"rhel9", "windows2019"}
+    assert model.minutes("rhel9", 2048) == pytest.approx(6)
+    assert model.minutes("windows2019", 2048) == pytest.approx(18)
+    assert model.minutes("solaris", 0) == pytest.approx(model.overall.overhead)
+    with pytest.raises(ValueError):
+        ThroughputModel.fit(VMRecords())
+
+
+def test_read_candidates():
+    vms = read_candidates(io.StringIO("name,disk_size,host,plan\nvm-1,1024,h1,p1\nvm-2,2048.0,,\n"))
+    assert [(vm.name, vm.disk_size, vm.host, vm.plan, vm.os) for vm in vms] == [
+        ("vm-1", 1024, "h1", "p1", "unknown"),
+        ("vm-2", 2048, "", "", "unknown"),
+    ]
+    with pytest.raises(ValueError, match="disk_size"):
+        read_candidates(io.StringIO("name,os\nvm-1,rhel9\n"))
+
+
+def test_observed_candidates_replay_the_datastores():
+    records = VMRecords()
+    records.add("late", "rhel9", "p", 2048, T0 + 60, 10.0, disk_tasks=[("ds-2", 10.0)])
+    records.add("early", "windows2019", "q", 1024, T0, 5.0, disk_tasks=[("ds-1", 20.0), ("ds-2", 10.0)])
+    records.add("never", "rhel9", "p", 0, None, 0.0)
+    assert [(vm.name, vm.os, vm.plan, vm.disk_size, vm.host, vm.datastore) for vm in observed_candidates(records)] == [
+        ("early", "windows2019", "q", 1024, "", "ds-1"),
+        ("late", "rhel9", "p", 2048, "", "ds-2"),
+    ]
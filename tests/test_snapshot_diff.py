@@ -0,0 +1,87 @@
+import copy
+
+import pytest
+import snapshot_diff
+import yaml
+from snapshot_diff import diff_dumps
+from vm_information import summarize_plan
+
+pytestmark = pytest.mark.unit
+
+
+def _write(path, plans):
+    with path.open("w") as stream:
+        yaml.safe_dump({"apiVersion": "v1", "items": plans, "kind": "List"}, stream)
+    return path
+
+
+@pytest.fixture(scope="module")
+def plans(sample_dump):
+    with sample_dump.open() as stream:
+        items = yaml.safe_load(stream)["items"]
+    return [plan for plan in items if "completed" in plan["status"]["migration"]]
+
+
+@pytest.fixture
+def dumps(tmp_path, plans):
+    """An old and a new dump: one plan completed, one removed, one added and two without resourceVersion."""
+    old = copy.deepcopy(plans[:8])
+    new = copy.deepcopy(plans[:8])
+    completed = new[0]
+    old[0]["metadata"]["resourceVersion"] = "1"
+    old[0]["status"]["migration"] = {"started": completed["status"]["migration"]["started"]}
+    del new[1]
+    new.append(copy.deepcopy(plans[8]))
+    for plan in old[2:4] + new[1:3]:
+        del plan["metadata"]["resourceVersion"]
+    new[2]["spec"]["targetNamespace"] = "moved"
+    return _write(tmp_path / "old.yaml", old), _write(tmp_path / "new.yaml", new), plans
+
+
+def test_plan_changes(dumps):
+    old_path, new_path, plans = dumps
+    result = diff_dumps(old_path, new_path)
+    assert result["plans"] == {"added": 1, "changed": 2, "removed": 1, "unchanged": 5}
+    kinds = {change[1]: change[0] for change in result["plan_changes"]}
+    assert kinds == {
+        plans[0]["metadata"]["name"]: "changed",
+        plans[3]["metadata"]["name"]: "changed",
+        plans[1]["metadata"]["name"]: "removed",
+        plans[8]["metadata"]["name"]: "added",
+    }
+    completed = next(change for change in result["plan_changes"] if change[1] == plans[0]["metadata"]["name"])
+    assert completed[3] == "Running" and completed[4] in ("Succeeded", "Failed")
+
+
+def test_completed_vms(dumps):
+    old_path, new_path, plans = dumps
+    result = diff_dumps(old_path, new_path)
+    expected = [record.name for plan in (plans[0], plans[8]) for record in summarize_plan(plan)[0]]
+    assert sorted(result["completed_vms"].names) == sorted(expected)
+    assert result["removed_vms"] == len(summarize_plan(plans[1])[0])
+
+
+def test_only_changed_plans_are_derived(dumps, monkeypatch):
+    old_path, new_path, plans = dumps
+    derived = []
+
+    class CountingPlanVersion(snapshot_diff.PlanVersion):
+        __slots__ = ()
+
+        def __init__(self, entry):
+            derived.append(entry["metadata"]["name"])
+            super().__init__(entry)
+
+    monkeypatch.setattr(snapshot_diff, "PlanVersion", CountingPlanVersion)
+    diff_dumps(old_path, new_path)
+    names = [plan["metadata"]["name"] for plan in plans]
+    # The new side of the completed, added and edited plans, then the old side of the completed, removed and
+    # edited plans
+    assert derived == [names[0], names[3], names[8], names[0], names[1], names[3]]
+
+
+def test_identical_dumps(tmp_path, plans):
+    path = _write(tmp_path / "plans.yaml", plans)
+    result = diff_dumps(path, path)
+    assert result["plans"] == {"added": 0, "changed": 0, "removed": 0, "unchanged": len(plans)}
+    assert result["plan_changes"] == [] and not len(result["completed_vms"]) and not len(result["new_failures"])
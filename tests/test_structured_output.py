@@ -0,0 +1,188 @@
+import csv
+import io
+import json
+from datetime import timedelta
+
+import clioutput
+import pytest
+from clioutput import CLIOutput, plain_table
+from mtv_plan_parser import load_dump
+from structured_output import (
+    CSV_FIELDS,
+    VM_FIELDS,
+    CSVOutput,
+    JSONLinesOutput,
+    vm_rows,
+)
+from tabulate import tabulate
+from vm_information import analyze_concurrent_migrations
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+SECTIONS = [
+    "migrations",
+    "os",
+    "disk_rates",
+    "failures_breakdown",
+    "failures_by_phase_and_os",
+    "concurrency",
+    "concurrency_by_os",
+    "concurrency_drops",
+    "concurrency_buckets",
+    "concurrency_os_buckets",
+]
+
+
+@pytest.fixture(scope="module")
+def report(sample_dump):
+    all_vms, successful_migrations, failed_migrations = load_dump(str(sample_dump))
+    concurrency_data = analyze_concurrent_migrations(all_vms, timedelta(minutes=30), per_os=True, bucket_peak=True)
+    return all_vms, successful_migrations, failed_migrations, concurrency_data
+
+
+def test_jsonl_rows(report):
+    all_vms, successful_migrations, failed_migrations, concurrency_data = report
+    sink = io.StringIO()
+    JSONLinesOutput(sink).write_report(*report)
+    rows = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert list(dict.fromkeys(row["section"] for row in rows)) == [
+        section for section in SECTIONS if section != "concurrency_drops" or concurrency_data["significant_drops"]
+    ]
+    migrations = {row["state"]: row for row in rows if row["section"] == "migrations"}
+    assert migrations["successful"]["plans"] == len(successful_migrations)
+    assert migrations["failed"]["plans"] == len(failed_migrations)
+    assert sum(row["vms"] for row in rows if row["section"] == "os") == len(all_vms)
+    disk_rates = {(row["grouping"], row["key"]): row for row in rows if row["section"] == "disk_rates"}
+    assert disk_rates["all", ""]["disks"] == len(all_vms.disk_rates) > 0
+    assert sum(row["disks"] for (grouping, _), row in disk_rates.items() if grouping == "os") == len(all_vms.disk_rates)
+    (concurrency,) = [row for row in rows if row["section"] == "concurrency"]
+    assert concurrency["max_concurrent_vms"] == concurrency_data["max_concurrent_total"]
+    assert concurrency["bucket_seconds"] == 1800
+    buckets = [row for row in rows if row["section"] == "concurrency_buckets"]
+    assert [row["vms"] for row in buckets] == [data["vms"] for data in concurrency_data["concurrency_buckets"]]
+    assert all(row["time"].endswith("+00:00") for row in buckets)
+
+
+def test_csv_table(report):
+    sink = io.StringIO()
+    CSVOutput(sink).write_report(*report)
+    header, *lines = csv.reader(io.StringIO(sink.getvalue()))
+    assert tuple(header) == CSV_FIELDS
+    assert all(len(line) == len(CSV_FIELDS) for line in lines)
+    # The same rows as the JSON lines, one line per value
+    rows = {}
+    for section, number, field, value in lines:
+        rows.setdefault((section, int(number)), {})[field] = value
+    jsonl = io.StringIO()
+    JSONLinesOutput(jsonl).write_report(*report)
+    expected = [json.loads(line) for line in jsonl.getvalue().splitlines()]
+    assert list(dict.fromkeys(section for section, _ in rows)) == list(
+        dict.fromkeys(row["section"] for row in expected)
+    )
+    assert len(rows) == len(expected)
+    (concurrency,) = [row for (section, _), row in rows.items() if section == "concurrency"]
+    assert int(concurrency["max_concurrent_vms"]) == report[3]["max_concurrent_total"]
+
+
+def test_csv_sections_never_share_columns():
+    sink = io.StringIO()
+    output = CSVOutput(sink)
+    output.write_sections([("first", ("name", "vms"), [("a", 1), ("b", 2)]), ("second", ("vms", "name"), [(3, "c")])])
+    output.close()
+    assert sink.getvalue().splitlines() == [
+        "section,row,field,value",
+        "first,0,name,a",
+        "first,0,vms,1",
+        "first,1,name,b",
+        "first,1,vms,2",
+        "second,0,vms,3",
+        "second,0,name,c",
+    ]
+
+
+def test_csv_rows_are_written_as_generated():
+    sink = io.StringIO()
+    written = []
+
+    def rows():
+        for number in range(3):
+            yield (number,)
+            written.append(sink.getvalue().count("\n"))
+
+    CSVOutput(sink).write_section("numbers", ("number",), rows())
+    # The header and each row are written before the next row is generated
+    assert written == [2, 3, 4]
+
+
+def test_csv_without_rows_has_a_header():
+    sink = io.StringIO()
+    output = CSVOutput(sink)
+    output.write_vm_table(VMRecords(), [], "ignored")
+    output.close()
+    assert sink.getvalue() == "section,row,field,value\n"
+
+
+def test_vm_table(report):
+    all_vms = report[0]
+    rows = [3, 0, 2]
+    sink = io.StringIO()
+    JSONLinesOutput(sink).write_vm_table(all_vms, rows, "ignored")
+    found = [json.loads(line) for line in sink.getvalue().splitlines()]
+    assert [row["name"] for row in found] == [all_vms.names[index] for index in rows]
+    assert [tuple(row[field] for field in VM_FIELDS) for row in found] == list(vm_rows(all_vms, rows))
+
+
+def test_text_output_to_a_sink(report, capsys):
+    sink = io.StringIO()
+    output = CLIOutput(sink)
+    output.write_report(*report)
+    output.close()
+    output = CLIOutput()
+    output.write_report(*report)
+    output.close()
+    assert sink.getvalue() == capsys.readouterr().out
+    assert "CONCURRENCY REPORT" in sink.getvalue()
+
+
+@pytest.mark.parametrize(
+    "rows, headers, right",
+    [
+        ([["a", "1.5"], ["long cell", "22.0"]], ["Name", "Value"], {1}),
+        ([["a", "1.5"], ["long cell", "22.0"]], [], {1}),
+        ([[""], ["Title:"], [" indented:", 3, "extra"], ["x", None]], [], set()),
+        ([["   padded  ", "b"], ["c"]], ["A long header", "B"], set()),
+    ],
+)
+def test_plain_table_matches_tabulate(rows, headers, right):
+    columns = max(len(row) for row in rows)
+    expected = tabulate(
+        rows,
+        headers=headers,
+        tablefmt="plain",
+        disable_numparse=True,
+        colalign=["right" if column in right else "left" for column in range(columns)],
+    )
+    assert "\n".join(plain_table(lambda: rows, headers, right)) == expected
+
+
+def test_long_tables_are_written_in_chunks(report, monkeypatch):
+    all_vms = report[0]
+    monkeypatch.setattr(clioutput, "TABLE_CHUNK_LINES", 10)
+    writes = []
+
+    class Sink(io.StringIO):
+        def write(self, text):
+            writes.append(text)
+            return super().write(text)
+
+    sink = Sink()
+    output = CLIOutput(sink)
+    output.write_vm_table(all_vms, range(len(all_vms)), "All VMs")
+    output.close()
+    lines = sink.getvalue().splitlines()
+    # The title, its underline, the count, a blank line, the column headers and one line per VM
+    assert len(lines) == 5 + len(all_vms)
+    assert lines[4].split() == ["VM", "Plan", "OS", "Start", "End", "Minutes", "State"]
+    assert max(text.count("\n") for text in writes) <= 10
+    assert len([text for text in writes if text]) > len(lines) // 10
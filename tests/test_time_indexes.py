@@ -0,0 +1,249 @@
+"""The sweep line, interval tree and bandwidth curves checked against brute force over random VMs."""
+
+import random
+from datetime import timedelta
+
+import numpy as np
+import pytest
+from bandwidth import BandwidthCurves
+from concurrency import ConcurrencyTimeline, floor_time
+from interval_index import IntervalIndex
+from timestamps import MISSING
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+T0 = 1719792000
+OSES = ("rhel9", "windows2019", "ubuntu")
+PLANS = ("plan-a", "plan-b", "plan-c", "plan-d")
+# Plans of the same name in both namespaces are different plans
+NAMESPACES = ("ns-1", "ns-2")
+
+
+def _records(seed, count=200, span=2 * 86400):
+    """Random VMs on distinct seconds, a few of them without a start time, a duration or disks."""
+    rnd = random.Random(seed)
+    records = VMRecords()
+    seconds = rnd.sample(range(T0, T0 + span), 2 * count)
+    for index in range(count):
+        start, end = sorted(seconds[2 * index : 2 * index + 2])
+        missing = rnd.random() < 0.05
+        records.add(
+            f"vm-{index}",
+            rnd.choice(OSES),
+            rnd.choice(PLANS),
+            rnd.choice([0, 1024, 40960, 512000]),
+            None if missing else start,
+            0.0 if rnd.random() < 0.05 else (end - start) / 60,
+            end_time=None if missing else end,
+            namespace=rnd.choice(NAMESPACES),
+        )
+    return records
+
+
+def _intervals(records):
+    """(row, start, end) of the VMs the sweep line and the interval tree index."""
+    return [
+        (row, records.start_times[row], records.end_times[row])
+        for row in range(len(records))
+        if records.start_times[row] != MISSING and records.durations[row]
+    ]
+
+
+def _plan_key(records, row):
+    return records.namespace_name(row), records.plan_name(row)
+
+
+@pytest.fixture(params=[1, 2, 3])
+def records(request):
+    return _records(request.param)
+
+
+def test_timeline_totals_and_peaks(records):
+    timeline = ConcurrencyTimeline(records)
+    intervals = _intervals(records)
+
+    def running(when, os_name=None):
+        return sum(
+            start <= when < end for row, start, end in intervals if os_name is None or records.os_name(row) == os_name
+        )
+
+    times = sorted(time for _, start, end in intervals for time in (start, end))
+    assert list(timeline.times) == times
+    for when in times[::7] + [times[0] - 1, times[-1] + 1]:
+        assert timeline.total_at(when) == running(when)
+        expected = {}
+        for row, start, end in intervals:
+            if start <= when < end:
+                expected.setdefault(records.os_name(row), []).append(records.names[row])
+        assert {os_name: sorted(names) for os_name, names in timeline.running_at(when).items()} == {
+            os_name: sorted(names) for os_name, names in expected.items()
+        }
+    assert timeline.max_concurrent_total == max(running(when) for when in times)
+    assert timeline.peak_time == min(when for when in times if running(when) == timeline.max_concurrent_total)
+    for os_name, peak in timeline.max_concurrent.items():
+        assert peak == max(running(when, os_name) for when in times)
+
+
+def test_timeline_average(records):
+    timeline = ConcurrencyTimeline(records)
+    events = sorted(
+        (time, delta, row) for row, start, end in _intervals(records) for time, delta in ((start, 1), (end, -1))
+    )
+    weighted = total = 0.0
+    current = 0
+    for _, delta, row in events:
+        weighted += current * records.durations[row]
+        total += records.durations[row]
+        current += delta
+    assert timeline.average_concurrent_vms == round(weighted / total, 2)
+
+
+@pytest.mark.parametrize("width", [timedelta(minutes=15), timedelta(hours=1), timedelta(hours=5)])
+def test_timeline_buckets(records, width):
+    timeline = ConcurrencyTimeline(records)
+    intervals = _intervals(records)
+    step = int(width.total_seconds())
+
+    def running(when, os_name=None):
+        return sum(
+            start <= when < end for row, start, end in intervals if os_name is None or records.os_name(row) == os_name
+        )
+
+    buckets = timeline.buckets(width, per_os=True, peak=True)
+    first, last = timeline.times[0], timeline.times[-1]
+    assert [bucket["time"] for bucket in buckets] == list(range(floor_time(first, step), last + 1, step))
+    for bucket in buckets:
+        start = bucket["time"]
+        inside = [start] + [when for when in timeline.times if start <= when < start + step]
+        assert bucket["vms"] == running(start)
+        assert bucket["peak_vms"] == max(running(when) for when in inside)
+        for os_name in OSES:
+            assert bucket["os"].get(os_name, 0) == running(start, os_name)
+            assert bucket["os_peak"].get(os_name, 0) == max(running(when, os_name) for when in inside)
+    assert [{"time": bucket["time"], "vms": bucket["vms"]} for bucket in timeline.buckets(width)] == [
+        {"time": bucket["time"], "vms": bucket["vms"]} for bucket in buckets
+    ]
+
+
+def test_interval_index_queries(records):
+    index = IntervalIndex(records)
+    intervals = _intervals(records)
+    assert len(index) == len(intervals)
+    rnd = random.Random(len(records))
+    for _ in range(50):
+        when = rnd.randrange(T0 - 3600, T0 + 2 * 86400 + 3600)
+        expected = {row for row, start, end in intervals if start <= when < end}
+        assert set(index.at(when).tolist()) == expected
+        assert index.count_at(when) == len(expected)
+        end = when + rnd.choice([0, 60, 3600, 86400])
+        overlapping = index.overlapping(when, end).tolist()
+        if end > when:
+            expected = {row for row, start, stop in intervals if start < end and stop > when}
+        assert set(overlapping) == expected and len(overlapping) == len(expected)
+        assert [records.start_times[row] for row in overlapping] == sorted(
+            records.start_times[row] for row in overlapping
+        )
+        longest = index.longest(5, when, end).tolist()
+        lengths = sorted((stop - start for row, start, stop in intervals if row in expected), reverse=True)
+        assert [records.end_times[row] - records.start_times[row] for row in longest] == lengths[:5]
+
+
+def test_interval_index_longest_and_plans(records):
+    index = IntervalIndex(records)
+    intervals = _intervals(records)
+    lengths = sorted((end - start for _, start, end in intervals), reverse=True)
+    longest = index.longest(10).tolist()
+    assert [records.end_times[row] - records.start_times[row] for row in longest] == lengths[:10]
+    assert index.longest(0).tolist() == []
+    for namespace in NAMESPACES:
+        for plan in PLANS:
+            key = namespace, plan
+            mine = [(start, end) for row, start, end in intervals if _plan_key(records, row) == key]
+            first, last = min(start for start, _ in mine), max(end for _, end in mine)
+            assert index.plan_span(namespace, plan) == (first, last)
+            assert set(index.overlapping_plan(namespace, plan).tolist()) == {
+                row for row, start, end in intervals if _plan_key(records, row) != key and start < last and end > first
+            }
+    assert index.plan_span("ns-1", "no-such-plan") is None
+    assert index.plan_span("no-such-namespace", "plan-a") is None
+    assert index.overlapping_plan("no-such-namespace", "plan-a").tolist() == []
+
+
+def test_buckets_reject_empty_width(records):
+    with pytest.raises(ValueError):
+        ConcurrencyTimeline(records).buckets(timedelta(0))
+
+
+def test_empty_timeline():
+    timeline = ConcurrencyTimeline(VMRecords())
+    assert len(timeline) == 0 and timeline.max_concurrent_total == 0 and timeline.peak_time is None
+    assert timeline.average_concurrent_vms == 0
+    assert timeline.total_at(T0) == 0 and timeline.running_at(T0) == {}
+    assert timeline.buckets() == []
+    index = IntervalIndex(VMRecords())
+    assert len(index) == 0 and index.count_at(T0) == 0
+    assert index.at(T0).tolist() == [] and index.overlapping(T0, T0 + 3600).tolist() == []
+
+
+@pytest.mark.parametrize("width", [timedelta(minutes=10), timedelta(hours=1), timedelta(hours=7)])
+def test_bandwidth_curves(records, width):
+    curves = BandwidthCurves(records, width)
+    step = int(width.total_seconds())
+    used = [
+        (row, records.start_times[row], records.end_times[row])
+        for row in range(len(records))
+        if records.start_times[row] != MISSING
+        and records.end_times[row] > records.start_times[row]
+        and records.disk_sizes[row] > 0
+    ]
+    assert curves.start == floor_time(min(start for _, start, _ in used), step)
+
+    def curve(rows):
+        values = np.zeros(len(curves))
+        for row, start, end in rows:
+            rate = records.disk_sizes[row] / 1024 / (end - start)
+            for bucket in range(len(values)):
+                bucket_start = curves.start + bucket * step
+                overlap = min(end, bucket_start + step) - max(start, bucket_start)
+                values[bucket] += rate * max(0, overlap) * 3600 / step
+        return values
+
+    assert curves.start + len(curves) * step >= max(end for _, _, end in used)
+    np.testing.assert_allclose(curves.total, curve(used), atol=1e-6)
+    assert curves.transferred == pytest.approx(sum(records.disk_sizes[row] for row, _, _ in used) / 1024)
+    for group_curves, name_of in ((curves.by_os, records.os_name), (curves.by_plan, records.plan_name)):
+        dense = group_curves.dense(len(curves))
+        for code, name in enumerate(group_curves.names):
+            np.testing.assert_allclose(dense[code], curve([vm for vm in used if name_of(vm[0]) == name]), atol=1e-6)
+
+
+def test_bandwidth_windows():
+    hour = 3600
+    records = VMRecords()
+    # (start hour, end hour, GB per hour)
+    for index, (start, end, rate, os_name) in enumerate(
+        [(0, 3, 10, "rhel9"), (3, 4, 1, "rhel9"), (4, 7, 9, "windows2019"), (7, 10, 1, "windows2019")]
+    ):
+        records.add(
+            f"vm-{index}",
+            os_name,
+            f"plan-{index}",
+            (end - start) * rate * 1024,
+            T0 + start * hour,
+            (end - start) * 60,
+        )
+    curves = BandwidthCurves(records)
+    assert curves.start == T0 and len(curves) == 10
+    np.testing.assert_allclose(curves.total, [10, 10, 10, 1, 9, 9, 9, 1, 1, 1])
+    assert curves.peak() == (10.0, T0)
+    assert curves.transferred == 61 and curves.average == pytest.approx(6.1)
+    assert curves.plateaus() == [(T0, T0 + 3 * hour, 10.0), (T0 + 4 * hour, T0 + 7 * hour, 9.0)]
+    assert curves.underutilized() == [(T0 + 7 * hour, T0 + 10 * hour, 1.0)]
+    assert [(name, peak, when) for name, peak, when, _ in curves.group_peaks("os")] == [
+        ("rhel9", 10.0, T0),
+        ("windows2019", 9.0, T0 + 4 * hour),
+    ]
+    assert [moved for _, _, _, moved in curves.group_peaks("plan")] == pytest.approx([30, 1, 27, 3])
+    empty = BandwidthCurves(VMRecords())
+    assert len(empty) == 0 and empty.peak() == (0.0, None) and empty.plateaus() == []
@@ -0,0 +1,38 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from timestamps import MISSING, as_epoch, parse_epoch, to_datetime
+
+pytestmark = pytest.mark.unit
+
+# 2024-07-01 06:26:11 UTC
+EPOCH = 1719815171
+
+
+@pytest.mark.parametrize(
+    "timestamp",
+    ["2024-07-01T06:26:11Z", "2024-07-01T06:26:11.750Z", "2024-07-01T08:26:11+02:00", "2024-07-01T06:26:11"],
+)
+def test_parse_epoch(timestamp):
+    assert parse_epoch(timestamp) == EPOCH
+
+
+def test_as_epoch():
+    assert as_epoch(datetime(2024, 7, 1, 6, 26, 11, tzinfo=timezone.utc)) == EPOCH
+    assert as_epoch(datetime(2024, 7, 1, 6, 26, 11)) == EPOCH
+    assert as_epoch(datetime(2024, 7, 1, 1, 26, 11, tzinfo=timezone(timedelta(hours=-5)))) == EPOCH
+    assert as_epoch(EPOCH) == EPOCH
+    assert as_epoch(None) == MISSING
+
+
+def test_to_datetime_round_trip():
+    when = to_datetime(EPOCH)
+    assert when == datetime(2024, 7, 1, 6, 26, 11, tzinfo=timezone.utc)
+    assert as_epoch(when) == EPOCH
+    assert to_datetime(None) is None and to_datetime(MISSING) is None
+
+
+def test_missing_is_nat():
+    times = np.array([EPOCH, MISSING], dtype=np.int64).view("datetime64[s]")
+    assert not np.isnat(times[0]) and np.isnat(times[1])
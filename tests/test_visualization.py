@@ -0,0 +1,54 @@
+import random
+
+import pytest
+from visualization import assign_lanes, plot_gantt_chart
+from vm_records import VMRecords
+
+pytestmark = pytest.mark.unit
+
+
+def _peak_concurrency(starts, ends):
+    events = sorted([(start, 1) for start in starts] + [(end, -1) for end in ends])
+    running = peak = 0
+    for _, delta in events:
+        running += delta
+        peak = max(peak, running)
+    return peak
+
+
+@pytest.mark.parametrize("seed", [1, 2, 3])
+def test_lanes_never_overlap_and_match_peak_concurrency(seed):
+    rnd = random.Random(seed)
+    starts = [rnd.randint(0, 1000) for _ in range(300)]
+    ends = [start + rnd.randint(1, 120) for start in starts]
+    lanes = assign_lanes(starts, ends)
+    for lane in set(lanes):
+        bars = sorted((starts[index], ends[index]) for index in range(len(lanes)) if lanes[index] == lane)
+        assert all(end <= next_start for (_, end), (next_start, _) in zip(bars, bars[1:]))
+    # Bars ending when another starts may share a lane, so ends sort before starts at equal times
+    assert max(lanes) + 1 == _peak_concurrency(starts, ends)
+
+
+def test_back_to_back_bars_share_a_lane():
+    assert assign_lanes([0, 10, 20], [10, 20, 30]) == [0, 0, 0]
+    assert assign_lanes([0, 5, 10], [10, 20, 30]) == [0, 1, 0]
+    assert assign_lanes([], []) == []
+
+
+@pytest.mark.parametrize("mode", ["vm", "lanes", "os", "plan"])
+def test_chart_modes(tmp_path, mode):
+    rnd = random.Random(mode)
+    records = VMRecords()
+    # 2024-07-01 00:00 UTC
+    start = 1719792000
+    for index in range(40):
+        begin = start + 60 * rnd.randint(0, 600)
+        records.add(f"vm-{index}", rnd.choice(["rhel9", "win2019"]), f"plan-{index % 4}", 1024, begin, 90.0)
+    path = tmp_path / f"{mode}.png"
+    plot_gantt_chart(records, mode, str(path), dpi=50)
+    assert path.stat().st_size > 0
+
+
+def test_unknown_mode(tmp_path):
+    with pytest.raises(ValueError):
+        plot_gantt_chart(VMRecords(), "bars", str(tmp_path / "chart.png"))
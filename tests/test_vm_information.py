@@ -0,0 +1,78 @@
+import random
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+from plan_loader import iter_plans
+from vm_information import (
+    VECTORIZE_MIN_PRECOPIES,
+    calculate_effective_migration_time,
+    calculate_effective_migration_times,
+    calculate_plan_effective_migration_times,
+    collect_precopies,
+)
+
+pytestmark = pytest.mark.unit
+
+START = datetime(2024, 7, 1, tzinfo=timezone.utc)
+
+
+def _timestamp(minutes):
+    return f"{START + timedelta(minutes=minutes):%Y-%m-%dT%H:%M:%SZ}"
+
+
+def _random_vm(rnd):
+    """A warm VM with precopies in random order, sharing start times and durations now and then."""
+    precopies = []
+    start = rnd.randint(0, 600)
+    for _ in range(rnd.choice([0, 1, 2, 3, 8])):
+        duration = rnd.choice([10, 20, 40, rnd.randint(1, 90)])
+        precopies.append({"start": _timestamp(start), "end": _timestamp(start + duration)})
+        start += rnd.choice([0, 30, 60])
+    rnd.shuffle(precopies)
+    return {"name": "vm", "warm": {"precopies": precopies}} if precopies or rnd.random() < 0.5 else {"name": "vm"}
+
+
+def _plan(vms):
+    return {"status": {"migration": {"started": _timestamp(0), "completed": _timestamp(700), "vms": vms}}}
+
+
+@pytest.mark.parametrize("threshold", [0.5, 0.25, 1.0])
+def test_batch_matches_scalar(threshold):
+    rnd = random.Random(threshold)
+    vms = [_random_vm(rnd) for _ in range(300)]
+    plan = _plan(vms)
+    expected = [calculate_effective_migration_time(vm, plan, threshold) for vm in vms]
+    starts, ends, offsets = collect_precopies(vms)
+    batch = calculate_effective_migration_times(starts, ends, offsets, 700.0, threshold)
+    np.testing.assert_allclose(batch, expected)
+
+
+def test_batch_without_precopies_uses_fallback():
+    offsets = np.array([0, 0, 0])
+    empty = np.empty(0, dtype=np.int64)
+    assert np.isnan(calculate_effective_migration_times(empty, empty, offsets)).all()
+    np.testing.assert_array_equal(calculate_effective_migration_times(empty, empty, offsets, [3.0, 4.0]), [3.0, 4.0])
+
+
+def test_plan_times_match_scalar_on_both_paths():
+    rnd = random.Random(3)
+    for count in (3, VECTORIZE_MIN_PRECOPIES):
+        vms = [_random_vm(rnd) for _ in range(count)]
+        plan = _plan(vms)
+        expected = [calculate_effective_migration_time(vm, plan) for vm in vms]
+        np.testing.assert_allclose(calculate_plan_effective_migration_times(plan), expected)
+
+
+def test_sample_warm_plans(sample_dump):
+    with sample_dump.open("rb") as stream:
+        plans = [plan for plan in iter_plans(stream) if "completed" in plan["status"].get("migration", {})]
+    assert any("warm" in vm for plan in plans for vm in plan["status"]["migration"]["vms"])
+    for plan in plans:
+        vms = plan["status"]["migration"]["vms"]
+        starts, ends, offsets = collect_precopies(vms)
+        fallback = [calculate_effective_migration_time({}, plan)] * len(vms)
+        np.testing.assert_allclose(
+            calculate_effective_migration_times(starts, ends, offsets, fallback),
+            [calculate_effective_migration_time(vm, plan) for vm in vms],
+        )
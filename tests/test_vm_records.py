@@ -0,0 +1,101 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from timestamps import MISSING
+from vm_records import VMRecord, VMRecords, as_vm_records
+
+pytestmark = pytest.mark.unit
+
+# 2024-07-01 06:00 UTC
+T0 = 1719813600
+MINUTE = 60
+
+
+@pytest.fixture
+def records():
+    records = VMRecords()
+    records.add("vm-1", "rhel9", "plan-a", 2048, T0, 30.0)
+    records.add("vm-2", "win2019", "plan-a", 4096, T0 + 10 * MINUTE, 45.5, failed=True)
+    records.add("vm-3", "rhel9", "plan-b", 1024, T0 + 20 * MINUTE, 5.0, end_time=T0 + 60 * MINUTE)
+    return records
+
+
+def test_rows_round_trip(records):
+    assert len(records) == 3
+    assert records[0] == VMRecord("vm-1", "rhel9", "plan-a", 2048, T0, T0 + 30 * MINUTE, 30.0)
+    assert records[1].failed and records[1].end_time == T0 + 55 * MINUTE + 30
+    assert records[2].end_time == T0 + 60 * MINUTE
+    assert [record.name for record in records] == ["vm-1", "vm-2", "vm-3"]
+
+
+def test_names_are_interned(records):
+    assert records.os_names == ["rhel9", "win2019"]
+    assert records.plan_names == ["plan-a", "plan-b"]
+    assert [records.os_name(index) for index in range(3)] == ["rhel9", "win2019", "rhel9"]
+    assert [records.plan_name(index) for index in range(3)] == ["plan-a", "plan-a", "plan-b"]
+    assert records.by_os() == {"rhel9": [0, 2], "win2019": [1]}
+
+
+def test_label_codes_and_plan_namespaces(records):
+    records.add("vm-4", "rhel9", "plan-a", 0, T0, 1.0, namespace="other")
+    assert records.label_code("plan", "plan-b") == 1 and records.label_code("plan", "plan-c") is None
+    assert records.label_code("namespace", "other") == records.namespace_codes[3]
+    assert records.plan_namespaces("plan-a") == ["", "other"]
+    assert records.plan_namespaces("plan-b") == [""]
+    assert records.plan_namespaces("plan-c") == []
+    with pytest.raises(ValueError):
+        records.label_code("colour", "red")
+
+
+def test_extend_copies_every_record(records):
+    copy = VMRecords()
+    copy.extend(records)
+    assert list(copy) == list(records)
+
+
+def test_datastore_of_the_first_disk_task(records):
+    records.add("vm-4", "rhel9", "plan-b", 2048, T0, 5.0, disk_tasks=[("ds-2", 40.0), ("ds-1", 50.0)])
+    records.add("vm-5", "rhel9", "plan-b", 1024, T0, 5.0, disk_tasks=[("ds-1", 60.0)])
+    assert records.datastore_names == ["", "ds-2", "ds-1"]
+    assert [records.datastore_name(index) for index in range(len(records))] == ["", "", "", "ds-2", "ds-1"]
+    copy = VMRecords()
+    copy.add("vm-0", "rhel9", "plan-a", 0, T0, 1.0, disk_tasks=[("ds-1", 10.0)])
+    copy.extend(records)
+    assert [copy.datastore_name(index) for index in range(len(copy))] == ["ds-1", "", "", "", "ds-2", "ds-1"]
+
+
+def test_missing_times(records):
+    records.add("vm-4", "rhel9", "plan-b", 0, None, 0.0)
+    assert records.start_times[3] == records.end_times[3] == MISSING
+    assert records[3].start_time is None and records[3].end_time is None
+
+
+def test_legacy_os_dict(records):
+    # Legacy dicts carry datetimes
+    start = datetime.fromtimestamp(T0, timezone.utc)
+    all_vms = {
+        "rhel9": [
+            {"name": "vm-1", "plan": "plan-a", "disk_size": 2048, "start_time": start, "duration": 30.0},
+            {
+                "name": "vm-3",
+                "plan": "plan-b",
+                "disk_size": 1024,
+                "start_time": start + timedelta(minutes=20),
+                "duration": 5.0,
+                "end_time": start + timedelta(hours=1),
+            },
+        ],
+        "win2019": [
+            {
+                "name": "vm-2",
+                "plan": "plan-a",
+                "disk_size": 4096,
+                "start_time": start + timedelta(minutes=10),
+                "duration": 45.5,
+                "failed": True,
+            }
+        ],
+    }
+    converted = as_vm_records(all_vms)
+    assert sorted(converted, key=lambda record: record.name) == list(records)
+    assert as_vm_records(records) is records
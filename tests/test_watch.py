@@ -0,0 +1,106 @@
+import copy
+import json
+import random
+
+import pytest
+from mtv_plan_parser import load_dump
+from plan_loader import iter_dump
+from vm_information import analyze_concurrent_migrations
+from watch import JSONStreamSplitter, PlanWatcher, plans_in
+
+pytestmark = pytest.mark.unit
+
+
+@pytest.fixture(scope="module")
+def plans(sample_json_dump):
+    return list(iter_dump(str(sample_json_dump)))
+
+
+def _chunks(text, rnd):
+    position = 0
+    while position < len(text):
+        size = rnd.choice([1, 2, 7, 100, 5000])
+        yield text[position : position + size]
+        position += size
+
+
+def test_splitter_handles_any_chunking():
+    documents = [
+        {"kind": "Plan", "metadata": {"name": 'tricky "}{][" \\ name'}},
+        [1, {"a": []}],
+        {},
+        {"type": "ADDED", "object": {"text": '\\"{'}},
+    ]
+    lines = "".join(json.dumps(document) + "\n" for document in documents[1:])
+    text = json.dumps(documents[0], indent=2) + "\n" + lines
+    for seed in range(20):
+        splitter = JSONStreamSplitter()
+        found = [
+            json.loads(document) for chunk in _chunks(text, random.Random(seed)) for document in splitter.feed(chunk)
+        ]
+        assert found == documents
+
+
+def test_splitter_rejects_other_values():
+    with pytest.raises(ValueError):
+        JSONStreamSplitter().feed('{"a": 1} nope')
+
+
+def test_plans_in_documents():
+    plan = {"kind": "Plan", "metadata": {"name": "a"}}
+    assert list(plans_in(plan)) == [plan]
+    assert list(plans_in({"kind": "List", "items": [plan, {"kind": "Secret"}, plan]})) == [plan, plan]
+    assert list(plans_in({"type": "MODIFIED", "object": plan})) == [plan]
+    assert list(plans_in({"type": "DELETED", "object": plan})) == []
+    assert list(plans_in([plan])) == []
+
+
+def test_watcher_matches_batch_report(plans, sample_json_dump):
+    watcher = PlanWatcher()
+    for plan in plans:
+        watcher.apply(plan)
+    all_vms, successful_migrations, failed_migrations = watcher.records()
+    expected_vms, expected_successful, expected_failed = load_dump(str(sample_json_dump))
+    assert sorted(all_vms.names) == sorted(expected_vms.names)
+    assert sorted(map(repr, all_vms.failures)) == sorted(map(repr, expected_vms.failures))
+    assert successful_migrations == expected_successful and failed_migrations == expected_failed
+    analysis = watcher.concurrency.analysis()
+    expected = analyze_concurrent_migrations(expected_vms)
+    assert analysis["hourly_concurrent_vms"] == expected["hourly_concurrent_vms"]
+    assert analysis["max_concurrent"] == expected["max_concurrent"]
+    assert analysis["max_concurrent_total"] == expected["max_concurrent_total"]
+
+
+def test_watcher_applies_each_version_once(plans):
+    plan = next(plan for plan in plans if plan["status"]["migration"].get("completed"))
+    watcher = PlanWatcher()
+    assert watcher.apply(plan)
+    watcher.changed = False
+    assert not watcher.apply(copy.deepcopy(plan))
+    assert not watcher.changed
+
+
+def test_watcher_follows_new_versions(plans):
+    plan = next(
+        plan
+        for plan in plans
+        if len(plan["status"]["migration"].get("vms", [])) > 1 and plan["status"]["migration"].get("completed")
+    )
+    watcher = PlanWatcher()
+    watcher.apply(plan)
+    vms = watcher.concurrency.vms
+    assert vms == len(watcher.records()[0])
+
+    rerun = copy.deepcopy(plan)
+    rerun["metadata"]["resourceVersion"] = "rerun"
+    del rerun["status"]["migration"]["completed"]
+    # A new migration that has not completed yet keeps the previous one in the report
+    watcher.apply(rerun)
+    assert watcher.concurrency.vms == vms
+
+    rerun["metadata"]["resourceVersion"] = "done"
+    rerun["status"]["migration"] = copy.deepcopy(plan["status"]["migration"])
+    del rerun["status"]["migration"]["vms"][0]
+    assert watcher.apply(rerun)
+    assert watcher.concurrency.vms < vms
+    assert len(watcher.records()[0]) == vms - 1